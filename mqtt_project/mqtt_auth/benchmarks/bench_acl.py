@@ -0,0 +1,85 @@
+"""
+Measures ACL decisions per second, client compilation and reload times for a large rule file.
+
+Run from mqtt_project/:
+    python -m mqtt_auth.benchmarks.bench_acl --rules 100000 --clients 1000
+"""
+import argparse
+import random
+import time
+from mqtt_auth.src.acl import ACLAuthProvider, ACLRules
+
+_RULES_PER_USER = 10
+_GLOBAL_RULES = 1000
+
+
+def _rule_file(rules: int) -> str:
+    """Builds a rule file of global topics, patterns and per-user sections totalling about rules lines."""
+    lines = [f"topic read public/area-{i}/+/state" for i in range(_GLOBAL_RULES)]
+    lines += ["topic deny public/area-0/#", "pattern readwrite devices/%c/#", "pattern write users/%u/status"]
+    for user in range((rules - len(lines)) // _RULES_PER_USER):
+        lines.append(f"user user-{user}")
+        lines += [f"topic write sites/site-{user}/line-{line}/#" for line in range(_RULES_PER_USER)]
+    return "\n".join(lines)
+
+
+def _timed(label: str, count: int, function) -> None:
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {count / elapsed:>14,.0f}/s {elapsed * 1000:>10.1f} ms")
+
+
+def run(rules: int, clients: int, decisions: int) -> None:
+    text = _rule_file(rules)
+    start = time.perf_counter()
+    parsed = ACLRules.parse(text)
+    provider = ACLAuthProvider(parsed)
+    print(f"parsed and compiled {len(parsed):,} rules in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    users = len(parsed.users)
+    _timed("client compilations", clients, lambda: [
+        provider.connect(f"client-{i}", f"user-{i % users}") for i in range(clients)
+    ])
+
+    rng = random.Random(1)
+    checks = []
+    for _ in range(decisions):
+        i = rng.randrange(clients)
+        kind = rng.randrange(3)
+        if kind == 0:
+            topic = f"sites/site-{i % users}/line-{rng.randrange(_RULES_PER_USER)}/speed"
+        elif kind == 1:
+            topic = f"devices/client-{i}/temperature"
+        else:
+            topic = f"sites/site-{(i + 1) % users}/line-0/speed"
+        checks.append((f"client-{i}", topic))
+
+    distinct = [(client_id, f"{topic}/{n}") for n, (client_id, topic) in enumerate(checks)]
+    _timed("publish decisions, uncached", decisions, lambda: [provider.can_publish(c, t) for c, t in distinct])
+    repeated = [(client_id, f"devices/{client_id}/temperature") for client_id, _ in checks]
+    for client_id, topic in repeated:
+        provider.can_publish(client_id, topic)
+    _timed("publish decisions, cached", decisions, lambda: [provider.can_publish(c, t) for c, t in repeated])
+    filters = [(client_id, f"public/area-{n % _GLOBAL_RULES}/+/state") for n, (client_id, _) in enumerate(checks)]
+    _timed("subscribe decisions", decisions, lambda: [provider.can_subscribe(c, f) for c, f in filters])
+
+    changed = ACLRules.parse(text.replace("topic write sites/site-0/line-0/#", "topic write sites/site-0/line-0/+"))
+    start = time.perf_counter()
+    recompiled = provider.reload(changed)
+    print(f"reload with one user changed: {recompiled} clients recompiled in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    print(provider.stats)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rules", type=int, default=100000)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--decisions", type=int, default=200000)
+    args = parser.parse_args()
+    run(args.rules, args.clients, args.decisions)
+
+
+if __name__ == "__main__":
+    main()
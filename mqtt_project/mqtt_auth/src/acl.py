@@ -0,0 +1,474 @@
+from collections import OrderedDict
+from time import perf_counter_ns
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from mqtt_common.src.auth import AuthCredentials, AuthInterface
+from mqtt_common.models.constants import MQTTProtocol
+from mqtt_common.models.errors import ValidationError
+from mqtt_common.src.metrics import Metrics
+from mqtt_storage.src.subscriptions import parse_shared_filter, validate_topic_filter
+
+READ = 1 # Subscribing
+WRITE = 2 # Publishing
+READWRITE = READ | WRITE
+DEFAULT_DECISION_CACHE_SIZE = 256 # Recent topic decisions remembered per connection and access
+
+_SEPARATOR = MQTTProtocol.TOPIC_LEVEL_SEPARATOR
+_PLUS = MQTTProtocol.SINGLE_LEVEL_WILDCARD
+_HASH = MQTTProtocol.MULTI_LEVEL_WILDCARD
+_SYSTEM_PREFIX = MQTTProtocol.SYSTEM_TOPIC_PREFIX
+_ACCESS = {"read": READ, "write": WRITE, "readwrite": READWRITE}
+_CLIENT_ID = "%c"
+_USERNAME = "%u"
+
+
+class AccessRule(NamedTuple):
+    """One ACL line: whether it allows or denies access (READ, WRITE or both) to a topic filter."""
+    topic_filter: str
+    access: int = READWRITE
+    deny: bool = False
+
+    @property
+    def mask(self) -> int:
+        """Allow bits in the low two bits, deny bits in the next two."""
+        return self.access << 2 if self.deny else self.access
+
+
+class ACLRules:
+    """
+    Parsed ACL rule file.
+
+    The format follows mosquitto's acl_file, with an optional allow/deny keyword:
+
+        # Comment
+        topic [allow|deny] [read|write|readwrite] <topic filter>
+        pattern [allow|deny] [read|write|readwrite] <topic filter with %c and %u>
+        user <username>
+        client <client id>
+
+    topic lines before any user or client line apply to every client, those after one
+    only to that username or client ID. pattern lines apply to every client wherever
+    they appear, with %c replaced by its client ID and %u by its username. Access
+    defaults to allow readwrite; read is subscribing, write is publishing.
+    """
+
+    def __init__(
+        self,
+        topics: Tuple[AccessRule, ...] = (),
+        patterns: Tuple[AccessRule, ...] = (),
+        users: Optional[Dict[str, Tuple[AccessRule, ...]]] = None,
+        clients: Optional[Dict[str, Tuple[AccessRule, ...]]] = None
+    ):
+        self.topics = topics # Rules for every client
+        self.patterns = patterns # Rules for every client, with %c and %u substituted
+        self.users = users or {} # username -> rules
+        self.clients = clients or {} # client_id -> rules
+
+    def __len__(self) -> int:
+        return (len(self.topics) + len(self.patterns)
+                + sum(map(len, self.users.values())) + sum(map(len, self.clients.values())))
+
+    @classmethod
+    def load(cls, path: str) -> 'ACLRules':
+        """Reads and parses a rule file."""
+        with open(path, encoding="utf-8") as f:
+            return cls.parse(f.read())
+
+    @classmethod
+    def parse(cls, text: str) -> 'ACLRules':
+        """Parses rule file contents; raises ValidationError naming the first invalid line."""
+        topics: List[AccessRule] = []
+        patterns: List[AccessRule] = []
+        sections: Dict[str, Dict[str, List[AccessRule]]] = {"user": {}, "client": {}}
+        section = topics
+        for number, line in enumerate(text.splitlines(), 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            keyword, _, rest = line.partition(" ")
+            rest = rest.strip()
+            if keyword in sections:
+                if not rest:
+                    raise ValidationError(f"ACL line {number}: {keyword} needs a name")
+                section = sections[keyword].setdefault(rest, [])
+            elif keyword in ("topic", "pattern"):
+                try:
+                    rule = cls._parse_rule(rest)
+                except ValidationError as e:
+                    raise ValidationError(f"ACL line {number}: {e}") from e
+                (patterns if keyword == "pattern" else section).append(rule)
+            else:
+                raise ValidationError(f"ACL line {number}: unknown keyword {keyword!r}")
+        return cls(
+            tuple(topics), tuple(patterns),
+            {name: tuple(rules) for name, rules in sections["user"].items()},
+            {name: tuple(rules) for name, rules in sections["client"].items()}
+        )
+
+    @staticmethod
+    def _parse_rule(rest: str) -> AccessRule:
+        """Parses '[allow|deny] [read|write|readwrite] <filter>'."""
+        deny = False
+        access = READWRITE
+        word, _, remainder = rest.partition(" ")
+        if word in ("allow", "deny"):
+            deny = word == "deny"
+            rest = remainder.strip()
+            word, _, remainder = rest.partition(" ")
+        if word in _ACCESS:
+            access = _ACCESS[word]
+            rest = remainder.strip()
+        validate_topic_filter(rest)
+        return AccessRule(rest, access, deny)
+
+
+class _RuleNode:
+    """One topic level of a rule trie."""
+    __slots__ = ('children', 'plus', 'here', 'multi', 'below')
+
+    def __init__(self):
+        self.children: Dict[str, '_RuleNode'] = {} # Child per literal topic level
+        self.plus: Optional['_RuleNode'] = None # Child for a '+' level
+        self.here = 0 # Masks of rules whose filter ends here
+        self.multi = 0 # Masks of rules with a '#' level below this one
+        self.below = 0 # Masks of every rule at or below this node
+
+
+class RuleTrie:
+    """
+    ACL rules compiled into a topic trie of allow/deny masks.
+
+    Checking a topic walks it like SubscriptionTrie.match and ORs the masks of every
+    matching rule. A subscription filter is allowed by the rules that cover it (every
+    topic it matches, they match too) and denied by any deny rule it overlaps, so
+    subscribing to 'a/#' is refused when 'a/secret' is denied. Rules starting with a
+    wildcard do not apply to '$' topics.
+    """
+    __slots__ = ('_root', 'rules')
+
+    def __init__(self, rules: Tuple[AccessRule, ...] = ()):
+        self._root = _RuleNode()
+        self.rules = rules
+        for rule in rules:
+            self._add(rule.topic_filter, rule.mask)
+        self._finish(self._root)
+
+    def _add(self, topic_filter: str, mask: int) -> None:
+        node = self._root
+        levels = topic_filter.split(_SEPARATOR)
+        is_multi = levels[-1] == _HASH
+        if is_multi:
+            levels.pop()
+        for level in levels:
+            if level == _PLUS:
+                if node.plus is None:
+                    node.plus = _RuleNode()
+                node = node.plus
+            else:
+                child = node.children.get(level)
+                if child is None:
+                    child = node.children[level] = _RuleNode()
+                node = child
+        if is_multi:
+            node.multi |= mask
+        else:
+            node.here |= mask
+
+    def _finish(self, root: _RuleNode) -> None:
+        """Fills in the below masks, children before parents."""
+        order = [root]
+        for node in order:
+            order.extend(node.children.values())
+            if node.plus is not None:
+                order.append(node.plus)
+        for node in reversed(order):
+            below = node.here | node.multi
+            for child in node.children.values():
+                below |= child.below
+            if node.plus is not None:
+                below |= node.plus.below
+            node.below = below
+
+    def topic_mask(self, topic: str) -> int:
+        """Returns the masks of every rule matching a topic name."""
+        root = self._root
+        if not root.below:
+            return 0
+        mask = 0
+        nodes = [root]
+        skip_wildcards = topic.startswith(_SYSTEM_PREFIX)
+        for level in topic.split(_SEPARATOR):
+            next_nodes = []
+            for node in nodes:
+                wild = not (skip_wildcards and node is root)
+                if wild:
+                    mask |= node.multi
+                child = node.children.get(level)
+                if child is not None:
+                    next_nodes.append(child)
+                if wild and node.plus is not None:
+                    next_nodes.append(node.plus)
+            if not next_nodes:
+                return mask
+            nodes = next_nodes
+        for node in nodes:
+            mask |= node.here | node.multi
+        return mask
+
+    def filter_masks(self, topic_filter: str) -> Tuple[int, int]:
+        """Returns (masks of rules covering a topic filter, masks of rules overlapping it)."""
+        if not self._root.below:
+            return 0, 0
+        levels = topic_filter.split(_SEPARATOR)
+        return self._filter_masks(self._root, levels, 0, levels[0].startswith(_SYSTEM_PREFIX))
+
+    def _filter_masks(self, node: _RuleNode, levels: List[str], index: int, system: bool) -> Tuple[int, int]:
+        at_root = index == 0
+        wild = not (system and at_root)
+        cover = overlap = node.multi if wild else 0
+        if index == len(levels):
+            return cover | node.here, overlap | node.here
+        level = levels[index]
+        if level == _HASH:
+            # Only '#' rules cover '#'; every rule below overlaps it ('a/#' also matches 'a')
+            if not at_root:
+                return cover, overlap | node.below
+            for key, child in node.children.items():
+                if not key.startswith(_SYSTEM_PREFIX):
+                    overlap |= child.below
+            return cover, overlap | (node.plus.below if node.plus is not None else 0)
+        if level == _PLUS:
+            # Only '+' rules cover '+'; literal rules at this level overlap it
+            for key, child in node.children.items():
+                if not (at_root and key.startswith(_SYSTEM_PREFIX)):
+                    overlap |= self._filter_masks(child, levels, index + 1, system)[1]
+            if node.plus is not None:
+                plus_cover, plus_overlap = self._filter_masks(node.plus, levels, index + 1, system)
+                cover |= plus_cover
+                overlap |= plus_overlap
+            return cover, overlap
+        child = node.children.get(level)
+        if child is not None:
+            child_cover, child_overlap = self._filter_masks(child, levels, index + 1, system)
+            cover |= child_cover
+            overlap |= child_overlap
+        if wild and node.plus is not None:
+            plus_cover, plus_overlap = self._filter_masks(node.plus, levels, index + 1, system)
+            cover |= plus_cover
+            overlap |= plus_overlap
+        return cover, overlap
+
+
+class _ClientACL:
+    """The compiled rules of one connection and its recent decisions."""
+    __slots__ = ('username', 'source', 'trie', 'publishes', 'subscribes')
+
+    def __init__(self, username: Optional[str], source: tuple, trie: RuleTrie):
+        self.username = username
+        self.source = source # The rule sections the trie was compiled from
+        self.trie = trie
+        self.publishes: 'OrderedDict[str, bool]' = OrderedDict() # topic -> allowed
+        self.subscribes: 'OrderedDict[str, bool]' = OrderedDict() # topic filter -> allowed
+
+
+def _substitute(rule: AccessRule, client_id: str, username: Optional[str]) -> Optional[AccessRule]:
+    """Returns a pattern rule with %c and %u replaced, or None if it cannot apply to this client."""
+    topic_filter = rule.topic_filter
+    for placeholder, value in ((_CLIENT_ID, client_id), (_USERNAME, username)):
+        if placeholder in topic_filter:
+            # A missing name or one that would change the filter's levels grants nothing
+            if not value or _SEPARATOR in value or _PLUS in value or _HASH in value:
+                return None
+            topic_filter = topic_filter.replace(placeholder, value)
+    return rule._replace(topic_filter=topic_filter)
+
+
+class ACLAuthProvider(AuthInterface):
+    """
+    Topic authorization from ACL rules.
+
+    Rules that apply to every client are compiled once into a shared RuleTrie. When a
+    client connects, its pattern rules (with %c and %u substituted) and the rules of
+    its username and client ID are compiled into a small trie of its own, so a
+    decision walks two tries whose size does not depend on the rules of other clients.
+    Each connection then remembers its last decision_cache_size publish topics and
+    subscription filters, so repeated publishes to the same topic cost one dict lookup.
+
+    A deny rule matching the topic wins over any allow rule; a topic no rule allows is
+    denied unless default_allow is set. reload() swaps in new rules and only recompiles
+    the clients whose sections changed; every decision cache is cleared.
+
+    Authentication is delegated to authenticator (every client is accepted without
+    one); a client that authenticated is compiled under its username. Clients that
+    were not, e.g. authenticated elsewhere, are compiled on their first check without
+    a username.
+
+    With metrics, sampled decisions that miss the cache record their time (acl).
+
+    Attributes:
+        hits: Decisions answered from a connection's cache
+        misses: Decisions that walked the tries
+        compiled: Client tries compiled
+        reloads: Rule reloads
+    """
+    gauges = frozenset({"rules", "clients"}) # Sizes, not counts
+
+    def __init__(
+        self,
+        rules: ACLRules,
+        authenticator: Optional[AuthInterface] = None,
+        default_allow: bool = False,
+        decision_cache_size: int = DEFAULT_DECISION_CACHE_SIZE,
+        path: Optional[str] = None,
+        metrics: Optional[Metrics] = None
+    ):
+        self.rules = rules
+        self.authenticator = authenticator
+        self.default_allow = default_allow
+        self.decision_cache_size = decision_cache_size
+        self.path = path # Rule file read again by reload()
+        self.metrics = metrics
+        self._shared = RuleTrie(rules.topics)
+        self._clients: Dict[str, _ClientACL] = {}
+        self.hits = 0
+        self.misses = 0
+        self.compiled = 0
+        self.reloads = 0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'ACLAuthProvider':
+        """Creates a provider from a rule file that reload() reads again."""
+        return cls(ACLRules.load(path), path=path, **kwargs)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Rule and decision cache counters."""
+        return {
+            "rules": len(self.rules),
+            "clients": len(self._clients),
+            "hits": self.hits,
+            "misses": self.misses,
+            "compiled": self.compiled,
+            "reloads": self.reloads,
+        }
+
+    async def authenticate(self, credentials: AuthCredentials) -> bool:
+        """Authenticate with the wrapped provider and compile the client's rules"""
+        if self.authenticator is not None and not await self.authenticator.authenticate(credentials):
+            return False
+        self.connect(credentials.client_id, credentials.username)
+        return True
+
+    def connect(self, client_id: str, username: Optional[str] = None) -> None:
+        """Compiles the rules of a connecting client, replacing any previous ones."""
+        self._clients[client_id] = self._compile(client_id, username)
+
+    def disconnect(self, client_id: str) -> None:
+        """Forgets the compiled rules of a client."""
+        self._clients.pop(client_id, None)
+
+    def reload(self, rules: Optional[ACLRules] = None) -> int:
+        """
+        Replaces the rules (read from path when not given) and returns how many
+        connected clients were recompiled.
+        """
+        rules = ACLRules.load(self.path) if rules is None else rules
+        if rules.topics != self.rules.topics:
+            self._shared = RuleTrie(rules.topics)
+        self.rules = rules
+        self.reloads += 1
+        recompiled = 0
+        for client_id, acl in self._clients.items():
+            if self._source(client_id, acl.username) != acl.source:
+                self._clients[client_id] = self._compile(client_id, acl.username)
+                recompiled += 1
+            else:
+                acl.publishes.clear()
+                acl.subscribes.clear()
+        return recompiled
+
+    def _source(self, client_id: str, username: Optional[str]) -> tuple:
+        """The rule sections a client's trie is compiled from."""
+        rules = self.rules
+        user_rules = rules.users.get(username, ()) if username is not None else ()
+        return rules.patterns, user_rules, rules.clients.get(client_id, ())
+
+    def _compile(self, client_id: str, username: Optional[str]) -> _ClientACL:
+        source = self._source(client_id, username)
+        patterns, user_rules, client_rules = source
+        substituted = (_substitute(rule, client_id, username) for rule in patterns)
+        rules = tuple(rule for rule in substituted if rule is not None) + user_rules + client_rules
+        self.compiled += 1
+        return _ClientACL(username, source, RuleTrie(rules))
+
+    def _client(self, client_id: str) -> _ClientACL:
+        acl = self._clients.get(client_id)
+        if acl is None:
+            acl = self._clients[client_id] = self._compile(client_id, None)
+        return acl
+
+    def _decide(self, allowed: int, denied: int, access: int) -> bool:
+        if denied & (access << 2):
+            return False
+        return bool(allowed & access) or self.default_allow
+
+    def can_publish(self, client_id: str, topic: str) -> bool:
+        """Returns whether a client may publish to a topic name."""
+        decisions = self._client(client_id).publishes
+        allowed = decisions.get(topic)
+        if allowed is not None:
+            self.hits += 1
+            decisions.move_to_end(topic)
+            return allowed
+        self.misses += 1
+        metrics = self.metrics
+        started = perf_counter_ns() if metrics is not None and metrics.acl.sampled() else 0
+        if _PLUS in topic or _HASH in topic:
+            allowed = False
+        else:
+            mask = self._shared.topic_mask(topic) | self._client(client_id).trie.topic_mask(topic)
+            allowed = self._decide(mask, mask, WRITE)
+        self._remember(decisions, topic, allowed)
+        if started:
+            metrics.acl.record(perf_counter_ns() - started)
+        return allowed
+
+    def can_subscribe(self, client_id: str, topic_filter: str) -> bool:
+        """Returns whether a client may subscribe to a topic filter; $share/<group>/<filter> is checked as <filter>."""
+        decisions = self._client(client_id).subscribes
+        allowed = decisions.get(topic_filter)
+        if allowed is not None:
+            self.hits += 1
+            decisions.move_to_end(topic_filter)
+            return allowed
+        self.misses += 1
+        metrics = self.metrics
+        started = perf_counter_ns() if metrics is not None and metrics.acl.sampled() else 0
+        try:
+            shared = parse_shared_filter(topic_filter)
+            if shared is None:
+                validate_topic_filter(topic_filter)
+        except ValidationError:
+            allowed = False
+        else:
+            # A shared subscription receives the messages of its inner filter
+            inner = topic_filter if shared is None else shared[1]
+            shared_cover, shared_overlap = self._shared.filter_masks(inner)
+            client_cover, client_overlap = self._client(client_id).trie.filter_masks(inner)
+            allowed = self._decide(shared_cover | client_cover, shared_overlap | client_overlap, READ)
+        self._remember(decisions, topic_filter, allowed)
+        if started:
+            metrics.acl.record(perf_counter_ns() - started)
+        return allowed
+
+    def _remember(self, decisions: 'OrderedDict[str, bool]', topic: str, allowed: bool) -> None:
+        decisions[topic] = allowed
+        if len(decisions) > self.decision_cache_size:
+            decisions.popitem(last=False)
+
+    async def authorize_publish(self, client_id: str, topic: str) -> bool:
+        """Check the client's compiled rules for a publish"""
+        return self.can_publish(client_id, topic)
+
+    async def authorize_subscribe(self, client_id: str, topic: str) -> bool:
+        """Check the client's compiled rules for a subscription"""
+        return self.can_subscribe(client_id, topic)
@@ -0,0 +1,235 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from mqtt_common.src.auth import AuthCredentials, AuthInterface
+from mqtt_common.models.errors import ValidationError
+
+PBKDF2_SCHEME = "pbkdf2_sha256"
+SCRYPT_SCHEME = "scrypt"
+DEFAULT_PBKDF2_ITERATIONS = 600000 # OWASP recommendation for PBKDF2-HMAC-SHA256
+DEFAULT_SCRYPT_N = 2 ** 14 # scrypt cost parameters N, r, p
+DEFAULT_SCRYPT_R = 8
+DEFAULT_SCRYPT_P = 1
+DEFAULT_MAX_WORKERS = 4 # Threads verifying password hashes
+DEFAULT_MAX_PENDING = 1000 # Verifications queued or running before further CONNECTs are refused
+DEFAULT_CACHE_TTL = 300.0 # Seconds a successful verification is remembered
+DEFAULT_NEGATIVE_TTL = 30.0 # Seconds a failed verification is remembered
+DEFAULT_CACHE_SIZE = 100000 # Verification results kept, least recently used first out
+
+_SALT_SIZE = 16
+_SEPARATOR = "$"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(
+    password: bytes,
+    scheme: str = PBKDF2_SCHEME,
+    iterations: int = DEFAULT_PBKDF2_ITERATIONS,
+    salt: Optional[bytes] = None
+) -> str:
+    """
+    Hashes a password into an encoded string holding the scheme, its parameters and the salt.
+
+    pbkdf2_sha256$<iterations>$<salt>$<hash> or scrypt$<n>$<r>$<p>$<salt>$<hash>, with
+    base64 salt and hash. iterations only applies to PBKDF2.
+    """
+    salt = os.urandom(_SALT_SIZE) if salt is None else salt
+    if scheme == PBKDF2_SCHEME:
+        digest = hashlib.pbkdf2_hmac("sha256", password, salt, iterations)
+        fields = [scheme, str(iterations)]
+    elif scheme == SCRYPT_SCHEME:
+        digest = hashlib.scrypt(password, salt=salt, n=DEFAULT_SCRYPT_N, r=DEFAULT_SCRYPT_R, p=DEFAULT_SCRYPT_P)
+        fields = [scheme, str(DEFAULT_SCRYPT_N), str(DEFAULT_SCRYPT_R), str(DEFAULT_SCRYPT_P)]
+    else:
+        raise ValidationError(f"Unknown password hash scheme: {scheme}")
+    return _SEPARATOR.join(fields + [_b64encode(salt), _b64encode(digest)])
+
+
+def verify_password(password: bytes, encoded: str) -> bool:
+    """
+    Checks a password against a hash from hash_password; runs the KDF, so call it off the event loop.
+
+    A malformed hash never matches.
+    """
+    fields = encoded.split(_SEPARATOR)
+    try:
+        if fields[0] == PBKDF2_SCHEME and len(fields) == 4:
+            expected = _b64decode(fields[3])
+            digest = hashlib.pbkdf2_hmac("sha256", password, _b64decode(fields[2]), int(fields[1]))
+        elif fields[0] == SCRYPT_SCHEME and len(fields) == 6:
+            expected = _b64decode(fields[5])
+            digest = hashlib.scrypt(
+                password, salt=_b64decode(fields[4]),
+                n=int(fields[1]), r=int(fields[2]), p=int(fields[3]), dklen=len(expected)
+            )
+        else:
+            return False
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest, expected)
+
+
+class PasswordAuthProvider(AuthInterface):
+    """
+    Username/password authentication against KDF password hashes.
+
+    Hash verification is deliberately slow, so it runs on executor (by default a
+    ThreadPoolExecutor of max_workers threads; hashlib releases the GIL while hashing)
+    and never on the event loop. At most max_pending verifications may be queued or
+    running: beyond that CONNECTs are refused at once and counted in shed, so a
+    reconnect storm cannot build an unbounded backlog.
+
+    Results are cached per (username, password digest) for cache_ttl seconds when the
+    password matched and negative_ttl seconds when it did not, so clients reconnecting
+    with the same credentials cost one verification per TTL. Cache keys hold a keyed
+    BLAKE2 digest of the password, never the password itself, and a cached result only
+    counts while the user's stored hash is unchanged. Concurrent CONNECTs with the same
+    credentials share one verification. Unknown usernames are checked against a dummy
+    hash with the parameters of a stored one, so they take as long as wrong passwords.
+
+    Authorization is not handled here: authorize_publish and authorize_subscribe allow
+    everything.
+
+    Attributes:
+        hits: Authentications answered from the cache, successful or not
+        misses: Authentications that needed a verification
+        verifications: Hash verifications run
+        shed: Authentications refused because max_pending verifications were in progress
+        pending: Verifications queued or running now
+        high_watermark: Largest value pending has reached
+    """
+    gauges = frozenset({"cached", "pending", "queued", "high_watermark"}) # Cache size and executor load, not counts
+
+    def __init__(
+        self,
+        users: Optional[Dict[str, str]] = None,
+        executor: Optional[Executor] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        cache_ttl: float = DEFAULT_CACHE_TTL,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.users: Dict[str, str] = dict(users or {}) # Username -> encoded password hash
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="auth")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        self.cache_size = cache_size
+        self.clock = clock
+        # (username, password digest) -> (expiry, result, stored hash it was verified against)
+        self._cache: 'OrderedDict[Tuple[str, bytes], Tuple[float, bool, str]]' = OrderedDict()
+        self._inflight: Dict[Tuple[str, bytes], asyncio.Future] = {}
+        self._digest_key = os.urandom(32) # Keys the password digests of cache entries
+        self.hits = 0
+        self.misses = 0
+        self.verifications = 0
+        self.shed = 0
+        self.pending = 0
+        self.high_watermark = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Cache and executor counters."""
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "verifications": self.verifications,
+            "shed": self.shed,
+            "pending": self.pending,
+            "queued": max(0, self.pending - self.max_workers),
+            "high_watermark": self.high_watermark,
+        }
+
+    def set_password(
+        self, username: str, password: bytes,
+        scheme: str = PBKDF2_SCHEME, iterations: int = DEFAULT_PBKDF2_ITERATIONS
+    ) -> None:
+        """Adds a user or changes its password; runs the KDF, so call it off the event loop."""
+        self.users[username] = hash_password(password, scheme, iterations)
+
+    def remove_user(self, username: str) -> None:
+        """Removes a user; its cached results stop counting at once."""
+        self.users.pop(username, None)
+
+    def close(self) -> None:
+        """Shuts down the executor."""
+        self.executor.shutdown(wait=False)
+
+    async def authenticate(self, credentials: AuthCredentials) -> bool:
+        """Verify a username and password, from the cache when possible"""
+        username, password = credentials.username, credentials.password
+        if username is None or password is None:
+            return False
+        stored = self.users.get(username)
+        key = (username, hashlib.blake2b(password, key=self._digest_key).digest())
+        cached = self._cache.get(key)
+        if cached is not None:
+            expires, result, verified_against = cached
+            if expires > self.clock() and verified_against is stored:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return result
+            del self._cache[key]
+        self.misses += 1
+
+        waiter = self._inflight.get(key)
+        if waiter is None:
+            if self.pending >= self.max_pending:
+                self.shed += 1
+                return False
+            waiter = self._inflight[key] = asyncio.ensure_future(self._verify(key, password, stored))
+        return await asyncio.shield(waiter)
+
+    async def _verify(self, key: Tuple[str, bytes], password: bytes, stored: Optional[str]) -> bool:
+        """Runs one verification on the executor and caches its result."""
+        self.pending += 1
+        if self.pending > self.high_watermark:
+            self.high_watermark = self.pending
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, verify_password, password, self._dummy_hash() if stored is None else stored
+            )
+            result = result and stored is not None
+            self.verifications += 1
+        finally:
+            self.pending -= 1
+            del self._inflight[key]
+        ttl = self.cache_ttl if result else self.negative_ttl
+        self._cache[key] = (self.clock() + ttl, result, stored)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def _dummy_hash(self) -> str:
+        """Returns a hash with the parameters of a stored one but a random salt and digest."""
+        template = next(iter(self.users.values()), "")
+        fields = template.split(_SEPARATOR)
+        if len(fields) < 3:
+            return ""
+        fields[-2:] = [_b64encode(os.urandom(_SALT_SIZE)), _b64encode(os.urandom(32))]
+        return _SEPARATOR.join(fields)
+
+    async def authorize_publish(self, client_id: str, topic: str) -> bool:
+        """Allow every publish; authorization is left to an ACL provider"""
+        return True
+
+    async def authorize_subscribe(self, client_id: str, topic: str) -> bool:
+        """Allow every subscription; authorization is left to an ACL provider"""
+        return True
@@ -0,0 +1,167 @@
+import pytest
+from mqtt_common.src.auth import AuthCredentials
+from mqtt_common.models.errors import ValidationError
+from mqtt_common.src.metrics import Metrics
+from mqtt_auth.src.acl import ACLAuthProvider, ACLRules, AccessRule, RuleTrie, READ, WRITE
+
+RULES = """
+# Everyone may read the public tree, nobody its private branch
+topic read public/#
+topic deny public/private/#
+pattern readwrite devices/%c/#
+pattern write users/%u/status
+
+user admin
+topic #
+
+client sensor-1
+topic write telemetry/+/temperature
+"""
+
+class TestACLRules:
+    """Tests for parsing rule files."""
+
+    def test_parse_sections(self):
+        """Tests that rules land in the global, pattern, user and client sections."""
+        rules = ACLRules.parse(RULES)
+        assert rules.topics == (
+            AccessRule("public/#", READ), AccessRule("public/private/#", deny=True)
+        )
+        assert rules.patterns == (AccessRule("devices/%c/#"), AccessRule("users/%u/status", WRITE))
+        assert rules.users == {"admin": (AccessRule("#"),)}
+        assert rules.clients == {"sensor-1": (AccessRule("telemetry/+/temperature", WRITE),)}
+        assert len(rules) == 6
+
+    @pytest.mark.parametrize("text", ["topic read a/#/b", "user", "acl a/b"])
+    def test_invalid_lines(self, text):
+        """Tests that invalid lines are rejected with their line number."""
+        with pytest.raises(ValidationError, match="line 2"):
+            ACLRules.parse("topic a\n" + text)
+
+class TestRuleTrie:
+    """Tests for compiled rule matching."""
+
+    def test_topic_mask(self):
+        """Tests that every matching rule contributes its mask and '$' topics skip leading wildcards."""
+        trie = RuleTrie((AccessRule("a/+", READ), AccessRule("a/#", WRITE, deny=True), AccessRule("#", READ)))
+        assert trie.topic_mask("a/b") == READ | WRITE << 2
+        assert trie.topic_mask("a") == READ | WRITE << 2
+        assert trie.topic_mask("b/c") == READ
+        assert trie.topic_mask("$SYS/load") == 0
+
+    def test_filter_masks(self):
+        """Tests that filters are allowed by covering rules and denied by overlapping ones."""
+        trie = RuleTrie((AccessRule("a/#", READ), AccessRule("a/secret", READ, deny=True)))
+        assert trie.filter_masks("a/b/+") == (READ, READ)
+        assert trie.filter_masks("a/+") == (READ, READ | READ << 2)
+        assert trie.filter_masks("a/#") == (READ, READ | READ << 2)
+        assert trie.filter_masks("#") == (0, READ | READ << 2)
+
+class TestACLAuthProvider:
+    """Tests for per-client compiled authorization."""
+
+    def _provider(self, **kwargs) -> ACLAuthProvider:
+        provider = ACLAuthProvider(ACLRules.parse(RULES), **kwargs)
+        provider.connect("sensor-1", "alice")
+        provider.connect("admin-console", "admin")
+        return provider
+
+    def test_publish(self):
+        """Tests pattern substitution, client rules and deny precedence for publishes."""
+        provider = self._provider()
+        assert provider.can_publish("sensor-1", "devices/sensor-1/state")
+        assert not provider.can_publish("sensor-1", "devices/sensor-2/state")
+        assert provider.can_publish("sensor-1", "users/alice/status")
+        assert provider.can_publish("sensor-1", "telemetry/kitchen/temperature")
+        assert not provider.can_publish("sensor-1", "public/news")
+        assert provider.can_publish("admin-console", "anything/at/all")
+        assert not provider.can_publish("admin-console", "public/private/keys")
+        assert not provider.can_publish("admin-console", "a/+")
+
+    def test_subscribe(self):
+        """Tests that a subscription needs a covering allow rule and no overlapping deny rule."""
+        provider = self._provider()
+        assert provider.can_subscribe("sensor-1", "public/news/+")
+        assert not provider.can_subscribe("sensor-1", "public/#")
+        assert not provider.can_subscribe("sensor-1", "telemetry/+/temperature")
+        assert provider.can_subscribe("sensor-1", "devices/sensor-1/#")
+        assert not provider.can_subscribe("sensor-1", "devices/+/#")
+        assert not provider.can_subscribe("sensor-1", "a/#/b")
+
+    def test_subscribe_shared(self):
+        """Tests that a shared subscription is authorized by its inner filter."""
+        provider = ACLAuthProvider(ACLRules.parse("topic read sensors/#\n"))
+        provider.connect("reader", None)
+        assert provider.can_subscribe("reader", "$share/g/sensors/+")
+        assert provider.can_subscribe("reader", "$share/g/sensors/#")
+        assert not provider.can_subscribe("reader", "$share/g/actuators/+")
+        assert not provider.can_subscribe("reader", "$share/g+/sensors/+")
+        assert not provider.can_subscribe("reader", "$share/g")
+
+    def test_unsafe_substitution(self):
+        """Tests that patterns grant nothing to client IDs containing wildcards or separators, or without a username."""
+        provider = self._provider()
+        provider.connect("+", None)
+        assert not provider.can_publish("+", "devices/x/state")
+        assert not provider.can_publish("+", "users//status")
+        assert provider.can_subscribe("+", "public/news")
+
+    def test_default_allow(self):
+        """Tests that default_allow admits topics no rule mentions but keeps denials."""
+        provider = self._provider(default_allow=True)
+        assert provider.can_publish("sensor-1", "unmentioned")
+        assert not provider.can_publish("sensor-1", "public/private/x")
+
+    def test_decision_cache(self):
+        """Tests that repeated decisions are answered from the connection's bounded cache."""
+        provider = self._provider(decision_cache_size=2)
+        for topic in ("devices/sensor-1/a", "devices/sensor-1/a", "devices/sensor-1/b", "devices/sensor-1/c",
+                      "devices/sensor-1/a"):
+            assert provider.can_publish("sensor-1", topic)
+        assert provider.hits == 1 and provider.misses == 4
+
+    def test_metrics_time_cache_misses(self):
+        """Tests that only decisions that miss the cache are timed."""
+        metrics = Metrics(sample_every=1)
+        provider = self._provider(metrics=metrics)
+        for _ in range(3):
+            provider.can_publish("sensor-1", "devices/sensor-1/a")
+        provider.can_subscribe("sensor-1", "public/news")
+        assert metrics.acl.count == provider.misses == 2
+
+    def test_reload_recompiles_changed_clients(self):
+        """Tests that a reload only recompiles clients whose rules changed and clears cached decisions."""
+        provider = self._provider()
+        provider.connect("sensor-2", "bob")
+        assert provider.can_publish("sensor-1", "telemetry/x/temperature")
+        compiled = provider.compiled
+        changed = RULES.replace("topic write telemetry/+/temperature", "topic write telemetry/+/humidity")
+        assert provider.reload(ACLRules.parse(changed)) == 1
+        assert provider.compiled == compiled + 1
+        assert not provider.can_publish("sensor-1", "telemetry/x/temperature")
+        assert provider.can_publish("sensor-1", "telemetry/x/humidity")
+
+        assert provider.reload(ACLRules.parse(changed.replace("topic read public/#", "topic read news/#"))) == 0
+        assert provider.can_subscribe("sensor-2", "news/today")
+        assert not provider.can_subscribe("sensor-2", "public/today")
+
+    def test_reload_from_file(self, tmp_path):
+        """Tests that from_file providers reload their rule file."""
+        path = tmp_path / "acl"
+        path.write_text("topic write a/b\n")
+        provider = ACLAuthProvider.from_file(str(path))
+        assert provider.can_publish("c1", "a/b")
+        path.write_text("topic write a/c\n")
+        provider.reload()
+        assert not provider.can_publish("c1", "a/b")
+        assert provider.stats["reloads"] == 1
+
+    @pytest.mark.asyncio
+    async def test_authenticate_compiles_under_username(self):
+        """Tests that authenticate delegates to the wrapped provider and compiles under the username."""
+        provider = ACLAuthProvider(ACLRules.parse(RULES))
+        assert await provider.authenticate(AuthCredentials(username="carol", client_id="c1"))
+        assert await provider.authorize_publish("c1", "users/carol/status")
+        assert not await provider.authorize_subscribe("c1", "users/carol/status")
+        provider.disconnect("c1")
+        assert provider.stats["clients"] == 0
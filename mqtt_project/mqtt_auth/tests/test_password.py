@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from mqtt_common.src.auth import AuthCredentials
+from mqtt_common.models.errors import ValidationError
+from mqtt_auth.src.password import (
+    PasswordAuthProvider, hash_password, verify_password, PBKDF2_SCHEME, SCRYPT_SCHEME
+)
+
+_ITERATIONS = 1000 # Keeps the tests fast; production hashes use the default
+
+def _credentials(username: str = "alice", password: bytes = b"secret") -> AuthCredentials:
+    return AuthCredentials(username=username, password=password, client_id="c1")
+
+def _provider(**kwargs) -> PasswordAuthProvider:
+    """Builds a provider with one user, alice/secret."""
+    provider = PasswordAuthProvider(**kwargs)
+    provider.set_password("alice", b"secret", iterations=_ITERATIONS)
+    return provider
+
+class TestPasswordHashes:
+    """Tests for hashing and verifying passwords."""
+
+    @pytest.mark.parametrize("scheme", [PBKDF2_SCHEME, SCRYPT_SCHEME])
+    def test_round_trip(self, scheme):
+        """Tests that a hash verifies its own password only."""
+        encoded = hash_password(b"secret", scheme, iterations=_ITERATIONS)
+        assert encoded.startswith(scheme + "$")
+        assert verify_password(b"secret", encoded)
+        assert not verify_password(b"wrong", encoded)
+
+    def test_salted(self):
+        """Tests that hashing the same password twice gives different hashes."""
+        assert hash_password(b"secret", iterations=_ITERATIONS) != hash_password(b"secret", iterations=_ITERATIONS)
+
+    def test_malformed_hash(self):
+        """Tests that malformed hashes never match and unknown schemes are rejected."""
+        assert not verify_password(b"secret", "")
+        assert not verify_password(b"secret", "pbkdf2_sha256$many$salt$hash")
+        with pytest.raises(ValidationError):
+            hash_password(b"secret", "md5")
+
+@pytest.mark.asyncio
+class TestPasswordAuthProvider:
+    """Tests for the cached, offloaded password provider."""
+
+    async def test_authenticate(self):
+        """Tests correct and wrong passwords, unknown users and missing credentials."""
+        provider = _provider()
+        assert await provider.authenticate(_credentials())
+        assert not await provider.authenticate(_credentials(password=b"wrong"))
+        assert not await provider.authenticate(_credentials(username="mallory"))
+        assert not await provider.authenticate(AuthCredentials(client_id="c1"))
+        assert provider.verifications == 3
+        provider.close()
+
+    async def test_cache_hits_and_expiry(self):
+        """Tests that results are cached for their TTL, negative results for a shorter one."""
+        now = [0.0]
+        provider = _provider(cache_ttl=10, negative_ttl=1, clock=lambda: now[0])
+        assert await provider.authenticate(_credentials())
+        assert not await provider.authenticate(_credentials(password=b"wrong"))
+        now[0] = 5
+        assert await provider.authenticate(_credentials())
+        assert not await provider.authenticate(_credentials(password=b"wrong"))
+        assert provider.hits == 1 and provider.verifications == 3
+        now[0] = 11
+        assert await provider.authenticate(_credentials())
+        assert provider.verifications == 4
+        provider.close()
+
+    async def test_password_change_invalidates(self):
+        """Tests that cached results stop counting once the user's hash changes."""
+        provider = _provider()
+        assert await provider.authenticate(_credentials())
+        provider.set_password("alice", b"changed", iterations=_ITERATIONS)
+        assert not await provider.authenticate(_credentials())
+        provider.remove_user("alice")
+        assert not await provider.authenticate(_credentials(password=b"changed"))
+        assert provider.hits == 0
+        provider.close()
+
+    async def test_storm_shares_verification(self):
+        """Tests that concurrent CONNECTs with the same credentials run one verification."""
+        provider = _provider()
+        results = await asyncio.gather(*(provider.authenticate(_credentials()) for _ in range(50)))
+        assert all(results)
+        assert provider.verifications == 1
+        assert provider.high_watermark == 1
+        provider.close()
+
+    async def test_sheds_beyond_max_pending(self):
+        """Tests that verifications beyond max_pending are refused and the queue depth is reported."""
+        release = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=1)
+        executor.submit(release.wait) # Occupies the only worker
+        provider = _provider(executor=executor, max_workers=1, max_pending=2)
+        first = asyncio.ensure_future(provider.authenticate(_credentials(username="u1")))
+        second = asyncio.ensure_future(provider.authenticate(_credentials(username="u2")))
+        await asyncio.sleep(0.01)
+        assert provider.stats["pending"] == 2 and provider.stats["queued"] == 1
+        assert not await provider.authenticate(_credentials(username="u3"))
+        assert provider.shed == 1
+        release.set()
+        assert await asyncio.gather(first, second) == [False, False]
+        assert provider.pending == 0
+        provider.close()
@@ -0,0 +1,96 @@
+"""
+Measures delivering one PUBLISH to many subscribers, encoding per subscriber versus once per wire format.
+
+Run from mqtt_project/:
+    python -m mqtt_broker.benchmarks.bench_fanout --subscribers 1 1000 50000
+"""
+import argparse
+import asyncio
+import time
+from mqtt_common.models.constants import MQTTProtocol
+from mqtt_common.models.message import Message
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.packet import PublishPacket
+from mqtt_network.src.connection import ClientConnection, ClientSession
+from mqtt_network.src.network import CentralizedNetwork
+from mqtt_network.src.outbound import OutboundQueue
+from mqtt_network.src.fanout import FanOut, DEFAULT_BATCH_SIZE
+
+
+def _network(subscribers: int) -> CentralizedNetwork:
+    """Registers one connection and session per subscriber, three quarters MQTT 3.1.1 and a quarter 5.0; queues are not drained."""
+    network = CentralizedNetwork()
+    for i in range(subscribers):
+        version = MQTTProtocol.VERSION_5_0 if i % 4 == 0 else MQTTProtocol.VERSION_3_1_1
+        connection = network.clients[f"client-{i}"] = ClientConnection(f"client-{i}", None, version, OutboundQueue(None, 10))
+        connection.session = ClientSession()
+    return network
+
+
+async def _watch_loop(stop: asyncio.Event) -> float:
+    """Returns the longest gap between event loop iterations until stop is set."""
+    worst = 0.0
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0)
+        now = time.perf_counter()
+        worst = max(worst, now - last)
+        last = now
+    return worst
+
+
+async def _naive(network: CentralizedNetwork, message: Message, subscribers: list) -> int:
+    """Encodes a PublishPacket per subscriber, as delivery did without a fan-out stage."""
+    delivered = 0
+    for packet_id, (client_id, qos) in enumerate(subscribers, 1):
+        connection = network.clients[client_id]
+        qos = min(qos, message.qos)
+        packet = PublishPacket(
+            topic=message.topic, payload=message.payload, qos=qos, retain=message.retain,
+            packet_id=packet_id if qos else None
+        )
+        delivered += connection.queue.put([PacketEncoder.encode_packet(packet, connection.protocol_version)], message)
+    return delivered
+
+
+async def _measure(deliver) -> tuple:
+    """Runs one delivery alongside a loop watcher; returns (seconds, worst stall, delivered)."""
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(_watch_loop(stop))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    delivered = await deliver()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await watcher, delivered
+
+
+async def run(subscribers: int, payload_size: int, batch_size: int) -> None:
+    message = Message(topic="alerts/all", payload=b"x" * payload_size, qos=1, retain=False, message_id=1)
+    matched = [(f"client-{i}", i % 3) for i in range(subscribers)]
+    for mode in ("per subscriber", "fan-out"):
+        network = _network(subscribers)
+        if mode == "fan-out":
+            fanout = FanOut(network, batch_size=batch_size)
+            deliver = lambda: fanout.publish(message, matched)
+        else:
+            deliver = lambda: _naive(network, message, matched)
+        elapsed, stall, delivered = await _measure(deliver)
+        assert delivered == subscribers
+        print(f"{subscribers:>12,} {mode:<15} {elapsed * 1000:>10.1f} {subscribers / elapsed:>16,.0f} "
+              f"{stall * 1000:>14.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 1000, 50000])
+    parser.add_argument("--payload-size", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    print(f"{'subscribers':>12} {'mode':<15} {'total ms':>10} {'recipients/s':>16} {'max stall ms':>14}")
+    for subscribers in args.subscribers:
+        asyncio.run(run(subscribers, args.payload_size, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
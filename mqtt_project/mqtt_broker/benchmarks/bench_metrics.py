@@ -0,0 +1,113 @@
+"""
+Measures the cost of timing the decode, ACL, route, fan-out and write stages of every message.
+
+Run from mqtt_project/:
+    python -m mqtt_broker.benchmarks.bench_metrics --messages 200000 --sample-every 1 16 64
+"""
+import argparse
+import asyncio
+import gc
+import time
+from typing import Optional
+from mqtt_common.models.constants import MQTTProtocol, PacketType
+from mqtt_common.src.metrics import Metrics
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.packet import PublishPacket
+from mqtt_protocol.src.stream import StreamDecoder
+from mqtt_storage.src.subscriptions import SubscriptionTrie
+from mqtt_auth.src.acl import ACLAuthProvider, ACLRules
+from mqtt_network.src.connection import ClientConnection
+from mqtt_network.src.network import CentralizedNetwork
+from mqtt_network.src.outbound import OutboundQueue
+from mqtt_network.src.fanout import FanOut
+
+TOPICS = 100 # Distinct topics published to, each with its own subscriber
+CHUNK = 100 # PUBLISH packets per read
+
+
+class _NullWriter:
+    """A transport that accepts every write."""
+
+    def writelines(self, buffers):
+        pass
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def run(messages: int, metrics: Optional[Metrics]) -> float:
+    """Decodes, authorizes, routes and fans out messages QoS 0 PUBLISH packets; returns the seconds taken."""
+    network = CentralizedNetwork()
+    subscriptions = SubscriptionTrie()
+    for i in range(TOPICS):
+        queue = OutboundQueue(_NullWriter(), messages, metrics=metrics)
+        queue.start()
+        network.clients[f"sub-{i}"] = ClientConnection(f"sub-{i}", None, MQTTProtocol.VERSION_3_1_1, queue)
+        subscriptions.add(f"sub-{i}", f"sensors/{i}/+", 0)
+    acl = ACLAuthProvider(ACLRules.parse("topic write sensors/#\n"), metrics=metrics)
+    fanout = FanOut(network, metrics=metrics)
+    chunk = b"".join(
+        PacketEncoder.encode(PublishPacket(
+            packet_type=PacketType.PUBLISH, topic=f"sensors/{i % TOPICS}/temperature", payload=b"21.5"
+        ))
+        for i in range(CHUNK)
+    )
+    decoder = StreamDecoder()
+    perf_counter_ns = time.perf_counter_ns
+
+    start = time.perf_counter()
+    for _ in range(messages // CHUNK):
+        # The stages as the protocol transport and BrokerNode time them
+        if metrics is not None and metrics.decode.sampled():
+            started = perf_counter_ns()
+            packets = decoder.packets(chunk)
+            metrics.decode.record(perf_counter_ns() - started)
+        else:
+            packets = decoder.packets(chunk)
+        for packet in packets:
+            message = packet.to_message()
+            if not acl.can_publish("publisher", message.topic):
+                continue
+            if metrics is not None and metrics.route.sampled():
+                started = perf_counter_ns()
+                matches = subscriptions.match(message.topic)
+                metrics.route.record(perf_counter_ns() - started)
+            else:
+                matches = subscriptions.match(message.topic)
+            await fanout.publish(message, matches.items())
+        await asyncio.sleep(0) # The writer tasks drain their queues
+    elapsed = time.perf_counter() - start
+    for connection in network.clients.values():
+        connection.queue.close()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--sample-every", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per configuration, the fastest is reported")
+    args = parser.parse_args()
+
+    configs = [None] + args.sample_every
+    best = {config: float("inf") for config in configs}
+    # Interleave the configurations, rotating their order, so drift in machine load and
+    # garbage left by the previous run affect them alike
+    for repeat in range(args.repeat):
+        for config in configs[repeat % len(configs):] + configs[:repeat % len(configs)]:
+            metrics = None if config is None else Metrics(sample_every=config)
+            gc.collect()
+            best[config] = min(best[config], asyncio.run(run(args.messages, metrics)))
+
+    print(f"{'metrics':<14} {'msgs/s':>10} {'overhead':>9}")
+    baseline = best[None]
+    for config in configs:
+        label = "off" if config is None else f"1 in {config}"
+        print(f"{label:<14} {args.messages / best[config]:>10,.0f} {(best[config] / baseline - 1) * 100:>8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
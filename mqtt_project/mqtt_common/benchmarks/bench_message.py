@@ -0,0 +1,71 @@
+"""
+Compares memory use and construction throughput of Message with the previous dataclass.
+
+Run from mqtt_project/:
+    python -m mqtt_common.benchmarks.bench_message --messages 200000
+"""
+import argparse
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from mqtt_common.models.message import Message
+
+
+@dataclass
+class DataclassMessage:
+    """The message representation Message replaced: a validated dataclass with a datetime."""
+    topic: str
+    payload: bytes
+    qos: int
+    retain: bool
+    message_id: Optional[int] = None
+    properties: Dict[str, Any] = field(default_factory=dict)
+    timestamp: datetime = field(default_factory=datetime.utcnow)
+
+    def __post_init__(self):
+        if not isinstance(self.topic, str):
+            raise ValueError("Topic must be a string")
+        if not isinstance(self.payload, bytes):
+            raise ValueError("Payload must be bytes")
+        if self.qos not in (0, 1, 2):
+            raise ValueError("QoS must be 0, 1, or 2")
+        if not isinstance(self.retain, bool):
+            raise ValueError("Retain must be a boolean")
+        if self.qos > 0 and self.message_id is None:
+            raise ValueError("Message ID is required for QoS > 0")
+
+
+def measure(name: str, create: Callable[..., Any], messages: int, topic: str, payload: bytes) -> None:
+    """Prints bytes per message and messages created per second."""
+    tracemalloc.start()
+    kept = [create(topic=topic, payload=payload, qos=1, retain=False, message_id=i + 1) for i in range(messages)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+
+    start = time.perf_counter()
+    for i in range(messages):
+        create(topic=topic, payload=payload, qos=1, retain=False, message_id=i + 1)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<20} {size / messages:>14.0f} {messages / elapsed:>14,.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--payload-size", type=int, default=64)
+    args = parser.parse_args()
+    # Shared topic and payload objects so only the message itself is measured
+    topic = "site/12/device/345/temperature"
+    payload = b"p" * args.payload_size
+
+    print(f"{'representation':<20} {'bytes/message':>14} {'messages/s':>14}")
+    measure("dataclass", DataclassMessage, args.messages, topic, payload)
+    measure("Message", Message, args.messages, topic, payload)
+    measure("Message.trusted", Message.trusted, args.messages, topic, payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from .message import Message
+from .message import Message, PayloadHandle
 from .errors import (
     MQTTError,
     ProtocolError,
@@ -8,11 +8,12 @@ from .errors import (
     StorageError,
     ValidationError
 )
-from .constants import QualityOfService, PacketType, ConnectReturnCode
+from .constants import QualityOfService, PacketType, ConnectReturnCode, PropertyId
 
 # Exports all models for easy importing
 __all__ = [
     'Message',
+    'PayloadHandle',
     'MQTTError',
     'ProtocolError',
     'ConnectError',
@@ -22,5 +23,6 @@ __all__ = [
     'ValidationError',
     'QualityOfService',
     'PacketType',
-    'ConnectReturnCode'
+    'ConnectReturnCode',
+    'PropertyId'
 ]
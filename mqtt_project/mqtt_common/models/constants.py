@@ -10,6 +10,7 @@ class MQTTProtocol:
     
     # Default values
     DEFAULT_KEEP_ALIVE = 60  # seconds
+    KEEP_ALIVE_GRACE_FACTOR = 1.5  # Clients silent for this many keep alive periods are disconnected
     DEFAULT_FLAGS = 0
     
     # Size limits
@@ -52,6 +53,15 @@ class MQTTProtocol:
     STRING_ENCODING = 'utf-8'
     BYTE_ORDER = 'big'
 
+    # Topic names and filters
+    TOPIC_LEVEL_SEPARATOR = '/'
+    SINGLE_LEVEL_WILDCARD = '+' # Matches exactly one topic level
+    MULTI_LEVEL_WILDCARD = '#' # Matches the parent level and any number of levels below it
+    SYSTEM_TOPIC_PREFIX = '$' # Topics starting with '$' are not matched by leading wildcards
+    SHARED_SUBSCRIPTION_PREFIX = '$share' # First level of a shared subscription: $share/<group>/<filter>
+    SYS_BROKER_TOPIC = '$SYS/broker' # Root of the topics the broker publishes its metrics on
+    ASSIGNED_CLIENT_ID_PREFIX = 'auto-' # Start of the client IDs the broker assigns to clients connecting without one
+
     # PUBLISH flags
     PUBLISH_DUP_FLAG = 0x08 # Duplicate delivery flag   
     PUBLISH_QOS_MASK = 0x06 # QoS level mask
@@ -61,6 +71,35 @@ class MQTTProtocol:
     # Field sizes
     PACKET_ID_SIZE = 2 # Size of packet ID field    
 
+    # Packet identifiers and flow control
+    MAX_PACKET_ID = 65535 # Packet IDs run from 1 to 65535; 0 is not allowed
+    DEFAULT_RECEIVE_MAXIMUM = 65535 # QoS 1/2 messages in flight when the peer sets no Receive Maximum
+    DEFAULT_RETRY_INTERVAL = 20.0 # Seconds without acknowledgement before MQTT 3.1.1 deliveries are resent with DUP
+    SESSION_EXPIRY_NEVER = 0xFFFFFFFF # Session Expiry Interval of a session that does not expire
+
+    # Required fixed header flags
+    PUBREL_FLAGS = 0x02 # Reserved flags of PUBREL
+    SUBSCRIBE_FLAGS = 0x02 # Reserved flags of SUBSCRIBE
+    UNSUBSCRIBE_FLAGS = 0x02 # Reserved flags of UNSUBSCRIBE
+
+    # CONNACK and SUBSCRIBE fields
+    CONNACK_SESSION_PRESENT_FLAG = 0x01 # Session present flag in CONNACK acknowledge flags
+    SUBSCRIBE_QOS_MASK = 0x03 # Requested QoS bits of a SUBSCRIBE options byte
+    SUBACK_FAILURE = 0x80 # SUBACK return code for a rejected subscription
+
+    # MQTT 5.0 reason codes
+    REASON_SERVER_BUSY = 0x89 # CONNACK: the server is busy, try again later
+    REASON_SESSION_TAKEN_OVER = 0x8E # DISCONNECT: another connection with the same client ID took over
+
+    # MQTT 5.0 subscription options
+    SUBSCRIBE_NO_LOCAL_FLAG = 0x04 # Do not deliver messages published by the subscriber itself
+    SUBSCRIBE_RETAIN_AS_PUBLISHED_FLAG = 0x08 # Keep the retain flag of forwarded messages
+    SUBSCRIBE_RETAIN_HANDLING_MASK = 0x30 # When to send retained messages on subscribe
+    SUBSCRIBE_RETAIN_HANDLING_SHIFT = 4
+
+    # MQTT 5.0 variable byte integers (property lengths, subscription identifiers)
+    MAX_VARIABLE_BYTE_INTEGER = 268435455
+
 class QualityOfService(IntEnum):
     """MQTT Quality of Service levels"""
     AT_MOST_ONCE = 0 # At most once delivery
@@ -91,4 +130,34 @@ class ConnectReturnCode(IntEnum):
     IDENTIFIER_REJECTED = 2 # Client ID is already in use
     SERVER_UNAVAILABLE = 3 # Server is temporarily unavailable
     BAD_USERNAME_PASSWORD = 4 # Username or password is incorrect
-    NOT_AUTHORIZED = 5 # Client is not authorized to connect
\ No newline at end of file
+    NOT_AUTHORIZED = 5 # Client is not authorized to connect
+
+class PropertyId(IntEnum):
+    """MQTT 5.0 property identifiers"""
+    PAYLOAD_FORMAT_INDICATOR = 0x01 # Byte: payload is UTF-8 (1) or unspecified bytes (0)
+    MESSAGE_EXPIRY_INTERVAL = 0x02 # Four byte integer: message lifetime in seconds
+    CONTENT_TYPE = 0x03 # UTF-8 string describing the payload
+    RESPONSE_TOPIC = 0x08 # UTF-8 string: topic for a request/response reply
+    CORRELATION_DATA = 0x09 # Binary data matching a response to its request
+    SUBSCRIPTION_IDENTIFIER = 0x0B # Variable byte integer identifying the matching subscription
+    SESSION_EXPIRY_INTERVAL = 0x11 # Four byte integer: session lifetime after disconnect
+    ASSIGNED_CLIENT_IDENTIFIER = 0x12 # UTF-8 string: client ID chosen by the server
+    SERVER_KEEP_ALIVE = 0x13 # Two byte integer: keep alive imposed by the server
+    AUTHENTICATION_METHOD = 0x15 # UTF-8 string naming the extended auth method
+    AUTHENTICATION_DATA = 0x16 # Binary data for extended auth
+    REQUEST_PROBLEM_INFORMATION = 0x17 # Byte: whether reason strings may be sent
+    WILL_DELAY_INTERVAL = 0x18 # Four byte integer: delay before publishing the will
+    REQUEST_RESPONSE_INFORMATION = 0x19 # Byte: whether response information is requested
+    RESPONSE_INFORMATION = 0x1A # UTF-8 string used to build response topics
+    SERVER_REFERENCE = 0x1C # UTF-8 string naming another server to use
+    REASON_STRING = 0x1F # UTF-8 string with diagnostic information
+    RECEIVE_MAXIMUM = 0x21 # Two byte integer: QoS 1/2 messages allowed in flight
+    TOPIC_ALIAS_MAXIMUM = 0x22 # Two byte integer: highest topic alias accepted
+    TOPIC_ALIAS = 0x23 # Two byte integer replacing the topic name
+    MAXIMUM_QOS = 0x24 # Byte: highest QoS the server supports
+    RETAIN_AVAILABLE = 0x25 # Byte: whether retained messages are supported
+    USER_PROPERTY = 0x26 # UTF-8 string pair, may appear multiple times
+    MAXIMUM_PACKET_SIZE = 0x27 # Four byte integer: largest packet accepted
+    WILDCARD_SUBSCRIPTION_AVAILABLE = 0x28 # Byte: whether wildcard filters are supported
+    SUBSCRIPTION_IDENTIFIER_AVAILABLE = 0x29 # Byte: whether subscription identifiers are supported
+    SHARED_SUBSCRIPTION_AVAILABLE = 0x2A # Byte: whether shared subscriptions are supported
@@ -1,38 +1,171 @@
-from dataclasses import dataclass, field
-from typing import Optional, Dict, Any
-from datetime import datetime
+from abc import ABC, abstractmethod
+import time
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Mapping, Union
+from datetime import datetime, timedelta
+
+_EPOCH = datetime(1970, 1, 1)
+# Offset from the monotonic clock to wall-clock time, fixed when the module is loaded
+WALL_CLOCK_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+_NO_PROPERTIES: Mapping[str, Any] = MappingProxyType({}) # Shared by every message without properties
+
+class PayloadHandle(ABC):
+    """Reference to a payload kept outside the Python heap, such as in a memory-mapped file"""
+
+    @abstractmethod
+    def view(self) -> memoryview:
+        """Return the payload as a read-only memoryview"""
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def tobytes(self) -> bytes:
+        """Copy the payload into a bytes object"""
+        return self.view().tobytes()
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, PayloadHandle):
+            other = other.view()
+        return self.view() == other
+
+    __hash__ = None
+
 
-@dataclass
 class Message:
     """
     MQTT Message representation
     
     Attributes:
         topic: The topic this message is published to
-        payload: The message content as bytes
+        payload: The message content as bytes, a memoryview or a PayloadHandle
         qos: Quality of Service level (0, 1, or 2)
         retain: Whether this is a retained message
         message_id: Optional message identifier (required for QoS > 0)
-        properties: Optional MQTT 5.0 properties
-        timestamp: When the message was created
+        properties: Optional MQTT 5.0 properties, as a read-only mapping (empty when there are none)
+        timestamp_ns: When the message was created, in monotonic clock nanoseconds
+        timestamp: When the message was created, as a UTC datetime derived from timestamp_ns
+
+    Messages are slotted and only allocate a properties dict when properties are present,
+    so a broker holding many queued messages pays for the fields alone. The dict is owned
+    by the message and only exposed through a read-only view, since one message object is
+    shared by every subscriber it is delivered to; replace() makes a copy with other
+    properties. Reading the monotonic clock is cheaper than building a datetime, which
+    is only made on access. Messages produced by the parser, whose fields are already
+    checked, are created with trusted() to skip validation.
     """
-    topic: str
-    payload: bytes
-    qos: int
-    retain: bool
-    message_id: Optional[int] = None
-    properties: Dict[str, Any] = field(default_factory=dict)
-    timestamp: datetime = field(default_factory=datetime.utcnow)
-
-    def __post_init__(self):
-        """Validate message attributes after initialization"""
+    __slots__ = ('topic', 'payload', 'qos', 'retain', 'message_id', '_properties', 'timestamp_ns')
+
+    def __init__(
+        self,
+        topic: str,
+        payload: Union[bytes, memoryview, PayloadHandle],
+        qos: int,
+        retain: bool,
+        message_id: Optional[int] = None,
+        properties: Optional[Dict[str, Any]] = None,
+        timestamp: Optional[datetime] = None,
+        timestamp_ns: Optional[int] = None
+    ):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.message_id = message_id
+        self._properties = dict(properties) if properties else None
+        if timestamp is not None:
+            timestamp_ns = (timestamp - _EPOCH) // timedelta(microseconds=1) * 1000 - WALL_CLOCK_OFFSET_NS
+        self.timestamp_ns = time.monotonic_ns() if timestamp_ns is None else timestamp_ns
+        self._validate()
+
+    @classmethod
+    def trusted(
+        cls,
+        topic: str,
+        payload: Union[bytes, memoryview, PayloadHandle],
+        qos: int,
+        retain: bool,
+        message_id: Optional[int] = None,
+        properties: Optional[Dict[str, Any]] = None,
+        timestamp_ns: Optional[int] = None
+    ) -> 'Message':
+        """Create a message without validating it, for fields that were already checked
+
+        The message takes ownership of properties instead of copying them.
+        """
+        message = cls.__new__(cls)
+        message.topic = topic
+        message.payload = payload
+        message.qos = qos
+        message.retain = retain
+        message.message_id = message_id
+        message._properties = properties or None
+        message.timestamp_ns = time.monotonic_ns() if timestamp_ns is None else timestamp_ns
+        return message
+
+    def _validate(self) -> None:
+        """Validate message attributes"""
         if not isinstance(self.topic, str):
             raise ValueError("Topic must be a string")
-        if not isinstance(self.payload, bytes):
+        if not isinstance(self.payload, (bytes, memoryview, PayloadHandle)):
             raise ValueError("Payload must be bytes")
         if self.qos not in (0, 1, 2):
             raise ValueError("QoS must be 0, 1, or 2")
         if not isinstance(self.retain, bool):
             raise ValueError("Retain must be a boolean")
         if self.qos > 0 and self.message_id is None:
-            raise ValueError("Message ID is required for QoS > 0")
\ No newline at end of file
+            raise ValueError("Message ID is required for QoS > 0")
+
+    @property
+    def properties(self) -> Mapping[str, Any]:
+        """MQTT 5.0 properties as a read-only mapping; use replace() to change them"""
+        return _NO_PROPERTIES if self._properties is None else MappingProxyType(self._properties)
+
+    @property
+    def wall_time_ns(self) -> int:
+        """Creation time in nanoseconds since the Unix epoch"""
+        return self.timestamp_ns + WALL_CLOCK_OFFSET_NS
+
+    @property
+    def timestamp(self) -> datetime:
+        """Creation time as a naive UTC datetime"""
+        return _EPOCH + timedelta(microseconds=self.wall_time_ns // 1000)
+
+    def replace(self, **changes: Any) -> 'Message':
+        """Return a validated copy of the message with some fields replaced"""
+        fields = {
+            'topic': self.topic,
+            'payload': self.payload,
+            'qos': self.qos,
+            'retain': self.retain,
+            'message_id': self.message_id,
+            'properties': self._properties,
+            'timestamp_ns': self.timestamp_ns
+        }
+        fields.update(changes)
+        return Message(**fields)
+
+    def view(self) -> memoryview:
+        """Return the payload as a memoryview without copying it"""
+        if isinstance(self.payload, PayloadHandle):
+            return self.payload.view()
+        return memoryview(self.payload)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Message):
+            return NotImplemented
+        return (
+            self.topic == other.topic and self.payload == other.payload and self.qos == other.qos
+            and self.retain == other.retain and self.message_id == other.message_id
+            and self.properties == other.properties and self.timestamp_ns == other.timestamp_ns
+        )
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (
+            f"Message(topic={self.topic!r}, payload={self.payload!r}, qos={self.qos!r}, "
+            f"retain={self.retain!r}, message_id={self.message_id!r}, "
+            f"properties={dict(self.properties)!r}, timestamp_ns={self.timestamp_ns!r})"
+        )
@@ -0,0 +1,310 @@
+import itertools
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+SUB_BUCKET_BITS = 4 # Each power of two is split into 2**SUB_BUCKET_BITS buckets, about 6% apart
+MAX_TRACKED_NS = 1 << 40 # Larger values (about 18 minutes) are counted in the last bucket
+DEFAULT_SAMPLE_EVERY = 16 # Time one in this many events, keeping the cost per message near 1%; 1 times every event
+QUANTILES = (0.5, 0.9, 0.99) # Quantiles reported per interval
+
+# Stages timed on the hot path, in nanoseconds, with their descriptions
+DECODE = "decode"
+ROUTE = "route"
+ACL = "acl"
+QUEUE_WAIT = "queue_wait"
+WRITE = "write"
+PUBLISH_DELIVER = "publish_deliver"
+STAGES = {
+    DECODE: "Time to decode the packets of one read",
+    ROUTE: "Time to match a topic against the subscription index",
+    ACL: "Time of ACL decisions not answered from the decision cache",
+    QUEUE_WAIT: "Time the oldest packet of a write batch waited in its outbound queue",
+    WRITE: "Time to write a batch to a transport and drain it",
+    PUBLISH_DELIVER: "Time from message creation until it is queued to its last subscriber",
+}
+
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_LINEAR = _SUB_BUCKETS << 1 # Values below this have a bucket each
+_MANTISSA_BITS = SUB_BUCKET_BITS + 1
+
+
+def _bucket_count(max_value: int) -> int:
+    shift = max(max_value.bit_length() - _MANTISSA_BITS, 0)
+    return shift * _SUB_BUCKETS + _LINEAR
+
+
+def bucket_index(value: int) -> int:
+    """Returns the histogram bucket of a non-negative value."""
+    if value < _LINEAR:
+        return value if value > 0 else 0
+    shift = value.bit_length() - _MANTISSA_BITS
+    return shift * _SUB_BUCKETS + (value >> shift)
+
+
+def bucket_bounds(index: int) -> Tuple[int, int]:
+    """Returns the lowest and highest value counted in a bucket."""
+    if index < _LINEAR:
+        return index, index
+    shift = index // _SUB_BUCKETS - 1
+    lowest = (index - shift * _SUB_BUCKETS) << shift
+    return lowest, lowest + (1 << shift) - 1
+
+
+class Counter:
+    """
+    A monotonically increasing count.
+
+    Counters are only touched from the event loop thread, so inc() is a plain integer
+    add without a lock.
+    """
+    __slots__ = ('name', 'help', 'value')
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        """Adds amount to the count."""
+        self.value += amount
+
+
+class HistogramSnapshot(NamedTuple):
+    """What a histogram recorded during one interval."""
+    count: int
+    sum: int
+    max: int
+    quantiles: Tuple[int, ...] # Values at QUANTILES, as the highest value of their bucket
+
+
+class Histogram:
+    """
+    Log-bucketed histogram of non-negative integers, typically nanoseconds.
+
+    Values below 32 get a bucket each; above that every power of two is split into 16
+    buckets, so a recorded value is known to within about 6% (the same layout as an
+    HdrHistogram with one significant digit). The counts live in one list allocated up
+    front: record() computes the bucket with bit_length() and increments it, without
+    allocating or sorting per sample.
+
+    The counts cover the current interval; rollover() returns the interval's snapshot,
+    adds it to the totals and clears the counts in place.
+
+    sampled() returns True once every sample_every calls and tells the caller whether to
+    time this event. Each histogram has its own cycle, so the events of one stage never
+    decide which events of another stage are timed.
+
+    Attributes:
+        total_count: Values recorded in all finished intervals
+        total_sum: Sum of those values
+    """
+
+    def __init__(self, name: str, help: str = "", max_value: int = MAX_TRACKED_NS, sample_every: int = 1):
+        self.name = name
+        self.help = help
+        self.sample_every = max(sample_every, 1)
+        # The __next__ of a cycle of booleans, a C call that is cheaper than any counter kept in Python
+        self.sampled: Callable[[], bool] = itertools.cycle(
+            [False] * (self.sample_every - 1) + [True]
+        ).__next__
+        self.counts = [0] * _bucket_count(max_value)
+        self.sum = 0
+        self.max = 0
+        self.total_count = 0
+        self.total_sum = 0
+        self.last = HistogramSnapshot(0, 0, 0, (0,) * len(QUANTILES)) # Snapshot of the last finished interval
+
+    @property
+    def count(self) -> int:
+        """Values recorded in the current interval."""
+        return sum(self.counts)
+
+    def record(self, value: int) -> None:
+        """Counts one value."""
+        # bucket_index(), inlined
+        if value < _LINEAR:
+            index = value if value > 0 else 0
+        else:
+            shift = value.bit_length() - _MANTISSA_BITS
+            index = (shift << SUB_BUCKET_BITS) + (value >> shift)
+        try:
+            self.counts[index] += 1
+        except IndexError:
+            self.counts[-1] += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> int:
+        """Returns the value at quantile q of the current interval, 0 when it is empty."""
+        count = self.count
+        if not count:
+            return 0
+        rank = max(int(q * count + 0.5), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_bounds(index)[1], self.max)
+        return self.max
+
+    def rollover(self) -> HistogramSnapshot:
+        """Ends the interval: returns its snapshot, adds it to the totals and clears the counts."""
+        count = self.count
+        snapshot = HistogramSnapshot(count, self.sum, self.max, tuple(self.quantile(q) for q in QUANTILES))
+        self.total_count += count
+        self.total_sum += self.sum
+        if count:
+            counts = self.counts
+            for index in range(len(counts)):
+                counts[index] = 0
+        self.sum = 0
+        self.max = 0
+        self.last = snapshot
+        return snapshot
+
+
+class Metrics:
+    """
+    Counters and stage latency histograms of one broker process.
+
+    Components that take a metrics argument time their hot-path stages into the
+    histograms named in STAGES (decode, route, acl, queue_wait, write and
+    publish_deliver), e.g. metrics.route.record(ns). They only read the clock when the
+    stage's histogram says so, e.g. metrics.route.sampled(), which is one call in
+    sample_every: with sample_every=1 every message is timed, with 64 the timing cost
+    per message drops 64-fold while the quantiles stay representative. Counters always
+    count every event.
+
+    Components that already count events expose them through their stats dict;
+    track() adds such a component, and its stats are read at each rollover() and
+    exposition rather than on the hot path. Entries named in the component's gauges
+    set are current levels (connected clients, queued packets) rather than counts:
+    they get no rate and are exposed as Prometheus gauges.
+
+    rollover() is called once per interval (see MetricsMonitor in mqtt_network): it
+    records each counter's rate and each histogram's snapshot for the interval, which
+    prometheus() and sys_topics() then report.
+    """
+
+    def __init__(self, sample_every: int = DEFAULT_SAMPLE_EVERY, prefix: str = "mqtt"):
+        self.sample_every = max(sample_every, 1)
+        self.prefix = prefix # Prefix of the Prometheus metric names
+        self.counters: Dict[str, Counter] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.rates: Dict[str, float] = {} # Per-second rate of each counter over the last interval
+        self.sources: Dict[str, Any] = {} # Name prefix -> component with a stats dict
+        self.gauges: Set[str] = set() # Names of the tracked stats that are levels, not counts
+        self.intervals = 0 # Finished intervals
+        self._previous: Dict[str, int] = {}
+        self._last_rollover = time.monotonic()
+        for stage, help in STAGES.items():
+            self.histogram(stage, help)
+        self.decode = self.histograms[DECODE]
+        self.route = self.histograms[ROUTE]
+        self.acl = self.histograms[ACL]
+        self.queue_wait = self.histograms[QUEUE_WAIT]
+        self.write = self.histograms[WRITE]
+        self.publish_deliver = self.histograms[PUBLISH_DELIVER]
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        """Returns the counter with a name, creating it if needed."""
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = self.counters[name] = Counter(name, help)
+        return counter
+
+    def histogram(self, name: str, help: str = "") -> Histogram:
+        """Returns the histogram with a name, creating it if needed."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(name, help, sample_every=self.sample_every)
+        return histogram
+
+    def track(self, name: str, component: Any) -> None:
+        """
+        Reports the integer entries of component.stats named <name>_<key>: as gauges for
+        the keys in component.gauges, if it has one, and as counters otherwise.
+        """
+        self.sources[name] = component
+        self.gauges.update(f"{name}_{key}" for key in getattr(component, "gauges", ()))
+
+    def values(self) -> Dict[str, int]:
+        """Current value of every counter and gauge, including the stats of tracked components."""
+        values = {name: counter.value for name, counter in self.counters.items()}
+        for source, component in self.sources.items():
+            for key, value in component.stats.items():
+                if isinstance(value, int) and not isinstance(value, bool):
+                    values[f"{source}_{key}"] = value
+        return values
+
+    def rollover(self, now: Optional[float] = None) -> None:
+        """Ends the current interval: computes counter rates and histogram snapshots."""
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._last_rollover
+        self._last_rollover = now
+        values = self.values()
+        previous = self._previous
+        gauges = self.gauges
+        self.rates = {
+            name: (value - previous.get(name, 0)) / elapsed if elapsed > 0 else 0.0
+            for name, value in values.items() if name not in gauges
+        }
+        self._previous = values
+        for histogram in self.histograms.values():
+            histogram.rollover()
+        self.intervals += 1
+
+    def prometheus(self) -> str:
+        """
+        Returns the Prometheus text exposition: current counters as <prefix>_<name>_total,
+        gauges as <prefix>_<name> and histograms as summaries in seconds, whose quantiles
+        cover the last interval and whose _count and _sum cover all finished intervals
+        (sampled values only).
+        """
+        prefix = self.prefix
+        gauges = self.gauges
+        lines: List[str] = []
+        for name, value in self.values().items():
+            if name in gauges:
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {value}")
+                continue
+            metric = f"{prefix}_{name}_total"
+            counter = self.counters.get(name)
+            if counter is not None and counter.help:
+                lines.append(f"# HELP {metric} {counter.help}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, histogram in self.histograms.items():
+            metric = f"{prefix}_{name}_seconds"
+            if histogram.help:
+                lines.append(f"# HELP {metric} {histogram.help}")
+            lines.append(f"# TYPE {metric} summary")
+            for q, value in zip(QUANTILES, histogram.last.quantiles):
+                lines.append(f'{metric}{{quantile="{q}"}} {value / 1e9:.9f}')
+            lines.append(f"{metric}_sum {histogram.total_sum / 1e9:.9f}")
+            lines.append(f"{metric}_count {histogram.total_count}")
+        return "\n".join(lines) + "\n"
+
+    def sys_topics(self, root: str) -> Dict[str, bytes]:
+        """
+        Returns the $SYS topics of the last interval under root with their payloads:
+        <root>/<name> (counter total or gauge level), <root>/load/<counter>/1s (per
+        second, counters only) and <root>/latency/<stage>/{count,p50,p90,p99,max} in
+        microseconds.
+        """
+        topics: Dict[str, bytes] = {}
+        rates = self.rates
+        for name, value in self._previous.items():
+            topics[f"{root}/{name}"] = str(value).encode()
+            if name in rates:
+                topics[f"{root}/load/{name}/1s"] = f"{rates[name]:.1f}".encode()
+        for name, histogram in self.histograms.items():
+            last = histogram.last
+            base = f"{root}/latency/{name}"
+            topics[f"{base}/count"] = str(last.count).encode()
+            for q, value in zip(QUANTILES, last.quantiles):
+                topics[f"{base}/p{round(q * 100)}"] = f"{value / 1000:.1f}".encode()
+            topics[f"{base}/max"] = f"{last.max / 1000:.1f}".encode()
+        return topics
@@ -1,6 +1,6 @@
 import pytest
 from typing import List, Optional, Tuple
-from mqtt_common.interfaces.storage import StorageInterface
+from mqtt_common.src.storage import StorageInterface
 from mqtt_common.models.message import Message
 
 class MockStorage(StorageInterface):
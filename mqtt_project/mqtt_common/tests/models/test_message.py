@@ -1,5 +1,5 @@
 import pytest
-from datetime import datetime
+from datetime import datetime, timedelta
 from mqtt_common.models.message import Message
 
 def test_valid_message_creation():
@@ -67,4 +67,58 @@ def test_invalid_payload_type():
             payload="test",  # type: ignore
             qos=0,
             retain=False
-        )
\ No newline at end of file
+        )
+
+def test_message_has_no_instance_dict():
+    """Test that messages are slotted"""
+    msg = Message(topic="test/topic", payload=b"test", qos=0, retain=False)
+    assert not hasattr(msg, "__dict__")
+
+def test_properties_read_only():
+    """Test that properties are a read-only view and only change through replace()"""
+    props = {"user_property": "test"}
+    msg = Message(topic="test/topic", payload=b"test", qos=0, retain=False, properties=props)
+    with pytest.raises(TypeError):
+        msg.properties["user_property"] = "changed"  # type: ignore
+    with pytest.raises(AttributeError):
+        msg.properties = {}  # type: ignore
+    props["user_property"] = "changed"
+    assert msg.properties == {"user_property": "test"}
+    with pytest.raises(TypeError):
+        Message(topic="test/topic", payload=b"test", qos=0, retain=False).properties["a"] = 1  # type: ignore
+    replaced = msg.replace(properties={"content_type": "text/plain"})
+    assert replaced.properties == {"content_type": "text/plain"}
+    assert msg.replace(properties={}).properties == {}
+    assert msg.properties == {"user_property": "test"}
+
+def test_timestamp_derived_from_nanoseconds():
+    """Test that the datetime timestamp is derived from the monotonic timestamp"""
+    before = datetime.utcnow()
+    msg = Message(topic="test/topic", payload=b"test", qos=0, retain=False)
+    after = datetime.utcnow()
+    assert isinstance(msg.timestamp_ns, int)
+    assert before - timedelta(milliseconds=5) <= msg.timestamp <= after + timedelta(milliseconds=5)
+
+def test_explicit_timestamp():
+    """Test creating a message with a datetime timestamp"""
+    created = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    msg = Message(topic="test/topic", payload=b"test", qos=0, retain=False, timestamp=created)
+    assert msg.timestamp == created
+
+def test_trusted_skips_validation():
+    """Test that trusted messages are created without validation"""
+    msg = Message.trusted(topic="test/topic", payload=b"test", qos=1, retain=False)
+    assert msg.message_id is None
+    assert msg.properties == {}
+    assert isinstance(msg.timestamp_ns, int)
+
+def test_replace():
+    """Test copying a message with a replaced field"""
+    msg = Message(topic="test/topic", payload=b"test", qos=1, retain=False, message_id=1)
+    copy = msg.replace(payload=b"other")
+    assert copy.payload == b"other"
+    assert copy.timestamp_ns == msg.timestamp_ns
+    assert copy != msg
+    assert copy.replace(payload=b"test") == msg
+    with pytest.raises(ValueError, match="QoS must be 0, 1, or 2"):
+        msg.replace(qos=3)
@@ -0,0 +1,140 @@
+from mqtt_common.src.metrics import (
+    Counter, Histogram, Metrics, QUANTILES, STAGES, bucket_bounds, bucket_index
+)
+
+class _Component:
+    """A component exposing its counters through stats."""
+
+    def __init__(self):
+        self.delivered = 0
+
+    @property
+    def stats(self):
+        return {"delivered": self.delivered, "enabled": True}
+
+class _Queue:
+    """A component whose stats include a gauge."""
+    gauges = frozenset({"depth"})
+
+    def __init__(self):
+        self.depth = 0
+        self.dropped = 0
+
+    @property
+    def stats(self):
+        return {"depth": self.depth, "dropped": self.dropped}
+
+class TestHistogram:
+    """Tests for log-bucketed histograms."""
+
+    def test_buckets_are_contiguous(self):
+        """Tests that every value falls into the bucket whose bounds contain it and buckets do not overlap."""
+        previous_highest = -1
+        for index in range(bucket_index(1 << 20)):
+            lowest, highest = bucket_bounds(index)
+            assert lowest == previous_highest + 1
+            assert bucket_index(lowest) == index and bucket_index(highest) == index
+            assert (highest - lowest) <= lowest / 16
+            previous_highest = highest
+
+    def test_quantiles_within_bucket_precision(self):
+        """Tests that quantiles are within about 6% of the exact value."""
+        histogram = Histogram("latency")
+        values = [1000 * (i + 1) for i in range(1000)]
+        for value in values:
+            histogram.record(value)
+        for q in (0.5, 0.9, 0.99):
+            exact = values[int(q * len(values)) - 1]
+            assert exact <= histogram.quantile(q) <= exact * 1.0625
+        assert histogram.quantile(1.0) == histogram.max == 1000000
+
+    def test_rollover(self):
+        """Tests that rollover snapshots the interval, adds it to the totals and clears the counts."""
+        histogram = Histogram("latency")
+        for value in (0, 5, 100, 1 << 50):
+            histogram.record(value)
+        snapshot = histogram.rollover()
+        assert (snapshot.count, snapshot.max) == (4, 1 << 50)
+        assert len(snapshot.quantiles) == len(QUANTILES)
+        assert histogram.last == snapshot
+        assert (histogram.count, histogram.total_count, histogram.total_sum) == (0, 4, 105 + (1 << 50))
+        assert not any(histogram.counts)
+        assert histogram.rollover().quantiles == (0, 0, 0)
+
+class TestMetrics:
+    """Tests for the metrics registry, sampling and exposition."""
+
+    def test_sampling(self):
+        """Tests that each stage samples one of its own calls in sample_every."""
+        metrics = Metrics(sample_every=4)
+        assert [metrics.route.sampled() for _ in range(8)] == [False, False, False, True] * 2
+        # Calls on other stages do not shift which route events are timed
+        for _ in range(3):
+            metrics.decode.sampled()
+        assert [metrics.route.sampled() for _ in range(4)] == [False, False, False, True]
+        assert all(Metrics(sample_every=1).acl.sampled() for _ in range(3))
+
+    def test_rates_include_tracked_stats(self):
+        """Tests that rollover turns counters and tracked stats into per-second rates."""
+        metrics = Metrics()
+        component = _Component()
+        metrics.track("fanout", component)
+        received = metrics.counter("messages_received")
+        assert metrics.counter("messages_received") is received
+        metrics.rollover(now=100.0)
+        received.inc(50)
+        component.delivered = 200
+        metrics.rollover(now=102.0)
+        assert metrics.rates == {"messages_received": 25.0, "fanout_delivered": 100.0}
+
+    def test_prometheus(self):
+        """Tests the text exposition of counters and stage summaries."""
+        metrics = Metrics(prefix="broker")
+        metrics.counter("messages_received", "PUBLISH packets received").inc(3)
+        metrics.route.record(2000)
+        metrics.rollover()
+        text = metrics.prometheus()
+        assert "# HELP broker_messages_received_total PUBLISH packets received\n" in text
+        assert "# TYPE broker_messages_received_total counter\nbroker_messages_received_total 3\n" in text
+        assert '# TYPE broker_route_seconds summary\nbroker_route_seconds{quantile="0.5"} 0.000002' in text
+        assert "broker_route_seconds_count 1\n" in text
+        assert all(f"broker_{stage}_seconds_sum" in text for stage in STAGES)
+
+    def test_sys_topics(self):
+        """Tests the $SYS topics of the last interval."""
+        metrics = Metrics()
+        metrics.counter("messages_received").inc(10)
+        for value in (1000, 3000):
+            metrics.write.record(value)
+        metrics.rollover(now=metrics._last_rollover + 1.0)
+        topics = metrics.sys_topics("$SYS/broker")
+        assert topics["$SYS/broker/messages_received"] == b"10"
+        assert topics["$SYS/broker/load/messages_received/1s"] == b"10.0"
+        assert topics["$SYS/broker/latency/write/count"] == b"2"
+        assert topics["$SYS/broker/latency/write/max"] == b"3.0"
+        assert topics["$SYS/broker/latency/decode/p99"] == b"0.0"
+
+    def test_gauges(self):
+        """Tests that gauge stats get no rate, a gauge exposition and no load topic."""
+        metrics = Metrics(prefix="broker")
+        queue = _Queue()
+        metrics.track("queue", queue)
+        metrics.rollover(now=100.0)
+        queue.depth, queue.dropped = 7, 4
+        metrics.rollover(now=101.0)
+        assert metrics.rates == {"queue_dropped": 4.0}
+        text = metrics.prometheus()
+        assert "# TYPE broker_queue_depth gauge\nbroker_queue_depth 7\n" in text
+        assert "# TYPE broker_queue_dropped_total counter\nbroker_queue_dropped_total 4\n" in text
+        assert "broker_queue_depth_total" not in text
+        topics = metrics.sys_topics("$SYS/broker")
+        assert topics["$SYS/broker/queue_depth"] == b"7"
+        assert "$SYS/broker/load/queue_depth/1s" not in topics
+        assert topics["$SYS/broker/load/queue_dropped/1s"] == b"4.0"
+
+    def test_counter(self):
+        """Tests that counters add up."""
+        counter = Counter("connections")
+        counter.inc()
+        counter.inc(2)
+        assert counter.value == 3
@@ -0,0 +1,86 @@
+"""
+Measures QoS 0 messages per second published on one cluster node and delivered by the others.
+
+Run from mqtt_project/:
+    python -m mqtt_network.benchmarks.bench_cluster --nodes 3 --messages 100000
+"""
+import argparse
+import asyncio
+import time
+from mqtt_common.models.constants import PacketType, QualityOfService
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.packet import ConnectPacket, PublishPacket, SubscribePacket
+from mqtt_protocol.src.stream import StreamDecoder
+from mqtt_network.src.cluster import LocalCluster
+from mqtt_network.src.config import NetworkConfig
+
+
+async def _connect(port: int, client_id: str):
+    """Opens a connection and waits for its CONNACK."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(PacketEncoder.encode(ConnectPacket(packet_type=PacketType.CONNECT, client_id=client_id)))
+    await reader.read(1024)
+    return reader, writer
+
+
+async def _receive(reader: asyncio.StreamReader, messages: int) -> None:
+    """Reads until messages PUBLISH packets arrived."""
+    decoder = StreamDecoder()
+    received = 0
+    while received < messages:
+        data = await reader.read(65536)
+        if not data:
+            raise ConnectionError("Subscriber disconnected")
+        received += sum(isinstance(packet, PublishPacket) for packet in decoder.packets(data))
+
+
+async def run(cluster: LocalCluster, messages: int, payload_size: int) -> None:
+    """Subscribes one client on every node but the first and publishes from the first."""
+    subscribers = []
+    for index, port in enumerate(cluster.ports[1:], 1):
+        reader, writer = await _connect(port, f"subscriber-{index}")
+        writer.write(PacketEncoder.encode(SubscribePacket(
+            packet_type=PacketType.SUBSCRIBE, packet_id=1,
+            subscriptions=[("bench/#", QualityOfService.AT_MOST_ONCE)]
+        )))
+        await reader.read(1024)
+        subscribers.append((reader, writer))
+    _, publisher = await _connect(cluster.ports[0], "publisher")
+    await asyncio.sleep(0.5) # Filter announcements reach the publisher's node
+
+    packet = PacketEncoder.encode(PublishPacket(
+        packet_type=PacketType.PUBLISH, topic="bench/load", payload=b"x" * payload_size
+    ))
+    start = time.perf_counter()
+    receiving = asyncio.gather(*(_receive(reader, messages) for reader, _ in subscribers))
+    for batch_start in range(0, messages, 1000):
+        publisher.write(packet * min(1000, messages - batch_start))
+        await publisher.drain()
+    await receiving
+    elapsed = time.perf_counter() - start
+
+    delivered = messages * len(subscribers)
+    print(f"{len(cluster.ports):>5} {messages:>10,} {messages / elapsed:>12,.0f} {delivered / elapsed:>14,.0f}")
+    for _, writer in subscribers + [(None, publisher)]:
+        writer.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--payload-size", type=int, default=64)
+    args = parser.parse_args()
+
+    # Queues deep enough that no QoS 0 message is dropped while subscribers catch up
+    cluster = LocalCluster(nodes=args.nodes, config=NetworkConfig(max_queue_depth=args.messages))
+    cluster.start()
+    try:
+        print(f"{'nodes':>5} {'messages':>10} {'published/s':>12} {'delivered/s':>14}")
+        asyncio.run(run(cluster, args.messages, args.payload_size))
+    finally:
+        cluster.stop()
+
+
+if __name__ == "__main__":
+    main()
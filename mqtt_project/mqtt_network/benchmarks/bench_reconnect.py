@@ -0,0 +1,95 @@
+"""
+Measures session takeovers per second when every client reconnects at once with its client ID.
+
+Run from mqtt_project/ (uses uvloop when installed unless --no-uvloop is given):
+    python -m mqtt_network.benchmarks.bench_reconnect --clients 3000 --connect-rate 0 2000
+"""
+import argparse
+import asyncio
+import time
+from mqtt_common.models.constants import PacketType
+from mqtt_protocol.src.encoder import PacketEncoder, PINGREQ_PACKET, PINGRESP_PACKET
+from mqtt_protocol.src.packet import ConnectPacket
+from mqtt_network.src.config import NetworkConfig, create_network, new_event_loop, STREAMS_TRANSPORT, PROTOCOL_TRANSPORT
+
+
+async def _open_all(port: int, clients: int) -> list:
+    """Opens a connection per client and sends its CONNECT with a persistent session."""
+    connections = []
+    for batch_start in range(0, clients, 100):
+        opened = await asyncio.gather(*(
+            asyncio.open_connection("127.0.0.1", port)
+            for _ in range(batch_start, min(batch_start + 100, clients))
+        ))
+        for index, (reader, writer) in enumerate(opened, batch_start):
+            writer.write(PacketEncoder.encode(ConnectPacket(
+                packet_type=PacketType.CONNECT, client_id=f"client-{index}", clean_session=False
+            )))
+            connections.append((reader, writer))
+    return connections
+
+
+async def run(config: NetworkConfig, clients: int) -> None:
+    """Connects every client, reconnects them all and times the takeovers and a PINGREQ round trip."""
+    network = create_network(config)
+    server_task = asyncio.create_task(network.start("127.0.0.1", 0))
+    while network.server is None or not network.server.sockets:
+        await asyncio.sleep(0.001)
+    port = network.server.sockets[0].getsockname()[1]
+    # Answer every packet with a PINGRESP
+    network.packet_handler = lambda client_id, packet: network.send_packet(client_id, [PINGRESP_PACKET])
+
+    first = await _open_all(port, clients)
+    while network.get_client_count() < clients:
+        await asyncio.sleep(0.001)
+    # An established client that keeps pinging during the storm
+    bystander_reader, bystander_writer = await asyncio.open_connection("127.0.0.1", port)
+    bystander_writer.write(PacketEncoder.encode(ConnectPacket(packet_type=PacketType.CONNECT, client_id="bystander")))
+    while not network.is_client_connected("bystander"):
+        await asyncio.sleep(0.001)
+
+    start = time.perf_counter()
+    second_task = asyncio.create_task(_open_all(port, clients))
+    ping_times = []
+    while network.takeovers + (network.admission.rejected if network.admission else 0) < clients:
+        ping_start = time.perf_counter()
+        bystander_writer.write(PINGREQ_PACKET)
+        await bystander_reader.read(1024)
+        ping_times.append(time.perf_counter() - ping_start)
+    elapsed = time.perf_counter() - start
+    second = await second_task
+
+    rejected = network.admission.rejected if network.admission else 0
+    worst_ping = max(ping_times, default=0) * 1000
+    print(f"{config.transport:<10} {config.connect_rate or 'none':>8} {network.takeovers / elapsed:>14,.0f} "
+          f"{rejected:>9} {worst_ping:>13.1f}")
+    for _, writer in first + second + [(bystander_reader, bystander_writer)]:
+        writer.close()
+    await network.stop()
+    server_task.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--connect-rate", type=float, nargs="+", default=[0, 2000],
+                        help="CONNECT admission rates to compare, 0 for no limit")
+    parser.add_argument("--no-uvloop", action="store_true", help="use the standard event loop")
+    args = parser.parse_args()
+
+    print(f"{'transport':<10} {'rate':>8} {'takeovers/s':>14} {'rejected':>9} {'max ping ms':>13}")
+    for transport in (STREAMS_TRANSPORT, PROTOCOL_TRANSPORT):
+        for rate in args.connect_rate:
+            config = NetworkConfig(
+                transport=transport, use_uvloop=not args.no_uvloop,
+                connect_rate=rate, connect_burst=100, connect_max_wait=60
+            )
+            loop = new_event_loop(config)
+            try:
+                loop.run_until_complete(run(config, args.clients))
+            finally:
+                loop.close()
+
+
+if __name__ == "__main__":
+    main()
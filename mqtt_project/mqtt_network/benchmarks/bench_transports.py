@@ -0,0 +1,95 @@
+"""
+Compares connections/s and inbound messages/s of the streams and BufferedProtocol transports.
+
+Run from mqtt_project/ (uses uvloop when installed unless --no-uvloop is given):
+    python -m mqtt_network.benchmarks.bench_transports --connections 2000 --messages 500000
+"""
+import argparse
+import asyncio
+import time
+from mqtt_common.models.constants import PacketType
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.packet import ConnectPacket, PublishPacket
+from mqtt_network.src.config import NetworkConfig, create_network, new_event_loop, STREAMS_TRANSPORT, PROTOCOL_TRANSPORT
+
+
+def _connect(client_id: str) -> bytes:
+    """Encodes a CONNECT packet."""
+    return PacketEncoder.encode(ConnectPacket(packet_type=PacketType.CONNECT, client_id=client_id))
+
+
+async def run(config: NetworkConfig, connections: int, messages: int, publishers: int, payload: bytes) -> None:
+    """Measures CONNECT handling and PUBLISH decoding rates of one transport."""
+    network = create_network(config)
+    received = 0
+
+    def count(client_id, packet) -> None:
+        nonlocal received
+        received += 1
+
+    network.packet_handler = count
+    server_task = asyncio.create_task(network.start("127.0.0.1", 0))
+    while network.server is None or not network.server.sockets:
+        await asyncio.sleep(0.001)
+    port = network.server.sockets[0].getsockname()[1]
+
+    # Connections per second: open, CONNECT, wait until every client is registered
+    start = time.perf_counter()
+    writers = []
+    for batch_start in range(0, connections, 100):
+        opened = await asyncio.gather(*(
+            asyncio.open_connection("127.0.0.1", port)
+            for _ in range(batch_start, min(batch_start + 100, connections))
+        ))
+        for index, (_, writer) in enumerate(opened, batch_start):
+            writer.write(_connect(f"client-{index}"))
+            writers.append(writer)
+    while network.get_client_count() < connections:
+        await asyncio.sleep(0.001)
+    connect_rate = connections / (time.perf_counter() - start)
+
+    # Messages per second: publishers stream QoS 0 PUBLISH packets in large writes
+    publish = PacketEncoder.encode(PublishPacket(
+        packet_type=PacketType.PUBLISH, topic="bench/topic", payload=payload
+    ))
+    per_publisher = messages // publishers
+    chunk = publish * 100
+    start = time.perf_counter()
+    for writer in writers[:publishers]:
+        for _ in range(per_publisher // 100):
+            writer.write(chunk)
+    await asyncio.gather(*(writer.drain() for writer in writers[:publishers]))
+    expected = publishers * (per_publisher // 100) * 100
+    while received < expected:
+        await asyncio.sleep(0.001)
+    message_rate = expected / (time.perf_counter() - start)
+
+    print(f"{config.transport:<10} {connect_rate:>14,.0f} {message_rate:>14,.0f}")
+    for writer in writers:
+        writer.close()
+    await network.stop()
+    server_task.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=500000)
+    parser.add_argument("--publishers", type=int, default=10)
+    parser.add_argument("--payload-size", type=int, default=64)
+    parser.add_argument("--no-uvloop", action="store_true", help="use the standard event loop")
+    args = parser.parse_args()
+    payload = b"p" * args.payload_size
+
+    print(f"{'transport':<10} {'connections/s':>14} {'messages/s':>14}")
+    for transport in (STREAMS_TRANSPORT, PROTOCOL_TRANSPORT):
+        config = NetworkConfig(transport=transport, use_uvloop=not args.no_uvloop)
+        loop = new_event_loop(config)
+        try:
+            loop.run_until_complete(run(config, args.connections, args.messages, args.publishers, payload))
+        finally:
+            loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import time
+from typing import Callable, Optional
+
+DEFAULT_CONNECT_BURST = 1000 # CONNECT packets admitted at once after a quiet period
+DEFAULT_MAX_WAIT = 5.0 # Seconds a CONNECT may wait for admission before it is refused
+
+
+class AdmissionController:
+    """
+    Token bucket pacing the processing of CONNECT packets.
+
+    Tokens accrue at rate per second up to burst. Each CONNECT takes one with reserve();
+    when none is left the bucket goes into debt and the returned delay is the time until
+    the CONNECT's token will have accrued, so waiting connections are admitted in arrival
+    order at the sustained rate without polling. A CONNECT that would wait longer than
+    max_wait is refused instead, letting the client back off and retry.
+
+    A reconnect storm therefore costs established connections no more than rate
+    registrations per second, while CONNECTs beyond what max_wait absorbs are turned away
+    cheaply instead of piling up.
+    """
+    __slots__ = ('rate', 'burst', 'max_wait', 'clock', '_tokens', '_updated', 'admitted', 'delayed', 'rejected')
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = DEFAULT_CONNECT_BURST,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        if rate <= 0:
+            raise ValueError(f"Admission rate must be positive: {rate}")
+        self.rate = rate # CONNECT packets admitted per second
+        self.burst = burst
+        self.max_wait = max_wait
+        self.clock = clock
+        self._tokens = float(burst) # Negative while CONNECTs wait for tokens
+        self._updated = clock()
+        self.admitted = 0 # CONNECTs given a token
+        self.delayed = 0 # Admitted CONNECTs that had to wait
+        self.rejected = 0 # CONNECTs refused
+
+    @property
+    def tokens(self) -> float:
+        """Tokens available now; negative while admitted CONNECTs are still waiting."""
+        self._refill()
+        return self._tokens
+
+    def reserve(self) -> Optional[float]:
+        """Takes a token and returns the seconds to wait before using it, or None if refused."""
+        self._refill()
+        delay = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+        if delay > self.max_wait:
+            self.rejected += 1
+            return None
+        self._tokens -= 1
+        self.admitted += 1
+        if delay:
+            self.delayed += 1
+        return delay
+
+    def _refill(self) -> None:
+        """Adds the tokens accrued since the last call."""
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
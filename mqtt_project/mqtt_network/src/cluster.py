@@ -0,0 +1,160 @@
+import asyncio
+import multiprocessing
+import queue
+import socket
+from typing import Callable, List, Optional, Sequence, Tuple
+from .config import NetworkConfig, new_event_loop
+from .routing import DEFAULT_LINK_QUEUE_DEPTH
+from .workers import BrokerNode, DEFAULT_START_TIMEOUT
+
+Address = Tuple[str, int]
+
+DEFAULT_RECONNECT_INTERVAL = 1.0 # Seconds between attempts to open or reopen a link to a peer node
+_POLL_INTERVAL = 0.01 # Seconds between checks whether every peer is linked
+
+
+class ClusterNode(BrokerNode):
+    """
+    One broker node of a cluster: a BrokerNode whose router is linked to every other node
+    over persistent TCP connections.
+
+    Nodes exchange only which filters their clients use (see PeerRouter), never per-client
+    state, and forward a publish once to each node with a matching filter. Forwarded
+    messages are delivered locally and never forwarded again, so the links form a full
+    mesh: peers must list the cluster address of every other node.
+
+    Each pair of nodes shares one link, opened by the node with the higher cluster
+    address. That node keeps reopening the link every reconnect_interval seconds while
+    its peer is unreachable; when a link comes back both ends announce all their filters
+    again. Link writes are batched by the link's OutboundQueue.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cluster_address: Address,
+        peers: Sequence[Address],
+        config: Optional[NetworkConfig] = None,
+        reconnect_interval: float = DEFAULT_RECONNECT_INTERVAL,
+        link_queue_depth: int = DEFAULT_LINK_QUEUE_DEPTH
+    ):
+        super().__init__(name, config or NetworkConfig(), link_queue_depth, reconnect_interval)
+        self.cluster_address = tuple(cluster_address) # Where peers open their links to this node
+        self.peer_addresses = [tuple(peer) for peer in peers]
+        self.link_server: Optional[asyncio.AbstractServer] = None
+
+    async def run(self, host: str, port: int, ready: Optional[Callable[[], None]] = None) -> None:
+        """Serves clients and links to the peers; calls ready once every peer is linked."""
+        self.link_server = await asyncio.start_server(self.router.link, *self.cluster_address)
+        await self._start_monitor()
+        for peer in self.peer_addresses:
+            if peer < self.cluster_address:
+                self._links.append(asyncio.create_task(
+                    self._keep_link(lambda peer=peer: asyncio.open_connection(*peer))
+                ))
+        server_task = asyncio.create_task(self.network.start(host, port))
+        try:
+            while len(self.router.peers) < len(self.peer_addresses) or self.network.server is None:
+                if server_task.done():
+                    break
+                await asyncio.sleep(_POLL_INTERVAL)
+            if ready is not None and not server_task.done():
+                ready()
+            await server_task
+        finally:
+            server_task.cancel()
+            await self.stop()
+
+    async def stop(self) -> None:
+        """Closes the links, the metrics monitor and the network."""
+        for task in self._links:
+            task.cancel()
+        self._links.clear()
+        if self.link_server is not None:
+            self.link_server.close()
+            self.link_server = None
+        self.router.close()
+        await self._stop_monitor()
+        self._stop_delivering()
+        await self.network.stop()
+
+
+def _run_node(
+    name: str, host: str, port: int, cluster_address: Address, peers: List[Address],
+    config: NetworkConfig, ready: multiprocessing.Queue
+) -> None:
+    """Entry point of a node process."""
+    loop = new_event_loop(config)
+    asyncio.set_event_loop(loop)
+    node = ClusterNode(name, cluster_address, peers, config)
+    try:
+        loop.run_until_complete(node.run(host, port, lambda: ready.put(name)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.close()
+
+
+def _free_port(host: str) -> int:
+    with socket.socket() as probe:
+        probe.bind((host, 0))
+        return probe.getsockname()[1]
+
+
+class LocalCluster:
+    """
+    Runs a cluster of nodes as local processes, each with its own client port and cluster
+    port on host; for tests, benchmarks and trying cluster mode on one machine.
+
+    ports and cluster_ports default to free ports picked at start(). With config.metrics,
+    node i serves its Prometheus endpoint on metrics_port + i.
+    """
+
+    def __init__(
+        self,
+        nodes: int = 3,
+        host: str = "127.0.0.1",
+        ports: Optional[List[int]] = None,
+        cluster_ports: Optional[List[int]] = None,
+        config: Optional[NetworkConfig] = None
+    ):
+        self.nodes = nodes
+        self.host = host
+        self.ports = ports # Client port of each node
+        self.cluster_ports = cluster_ports # Link port of each node
+        self.config = config or NetworkConfig()
+        self.processes: List[multiprocessing.Process] = []
+
+    def start(self, timeout: float = DEFAULT_START_TIMEOUT) -> None:
+        """Starts the nodes and returns once every one of them is linked to all others."""
+        self.ports = self.ports or [_free_port(self.host) for _ in range(self.nodes)]
+        self.cluster_ports = self.cluster_ports or [_free_port(self.host) for _ in range(self.nodes)]
+        addresses = [(self.host, port) for port in self.cluster_ports]
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        for index in range(self.nodes):
+            process = context.Process(
+                target=_run_node,
+                args=(
+                    f"node-{index}", self.host, self.ports[index], addresses[index],
+                    addresses[:index] + addresses[index + 1:], self.config.for_process(index), ready
+                ),
+                name=f"mqtt-node-{index}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+        try:
+            for _ in range(self.nodes):
+                ready.get(timeout=timeout)
+        except queue.Empty:
+            self.stop()
+            raise TimeoutError(f"Cluster nodes did not start within {timeout} seconds")
+
+    def stop(self) -> None:
+        """Terminates the nodes."""
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes.clear()
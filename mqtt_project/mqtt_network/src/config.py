@@ -0,0 +1,79 @@
+import asyncio
+import dataclasses
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+from mqtt_common.models.message import Message
+from mqtt_common.src.metrics import Metrics, DEFAULT_SAMPLE_EVERY
+from .admission import AdmissionController, DEFAULT_CONNECT_BURST, DEFAULT_MAX_WAIT
+from .monitor import DEFAULT_INTERVAL
+from .network import CentralizedNetwork
+from .outbound import OverflowPolicy, DEFAULT_MAX_DEPTH
+from .protocol_network import ProtocolNetwork, DEFAULT_READ_BUFFER_SIZE
+
+try:
+    import uvloop
+except ImportError: # Optional: the standard event loop is used without it
+    uvloop = None
+
+STREAMS_TRANSPORT = "streams" # StreamReader/StreamWriter, CentralizedNetwork
+PROTOCOL_TRANSPORT = "protocol" # BufferedProtocol, ProtocolNetwork
+
+
+@dataclass
+class NetworkConfig:
+    """Settings selecting and configuring the network implementation."""
+    transport: str = STREAMS_TRANSPORT
+    max_queue_depth: int = DEFAULT_MAX_DEPTH
+    overflow_policy: OverflowPolicy = OverflowPolicy.DROP_QOS0
+    read_buffer_size: int = DEFAULT_READ_BUFFER_SIZE # Protocol transport only
+    use_uvloop: bool = True # Run on uvloop when it is installed
+    reuse_port: bool = False # Bind with SO_REUSEPORT, as every process of a WorkerPool does
+    connect_rate: float = 0.0 # CONNECT packets processed per second, 0 for no limit
+    connect_burst: int = DEFAULT_CONNECT_BURST # CONNECT packets processed at once before connect_rate applies
+    connect_max_wait: float = DEFAULT_MAX_WAIT # Seconds a CONNECT may wait for admission before it is refused
+    metrics: bool = False # Time the hot-path stages and run a MetricsMonitor on every node
+    metrics_sample_every: int = DEFAULT_SAMPLE_EVERY # Time one in this many events per stage
+    metrics_interval: float = DEFAULT_INTERVAL # Seconds between $SYS publications
+    metrics_host: str = "127.0.0.1" # Interface of the Prometheus endpoint
+    metrics_port: Optional[int] = None # Port of the Prometheus endpoint, None for no endpoint
+
+    def for_process(self, index: int) -> 'NetworkConfig':
+        """Returns the settings of the index-th process of a pool: its own metrics_port, offset by index."""
+        if not self.metrics_port:
+            return self
+        return dataclasses.replace(self, metrics_port=self.metrics_port + index)
+
+
+def create_network(
+    config: NetworkConfig,
+    spill: Optional[Callable[[str, Message], Awaitable[None]]] = None,
+    replay: Optional[Callable[[str, int], AsyncIterator[List[Message]]]] = None
+) -> CentralizedNetwork:
+    """
+    Creates the network implementation selected by config.transport, with a Metrics
+    object of its own when config.metrics is set.
+    """
+    admission = None
+    if config.connect_rate:
+        admission = AdmissionController(config.connect_rate, config.connect_burst, config.connect_max_wait)
+    if config.transport == STREAMS_TRANSPORT:
+        network = CentralizedNetwork(
+            config.max_queue_depth, config.overflow_policy, spill, config.reuse_port, admission, replay
+        )
+    elif config.transport == PROTOCOL_TRANSPORT:
+        network = ProtocolNetwork(
+            config.max_queue_depth, config.overflow_policy, spill, config.read_buffer_size,
+            config.reuse_port, admission, replay
+        )
+    else:
+        raise ValueError(f"Unknown network transport: {config.transport}")
+    if config.metrics:
+        network.metrics = Metrics(sample_every=config.metrics_sample_every)
+    return network
+
+
+def new_event_loop(config: NetworkConfig) -> asyncio.AbstractEventLoop:
+    """Creates the event loop to run the network on: uvloop if enabled and installed."""
+    if config.use_uvloop and uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Optional
+from mqtt_common.models.constants import MQTTProtocol
+from mqtt_common.models.message import Message
+from mqtt_protocol.src.encoder import PublishTemplate
+from mqtt_protocol.src.inflight import InboundFlow, OutboundFlow
+from mqtt_protocol.src.properties import Properties
+from .outbound import OutboundQueue
+from .timers import Timer
+
+
+class ClientSession:
+    """
+    QoS 1 and 2 state of one client of a BrokerNode, kept as ClientConnection.session so
+    it moves to the new connection on session takeover. FanOut creates one for clients
+    that do not have it yet.
+
+    inbound tracks the client's own publishes and the acknowledgements owed for them;
+    outbound assigns the packet IDs of deliveries to the client and holds deliveries
+    beyond its Receive Maximum until acknowledgements make room. A persistent session
+    outlives its connection, together with the client's subscriptions, for expiry_interval
+    seconds or for good.
+    """
+    __slots__ = ('inbound', 'outbound', 'persistent', 'expiry_interval', 'retry_timer', 'expiry_timer')
+
+    def __init__(self, receive_maximum: int = MQTTProtocol.DEFAULT_RECEIVE_MAXIMUM):
+        self.inbound = InboundFlow()
+        self.outbound = OutboundFlow(receive_maximum)
+        self.persistent = False # Kept after disconnect: clean_session unset (MQTT 5.0: a Session Expiry Interval set)
+        self.expiry_interval: Optional[int] = None # Seconds a persistent session is kept after disconnect, None for ever
+        self.retry_timer: Optional[Timer] = None # Resends unacknowledged deliveries; None when nothing is in flight
+        self.expiry_timer: Optional[Timer] = None # Ends the session while its client is away
+
+
+class ClientConnection:
+    """A connected client: its transport, the protocol version it speaks and its outbound queue."""
+    __slots__ = ('client_id', 'writer', 'protocol_version', 'queue', 'keep_alive_timer', 'session')
+
+    def __init__(
+        self,
+        client_id: str,
+        writer: asyncio.StreamWriter,
+        protocol_version: int,
+        queue: OutboundQueue
+    ):
+        self.client_id = client_id
+        self.writer = writer
+        self.protocol_version = protocol_version
+        self.queue = queue
+        self.keep_alive_timer: Optional[Timer] = None # Postponed on every received packet; None without keep alive
+        self.session: Optional[ClientSession] = None # Broker state of the client's session, handed over on session takeover
+
+    def send_message(self, message: Message, packet_id: Optional[int] = None, dup: bool = False) -> bool:
+        """
+        Encodes a message as a PUBLISH for this client and queues it; returns whether it was queued.
+
+        QoS 1/2 messages are sent with packet_id, or with their message_id when it is None,
+        and with the DUP flag when dup is set.
+        """
+        properties = None
+        if message.properties and self.protocol_version >= MQTTProtocol.VERSION_5_0:
+            properties = Properties.from_dict(message.properties)
+        template = PublishTemplate(
+            message.topic, message.view(), message.qos, message.retain, dup,
+            protocol_version=self.protocol_version,
+            properties=properties
+        )
+        return self.queue.put(template.buffers(message.message_id if packet_id is None else packet_id), message)
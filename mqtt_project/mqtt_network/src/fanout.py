@@ -0,0 +1,222 @@
+import asyncio
+import time
+from typing import Container, Dict, Iterable, Optional, Tuple
+from mqtt_common.models.constants import MQTTProtocol, PacketType
+from mqtt_common.models.message import Message
+from mqtt_common.src.metrics import Metrics
+from mqtt_protocol.src.encoder import PacketEncoder, PublishTemplate
+from mqtt_protocol.src.packet import MQTTPacket
+from mqtt_protocol.src.properties import Properties
+from .connection import ClientConnection, ClientSession
+from .network import CentralizedNetwork
+
+DEFAULT_BATCH_SIZE = 1000 # Recipients dispatched between yields to the event loop
+
+
+class FanOut:
+    """
+    Delivers one PUBLISH to all its matching subscribers, encoding it once per wire format.
+
+    The bytes sent to two subscribers only differ when their effective QoS, protocol
+    version or retain flag differ, plus the packet ID at QoS > 0. publish() therefore
+    keeps one PublishTemplate per (QoS, protocol version, retain) group, built when the
+    group's first subscriber comes up, and each recipient costs a dict lookup and a
+    packet ID patched into its own small buffer; topic, properties and payload buffers
+    are shared by every queued packet.
+
+    Recipients are queued on their connections' OutboundQueues, and publish() yields to
+    the event loop every batch_size recipients, so a publish to many subscribers delays
+    other clients by at most one batch. Subscription identifiers are not stored by the
+    subscription index and are not sent.
+
+    QoS 1 and 2 packet IDs come from the outbound flow of the client's ClientSession,
+    created with receive_maximum for a connection that has none: when the client's
+    window is full the message waits in its flow and is sent by acknowledge() once the
+    client's acknowledgements make room. BrokerNode delivers every message this way.
+
+    With a retry_interval, an MQTT 3.1.1 client that acknowledges nothing for that long
+    while deliveries are in flight gets every unacknowledged PUBLISH again with DUP set,
+    or the PUBREL of a QoS 2 message it already received (see resend()); the session's
+    retry timer on the network's timing wheel is armed by the first delivery in flight
+    and postponed by each acknowledgement. MQTT 5.0 only allows resending when a session
+    resumes, for which BrokerNode calls resend() as well.
+
+    With metrics, sampled publishes record the time from the message's creation until
+    it was queued to its last subscriber (publish_deliver).
+
+    Attributes:
+        publishes: Messages fanned out
+        delivered: Packets queued to subscribers
+        encoded: Templates built, one per group of each publish
+        deferred: QoS 1/2 deliveries held back by a full in-flight window
+        undelivered: Subscribers that were not connected or whose queue refused the packet
+        yields: Times publish() yielded to the event loop
+        retries: Deliveries and PUBRELs resent after retry_interval
+    """
+
+    def __init__(
+        self,
+        network: CentralizedNetwork,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        receive_maximum: int = MQTTProtocol.DEFAULT_RECEIVE_MAXIMUM,
+        metrics: Optional[Metrics] = None,
+        retry_interval: Optional[float] = None
+    ):
+        self.network = network
+        self.batch_size = batch_size
+        self.receive_maximum = receive_maximum # Window of sessions created here
+        self.metrics = metrics
+        self.retry_interval = retry_interval # Seconds without acknowledgement before resending, None to never resend
+        self.publishes = 0
+        self.delivered = 0
+        self.encoded = 0
+        self.deferred = 0
+        self.undelivered = 0
+        self.yields = 0
+        self.retries = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Fan-out counters."""
+        return {
+            "publishes": self.publishes,
+            "delivered": self.delivered,
+            "encoded": self.encoded,
+            "deferred": self.deferred,
+            "undelivered": self.undelivered,
+            "yields": self.yields,
+            "retries": self.retries,
+        }
+
+    async def publish(
+        self,
+        message: Message,
+        subscribers: Iterable[Tuple[str, int]],
+        retain_as_published: Container[str] = ()
+    ) -> int:
+        """
+        Queues message for every (client_id, qos) subscriber and returns how many were queued.
+
+        Each subscriber gets the lower of the message's and its subscription's QoS. The
+        retain flag is only kept for the clients in retain_as_published.
+        """
+        self.publishes += 1
+        clients = self.network.clients
+        retry_interval = self.retry_interval
+        batch_size = self.batch_size
+        properties = Properties.from_dict(message.properties) if message.properties else None
+        payload = message.view()
+        # (qos, protocol version, retain) -> template, and (qos, retain) -> message as delivered
+        templates: Dict[Tuple[int, int, bool], PublishTemplate] = {}
+        variants: Dict[Tuple[int, bool], Message] = {}
+        delivered = 0
+        dispatched = 0
+        for client_id, qos in subscribers:
+            dispatched += 1
+            if dispatched % batch_size == 0:
+                self.yields += 1
+                await asyncio.sleep(0)
+            connection = clients.get(client_id)
+            if connection is None:
+                self.undelivered += 1
+                continue
+            qos = min(qos, message.qos)
+            retain = message.retain and client_id in retain_as_published
+            version = connection.protocol_version
+            template = templates.get((qos, version, retain))
+            if template is None:
+                template = templates[qos, version, retain] = PublishTemplate(
+                    message.topic, payload, qos, retain, protocol_version=version,
+                    properties=properties if version >= MQTTProtocol.VERSION_5_0 else None
+                )
+                self.encoded += 1
+            variant = variants.get((qos, retain))
+            if variant is None:
+                variant = variants[qos, retain] = self._variant(message, qos, retain)
+
+            if qos:
+                session = connection.session
+                if session is None:
+                    session = connection.session = ClientSession(self.receive_maximum)
+                packet_id = session.outbound.send(variant)
+                if packet_id is None:
+                    self.deferred += 1
+                    continue
+                if retry_interval is not None and session.retry_timer is None and version < MQTTProtocol.VERSION_5_0:
+                    session.retry_timer = self.network.timers.schedule(retry_interval, self._retry, client_id, session)
+                queued = connection.queue.put(template.buffers(packet_id), variant)
+            else:
+                queued = connection.queue.put(template.buffers(), variant)
+            if queued:
+                delivered += 1
+            else:
+                self.undelivered += 1
+        self.delivered += delivered
+        metrics = self.metrics
+        if delivered and metrics is not None and metrics.publish_deliver.sampled():
+            metrics.publish_deliver.record(time.monotonic_ns() - message.timestamp_ns)
+        return delivered
+
+    @staticmethod
+    def _variant(message: Message, qos: int, retain: bool) -> Message:
+        """Returns message as delivered with a QoS and retain flag, kept with the packet in flight."""
+        if qos == message.qos and retain == message.retain:
+            return message
+        return Message.trusted(
+            message.topic, message.payload, qos, retain,
+            message.message_id, message._properties, message.timestamp_ns
+        )
+
+    def acknowledge(self, client_id: str, packets: Iterable[MQTTPacket]) -> int:
+        """
+        Applies a client's PUBACK, PUBREC and PUBCOMP packets, queues the PUBRELs they call for
+        and sends the messages that now fit in its window; returns how many messages were sent.
+        An acknowledgement of the wrong type for its message raises ProtocolError.
+        """
+        connection = self.network.clients.get(client_id)
+        if connection is None or connection.session is None:
+            return 0
+        session = connection.session
+        released, pubrel = session.outbound.acknowledge(packets)
+        if session.retry_timer is not None:
+            if session.outbound.inflight:
+                session.retry_timer.postpone()
+            else:
+                session.retry_timer.cancel()
+                session.retry_timer = None
+        for packet_id in pubrel:
+            connection.queue.put([PacketEncoder.encode_ack(PacketType.PUBREL, packet_id)])
+        sent = 0
+        for packet_id, message in released:
+            if connection.send_message(message, packet_id):
+                sent += 1
+        self.delivered += sent
+        return sent
+
+    def resend(self, connection: ClientConnection) -> int:
+        """
+        Queues the client's unacknowledged deliveries again with DUP, and the PUBRELs of QoS 2
+        messages it already received; returns how many packets were queued.
+        """
+        session = connection.session
+        resent = 0
+        for packet_id, message in session.outbound.unacknowledged():
+            if message is None:
+                connection.queue.put([PacketEncoder.encode_ack(PacketType.PUBREL, packet_id)])
+            else:
+                connection.send_message(message, packet_id, dup=True)
+            resent += 1
+        if (self.retry_interval is not None and session.retry_timer is None and session.outbound.inflight
+                and connection.protocol_version < MQTTProtocol.VERSION_5_0):
+            session.retry_timer = self.network.timers.schedule(
+                self.retry_interval, self._retry, connection.client_id, session
+            )
+        return resent
+
+    def _retry(self, client_id: str, session: ClientSession) -> None:
+        """Resends the deliveries a client left unacknowledged for retry_interval."""
+        session.retry_timer = None
+        connection = self.network.clients.get(client_id)
+        if connection is None or connection.session is not session:
+            return # Disconnected or ended: a resumed session is resent on reconnect
+        self.retries += self.resend(connection)
@@ -0,0 +1,129 @@
+import asyncio
+from typing import Callable, Dict, Optional
+from mqtt_common.models.constants import MQTTProtocol
+from mqtt_common.models.message import Message
+from mqtt_common.src.metrics import Metrics
+
+DEFAULT_INTERVAL = 1.0 # Seconds per metrics interval
+METRICS_PATH = "/metrics" # HTTP path Prometheus scrapes
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_MAX_REQUEST_LINES = 100 # Header lines read from a scrape request before giving up
+
+
+class MetricsMonitor:
+    """
+    Aggregates a Metrics object per interval and reports it on $SYS topics and over HTTP.
+
+    Every interval seconds the monitor calls metrics.rollover(), which turns the
+    interval's counters into rates and its histograms into quantiles, and passes a
+    retained QoS 0 message for each topic of metrics.sys_topics() to publish, for
+    instance a BrokerNode's delivery to its subscribers. serve() answers GET /metrics
+    with metrics.prometheus(); a scrape only formats what is already aggregated.
+
+    Attributes:
+        published: $SYS messages passed to publish
+        scrapes: Prometheus requests answered
+        errors: publish calls that raised
+        last_error: Last exception raised by publish
+    """
+
+    def __init__(
+        self,
+        metrics: Metrics,
+        publish: Optional[Callable[[Message], None]] = None,
+        interval: float = DEFAULT_INTERVAL,
+        sys_root: str = MQTTProtocol.SYS_BROKER_TOPIC
+    ):
+        self.metrics = metrics
+        self.publish = publish
+        self.interval = interval
+        self.sys_root = sys_root # Topic the $SYS metrics are published under
+        self.server: Optional[asyncio.AbstractServer] = None # Prometheus endpoint, once serve() was called
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.scrapes = 0
+        self.errors = 0
+        self.last_error: Optional[Exception] = None
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Monitor counters."""
+        return {
+            "intervals": self.metrics.intervals,
+            "published": self.published,
+            "scrapes": self.scrapes,
+            "errors": self.errors,
+        }
+
+    def start(self) -> None:
+        """Starts rolling the metrics over every interval."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the interval task and the Prometheus endpoint."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            # Fixed deadlines, so intervals do not drift by the time tick() takes
+            deadline += self.interval
+            await asyncio.sleep(max(deadline - loop.time(), 0))
+            self.tick()
+
+    def tick(self) -> int:
+        """Ends the current interval and publishes its $SYS topics; returns how many were published."""
+        self.metrics.rollover()
+        if self.publish is None:
+            return 0
+        published = 0
+        for topic, payload in self.metrics.sys_topics(self.sys_root).items():
+            try:
+                self.publish(Message.trusted(topic, payload, 0, True))
+                published += 1
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+        self.published += published
+        return published
+
+    async def serve(self, host: str, port: int) -> asyncio.AbstractServer:
+        """Starts the Prometheus endpoint on host and port."""
+        self.server = await asyncio.start_server(self._handle_scrape, host, port)
+        return self.server
+
+    async def _handle_scrape(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answers one HTTP request and closes the connection."""
+        try:
+            request = await reader.readline()
+            for _ in range(_MAX_REQUEST_LINES):
+                if await reader.readline() in (b"\r\n", b"\n", b""):
+                    break
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == METRICS_PATH.encode():
+                body = self.metrics.prometheus().encode()
+                status = b"200 OK"
+                content_type = PROMETHEUS_CONTENT_TYPE.encode()
+                self.scrapes += 1
+            else:
+                body = b"Not Found\n"
+                status = b"404 Not Found"
+                content_type = b"text/plain"
+            writer.write(
+                b"HTTP/1.1 " + status + b"\r\nContent-Type: " + content_type +
+                b"\r\nContent-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -1,19 +1,99 @@
 import asyncio
-from typing import Dict, Optional
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
 from mqtt_common.src.network import NetworkInterface
+from mqtt_common.models.constants import MQTTProtocol, PacketType, ConnectReturnCode
+from mqtt_common.models.errors import ProtocolError, ValidationError
 from mqtt_common.models.message import Message
+from mqtt_common.src.metrics import Metrics
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.packet import MQTTPacket, ConnectPacket, ConnAckPacket, DisconnectPacket
+from mqtt_protocol.src.stream import StreamDecoder
+from .admission import AdmissionController
+from .connection import ClientConnection
+from .outbound import Buffer, OutboundQueue, OverflowPolicy, DEFAULT_MAX_DEPTH
+from .timers import TimingWheel
 
 class CentralizedNetwork(NetworkInterface):
-    def __init__(self):
+    """
+    TCP server holding one ClientConnection per connected client.
+
+    Outgoing packets go through each client's bounded OutboundQueue, drained by its own
+    writer task, so send_message() never waits on a socket: fan-out to many subscribers
+    is not serialised on the slowest one. When a queue is full, overflow_policy decides
+    whether the packet is dropped, the client disconnected, or the message passed to
+    spill(client_id, message), for instance to keep it in the client's session.
+
+    Once a client's queue spills, its later messages are spilled too until the queue
+    has drained. The network then replays the backlog with replay(client_id, count),
+    an async iterator of message batches such as OfflineQueues.replay(), one batch of
+    at most the queue's free room per drain, and queues the client's messages in
+    memory again once replay yields nothing and no spill callback is running. Without
+    replay, spilled messages stay with spill and the queue stops spilling as soon as
+    it has drained.
+
+    connect_handler(connection, connect_packet) is called when a client has been registered,
+    every packet received after CONNECT is passed to packet_handler(client_id, packet)
+    and disconnect_handler(client_id) is called once a client has been removed.
+
+    Keep alive is enforced with one timer per client on the shared timers wheel: a client
+    that sends nothing for KEEP_ALIVE_GRACE_FACTOR times its keep alive is disconnected.
+    The wheel also carries the QoS retry and session expiry timers of BrokerNode sessions.
+
+    A CONNECT with the client ID of a connected client takes its session over: unless
+    the new connection asks for a clean session, it receives the old connection's session
+    and unwritten packets, and the old transport is closed without waiting for it. The
+    old connection's read loop then stops without removing the client. With a clean
+    session, disconnect_handler is called for the old session first, so the broker
+    drops its state (such as subscriptions) before the new connection is registered. A client that
+    connects without a client ID is registered under a unique ID assigned by the server
+    (ASSIGNED_CLIENT_ID_PREFIX and a random UUID, so worker processes sharing a port do
+    not collide); on MQTT 3.1.1 this is only allowed with a clean session, otherwise the
+    CONNECT gets an identifier rejected CONNACK. With an admission
+    controller, CONNECT processing is paced by its token bucket and CONNECTs it refuses
+    get a server unavailable (MQTT 5.0: server busy) CONNACK.
+    """
+    gauges = frozenset({"clients", "queued", "queued_bytes", "max_depth", "high_watermark"}) # Levels among the stats, reported as gauges; the rest count events
+
+    def __init__(
+        self,
+        max_queue_depth: int = DEFAULT_MAX_DEPTH,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_QOS0,
+        spill: Optional[Callable[[str, Message], Awaitable[None]]] = None,
+        reuse_port: bool = False,
+        admission: Optional[AdmissionController] = None,
+        replay: Optional[Callable[[str, int], AsyncIterator[List[Message]]]] = None
+    ):
         self.server: Optional[asyncio.Server] = None # Server object for handling client connections    
-        self.clients: Dict[str, asyncio.StreamWriter] = {} # Dictionary of connected clients
+        self.clients: Dict[str, ClientConnection] = {} # Dictionary of connected clients
         self.running: bool = False # Flag to indicate if the server is running
+        self.max_queue_depth = max_queue_depth # Packets queued per client before overflow_policy applies
+        self.overflow_policy = overflow_policy
+        self.spill = spill # Receives overflowing messages under OverflowPolicy.SPILL
+        self._spill_tasks: Set[asyncio.Task] = set() # Spill callbacks still running
+        self.replay = replay # Yields a client's spilled messages in batches of at most a given count
+        self._replays: Dict[str, asyncio.Task] = {} # Client ID -> task replaying its spilled backlog
+        self.replayed = 0 # Spilled messages queued to their client again
+        self.reuse_port = reuse_port # Bind with SO_REUSEPORT so several processes can share the port
+        self.connect_handler: Optional[Callable[[ClientConnection, ConnectPacket], None]] = None # Called once a client is registered
+        self.packet_handler: Optional[Callable[[str, MQTTPacket], None]] = None # Receives packets after CONNECT
+        self.disconnect_handler: Optional[Callable[[str], None]] = None # Called with the client ID of a removed client
+        self.timers = TimingWheel() # Keep alive and other deadlines, advanced while the server runs
+        self.admission = admission # Paces CONNECT processing; None admits every CONNECT at once
+        self.metrics: Optional[Metrics] = None # Times decoding and the outbound queues of new connections when set
+        self.keep_alive_expired = 0 # Clients disconnected for exceeding their keep alive
+        self.takeovers = 0 # Connections replaced by a newer connection with the same client ID
+        # Outbound queue counters of clients that have disconnected
+        self.dropped = 0
+        self.spilled = 0
+        self.overflow_disconnects = 0
 
     async def start(self, host: str, port: int) -> None:
         """Start the TCP server and listen for connections"""
         self.running = True
+        self.timers.start()
         self.server = await asyncio.start_server( 
-            self.handle_client_connection, host, port
+            self.handle_client_connection, host, port, reuse_port=self.reuse_port or None
         )
         
         async with self.server:
@@ -22,31 +102,32 @@ class CentralizedNetwork(NetworkInterface):
     async def stop(self) -> None:
         """Stop the server and close all client connections"""
         self.running = False
+        self.timers.stop()
         if self.server: 
             self.server.close()
             await self.server.wait_closed()
             
-        # Close all client connections
-        for writer in self.clients.values():
-            writer.close()
-            await writer.wait_closed()
-        self.clients.clear()
+        # Close all client connections, then wait for their transports together
+        connections = [self._forget_client(client_id) for client_id in list(self.clients)]
+        for task in list(self._replays.values()):
+            task.cancel()
+        await asyncio.gather(*(self._wait_closed(connection) for connection in connections if connection))
 
     async def send_message(self, client_id: str, message: Message) -> None:
-        """Send a message to a specific client"""
-        if client_id not in self.clients: 
+        """Queue a message for a specific client without waiting for the socket"""
+        connection = self.clients.get(client_id)
+        if connection is None: 
             raise ValueError(f"Client {client_id} not connected")
-            
-        writer = self.clients[client_id]
-        try:
-            # Convert message to bytes and send
-            message_bytes = message.to_bytes()
-            writer.write(message_bytes)
-            await writer.drain() 
-        except Exception as e:
-            # Handle connection errors
-            await self._remove_client(client_id)
-            raise ConnectionError(f"Failed to send message to client {client_id}: {str(e)}")
+        if not connection.send_message(message) and connection.queue.closed:
+            # The read loop of the connection removes the client
+            raise ConnectionError(f"Failed to send message to client {client_id}: connection closed")
+
+    def send_packet(self, client_id: str, buffers: List[Buffer], message: Optional[Message] = None) -> bool:
+        """Queue an encoded packet for a client; returns whether it was queued"""
+        connection = self.clients.get(client_id)
+        if connection is None:
+            return False
+        return connection.queue.put(buffers, message)
 
     def get_client_count(self) -> int:
         """Return the current number of connected clients"""
@@ -56,51 +137,245 @@ class CentralizedNetwork(NetworkInterface):
         """Check if a client is currently connected"""
         return client_id in self.clients
 
+    def queue_depths(self) -> Dict[str, int]:
+        """Return the number of packets waiting in each client's outbound queue"""
+        return {client_id: connection.queue.depth for client_id, connection in self.clients.items()}
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Connection counters and the outbound_stats() of all clients."""
+        stats = self.outbound_stats()
+        stats['keep_alive_expired'] = self.keep_alive_expired
+        stats['takeovers'] = self.takeovers
+        return stats
+
+    def outbound_stats(self) -> Dict[str, int]:
+        """Return outbound queue metrics aggregated over all clients"""
+        queues = [connection.queue for connection in self.clients.values()]
+        return {
+            'clients': len(queues),
+            'queued': sum(queue.depth for queue in queues),
+            'queued_bytes': sum(queue.queued_bytes for queue in queues),
+            'max_depth': max((queue.depth for queue in queues), default=0),
+            'high_watermark': max((queue.high_watermark for queue in queues), default=0),
+            'dropped': self.dropped + sum(queue.dropped for queue in queues),
+            'spilled': self.spilled + sum(queue.spilled for queue in queues),
+            'overflow_disconnects': self.overflow_disconnects + sum(queue.overflowed for queue in queues),
+        }
+
     async def handle_client_connection(
         self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
     ) -> None:
         """Handle new client connections"""
-        # Wait for CONNECT packet to get client_id
+        client_id: Optional[str] = None
+        connection: Optional[ClientConnection] = None
+        packets = StreamDecoder().iter_packets(reader)
         try:
-            connect_packet = await self._read_connect_packet(reader)
-            client_id = connect_packet.client_id
+            # Wait for CONNECT packet to get client_id
+            connect_packet = await self._read_connect_packet(packets)
+            delay = self._admission_delay(writer, connect_packet)
+            if delay is None:
+                return
+            if delay:
+                await asyncio.sleep(delay)
+            client_id = self._client_id(writer, connect_packet)
+            if client_id is None:
+                return
             
             # Store client connection
-            self.clients[client_id] = writer
+            connection = self._register_client(client_id, writer, connect_packet)
             
-            # Handle incoming messages until connection closes
+            # Handle incoming packets until connection closes
             while self.running:
-                try:
-                    message = await self._read_message(reader)
-                    if message is None:  # Connection closed
-                        break
-                    # Process message (implement message handling logic)
-                    await self._handle_message(client_id, message)
-                except ConnectionError:
+                packet = await self._read_packet(packets)
+                if packet is None or connection.queue.closed:  # Connection closed or taken over
                     break
-                
+                if connection.keep_alive_timer is not None:
+                    connection.keep_alive_timer.postpone()
+                self._handle_packet(client_id, packet)
+        except (ConnectionError, ProtocolError, ValidationError):
+            pass
         finally:
-            await self._remove_client(client_id)
+            if connection is not None:
+                await self._remove_client(client_id, connection)
+            else:
+                writer.close()
 
-    async def _remove_client(self, client_id: str) -> None:
-        """Remove a client and clean up their connection"""
-        if client_id in self.clients:
-            writer = self.clients[client_id]
+    def _register_client(
+        self, client_id: str, writer: asyncio.StreamWriter, connect_packet: ConnectPacket
+    ) -> ClientConnection:
+        """Store a new connection, start its outbound queue and pass it to the connect handler"""
+        spill = None
+        if self.spill is not None:
+            spill = lambda message: self._spill_message(client_id, message)
+        queue = OutboundQueue(writer, self.max_queue_depth, self.overflow_policy, spill, self.metrics)
+        connection = ClientConnection(client_id, writer, connect_packet.protocol_version, queue)
+        previous = self.clients.get(client_id)
+        if previous is not None:
+            self._take_over(previous, connection, connect_packet)
+        self.clients[client_id] = connection
+        queue.start()
+        if connect_packet.keep_alive:
+            connection.keep_alive_timer = self.timers.schedule(
+                connect_packet.keep_alive * MQTTProtocol.KEEP_ALIVE_GRACE_FACTOR, self._keep_alive_expired, connection
+            )
+        if self.connect_handler is not None:
+            self.connect_handler(connection, connect_packet)
+        return connection
+
+    def _take_over(self, previous: ClientConnection, connection: ClientConnection, connect_packet: ConnectPacket) -> None:
+        """Hand a client's session from its previous connection to a new one and close the old transport without waiting"""
+        self.takeovers += 1
+        if not connect_packet.clean_session:
+            connection.session = previous.session
+            # Encoded packets are only valid for a connection speaking the same protocol version
+            if previous.protocol_version == connection.protocol_version:
+                connection.queue.adopt(previous.queue)
+        elif self.disconnect_handler is not None:
+            # The old session ends here, not when its read loop stops
+            self.disconnect_handler(previous.client_id)
+        if previous.protocol_version >= MQTTProtocol.VERSION_5_0 and not previous.queue.closed:
+            previous.writer.writelines([PacketEncoder.encode(DisconnectPacket(
+                packet_type=PacketType.DISCONNECT, reason_code=MQTTProtocol.REASON_SESSION_TAKEN_OVER
+            ), previous.protocol_version)])
+        self._retire(previous)
+
+    def _admission_delay(self, writer: asyncio.StreamWriter, connect_packet: ConnectPacket) -> Optional[float]:
+        """Return how long to wait before processing a CONNECT, or None after refusing it"""
+        if self.admission is None:
+            return 0.0
+        delay = self.admission.reserve()
+        if delay is None:
+            writer.writelines([PacketEncoder.encode(ConnAckPacket(
+                packet_type=PacketType.CONNACK,
+                return_code=(
+                    MQTTProtocol.REASON_SERVER_BUSY
+                    if connect_packet.protocol_version >= MQTTProtocol.VERSION_5_0
+                    else ConnectReturnCode.SERVER_UNAVAILABLE
+                )
+            ), connect_packet.protocol_version)])
             writer.close()
-            await writer.wait_closed()
-            del self.clients[client_id]
-
-    async def _read_connect_packet(self, reader: asyncio.StreamReader) -> Message:
-        """Read and parse the initial CONNECT packet"""
-        # Implement MQTT CONNECT packet parsing
-        pass
-
-    async def _read_message(self, reader: asyncio.StreamReader) -> Optional[Message]:
-        """Read and parse an MQTT message"""
-        # Implement MQTT message parsing
-        pass
-
-    async def _handle_message(self, client_id: str, message: Message) -> None:
-        """Process received messages"""
-        # Implement message handling logic
-        pass
+        return delay
+
+    def _client_id(self, writer: asyncio.StreamWriter, connect_packet: ConnectPacket) -> Optional[str]:
+        """Return the client ID to register a CONNECT under, assigning one if it is empty, or None after refusing it"""
+        if connect_packet.client_id:
+            return connect_packet.client_id
+        if connect_packet.protocol_version < MQTTProtocol.VERSION_5_0 and not connect_packet.clean_session:
+            # MQTT 3.1.1 has no way to tell the client which session an assigned ID refers to
+            writer.writelines([PacketEncoder.encode(ConnAckPacket(
+                packet_type=PacketType.CONNACK, return_code=ConnectReturnCode.IDENTIFIER_REJECTED
+            ), connect_packet.protocol_version)])
+            writer.close()
+            return None
+        return MQTTProtocol.ASSIGNED_CLIENT_ID_PREFIX + uuid.uuid4().hex
+
+    def _keep_alive_expired(self, connection: ClientConnection) -> None:
+        """Close a connection that has been silent for longer than its keep alive allows"""
+        if self.clients.get(connection.client_id) is connection:
+            self.keep_alive_expired += 1
+            # Closing the transport ends the connection's read loop, which removes the client
+            connection.queue.close()
+
+    def _spill_message(self, client_id: str, message: Message) -> None:
+        """Run the spill callback for a message that overflowed a client's queue"""
+        loop = asyncio.get_running_loop()
+        task = loop.create_task(self.spill(client_id, message))
+        self._spill_tasks.add(task)
+        task.add_done_callback(self._spill_tasks.discard)
+        if client_id not in self._replays:
+            self._replays[client_id] = loop.create_task(self._replay_spilled(client_id))
+
+    async def _replay_spilled(self, client_id: str) -> None:
+        """Replay a client's spilled backlog as its queue drains, then stop spilling its messages"""
+        try:
+            while True:
+                connection = self.clients.get(client_id)
+                if connection is None or not connection.queue.spilling:
+                    return
+                queue = connection.queue
+                await queue.drained()
+                # Every spilled message must have reached spill before the backlog is read
+                if self._spill_tasks:
+                    await asyncio.gather(*self._spill_tasks, return_exceptions=True)
+                if self.clients.get(client_id) is not connection:
+                    continue # Taken over: carry on with the new connection, which adopted the backlog
+                if queue.closed:
+                    return
+                room = queue.max_depth - queue.depth
+                if room <= 0:
+                    continue
+                replayed = 0
+                if self.replay is not None:
+                    async for batch in self.replay(client_id, room):
+                        # The backlog itself is not spilled again
+                        queue.spilling = False
+                        for message in batch:
+                            connection.send_message(message)
+                        queue.spilling = True
+                        replayed = len(batch)
+                        break
+                if replayed:
+                    self.replayed += replayed
+                elif not self._spill_tasks:
+                    queue.end_spill()
+                    return
+        finally:
+            del self._replays[client_id]
+
+    async def _remove_client(self, client_id: str, connection: Optional[ClientConnection] = None) -> None:
+        """Remove a client and clean up their connection"""
+        connection = self._forget_client(client_id, connection)
+        if connection is not None:
+            await self._wait_closed(connection)
+
+    async def _wait_closed(self, connection: ClientConnection) -> None:
+        """Wait until the transport of a removed connection has closed"""
+        try:
+            await connection.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+    def _forget_client(self, client_id: str, connection: Optional[ClientConnection] = None) -> Optional[ClientConnection]:
+        """
+        Remove a client, close its queue and transport and keep its queue counters.
+
+        Given a connection, the client is only removed if that connection is still the
+        current one, so a connection that was taken over does not remove its successor.
+        """
+        current = self.clients.get(client_id)
+        if current is None or (connection is not None and current is not connection):
+            return None
+        del self.clients[client_id]
+        self._retire(current)
+        if self.disconnect_handler is not None:
+            self.disconnect_handler(client_id)
+        return current
+
+    def _retire(self, connection: ClientConnection) -> None:
+        """Cancel a connection's keep alive, close its queue and transport and keep its queue counters"""
+        if connection.keep_alive_timer is not None:
+            connection.keep_alive_timer.cancel()
+        queue = connection.queue
+        queue.close()
+        self.dropped += queue.dropped
+        self.spilled += queue.spilled
+        self.overflow_disconnects += queue.overflowed
+
+    async def _read_connect_packet(self, packets: AsyncIterator[MQTTPacket]) -> ConnectPacket:
+        """Read the initial packet, which must be CONNECT"""
+        packet = await self._read_packet(packets)
+        if packet is None:
+            raise ConnectionError("Connection closed before CONNECT")
+        if type(packet) is not ConnectPacket:
+            raise ProtocolError("First packet must be CONNECT")
+        return packet
+
+    async def _read_packet(self, packets: AsyncIterator[MQTTPacket]) -> Optional[MQTTPacket]:
+        """Read the next MQTT packet, or None once the connection is closed"""
+        return await anext(packets, None)
+
+    def _handle_packet(self, client_id: str, packet: MQTTPacket) -> None:
+        """Pass a received packet to the packet handler"""
+        if self.packet_handler is not None:
+            self.packet_handler(client_id, packet)
@@ -0,0 +1,199 @@
+import asyncio
+from collections import deque
+from enum import Enum
+from itertools import chain
+from time import perf_counter_ns
+from typing import Callable, Deque, List, Optional, Union
+from mqtt_common.models.message import Message
+from mqtt_common.src.metrics import Metrics
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+DEFAULT_MAX_DEPTH = 1000 # Packets queued per client before the overflow policy applies
+
+
+class OverflowPolicy(Enum):
+    """What an OutboundQueue does with a packet that arrives while it is full."""
+    DROP_QOS0 = "drop_qos0" # Drop QoS 0 packets; a QoS 1/2 packet disconnects the client
+    DISCONNECT = "disconnect" # Disconnect the client, whose session keeps undelivered QoS 1/2 messages
+    SPILL = "spill" # Hand the message to the spill callback, typically session storage
+    DROP = "drop" # Drop the packet whatever its QoS and keep the connection, e.g. for broker links
+
+
+class OutboundQueue:
+    """
+    Bounded queue of encoded packets for one client, drained by a dedicated writer task.
+
+    put() never waits: it appends the packet's buffers and wakes the writer task, which
+    takes everything queued since its last iteration, writes it with a single writelines()
+    and only then awaits drain(). A slow subscriber therefore only stalls its own writer
+    task, never the publisher, and a burst of packets costs one write and one drain.
+
+    Once depth packets are queued the overflow policy applies. Under SPILL, every later
+    message also goes to the spill callback until end_spill() is called by whoever replays
+    the spilled backlog, so a newer message never overtakes an older spilled one;
+    drained() tells that replayer when the client has caught up (see CentralizedNetwork).
+
+    With metrics, a sampled batch records how long its oldest packet waited (queue_wait)
+    and how long its write and drain took (write): the clock is read when a packet
+    arrives in an empty queue and around the write, never per packet.
+    """
+
+    def __init__(
+        self,
+        writer: asyncio.StreamWriter,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+        policy: OverflowPolicy = OverflowPolicy.DROP_QOS0,
+        spill: Optional[Callable[[Message], None]] = None,
+        metrics: Optional[Metrics] = None
+    ):
+        self.writer = writer
+        self.max_depth = max_depth
+        self.policy = policy
+        self.spill = spill # Receives messages that overflow under OverflowPolicy.SPILL
+        self.metrics = metrics
+        self._queued_at = 0 # perf_counter_ns() when the oldest packet of a sampled batch arrived
+        self._packets: Deque[List[Buffer]] = deque() # Buffers of each queued packet
+        self._waiter: Optional[asyncio.Future] = None # Set while the writer task waits for packets
+        self._drained: List[asyncio.Future] = [] # drained() calls waiting for the queue to empty
+        self._task: Optional[asyncio.Task] = None
+        self.spilling = False # Messages are spilled until the backlog has been replayed
+        self.closed = False
+        self.queued_bytes = 0 # Bytes waiting in the queue
+        self.high_watermark = 0 # Largest depth reached
+        self.sent = 0 # Packets written to the transport
+        self.writes = 0 # writelines() calls, each covering one or more packets
+        self.dropped = 0 # Packets dropped on overflow
+        self.spilled = 0 # Messages handed to the spill callback
+        self.overflowed = False # Whether the queue disconnected its client on overflow
+        self.last_error: Optional[Exception] = None # Error that stopped the writer task
+
+    @property
+    def depth(self) -> int:
+        """Number of packets waiting to be written."""
+        return len(self._packets)
+
+    def start(self) -> None:
+        """Starts the writer task."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def put(self, buffers: List[Buffer], message: Optional[Message] = None) -> bool:
+        """
+        Queues the buffers of one packet and returns whether they were queued.
+
+        message is the message the packet carries, if any: its QoS decides what
+        DROP_QOS0 does on overflow and SPILL hands it to the spill callback.
+        """
+        if self.closed:
+            return False
+        if len(self._packets) >= self.max_depth or (self.spilling and message is not None):
+            return self._overflow(message)
+        if not self._packets and self.metrics is not None and self.metrics.queue_wait.sampled():
+            self._queued_at = perf_counter_ns()
+        self._packets.append(buffers)
+        self.queued_bytes += sum(map(len, buffers))
+        if len(self._packets) > self.high_watermark:
+            self.high_watermark = len(self._packets)
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+        return True
+
+    def _overflow(self, message: Optional[Message]) -> bool:
+        """Applies the overflow policy to a packet that does not fit in the queue."""
+        policy = self.policy
+        if policy is OverflowPolicy.SPILL and self.spill is not None and message is not None:
+            self.spilling = True
+            self.spill(message)
+            self.spilled += 1
+            return False
+        if policy is OverflowPolicy.DISCONNECT or (
+            policy is OverflowPolicy.DROP_QOS0 and message is not None and message.qos > 0
+        ):
+            self.overflowed = True
+            self.close()
+            return False
+        self.dropped += 1
+        return False
+
+    def adopt(self, other: 'OutboundQueue') -> None:
+        """
+        Takes over the packets another queue has not written yet, ahead of this queue's own,
+        along with its spilling state; used when a new connection takes over a session.
+        """
+        if other._packets:
+            self._packets.extendleft(reversed(other._packets))
+            self.queued_bytes += other.queued_bytes
+            other._packets.clear()
+            other.queued_bytes = 0
+            if len(self._packets) > self.high_watermark:
+                self.high_watermark = len(self._packets)
+            waiter = self._waiter
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+        self.spilling = self.spilling or other.spilling
+
+    def end_spill(self) -> None:
+        """Queues messages in memory again once the spilled backlog has been replayed."""
+        self.spilling = False
+
+    async def drained(self) -> None:
+        """Waits until every queued packet has been written and drained, or the queue is closed."""
+        if self.closed or (not self._packets and (self._waiter is not None or self._task is None)):
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._drained.append(waiter)
+        await waiter
+
+    def _wake_drained(self) -> None:
+        """Resolves the pending drained() calls."""
+        waiters, self._drained = self._drained, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _run(self) -> None:
+        """Writes everything queued since the previous iteration in one call, then drains."""
+        packets = self._packets
+        writer = self.writer
+        loop = asyncio.get_running_loop()
+        try:
+            while not self.closed:
+                if not packets:
+                    if self._drained:
+                        self._wake_drained()
+                    self._waiter = loop.create_future()
+                    await self._waiter
+                    self._waiter = None
+                    continue
+                count = len(packets)
+                batch = list(chain.from_iterable(packets))
+                packets.clear()
+                self.queued_bytes = 0
+                queued_at = self._queued_at
+                if queued_at:
+                    self._queued_at = 0
+                    started = perf_counter_ns()
+                    self.metrics.queue_wait.record(started - queued_at)
+                writer.writelines(batch)
+                self.sent += count
+                self.writes += 1
+                await writer.drain()
+                if queued_at:
+                    self.metrics.write.record(perf_counter_ns() - started)
+        except (ConnectionError, OSError) as e:
+            self.last_error = e
+            self.close()
+
+    def close(self) -> None:
+        """Drops queued packets, stops the writer task and closes the transport without waiting."""
+        if self.closed:
+            return
+        self.closed = True
+        self._packets.clear()
+        self.queued_bytes = 0
+        self._wake_drained()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self.writer.close()
@@ -0,0 +1,187 @@
+import asyncio
+from time import perf_counter_ns
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+from mqtt_common.models.errors import ProtocolError, ValidationError
+from mqtt_common.models.message import Message
+from mqtt_protocol.src.packet import MQTTPacket, ConnectPacket
+from mqtt_protocol.src.stream import StreamDecoder
+from .admission import AdmissionController
+from .connection import ClientConnection
+from .network import CentralizedNetwork
+from .outbound import Buffer, OverflowPolicy, DEFAULT_MAX_DEPTH
+
+DEFAULT_READ_BUFFER_SIZE = 65536 # Bytes of the preallocated receive buffer of each connection
+
+
+class ConnectionProtocol(asyncio.BufferedProtocol):
+    """
+    One client connection of a ProtocolNetwork.
+
+    The transport reads straight into a preallocated bytearray returned by get_buffer(),
+    and buffer_updated() feeds the received bytes to the connection's StreamDecoder and
+    dispatches the decoded packets synchronously: no StreamReader buffer and no coroutine
+    wake-up per read. The decoder copies each chunk once, since the buffer is reused.
+
+    The protocol also stands in for the StreamWriter of the connection's OutboundQueue:
+    writelines() goes straight to the transport and drain() only waits while the
+    transport has paused writing, which pause_writing()/resume_writing() track.
+
+    A CONNECT the network's admission controller delays pauses reading; the packets
+    received after it are dispatched once the connection has been admitted.
+    """
+
+    def __init__(self, network: 'ProtocolNetwork', buffer_size: int = DEFAULT_READ_BUFFER_SIZE):
+        self.network = network
+        self.transport: Optional[asyncio.Transport] = None
+        self.client_id: Optional[str] = None # Set once CONNECT has been received
+        self.connection: Optional[ClientConnection] = None # Registered connection, once CONNECT has been received
+        self.decoder = StreamDecoder()
+        self._buffer = memoryview(bytearray(buffer_size))
+        self._paused = False # Transport write buffer above its high-water mark
+        self._drain_waiter: Optional[asyncio.Future] = None
+        self._closed = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self._buffer
+
+    def buffer_updated(self, nbytes: int) -> None:
+        metrics = self.network.metrics
+        try:
+            if metrics is not None and metrics.decode.sampled():
+                started = perf_counter_ns()
+                packets = self.decoder.packets(self._buffer[:nbytes])
+                metrics.decode.record(perf_counter_ns() - started)
+            else:
+                packets = self.decoder.packets(self._buffer[:nbytes])
+        except (ProtocolError, ValidationError):
+            self.transport.close()
+            return
+        connection = self.connection
+        if connection is not None and connection.keep_alive_timer is not None:
+            connection.keep_alive_timer.postpone()
+        self._dispatch(packets)
+
+    def _dispatch(self, packets: List[MQTTPacket]) -> None:
+        """Registers the client on CONNECT and passes the following packets to the network."""
+        network = self.network
+        for index, packet in enumerate(packets):
+            if self.connection is None:
+                if type(packet) is not ConnectPacket:
+                    self.transport.close()
+                    return
+                delay = network._admission_delay(self, packet)
+                if delay is None:
+                    return
+                if delay:
+                    self.transport.pause_reading()
+                    asyncio.get_running_loop().call_later(delay, self._admit, packet, packets[index + 1:])
+                    return
+                if not self._register(packet):
+                    return
+            elif network.running and not self.connection.queue.closed:
+                network._handle_packet(self.client_id, packet)
+
+    def _admit(self, connect_packet: ConnectPacket, packets: List[MQTTPacket]) -> None:
+        """Registers a client whose CONNECT waited for admission and resumes reading."""
+        if self.transport.is_closing() or not self._register(connect_packet):
+            return
+        self._dispatch(packets)
+        if not self.transport.is_closing():
+            self.transport.resume_reading()
+
+    def _register(self, connect_packet: ConnectPacket) -> bool:
+        """Registers the client of this connection with the network; returns False if the CONNECT was refused."""
+        client_id = self.network._client_id(self, connect_packet)
+        if client_id is None:
+            return False
+        self.client_id = client_id
+        self.connection = self.network._register_client(client_id, self, connect_packet)
+        return True
+
+    def eof_received(self) -> bool:
+        return False # Close the transport
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if self.connection is not None:
+            self.network._forget_client(self.client_id, self.connection)
+        waiter = self._drain_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(ConnectionResetError("Connection lost"))
+        if not self._closed.done():
+            self._closed.set_result(None)
+
+    def pause_writing(self) -> None:
+        self._paused = True
+
+    def resume_writing(self) -> None:
+        self._paused = False
+        waiter = self._drain_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def writelines(self, buffers: List[Buffer]) -> None:
+        """Writes buffers to the transport."""
+        self.transport.writelines(buffers)
+
+    async def drain(self) -> None:
+        """Waits until the transport has resumed writing."""
+        if self.transport.is_closing():
+            raise ConnectionResetError("Connection closed")
+        if not self._paused:
+            return
+        self._drain_waiter = asyncio.get_running_loop().create_future()
+        try:
+            await self._drain_waiter
+        finally:
+            self._drain_waiter = None
+
+    def close(self) -> None:
+        """Closes the transport without waiting for it."""
+        self.transport.close()
+
+    def is_closing(self) -> bool:
+        return self.transport.is_closing()
+
+    async def wait_closed(self) -> None:
+        """Waits until the connection has been lost."""
+        await self._closed
+
+
+class ProtocolNetwork(CentralizedNetwork):
+    """
+    CentralizedNetwork built on asyncio.BufferedProtocol instead of streams.
+
+    Each connection is a ConnectionProtocol reading into its own preallocated buffer and
+    decoding in the transport callback. Outbound queues, overflow policies and metrics are
+    those of CentralizedNetwork; with metrics set, sampled reads also record their decode
+    time, which the streams transport cannot separate from waiting on the socket. Packets
+    reach packet_handler from within buffer_updated(), so handlers must not block.
+    """
+
+    def __init__(
+        self,
+        max_queue_depth: int = DEFAULT_MAX_DEPTH,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_QOS0,
+        spill: Optional[Callable[[str, Message], Awaitable[None]]] = None,
+        read_buffer_size: int = DEFAULT_READ_BUFFER_SIZE,
+        reuse_port: bool = False,
+        admission: Optional[AdmissionController] = None,
+        replay: Optional[Callable[[str, int], AsyncIterator[List[Message]]]] = None
+    ):
+        super().__init__(max_queue_depth, overflow_policy, spill, reuse_port, admission, replay)
+        self.read_buffer_size = read_buffer_size # Bytes preallocated per connection for reads
+
+    async def start(self, host: str, port: int) -> None:
+        """Start the TCP server and listen for connections"""
+        self.running = True
+        self.timers.start()
+        self.server = await asyncio.get_running_loop().create_server(
+            lambda: ConnectionProtocol(self, self.read_buffer_size), host, port,
+            reuse_port=self.reuse_port or None
+        )
+
+        async with self.server:
+            await self.server.serve_forever()
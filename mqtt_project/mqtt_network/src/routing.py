@@ -0,0 +1,164 @@
+import asyncio
+from typing import Callable, Dict, List
+from mqtt_common.models.constants import MQTTProtocol, PacketType, QualityOfService
+from mqtt_common.models.errors import ProtocolError, ValidationError
+from mqtt_common.models.message import Message
+from mqtt_protocol.src.encoder import PacketEncoder, PublishTemplate
+from mqtt_protocol.src.packet import MQTTPacket, ConnectPacket, PublishPacket, SubscribePacket, UnsubscribePacket
+from mqtt_protocol.src.properties import Properties
+from mqtt_protocol.src.stream import StreamDecoder
+from mqtt_storage.src.subscriptions import SubscriptionTrie
+from .outbound import OutboundQueue, OverflowPolicy
+
+DEFAULT_LINK_QUEUE_DEPTH = 100000 # Packets queued per link before forwarded messages are dropped
+_LINK_VERSION = MQTTProtocol.VERSION_5_0 # Links carry message properties unchanged
+_LINK_PACKET_ID = 1 # SUBSCRIBE/UNSUBSCRIBE on links are not acknowledged, so one ID suffices
+
+
+class PeerRouter:
+    """
+    Forwards published messages to peers (worker processes or broker nodes) whose clients
+    subscribe to a matching filter.
+
+    Peers are connected by bidirectional links speaking MQTT 5.0: each end opens with a
+    CONNECT naming itself, then sends SUBSCRIBE/UNSUBSCRIBE for the filters its own clients
+    start or stop using and PUBLISH for the messages it forwards. Only filters are shared,
+    never client IDs: a filter is announced when its first local subscriber appears and
+    withdrawn when its last one leaves. Each router keeps the announced filters of all
+    peers in a SubscriptionTrie keyed by peer name, so publish() finds the interested peers
+    with one match and encodes the message once for all of them.
+
+    Link packets are not acknowledged and forwarded messages are handed to on_message
+    only, never forwarded again. Outgoing link traffic goes through an OutboundQueue, so
+    bursts of forwarded messages are written in batches. A full link queue drops the
+    forwarded messages that do not fit, whatever their QoS, rather than closing the link;
+    an announcement that does not fit closes the link instead, since the peer's view of
+    our filters would otherwise go stale, and the reopened link announces them all again.
+
+    Attributes:
+        forwarded: Messages sent to peers, counted once per peer
+        received: Messages received from peers
+        dropped: Forwarded messages dropped by full link queues
+    """
+    gauges = frozenset({"peers"}) # Linked peers is a level, not a count
+
+    def __init__(
+        self,
+        name: str,
+        on_message: Callable[[Message], None],
+        max_queue_depth: int = DEFAULT_LINK_QUEUE_DEPTH
+    ):
+        self.name = name # Announced to peers in the link CONNECT
+        self.on_message = on_message # Receives messages forwarded by peers
+        self.max_queue_depth = max_queue_depth # Packets queued per link
+        self.interest = SubscriptionTrie() # Filters announced by each peer
+        self.peers: Dict[str, OutboundQueue] = {} # Outgoing queue of each linked peer
+        self._local: Dict[str, int] = {} # Local subscriptions per announced filter
+        self.forwarded = 0
+        self.received = 0
+        self.dropped = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Router counters."""
+        return {
+            "peers": len(self.peers),
+            "forwarded": self.forwarded,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+    def add_local(self, topic_filter: str) -> None:
+        """Records a local subscription, announcing the filter to peers if it is new."""
+        count = self._local.get(topic_filter, 0)
+        self._local[topic_filter] = count + 1
+        if not count:
+            self._broadcast(self._subscribe_packet([topic_filter]))
+
+    def remove_local(self, topic_filter: str) -> None:
+        """Forgets a local subscription, withdrawing the filter once nobody uses it."""
+        count = self._local.get(topic_filter, 0)
+        if count > 1:
+            self._local[topic_filter] = count - 1
+        elif count:
+            del self._local[topic_filter]
+            self._broadcast(PacketEncoder.encode(UnsubscribePacket(
+                packet_type=PacketType.UNSUBSCRIBE, packet_id=_LINK_PACKET_ID, topics=[topic_filter]
+            ), _LINK_VERSION))
+
+    def publish(self, message: Message) -> int:
+        """Forwards a message to every peer interested in its topic and returns how many it was queued for."""
+        peers = self.interest.match(message.topic)
+        if not peers:
+            return 0
+        properties = Properties.from_dict(message.properties) if message.properties else None
+        buffers = PublishTemplate(
+            message.topic, message.view(), message.qos, message.retain,
+            protocol_version=_LINK_VERSION, properties=properties
+        ).buffers(message.message_id)
+        forwarded = 0
+        for peer in peers:
+            if self.peers[peer].put(buffers, message):
+                forwarded += 1
+        self.forwarded += forwarded
+        self.dropped += len(peers) - forwarded
+        return forwarded
+
+    async def link(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Runs a link with a peer until it closes; both ends of a connection call this."""
+        queue = OutboundQueue(writer, self.max_queue_depth, OverflowPolicy.DROP)
+        queue.start()
+        queue.put([PacketEncoder.encode(ConnectPacket(
+            packet_type=PacketType.CONNECT, client_id=self.name, protocol_version=_LINK_VERSION
+        ), _LINK_VERSION)])
+        packets = StreamDecoder(protocol_version=_LINK_VERSION).iter_packets(reader)
+        peer = None
+        try:
+            connect = await anext(packets, None)
+            if type(connect) is not ConnectPacket:
+                return
+            peer = connect.client_id
+            self.peers[peer] = queue
+            if self._local:
+                queue.put([self._subscribe_packet(list(self._local))])
+            async for packet in packets:
+                self._handle_packet(peer, packet)
+        except (ConnectionError, ProtocolError, ValidationError):
+            pass
+        finally:
+            if peer is not None and self.peers.get(peer) is queue:
+                del self.peers[peer]
+                self.interest.remove_client(peer)
+            queue.close()
+
+    def close(self) -> None:
+        """Closes every link; each link() call then returns."""
+        for queue in list(self.peers.values()):
+            queue.close()
+
+    def _handle_packet(self, peer: str, packet: MQTTPacket) -> None:
+        """Applies one packet received from a peer."""
+        packet_type = type(packet)
+        if packet_type is PublishPacket:
+            self.received += 1
+            self.on_message(packet.detach().to_message())
+        elif packet_type is SubscribePacket:
+            for topic_filter, qos in packet.subscriptions:
+                self.interest.add(peer, topic_filter, qos)
+        elif packet_type is UnsubscribePacket:
+            for topic_filter in packet.topics:
+                self.interest.remove(peer, topic_filter)
+
+    def _broadcast(self, packet: bytes) -> None:
+        """Queues an encoded announcement on every link, closing the links it does not fit on."""
+        for queue in list(self.peers.values()):
+            if not queue.put([packet]):
+                queue.close()
+
+    @staticmethod
+    def _subscribe_packet(topic_filters: List[str]) -> bytes:
+        """Encodes the SUBSCRIBE announcing topic filters to a peer."""
+        return PacketEncoder.encode(SubscribePacket(
+            packet_type=PacketType.SUBSCRIBE, packet_id=_LINK_PACKET_ID,
+            subscriptions=[(topic_filter, QualityOfService.EXACTLY_ONCE) for topic_filter in topic_filters]
+        ), _LINK_VERSION)
@@ -0,0 +1,155 @@
+import asyncio
+import math
+import time
+from typing import Any, Callable, List, Optional, Set
+
+DEFAULT_TICK = 0.1 # Seconds per wheel slot; timers fire within one tick of their deadline
+DEFAULT_SLOTS = 1024 # Slots in the wheel; longer delays wrap around and wait extra rounds
+
+
+class Timer:
+    """A callback scheduled on a TimingWheel."""
+    __slots__ = ('expires', 'interval', 'callback', 'args', '_due', '_bucket', '_wheel')
+
+    def __init__(self, wheel: 'TimingWheel', delay: float, callback: Callable[..., Any], args: tuple):
+        self.expires = wheel.now + delay # Clock time at which the timer fires
+        self.interval = delay # Delay used by postpone() without an argument
+        self.callback = callback
+        self.args = args
+        self._due = 0 # Wheel tick of the slot holding the timer
+        self._bucket: Optional[Set['Timer']] = None # Slot holding the timer, None once fired or cancelled
+        self._wheel = wheel
+
+    @property
+    def active(self) -> bool:
+        """Whether the timer is still waiting to fire."""
+        return self._bucket is not None
+
+    def postpone(self, delay: Optional[float] = None) -> None:
+        """
+        Moves the deadline to delay (by default the original interval) from now.
+
+        Only the deadline is updated: the timer stays in its slot and is moved when that
+        slot comes up, so postponing on every received packet costs one attribute write.
+        The deadline can only move later this way; use reschedule() to bring it forward.
+        """
+        self.expires = self._wheel.now + (self.interval if delay is None else delay)
+
+    def reschedule(self, delay: float) -> None:
+        """Moves the deadline to delay from now, earlier or later."""
+        self._wheel.cancel(self)
+        self._wheel.now = self._wheel.clock()
+        self.expires = self._wheel.now + delay
+        self._wheel._insert(self)
+
+    def cancel(self) -> None:
+        """Cancels the timer."""
+        self._wheel.cancel(self)
+
+
+class TimingWheel:
+    """
+    Hashed timing wheel running every timer of the process from a single loop task.
+
+    Timers hash into a ring of slots by the tick their deadline falls in; a slot holds the
+    timers of every round that lands on it. Scheduling and cancelling are O(1) set
+    operations and each tick only visits one slot, so hundreds of thousands of keep-alive,
+    retry and expiry timers cost one asyncio wake-up per tick instead of one TimerHandle
+    in the event loop's heap each. Deadlines are kept to within one tick.
+
+    The current time is read into now once per tick and when a timer is scheduled;
+    postpone() counts from that value to stay cheap. advance() may also be called directly, e.g. in tests.
+    """
+
+    def __init__(
+        self,
+        tick: float = DEFAULT_TICK,
+        slots: int = DEFAULT_SLOTS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.tick = tick
+        self.clock = clock
+        self._slots: List[Set[Timer]] = [set() for _ in range(slots)]
+        self._origin = clock() # Clock time of tick 0
+        self._tick = 0 # Last tick processed
+        self.now = self._origin # Clock time of the last advance()
+        self.active = 0 # Timers waiting to fire
+        self.expired = 0 # Timers fired
+        self.errors = 0 # Callbacks that raised
+        self.last_error: Optional[Exception] = None # Last exception raised by a callback
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, delay: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """Calls callback(*args) once delay seconds have passed and returns the timer."""
+        self.now = self.clock()
+        timer = Timer(self, delay, callback, args)
+        self._insert(timer)
+        return timer
+
+    def _insert(self, timer: Timer) -> None:
+        """Places a timer in the slot of the tick its deadline falls in."""
+        due = math.ceil((timer.expires - self._origin) / self.tick)
+        if due <= self._tick:
+            due = self._tick + 1
+        timer._due = due
+        bucket = timer._bucket = self._slots[due % len(self._slots)]
+        bucket.add(timer)
+        self.active += 1
+
+    def cancel(self, timer: Timer) -> None:
+        """Cancels a timer; cancelling a fired or cancelled timer does nothing."""
+        if timer._bucket is not None:
+            timer._bucket.discard(timer)
+            timer._bucket = None
+            self.active -= 1
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """Processes every tick up to now and returns the number of timers fired."""
+        now = self.clock() if now is None else now
+        self.now = now
+        target = int((now - self._origin) / self.tick)
+        if target <= self._tick:
+            return 0
+        slots = self._slots
+        count = len(slots)
+        due: List[Timer] = []
+        # After a stall longer than a full turn, every slot is visited once
+        for tick in range(self._tick + 1, self._tick + 1 + min(target - self._tick, count)):
+            bucket = slots[tick % count]
+            if bucket:
+                ready = [timer for timer in bucket if timer._due <= target]
+                bucket.difference_update(ready)
+                due.extend(ready)
+        self._tick = target
+        self.active -= len(due)
+        fired = 0
+        for timer in due:
+            timer._bucket = None
+            if timer.expires > now: # Postponed since it was placed
+                self._insert(timer)
+                continue
+            fired += 1
+            try:
+                timer.callback(*timer.args)
+            except Exception as e: # One failing callback must not stop the other timers
+                self.errors += 1
+                self.last_error = e
+        self.expired += fired
+        return fired
+
+    def start(self) -> None:
+        """Starts ticking on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        """Stops ticking; pending timers are kept."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        """Advances the wheel once per tick."""
+        while True:
+            await asyncio.sleep(self.tick)
+            self.advance()
@@ -0,0 +1,428 @@
+import asyncio
+import collections
+import dataclasses
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import time
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from mqtt_common.models.constants import MQTTProtocol, PacketType, PropertyId, QualityOfService
+from mqtt_common.models.errors import ProtocolError, ValidationError
+from mqtt_common.models.message import Message
+from mqtt_protocol.src.encoder import PacketEncoder, PINGRESP_PACKET
+from mqtt_protocol.src.properties import Properties
+from mqtt_protocol.src.packet import (
+    MQTTPacket, ConnectPacket, ConnAckPacket, PublishPacket, PingReqPacket,
+    PubAckPacket, PubRecPacket, PubRelPacket, PubCompPacket,
+    SubscribePacket, SubAckPacket, UnsubscribePacket, UnsubAckPacket
+)
+from mqtt_storage.src.subscriptions import SubscriptionTrie
+from .config import NetworkConfig, create_network, new_event_loop
+from .connection import ClientConnection, ClientSession
+from .fanout import FanOut
+from .monitor import MetricsMonitor
+from .routing import PeerRouter, DEFAULT_LINK_QUEUE_DEPTH
+
+SOCKET_NAME = "worker-{}.sock" # Unix socket of each worker's router, in the pool's socket directory
+DEFAULT_START_TIMEOUT = 30.0 # Seconds WorkerPool.start() waits for every worker to be ready
+_RETRY_INTERVAL = 0.01 # Seconds between attempts to reach a worker that is starting or lost its link
+_ACKNOWLEDGEMENTS = (PubAckPacket, PubRecPacket, PubCompPacket) # Sent by subscribers for deliveries
+
+
+class BrokerNode:
+    """
+    A network serving clients plus a PeerRouter forwarding their publishes to other
+    processes or nodes; Worker and ClusterNode differ only in how the routers are linked.
+
+    The node indexes the subscriptions of its own clients and announces their filters to
+    its peers through its router, so every node holds an index of which peers want which
+    filters. A PUBLISH is delivered to the node's matching clients and forwarded once to
+    each peer with a matching filter, which delivers it to its own.
+
+    Deliveries go through the node's FanOut, which encodes each message once per wire
+    format and yields to the event loop between batches of subscribers; messages wait
+    in a queue for the one task delivering them, so they reach every client in the order
+    they were published. They are sent at the lower of the message and subscription QoS,
+    with RETAIN cleared as for any message forwarded to an established subscription.
+    Each client's ClientSession acknowledges its QoS 1 and 2 publishes (PUBACK, or
+    PUBREC and PUBCOMP, delivering a QoS 2 message once however often it is resent
+    before PUBREL) and gives every QoS 1/2 delivery a packet ID of the subscriber's own;
+    the subscriber's acknowledgements free the ID, trigger PUBREL for QoS 2 and send
+    deliveries that were waiting for room in its window. An acknowledgement of the wrong
+    type closes the connection.
+
+    A client connecting without a clean session resumes its ClientSession and
+    subscriptions if it had a persistent one (CONNACK session present), and its
+    unacknowledged deliveries are sent again with DUP, or their PUBREL for QoS 2
+    messages already received; MQTT 3.1.1 clients also get them again after
+    retry_interval seconds without an acknowledgement (see FanOut). A session is
+    persistent without a clean session on MQTT 3.1.1 and with a Session Expiry Interval
+    on MQTT 5.0: it is kept with its subscriptions when the client disconnects, until
+    that interval (if any) runs out on the network's timing wheel, and messages published
+    meanwhile are not queued for it. A clean session drops whatever the client had.
+
+    When the network has metrics, sampled deliveries record their subscription match
+    (route), and the fan-out the time since the message was created (publish_deliver).
+
+    With config.metrics set, the node also has a MetricsMonitor tracking the stats of
+    its network, router, fan-out and itself. run() starts it: every metrics_interval it
+    publishes the node's $SYS topics under $SYS/broker/<name>, to local clients and
+    peers alike, and with a metrics_port it serves the Prometheus endpoint there.
+
+    Links are queued up to link_queue_depth packets each, independently of the client
+    queues' max_queue_depth, and the side that opens a link reopens it every
+    reconnect_interval seconds whenever it fails or closes (see _keep_link()).
+
+    Attributes:
+        link_attempts: Connections to peers that failed or were lost
+        fanout: FanOut delivering messages to the node's clients
+        monitor: MetricsMonitor of the node, None without config.metrics
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: NetworkConfig,
+        link_queue_depth: int = DEFAULT_LINK_QUEUE_DEPTH,
+        reconnect_interval: float = _RETRY_INTERVAL,
+        retry_interval: Optional[float] = MQTTProtocol.DEFAULT_RETRY_INTERVAL
+    ):
+        self.name = name
+        self.config = config
+        self.network = create_network(config)
+        self.network.connect_handler = self._client_connected
+        self.network.packet_handler = self._handle_packet
+        self.network.disconnect_handler = self._client_disconnected
+        self.subscriptions = SubscriptionTrie() # Subscriptions of this node's clients
+        self.sessions: Dict[str, ClientSession] = {} # Sessions of connected clients and persistent ones
+        self.router = PeerRouter(name, self._deliver, link_queue_depth)
+        self.fanout = FanOut(self.network, metrics=self.network.metrics, retry_interval=retry_interval)
+        self._deliveries: Deque[Tuple[Message, Dict[str, int]]] = collections.deque() # Matched, not yet fanned out
+        self._delivering: Optional[asyncio.Task] = None
+        self.reconnect_interval = reconnect_interval # Seconds between attempts to open or reopen a link
+        self.link_attempts = 0
+        self._links: List[asyncio.Task] = []
+        self.monitor: Optional[MetricsMonitor] = None
+        metrics = self.network.metrics
+        if metrics is not None:
+            self.monitor = MetricsMonitor(
+                metrics, self._publish, config.metrics_interval, f"{MQTTProtocol.SYS_BROKER_TOPIC}/{name}"
+            )
+            metrics.track("network", self.network)
+            metrics.track("router", self.router)
+            metrics.track("fanout", self.fanout)
+            metrics.track("node", self)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Node counters."""
+        return {"link_attempts": self.link_attempts}
+
+    async def _start_monitor(self) -> None:
+        """Starts the metrics monitor and its Prometheus endpoint, if the node has them."""
+        if self.monitor is None:
+            return
+        self.monitor.start()
+        if self.config.metrics_port is not None:
+            await self.monitor.serve(self.config.metrics_host, self.config.metrics_port)
+
+    async def _stop_monitor(self) -> None:
+        """Stops the metrics monitor, if the node has one."""
+        if self.monitor is not None:
+            await self.monitor.stop()
+
+    def _stop_delivering(self) -> None:
+        """Stops delivering and drops the messages still waiting for it."""
+        if self._delivering is not None:
+            self._delivering.cancel()
+            self._delivering = None
+        self._deliveries.clear()
+
+    def _client_connected(self, connection: ClientConnection, connect_packet: ConnectPacket) -> None:
+        """
+        Accepts a client with a new or resumed session, telling an MQTT 5.0 client that
+        connected without an ID which one it got.
+        """
+        client_id = connection.client_id
+        properties = connect_packet.properties
+        if connect_packet.clean_session:
+            self._end_session(client_id)
+        session = connection.session or self.sessions.get(client_id) # Taken over or persistent
+        session_present = session is not None
+        if session is None:
+            receive_maximum = None if properties is None else properties.get(PropertyId.RECEIVE_MAXIMUM)
+            session = ClientSession(receive_maximum or MQTTProtocol.DEFAULT_RECEIVE_MAXIMUM)
+        elif session.expiry_timer is not None:
+            session.expiry_timer.cancel()
+            session.expiry_timer = None
+        if connection.protocol_version >= MQTTProtocol.VERSION_5_0:
+            # Clean Start only discards the previous session; the expiry decides about this one
+            expiry_interval = 0 if properties is None else properties.get(PropertyId.SESSION_EXPIRY_INTERVAL, 0)
+            session.persistent = expiry_interval != 0
+            session.expiry_interval = None if expiry_interval == MQTTProtocol.SESSION_EXPIRY_NEVER else expiry_interval
+        else:
+            session.persistent = not connect_packet.clean_session
+        connection.session = self.sessions[client_id] = session
+        connack_properties = None
+        if not connect_packet.client_id and connection.protocol_version >= MQTTProtocol.VERSION_5_0:
+            connack_properties = Properties({PropertyId.ASSIGNED_CLIENT_IDENTIFIER: client_id})
+        connection.queue.put([PacketEncoder.encode(ConnAckPacket(
+            packet_type=PacketType.CONNACK, session_present=session_present, properties=connack_properties
+        ), connection.protocol_version)])
+        if session_present:
+            self.fanout.resend(connection)
+
+    def _client_disconnected(self, client_id: str) -> None:
+        """Keeps a persistent session and its subscriptions until it expires; ends any other."""
+        session = self.sessions.get(client_id)
+        if session is None or not session.persistent:
+            self._end_session(client_id)
+        elif session.expiry_interval is not None:
+            session.expiry_timer = self.network.timers.schedule(
+                session.expiry_interval, self._expire_session, client_id, session
+            )
+
+    def _expire_session(self, client_id: str, session: ClientSession) -> None:
+        """Ends a persistent session whose client did not come back within its expiry interval."""
+        session.expiry_timer = None
+        if self.sessions.get(client_id) is session and client_id not in self.network.clients:
+            self._end_session(client_id)
+
+    def _end_session(self, client_id: str) -> None:
+        """Forgets a client's session and subscriptions and withdraws filters nobody else uses."""
+        session = self.sessions.pop(client_id, None)
+        if session is not None:
+            for timer in (session.retry_timer, session.expiry_timer):
+                if timer is not None:
+                    timer.cancel()
+            session.retry_timer = session.expiry_timer = None
+        for topic_filter in self.subscriptions.subscriptions(client_id):
+            self.router.remove_local(topic_filter)
+        self.subscriptions.remove_client(client_id)
+
+    def _handle_packet(self, client_id: str, packet: MQTTPacket) -> None:
+        """Handles one packet from a client of this node."""
+        connection = self.network.clients.get(client_id)
+        if connection is None:
+            return
+        packet_type = type(packet)
+        session = connection.session
+        if packet_type is PublishPacket:
+            inbound = session.inbound
+            if inbound.receive(packet):
+                self._publish(packet.detach().to_message())
+            if inbound.pending_acks:
+                connection.queue.put([inbound.flush()])
+        elif packet_type in _ACKNOWLEDGEMENTS:
+            try:
+                self.fanout.acknowledge(client_id, (packet,))
+            except ProtocolError:
+                connection.queue.close() # The read loop of the connection removes the client
+        elif packet_type is PubRelPacket:
+            session.inbound.release(packet.packet_id)
+            connection.queue.put([session.inbound.flush()])
+        elif packet_type is SubscribePacket:
+            return_codes = []
+            for topic_filter, qos in packet.subscriptions:
+                try:
+                    if self.subscriptions.add(client_id, topic_filter, qos):
+                        self.router.add_local(topic_filter)
+                    return_codes.append(qos)
+                except ValidationError:
+                    return_codes.append(MQTTProtocol.SUBACK_FAILURE)
+            connection.queue.put([PacketEncoder.encode(SubAckPacket(
+                packet_type=PacketType.SUBACK, packet_id=packet.packet_id, return_codes=return_codes
+            ), connection.protocol_version)])
+        elif packet_type is UnsubscribePacket:
+            for topic_filter in packet.topics:
+                if self.subscriptions.remove(client_id, topic_filter):
+                    self.router.remove_local(topic_filter)
+            connection.queue.put([PacketEncoder.encode(UnsubAckPacket(
+                packet_type=PacketType.UNSUBACK, packet_id=packet.packet_id,
+                reason_codes=[0] * len(packet.topics)
+            ), connection.protocol_version)])
+        elif packet_type is PingReqPacket:
+            connection.queue.put([PINGRESP_PACKET])
+
+    async def _keep_link(
+        self, connect: Callable[[], Awaitable[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]]
+    ) -> None:
+        """Opens a link to a peer with connect() and reopens it whenever it fails or closes."""
+        while True:
+            try:
+                reader, writer = await connect()
+            except OSError:
+                self.link_attempts += 1
+                await asyncio.sleep(self.reconnect_interval)
+                continue
+            try:
+                await self.router.link(reader, writer)
+            finally:
+                writer.close()
+            self.link_attempts += 1
+            await asyncio.sleep(self.reconnect_interval)
+
+    def _publish(self, message: Message) -> None:
+        """Delivers a message published on this node to its clients and forwards it to interested peers."""
+        self._deliver(message)
+        self.router.publish(message)
+
+    def _deliver(self, message: Message) -> None:
+        """Matches a message against the subscriptions of this node's clients and queues it for the fan-out."""
+        metrics = self.network.metrics
+        sampled = metrics is not None and metrics.route.sampled()
+        if sampled:
+            started = time.perf_counter_ns()
+            matches = self.subscriptions.match(message.topic)
+            metrics.route.record(time.perf_counter_ns() - started)
+        else:
+            matches = self.subscriptions.match(message.topic)
+        if not matches:
+            return
+        self._deliveries.append((message, matches))
+        if self._delivering is None:
+            self._delivering = asyncio.get_running_loop().create_task(self._fan_out())
+
+    async def _fan_out(self) -> None:
+        """Fans out the queued messages in order until none is left."""
+        deliveries = self._deliveries
+        try:
+            while deliveries:
+                message, matches = deliveries.popleft()
+                # No client is retain_as_published, so RETAIN is cleared (MQTT-3.3.1-9)
+                await self.fanout.publish(message, matches.items())
+        finally:
+            self._delivering = None
+
+
+class Worker(BrokerNode):
+    """
+    One process of a WorkerPool: a BrokerNode listening with SO_REUSEPORT whose router is
+    linked to every other worker over Unix-domain sockets.
+
+    The kernel spreads incoming connections over the listening sockets of all workers.
+    """
+
+    def __init__(self, index: int, count: int, socket_dir: str, config: NetworkConfig):
+        super().__init__(f"worker-{index}", dataclasses.replace(config, reuse_port=True))
+        self.index = index
+        self.count = count # Workers in the pool
+        self.socket_dir = socket_dir
+
+    def socket_path(self, index: int) -> str:
+        """Returns the Unix socket path of a worker's router."""
+        return os.path.join(self.socket_dir, SOCKET_NAME.format(index))
+
+    async def run(self, host: str, port: int, ready: Optional[Callable[[], None]] = None) -> None:
+        """Links to the other workers, serves clients and calls ready once both are up."""
+        link_server = await asyncio.start_unix_server(self._accept_link, self.socket_path(self.index))
+        await self._start_monitor()
+        # Each pair of workers shares one link, opened and kept open by the higher index
+        for peer in range(self.index):
+            path = self.socket_path(peer)
+            self._links.append(asyncio.create_task(
+                self._keep_link(lambda path=path: asyncio.open_unix_connection(path))
+            ))
+        server_task = asyncio.create_task(self.network.start(host, port))
+        while len(self.router.peers) < self.count - 1 or self.network.server is None:
+            if server_task.done():
+                break
+            await asyncio.sleep(_RETRY_INTERVAL)
+        if ready is not None and not server_task.done():
+            ready()
+        try:
+            await server_task
+        finally:
+            for task in self._links:
+                task.cancel()
+            self._links.clear()
+            self.router.close()
+            link_server.close()
+            await self._stop_monitor()
+            self._stop_delivering()
+
+    async def _accept_link(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Runs a link opened by another worker."""
+        await self.router.link(reader, writer)
+
+
+def _run_worker(
+    index: int, count: int, host: str, port: int, socket_dir: str,
+    config: NetworkConfig, ready: multiprocessing.Queue
+) -> None:
+    """Entry point of a worker process."""
+    loop = new_event_loop(config)
+    asyncio.set_event_loop(loop)
+    worker = Worker(index, count, socket_dir, config)
+    try:
+        loop.run_until_complete(worker.run(host, port, lambda: ready.put(index)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.close()
+
+
+class WorkerPool:
+    """
+    Runs the broker as several processes sharing one listening port with SO_REUSEPORT,
+    so it can use more than one core. See Worker for how publishes cross processes.
+
+    port must be fixed: with port 0 every worker would bind its own random port. With
+    config.metrics, worker i serves its Prometheus endpoint on metrics_port + i.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        workers: Optional[int] = None,
+        config: Optional[NetworkConfig] = None,
+        socket_dir: Optional[str] = None
+    ):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1 # Number of worker processes
+        self.config = config or NetworkConfig()
+        self.socket_dir = socket_dir # Directory of the workers' Unix sockets, temporary if None
+        self._created_socket_dir = False
+        self.processes: List[multiprocessing.Process] = []
+
+    def start(self, timeout: float = DEFAULT_START_TIMEOUT) -> None:
+        """Starts the workers and returns once every one of them serves clients."""
+        if self.socket_dir is None:
+            self.socket_dir = tempfile.mkdtemp(prefix="mqtt-workers-")
+            self._created_socket_dir = True
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        for index in range(self.workers):
+            process = context.Process(
+                target=_run_worker,
+                args=(
+                    index, self.workers, self.host, self.port, self.socket_dir,
+                    self.config.for_process(index), ready
+                ),
+                name=f"mqtt-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+        try:
+            for _ in range(self.workers):
+                ready.get(timeout=timeout)
+        except queue.Empty:
+            self.stop()
+            raise TimeoutError(f"Broker workers did not start within {timeout} seconds")
+
+    def stop(self) -> None:
+        """Terminates the workers and removes their sockets."""
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes.clear()
+        if self._created_socket_dir:
+            shutil.rmtree(self.socket_dir, ignore_errors=True)
+            self.socket_dir = None
+            self._created_socket_dir = False
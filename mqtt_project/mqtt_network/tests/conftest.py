@@ -0,0 +1,62 @@
+import asyncio
+import socket
+from mqtt_common.models.constants import PacketType, QualityOfService
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.packet import ConnectPacket, ConnAckPacket, PublishPacket, SubscribePacket, SubAckPacket
+from mqtt_protocol.src.stream import StreamDecoder
+
+# Helpers shared by the network tests, imported with `from .conftest import ...`
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+async def _serve(network):
+    """Starts a network on a free port and returns (server task, port)."""
+    task = asyncio.create_task(network.start("127.0.0.1", 0))
+    while network.server is None or not network.server.sockets:
+        await asyncio.sleep(0.001)
+    return task, network.server.sockets[0].getsockname()[1]
+
+async def _wait_for(condition):
+    """Yields to the event loop until condition() holds."""
+    for _ in range(2000):
+        if condition():
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError("Condition not reached")
+
+class _Client:
+    """A minimal MQTT client over asyncio streams."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.decoder = StreamDecoder()
+        self.pending = []
+
+    @classmethod
+    async def connect(cls, port: int, client_id: str) -> '_Client':
+        client = cls(*await asyncio.open_connection("127.0.0.1", port))
+        client.writer.write(PacketEncoder.encode(ConnectPacket(packet_type=PacketType.CONNECT, client_id=client_id)))
+        assert isinstance(await client.receive(), ConnAckPacket)
+        return client
+
+    async def subscribe(self, topic_filter: str) -> None:
+        self.writer.write(PacketEncoder.encode(SubscribePacket(
+            packet_type=PacketType.SUBSCRIBE, packet_id=1,
+            subscriptions=[(topic_filter, QualityOfService.AT_MOST_ONCE)]
+        )))
+        assert isinstance(await self.receive(), SubAckPacket)
+
+    def publish(self, topic: str, payload: bytes) -> None:
+        self.writer.write(PacketEncoder.encode(PublishPacket(packet_type=PacketType.PUBLISH, topic=topic, payload=payload)))
+
+    async def receive(self):
+        while not self.pending:
+            data = await asyncio.wait_for(self.reader.read(65536), 5)
+            assert data, "Connection closed"
+            self.pending.extend(self.decoder.packets(data))
+        return self.pending.pop(0)
+
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from mqtt_network.src.cluster import ClusterNode, LocalCluster
+from .conftest import _Client, _free_port, _wait_for
+
+@pytest.mark.asyncio
+class TestClusterNode:
+    """Tests for broker nodes linked over TCP."""
+
+    async def test_link_reopens_after_peer_restart(self):
+        """Tests that the dialing node links once its peer is up, and again after the peer restarts."""
+        low, high = ("127.0.0.1", _free_port()), ("127.0.0.1", _free_port())
+        if low > high:
+            low, high = high, low
+        low_port, high_port = _free_port(), _free_port()
+        dialer = ClusterNode("high", high, [low], reconnect_interval=0.01)
+        dialer_task = asyncio.create_task(dialer.run("127.0.0.1", high_port))
+        await asyncio.sleep(0.05)
+        assert dialer.link_attempts > 0 # The peer is not listening yet
+
+        listener = ClusterNode("low", low, [high])
+        listener_task = asyncio.create_task(listener.run("127.0.0.1", low_port))
+        await _wait_for(lambda: "low" in dialer.router.peers and "high" in listener.router.peers)
+        subscriber = await _Client.connect(low_port, "sub")
+        await subscriber.subscribe("alerts/#")
+        await _wait_for(lambda: dialer.router.interest.match("alerts/fire"))
+        publisher = await _Client.connect(high_port, "pub")
+        publisher.publish("alerts/fire", b"evacuate")
+        packet = await subscriber.receive()
+        assert (packet.topic, bytes(packet.payload)) == ("alerts/fire", b"evacuate")
+
+        # The listener restarts; the dialer reopens the link and learns its filters again
+        listener_task.cancel()
+        await asyncio.gather(listener_task, return_exceptions=True)
+        await _wait_for(lambda: not dialer.router.peers)
+        assert not dialer.router.interest.match("alerts/fire")
+        listener = ClusterNode("low", low, [high])
+        listener_task = asyncio.create_task(listener.run("127.0.0.1", low_port))
+        await _wait_for(lambda: "low" in dialer.router.peers and listener.network.server is not None)
+        subscriber = await _Client.connect(low_port, "sub")
+        await subscriber.subscribe("alerts/#")
+        await _wait_for(lambda: dialer.router.interest.match("alerts/fire"))
+        publisher.publish("alerts/fire", b"again")
+        packet = await subscriber.receive()
+        assert bytes(packet.payload) == b"again"
+
+        for client in (subscriber, publisher):
+            client.writer.close()
+        for task in (listener_task, dialer_task):
+            task.cancel()
+        await asyncio.gather(listener_task, dialer_task, return_exceptions=True)
+
+@pytest.mark.asyncio
+class TestLocalCluster:
+    """Tests for a cluster of node processes."""
+
+    async def test_publish_crosses_nodes(self):
+        """Tests that a publish reaches subscribers on other nodes and nodes without interest get nothing."""
+        cluster = LocalCluster(nodes=3)
+        await asyncio.to_thread(cluster.start)
+        try:
+            publisher = await _Client.connect(cluster.ports[0], "publisher")
+            near = await _Client.connect(cluster.ports[0], "near")
+            far = await _Client.connect(cluster.ports[2], "far")
+            other = await _Client.connect(cluster.ports[1], "other")
+            await near.subscribe("plant/+/status")
+            await far.subscribe("plant/#")
+            await other.subscribe("office/#")
+            await asyncio.sleep(0.2) # Filter announcements reach the other nodes
+
+            publisher.publish("plant/7/status", b"running")
+            for client in (near, far):
+                packet = await client.receive()
+                assert (packet.topic, bytes(packet.payload)) == ("plant/7/status", b"running")
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(other.reader.read(1), 0.2)
+            for client in (publisher, near, far, other):
+                client.writer.close()
+        finally:
+            await asyncio.to_thread(cluster.stop)
@@ -0,0 +1,154 @@
+import asyncio
+import pytest
+from mqtt_common.models.constants import MQTTProtocol, PropertyId
+from mqtt_common.models.message import Message
+from mqtt_common.src.metrics import Metrics
+from mqtt_protocol.src.packet import PubAckPacket, PubCompPacket, PubRecPacket, PubRelPacket
+from mqtt_protocol.src.stream import StreamDecoder
+from mqtt_network.src.connection import ClientConnection, ClientSession
+from mqtt_network.src.network import CentralizedNetwork
+from mqtt_network.src.outbound import OutboundQueue
+from mqtt_network.src.timers import TimingWheel
+from mqtt_network.src.fanout import FanOut
+
+class _Writer:
+    """Collects what an OutboundQueue writes."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writelines(self, buffers):
+        for buffer in buffers:
+            self.data += buffer
+
+    async def drain(self):
+        pass
+
+def _network(*clients) -> CentralizedNetwork:
+    """A network with (client_id, protocol version) connections writing to _Writers."""
+    network = CentralizedNetwork()
+    for client_id, version in clients:
+        queue = OutboundQueue(_Writer())
+        queue.start()
+        network.clients[client_id] = ClientConnection(client_id, queue.writer, version, queue)
+    return network
+
+async def _received(network: CentralizedNetwork, client_id: str) -> list:
+    """Returns the packets written to a client so far."""
+    await asyncio.sleep(0)
+    connection = network.clients[client_id]
+    return StreamDecoder(protocol_version=connection.protocol_version).packets(bytes(connection.writer.data))
+
+def _message(qos: int = 1, retain: bool = False, properties=None) -> Message:
+    return Message(topic="a/b", payload=b"payload", qos=qos, retain=retain,
+                   message_id=1 if qos else None, properties=properties)
+
+@pytest.mark.asyncio
+class TestFanOut:
+    """Tests for encode-once delivery to many subscribers."""
+
+    async def test_one_template_per_wire_format(self):
+        """Tests that subscribers sharing QoS, version and retain share one encoding."""
+        v3, v5 = MQTTProtocol.VERSION_3_1_1, MQTTProtocol.VERSION_5_0
+        network = _network(("c1", v3), ("c2", v3), ("c3", v5), ("c4", v3), ("c5", v3))
+        fanout = FanOut(network)
+        subscribers = [("c1", 1), ("c2", 2), ("c3", 1), ("c4", 0), ("c5", 1), ("gone", 1)]
+        message = _message(retain=True, properties={"content_type": "text/plain"})
+        assert await fanout.publish(message, subscribers, retain_as_published={"c5"}) == 5
+        # (1, v3, False) for c1 and c2, (1, v5, False), (0, v3, False) and (1, v3, True)
+        assert fanout.encoded == 4
+        assert fanout.undelivered == 1
+
+        c1, = await _received(network, "c1")
+        c2, = await _received(network, "c2")
+        c3, = await _received(network, "c3")
+        c4, = await _received(network, "c4")
+        c5, = await _received(network, "c5")
+        assert (c1.qos, c1.retain, c1.packet_id) == (1, False, 1)
+        assert (c2.qos, c2.payload) == (1, b"payload")
+        assert c3.properties[PropertyId.CONTENT_TYPE] == "text/plain"
+        assert (c4.qos, c4.packet_id) == (0, None)
+        assert c5.retain
+
+    async def test_packet_ids_per_client(self):
+        """Tests that each client gets consecutive packet IDs from its own window."""
+        network = _network(("c1", MQTTProtocol.VERSION_3_1_1), ("c2", MQTTProtocol.VERSION_3_1_1))
+        fanout = FanOut(network)
+        await fanout.publish(_message(), [("c1", 1)])
+        await fanout.publish(_message(), [("c1", 1), ("c2", 1)])
+        assert [p.packet_id for p in await _received(network, "c1")] == [1, 2]
+        assert [p.packet_id for p in await _received(network, "c2")] == [1]
+        assert network.clients["c1"].session.outbound.inflight == 2
+
+    async def test_full_window_defers_until_acknowledged(self):
+        """Tests that messages beyond the receive maximum wait for acknowledgements."""
+        network = _network(("c1", MQTTProtocol.VERSION_5_0))
+        fanout = FanOut(network)
+        network.clients["c1"].session = ClientSession(receive_maximum=1)
+        await fanout.publish(_message(qos=2), [("c1", 2)])
+        await fanout.publish(_message(qos=1), [("c1", 2)])
+        assert fanout.deferred == 1
+        assert fanout.acknowledge("c1", [PubRecPacket(packet_id=1)]) == 0
+        assert fanout.acknowledge("c1", [PubCompPacket(packet_id=1)]) == 1
+        packets = await _received(network, "c1")
+        assert [type(p) for p in packets] == [type(packets[0]), PubRelPacket, type(packets[0])]
+        assert (packets[2].qos, packets[2].packet_id) == (1, 1)
+        assert fanout.acknowledge("c1", [PubAckPacket(packet_id=1)]) == 0
+        assert network.clients["c1"].session.outbound.completed == 2
+
+    async def test_unacknowledged_deliveries_are_retried(self):
+        """Tests that MQTT 3.1.1 deliveries left unacknowledged for retry_interval are resent with DUP, MQTT 5.0 ones never."""
+        network = _network(("c1", MQTTProtocol.VERSION_3_1_1), ("c5", MQTTProtocol.VERSION_5_0))
+        fanout = FanOut(network, retry_interval=1.0)
+        now = [0.0]
+        timers = network.timers = TimingWheel(clock=lambda: now[0])
+        await fanout.publish(_message(qos=2), [("c1", 2), ("c5", 2)])
+        assert network.clients["c5"].session.retry_timer is None
+        now[0] = 1.5
+        timers.advance()
+        first, resent = await _received(network, "c1")
+        assert (resent.packet_id, first.dup, resent.dup) == (1, False, True)
+        assert fanout.retries == 1
+        assert len(await _received(network, "c5")) == 1
+
+        # A PUBREC postpones the retry, which then resends the PUBREL
+        now[0] = 2.0
+        timers.advance()
+        fanout.acknowledge("c1", [PubRecPacket(packet_id=1)])
+        now[0] = 2.9
+        timers.advance()
+        assert fanout.retries == 1
+        now[0] = 3.6
+        timers.advance()
+        assert [type(p) for p in (await _received(network, "c1"))[2:]] == [PubRelPacket, PubRelPacket]
+        fanout.acknowledge("c1", [PubCompPacket(packet_id=1)])
+        assert network.clients["c1"].session.retry_timer is None
+        assert timers.active == 0
+
+    async def test_yields_between_batches(self):
+        """Tests that large fan-outs yield to the event loop every batch_size recipients."""
+        clients = [(f"c{i}", MQTTProtocol.VERSION_3_1_1) for i in range(25)]
+        network = _network(*clients)
+        fanout = FanOut(network, batch_size=10)
+        ticks = []
+        async def other_client():
+            for _ in range(3):
+                ticks.append(None)
+                await asyncio.sleep(0)
+        task = asyncio.ensure_future(other_client())
+        assert await fanout.publish(_message(qos=0), [(client_id, 0) for client_id, _ in clients]) == 25
+        # The other client ran at both yields, before the publish completed
+        assert fanout.yields == 2
+        assert len(ticks) == 2
+        await task
+
+    async def test_fanout_records_publish_deliver(self):
+        """Tests that sampled fan-outs record the time since the message was created."""
+        metrics = Metrics(sample_every=2)
+        network = _network(("c1", MQTTProtocol.VERSION_3_1_1))
+        fanout = FanOut(network, metrics=metrics)
+        for _ in range(4):
+            message = Message(topic="a/b", payload=b"x", qos=0, retain=False)
+            await fanout.publish(message, [("c1", 0)])
+        assert metrics.publish_deliver.count == 2
+        assert metrics.publish_deliver.max > 0
@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from mqtt_common.models.constants import MQTTProtocol
+from mqtt_common.src.metrics import Metrics
+from mqtt_network.src.monitor import MetricsMonitor
+
+async def _get(port: int, path: str) -> bytes:
+    """Sends an HTTP GET and returns the whole response."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET " + path.encode() + b" HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    response = await reader.read()
+    writer.close()
+    return response
+
+@pytest.mark.asyncio
+class TestMetricsMonitor:
+    """Tests for per-interval aggregation, $SYS topics and the Prometheus endpoint."""
+
+    async def test_tick_publishes_sys_topics(self):
+        """Tests that each interval publishes retained $SYS messages and counts failing publishes."""
+        published = []
+        metrics = Metrics()
+        monitor = MetricsMonitor(metrics, published.append)
+        metrics.counter("messages_received").inc()
+        count = monitor.tick()
+        assert count == len(published) > 0
+        topics = {message.topic: message for message in published}
+        received = topics[MQTTProtocol.SYS_BROKER_TOPIC + "/messages_received"]
+        assert (received.payload, received.qos, received.retain) == (b"1", 0, True)
+
+        def failing(message):
+            raise RuntimeError("no route")
+        monitor.publish = failing
+        assert monitor.tick() == 0
+        assert monitor.errors == count and isinstance(monitor.last_error, RuntimeError)
+        assert monitor.stats["intervals"] == 2
+
+    async def test_runs_every_interval(self):
+        """Tests that start() rolls the metrics over periodically until stop()."""
+        metrics = Metrics()
+        monitor = MetricsMonitor(metrics, interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.055)
+        await monitor.stop()
+        assert 3 <= metrics.intervals <= 6
+
+    async def test_prometheus_endpoint(self):
+        """Tests that GET /metrics returns the exposition and other paths 404."""
+        metrics = Metrics()
+        metrics.counter("messages_received").inc(7)
+        monitor = MetricsMonitor(metrics)
+        server = await monitor.serve("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            response = await _get(port, "/metrics")
+            assert response.startswith(b"HTTP/1.1 200 OK\r\n")
+            assert b"Content-Type: text/plain; version=0.0.4" in response
+            assert response.endswith(metrics.prometheus().encode())
+            assert b"mqtt_messages_received_total 7\n" in response
+            assert (await _get(port, "/")).startswith(b"HTTP/1.1 404")
+            assert monitor.scrapes == 1
+        finally:
+            await monitor.stop()
@@ -0,0 +1,220 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from mqtt_common.models.constants import PacketType
+from mqtt_common.models.message import Message
+from mqtt_common.src.metrics import Metrics
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.packet import ConnectPacket, PublishPacket
+from mqtt_protocol.src.stream import StreamDecoder
+from mqtt_network.src.network import CentralizedNetwork
+from mqtt_network.src.outbound import OutboundQueue, OverflowPolicy
+from mqtt_storage.src.offline import OfflineQueues
+from .conftest import _serve, _wait_for
+
+def _message(qos: int = 0, message_id: int = None) -> Message:
+    """Builds a small message."""
+    return Message(topic="devices/1", payload=b"payload", qos=qos, retain=False, message_id=message_id)
+
+@pytest_asyncio.fixture
+async def connection():
+    """Yields (reader of the server side, writer of the client side) of a loopback connection."""
+    accepted = asyncio.get_running_loop().create_future()
+    server = await asyncio.start_server(
+        lambda reader, writer: accepted.set_result((reader, writer)), "127.0.0.1", 0
+    )
+    port = server.sockets[0].getsockname()[1]
+    _, client_writer = await asyncio.open_connection("127.0.0.1", port)
+    server_reader, server_writer = await accepted
+    yield server_reader, client_writer
+    client_writer.close()
+    server_writer.close()
+    server.close()
+    await server.wait_closed()
+
+@pytest.mark.asyncio
+class TestOutboundQueue:
+    """Tests for the per-client bounded outbound queue."""
+
+    async def test_pending_packets_are_coalesced(self, connection):
+        """Tests that packets queued between writer iterations go out in one write."""
+        reader, writer = connection
+        queue = OutboundQueue(writer)
+        queue.start()
+        for i in range(100):
+            assert queue.put([b"%03d" % i])
+        assert queue.depth == 100
+        data = await reader.readexactly(300)
+        assert data == b"".join(b"%03d" % i for i in range(100))
+        assert queue.writes == 1
+        assert queue.sent == 100
+        assert queue.high_watermark == 100
+        queue.close()
+
+    async def test_metrics_time_sampled_batches(self, connection):
+        """Tests that sampled batches record their queue wait and write time once per batch."""
+        reader, writer = connection
+        metrics = Metrics(sample_every=2)
+        queue = OutboundQueue(writer, metrics=metrics)
+        queue.start()
+        for batch in range(4):
+            for i in range(10):
+                queue.put([b"x"])
+            await reader.readexactly(10)
+            await asyncio.sleep(0)
+        assert queue.writes == 4
+        assert metrics.queue_wait.count == metrics.write.count == 2
+        assert metrics.queue_wait.max > 0
+        queue.close()
+
+    async def test_drop_qos0_on_overflow(self, connection):
+        """Tests that QoS 0 packets are dropped and QoS 1 disconnects under DROP_QOS0."""
+        _, writer = connection
+        queue = OutboundQueue(writer, max_depth=2, policy=OverflowPolicy.DROP_QOS0)
+        assert queue.put([b"a"], _message())
+        assert queue.put([b"b"], _message())
+        assert not queue.put([b"c"], _message())
+        assert queue.dropped == 1
+        assert not queue.closed
+        assert not queue.put([b"d"], _message(qos=1, message_id=1))
+        assert queue.overflowed
+        assert queue.closed
+        assert queue.depth == 0
+
+    async def test_disconnect_on_overflow(self, connection):
+        """Tests that any overflow closes the connection under DISCONNECT."""
+        _, writer = connection
+        queue = OutboundQueue(writer, max_depth=1, policy=OverflowPolicy.DISCONNECT)
+        assert queue.put([b"a"], _message())
+        assert not queue.put([b"b"], _message())
+        assert queue.overflowed
+        assert writer.is_closing()
+        assert not queue.put([b"c"], _message())
+
+    async def test_spill_on_overflow(self, connection):
+        """Tests that overflowing messages and every later one are spilled until end_spill()."""
+        _, writer = connection
+        spilled = []
+        queue = OutboundQueue(writer, max_depth=1, policy=OverflowPolicy.SPILL, spill=spilled.append)
+        first, second, third = _message(), _message(1, 1), _message(1, 2)
+        assert queue.put([b"a"], first)
+        assert not queue.put([b"b"], second)
+        queue.start()
+        await asyncio.sleep(0.01) # The queue drains, yet later messages must not overtake
+        assert queue.depth == 0
+        assert not queue.put([b"c"], third)
+        assert spilled == [second, third]
+        assert queue.put([b"\x40\x02\x00\x01"]) # Packets without a message are still queued
+        queue.end_spill()
+        await asyncio.sleep(0.01)
+        assert queue.put([b"d"], _message())
+        assert queue.spilled == 2
+        queue.close()
+
+    async def test_drained(self, connection):
+        """Tests that drained() returns once everything queued has been written, or the queue closed."""
+        reader, writer = connection
+        queue = OutboundQueue(writer)
+        await asyncio.wait_for(queue.drained(), 1) # Empty before the writer starts
+        queue.put([b"abc"])
+        queue.start()
+        await asyncio.wait_for(queue.drained(), 1)
+        assert queue.sent == 1 and await reader.readexactly(3) == b"abc"
+        queue.put([b"d"])
+        waiting = asyncio.ensure_future(queue.drained())
+        queue.close()
+        await asyncio.wait_for(waiting, 1)
+
+@pytest.mark.asyncio
+class TestCentralizedNetwork:
+    """Tests for sending through CentralizedNetwork outbound queues."""
+
+    async def test_send_message(self):
+        """Tests that a message is queued and delivered as a PUBLISH, with queue metrics."""
+        network = CentralizedNetwork(max_queue_depth=10)
+        server_task = asyncio.create_task(network.start("127.0.0.1", 0))
+        while network.server is None or not network.server.sockets:
+            await asyncio.sleep(0.001)
+        port = network.server.sockets[0].getsockname()[1]
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(PacketEncoder.encode(ConnectPacket(packet_type=PacketType.CONNECT, client_id="sub")))
+        while not network.is_client_connected("sub"):
+            await asyncio.sleep(0.001)
+
+        await network.send_message("sub", _message(qos=1, message_id=5))
+        assert network.queue_depths() == {"sub": 1}
+        decoder = StreamDecoder()
+        packets = []
+        while not packets:
+            packets = decoder.packets(await reader.read(1024))
+        packet = packets[0]
+        assert isinstance(packet, PublishPacket)
+        assert (packet.topic, bytes(packet.payload), packet.qos, packet.packet_id) == ("devices/1", b"payload", 1, 5)
+        stats = network.outbound_stats()
+        assert stats["clients"] == 1
+        assert stats["queued"] == 0
+        assert stats["high_watermark"] == 1
+
+        with pytest.raises(ValueError):
+            await network.send_message("unknown", _message())
+        writer.close()
+        await network.stop()
+        server_task.cancel()
+
+    async def test_spilled_backlog_is_replayed(self, tmp_path):
+        """Tests that spilled messages are replayed in order once the queue drains, and spilling then ends."""
+        offline = OfflineQueues(str(tmp_path))
+        await offline.start()
+
+        async def spill(client_id, message):
+            offline.enqueue(client_id, message)
+
+        network = CentralizedNetwork(
+            max_queue_depth=2, overflow_policy=OverflowPolicy.SPILL, spill=spill, replay=offline.replay
+        )
+        server_task, port = await _serve(network)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(PacketEncoder.encode(ConnectPacket(packet_type=PacketType.CONNECT, client_id="sub")))
+        await _wait_for(lambda: network.is_client_connected("sub"))
+
+        # Sent within one step of the event loop: two are queued and the rest spilled
+        for message_id in range(1, 11):
+            await network.send_message("sub", _message(qos=1, message_id=message_id))
+        queue = network.clients["sub"].queue
+        assert queue.spilled == 8 and queue.spilling
+        decoder = StreamDecoder()
+        packet_ids = []
+        while len(packet_ids) < 10:
+            packet_ids += [packet.packet_id for packet in decoder.packets(await reader.read(1024))]
+        assert packet_ids == list(range(1, 11))
+        await _wait_for(lambda: not queue.spilling)
+        assert network.replayed == 8 and "sub" not in offline
+
+        writer.close()
+        await network.stop()
+        server_task.cancel()
+        await offline.stop()
+
+    async def test_spilling_ends_without_replay(self):
+        """Tests that without replay a queue stops spilling once it has drained."""
+        spilled = []
+
+        async def spill(client_id, message):
+            spilled.append(message)
+
+        network = CentralizedNetwork(max_queue_depth=1, overflow_policy=OverflowPolicy.SPILL, spill=spill)
+        server_task, port = await _serve(network)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(PacketEncoder.encode(ConnectPacket(packet_type=PacketType.CONNECT, client_id="sub")))
+        await _wait_for(lambda: network.is_client_connected("sub"))
+        for message_id in range(1, 4):
+            await network.send_message("sub", _message(qos=1, message_id=message_id))
+        queue = network.clients["sub"].queue
+        await _wait_for(lambda: not queue.spilling)
+        assert [message.message_id for message in spilled] == [2, 3]
+        assert queue.put([b"x"], _message())
+
+        writer.close()
+        await network.stop()
+        server_task.cancel()
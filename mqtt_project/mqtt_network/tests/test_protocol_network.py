@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from mqtt_common.models.constants import PacketType
+from mqtt_common.models.message import Message
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.packet import ConnectPacket, PublishPacket
+from mqtt_protocol.src.stream import StreamDecoder
+from mqtt_network.src.config import NetworkConfig, create_network, PROTOCOL_TRANSPORT, STREAMS_TRANSPORT
+from mqtt_network.src.protocol_network import ProtocolNetwork
+from .conftest import _serve, _wait_for
+
+@pytest.mark.asyncio
+class TestProtocolNetwork:
+    """Tests for the BufferedProtocol network implementation."""
+
+    @pytest.mark.parametrize("transport", [STREAMS_TRANSPORT, PROTOCOL_TRANSPORT])
+    async def test_round_trip(self, transport):
+        """Tests that packets reach the handler and messages reach the client with either transport."""
+        network = create_network(NetworkConfig(transport=transport))
+        received = []
+        network.packet_handler = lambda client_id, packet: received.append((client_id, packet))
+        server_task, port = await _serve(network)
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        connect = PacketEncoder.encode(ConnectPacket(packet_type=PacketType.CONNECT, client_id="c1"))
+        publish = PacketEncoder.encode(PublishPacket(packet_type=PacketType.PUBLISH, topic="a/b", payload=b"x"))
+        # CONNECT and a PUBLISH split across reads at an awkward offset
+        data = connect + publish * 3
+        writer.write(data[:len(connect) + 2])
+        await asyncio.sleep(0.01)
+        writer.write(data[len(connect) + 2:])
+        await _wait_for(lambda: len(received) == 3)
+        assert all(client_id == "c1" and packet.topic == "a/b" for client_id, packet in received)
+
+        await network.send_message("c1", Message(topic="x/y", payload=b"hello", qos=0, retain=False))
+        decoder = StreamDecoder()
+        packets = []
+        while not packets:
+            packets = decoder.packets(await reader.read(1024))
+        assert (packets[0].topic, bytes(packets[0].payload)) == ("x/y", b"hello")
+
+        writer.close()
+        await _wait_for(lambda: not network.is_client_connected("c1"))
+        await network.stop()
+        server_task.cancel()
+
+    async def test_first_packet_must_be_connect(self):
+        """Tests that a connection starting with another packet is closed."""
+        network = ProtocolNetwork()
+        server_task, port = await _serve(network)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(PacketEncoder.encode(PublishPacket(packet_type=PacketType.PUBLISH, topic="a", payload=b"")))
+        assert await reader.read() == b""
+        assert network.get_client_count() == 0
+        writer.close()
+        await network.stop()
+        server_task.cancel()
+
+    async def test_unknown_transport(self):
+        """Tests that an unknown transport name is rejected."""
+        with pytest.raises(ValueError, match="Unknown network transport"):
+            create_network(NetworkConfig(transport="carrier-pigeon"))
@@ -0,0 +1,170 @@
+import asyncio
+import pytest
+from mqtt_common.models.constants import MQTTProtocol, PacketType, ConnectReturnCode
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.packet import ConnectPacket, ConnAckPacket, DisconnectPacket, PublishPacket
+from mqtt_protocol.src.stream import StreamDecoder
+from mqtt_network.src.admission import AdmissionController
+from mqtt_network.src.config import NetworkConfig, create_network, PROTOCOL_TRANSPORT, STREAMS_TRANSPORT
+from .conftest import _serve, _wait_for
+
+async def _connect(port: int, client_id: str, protocol_version: int = MQTTProtocol.VERSION_3_1_1,
+                   clean_session: bool = True, extra: bytes = b""):
+    """Opens a connection and sends CONNECT, followed by extra bytes."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(PacketEncoder.encode(ConnectPacket(
+        packet_type=PacketType.CONNECT, client_id=client_id,
+        protocol_version=protocol_version, clean_session=clean_session
+    ), protocol_version) + extra)
+    return reader, writer
+
+async def _read_until_closed(reader: asyncio.StreamReader, protocol_version: int = MQTTProtocol.VERSION_3_1_1) -> list:
+    """Returns every packet received until the server closes the connection."""
+    decoder = StreamDecoder(protocol_version=protocol_version)
+    packets = []
+    while data := await asyncio.wait_for(reader.read(1024), 5):
+        packets.extend(decoder.packets(data))
+    return packets
+
+class TestAdmissionController:
+    """Tests for the CONNECT token bucket."""
+
+    def test_burst_then_rate(self):
+        """Tests that a burst is admitted at once and later CONNECTs wait their turn in order."""
+        now = [0.0]
+        admission = AdmissionController(rate=10, burst=2, max_wait=1.0, clock=lambda: now[0])
+        assert admission.reserve() == 0 and admission.reserve() == 0
+        assert admission.reserve() == pytest.approx(0.1)
+        assert admission.reserve() == pytest.approx(0.2)
+        now[0] = 0.2
+        assert admission.tokens == pytest.approx(0.0)
+        assert admission.delayed == 2 and admission.admitted == 4
+
+    def test_refuses_beyond_max_wait(self):
+        """Tests that a CONNECT which would wait longer than max_wait is refused without taking a token."""
+        admission = AdmissionController(rate=1, burst=1, max_wait=0.5, clock=lambda: 0.0)
+        assert admission.reserve() == 0
+        assert admission.reserve() is None
+        assert admission.rejected == 1 and admission.tokens == 0
+
+    def test_rate_must_be_positive(self):
+        """Tests that a zero rate is rejected."""
+        with pytest.raises(ValueError):
+            AdmissionController(rate=0)
+
+@pytest.mark.asyncio
+class TestSessionTakeover:
+    """Tests for session takeover and CONNECT admission in the networks."""
+
+    @pytest.mark.parametrize("transport", [STREAMS_TRANSPORT, PROTOCOL_TRANSPORT])
+    async def test_takeover_keeps_session(self, transport):
+        """Tests that a reconnect with the same client ID replaces the old connection and keeps its session."""
+        network = create_network(NetworkConfig(transport=transport))
+        disconnected = []
+        network.connect_handler = lambda connection, packet: setattr(
+            connection, 'session', connection.session or {"subscriptions": ["a/#"]}
+        )
+        network.disconnect_handler = disconnected.append
+        server_task, port = await _serve(network)
+
+        old_reader, old_writer = await _connect(port, "c1", MQTTProtocol.VERSION_5_0, clean_session=False)
+        await _wait_for(lambda: network.is_client_connected("c1"))
+        old = network.clients["c1"]
+        session = old.session
+
+        new_reader, new_writer = await _connect(port, "c1", MQTTProtocol.VERSION_5_0, clean_session=False)
+        await _wait_for(lambda: network.clients.get("c1") is not old)
+        assert network.clients["c1"].session is session
+        assert network.takeovers == 1
+        # The old client is told why and disconnected; the session stays with the new one
+        packets = await _read_until_closed(old_reader, MQTTProtocol.VERSION_5_0)
+        assert packets == [DisconnectPacket(reason_code=MQTTProtocol.REASON_SESSION_TAKEN_OVER)]
+        await asyncio.sleep(0.01)
+        assert network.is_client_connected("c1")
+        assert disconnected == []
+
+        new_writer.close()
+        await _wait_for(lambda: not network.is_client_connected("c1"))
+        assert disconnected == ["c1"]
+        old_writer.close()
+        await network.stop()
+        server_task.cancel()
+
+    async def test_clean_session_drops_state(self):
+        """Tests that a takeover asking for a clean session does not inherit the old session."""
+        network = create_network(NetworkConfig())
+        network.connect_handler = lambda connection, packet: setattr(connection, 'session', connection.session or object())
+        server_task, port = await _serve(network)
+        _, old_writer = await _connect(port, "c1")
+        await _wait_for(lambda: network.is_client_connected("c1"))
+        session = network.clients["c1"].session
+        _, new_writer = await _connect(port, "c1", clean_session=True)
+        await _wait_for(lambda: network.takeovers == 1)
+        assert network.clients["c1"].session is not session
+        for writer in (old_writer, new_writer):
+            writer.close()
+        await network.stop()
+        server_task.cancel()
+
+    @pytest.mark.parametrize("transport", [STREAMS_TRANSPORT, PROTOCOL_TRANSPORT])
+    async def test_empty_client_ids(self, transport):
+        """Tests that clients without an ID get unique assigned IDs instead of taking each other over."""
+        network = create_network(NetworkConfig(transport=transport))
+        server_task, port = await _serve(network)
+        _, first = await _connect(port, "")
+        _, second = await _connect(port, "", MQTTProtocol.VERSION_5_0, clean_session=False)
+        await _wait_for(lambda: network.get_client_count() == 2)
+        assert network.takeovers == 0
+        assert all(client_id.startswith(MQTTProtocol.ASSIGNED_CLIENT_ID_PREFIX) for client_id in network.clients)
+        # MQTT 3.1.1 only allows an empty client ID with a clean session
+        reader, third = await _connect(port, "", clean_session=False)
+        assert await _read_until_closed(reader) == [
+            ConnAckPacket(return_code=ConnectReturnCode.IDENTIFIER_REJECTED)
+        ]
+        assert network.get_client_count() == 2
+        for writer in (first, second, third):
+            writer.close()
+        await network.stop()
+        server_task.cancel()
+
+    @pytest.mark.parametrize("transport", [STREAMS_TRANSPORT, PROTOCOL_TRANSPORT])
+    async def test_admission_refuses_storm(self, transport):
+        """Tests that CONNECTs beyond the admission budget get a server unavailable CONNACK."""
+        network = create_network(NetworkConfig(
+            transport=transport, connect_rate=1, connect_burst=1, connect_max_wait=0
+        ))
+        server_task, port = await _serve(network)
+        _, first = await _connect(port, "c1")
+        await _wait_for(lambda: network.is_client_connected("c1"))
+        reader, second = await _connect(port, "c2")
+        assert await _read_until_closed(reader) == [
+            ConnAckPacket(return_code=ConnectReturnCode.SERVER_UNAVAILABLE)
+        ]
+        assert not network.is_client_connected("c2")
+        assert network.admission.rejected == 1
+        for writer in (first, second):
+            writer.close()
+        await network.stop()
+        server_task.cancel()
+
+    @pytest.mark.parametrize("transport", [STREAMS_TRANSPORT, PROTOCOL_TRANSPORT])
+    async def test_admission_delays_connect(self, transport):
+        """Tests that a delayed CONNECT is registered later and the packets sent after it still arrive."""
+        network = create_network(NetworkConfig(
+            transport=transport, connect_rate=20, connect_burst=1, connect_max_wait=1
+        ))
+        received = []
+        network.packet_handler = lambda client_id, packet: received.append(client_id)
+        server_task, port = await _serve(network)
+        publish = PacketEncoder.encode(PublishPacket(packet_type=PacketType.PUBLISH, topic="a", payload=b"x"))
+        _, first = await _connect(port, "c1")
+        await _wait_for(lambda: network.is_client_connected("c1"))
+        _, second = await _connect(port, "c2", extra=publish * 2)
+        await asyncio.sleep(0.01)
+        assert not network.is_client_connected("c2")
+        await _wait_for(lambda: received == ["c2", "c2"])
+        assert network.admission.delayed == 1
+        for writer in (first, second):
+            writer.close()
+        await network.stop()
+        server_task.cancel()
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from mqtt_common.models.constants import PacketType
+from mqtt_protocol.src.encoder import PacketEncoder, PINGREQ_PACKET
+from mqtt_protocol.src.packet import ConnectPacket
+from mqtt_network.src.config import NetworkConfig, create_network, PROTOCOL_TRANSPORT, STREAMS_TRANSPORT
+from mqtt_network.src.timers import TimingWheel
+
+class _Clock:
+    """A clock advanced by hand."""
+
+    def __init__(self):
+        self.time = 1000.0
+
+    def __call__(self) -> float:
+        return self.time
+
+def _wheel(slots: int = 8):
+    """Returns a wheel with 1 second ticks on a manual clock, and the clock."""
+    clock = _Clock()
+    return TimingWheel(tick=1.0, slots=slots, clock=clock), clock
+
+class TestTimingWheel:
+    """Tests for the hashed timing wheel."""
+
+    def test_fires_within_one_tick(self):
+        """Tests that timers fire at the first tick past their deadline, in any round."""
+        wheel, clock = _wheel()
+        fired = []
+        wheel.schedule(2.5, fired.append, "short")
+        wheel.schedule(20, fired.append, "long") # Wraps around the 8 slots twice
+        assert wheel.active == 2
+        assert wheel.advance(clock.time + 2) == 0
+        assert wheel.advance(clock.time + 3) == 1
+        assert fired == ["short"]
+        assert wheel.advance(clock.time + 19) == 0
+        assert wheel.advance(clock.time + 20) == 1
+        assert fired == ["short", "long"]
+        assert wheel.active == 0
+        assert wheel.expired == 2
+
+    def test_cancel(self):
+        """Tests that a cancelled timer never fires."""
+        wheel, clock = _wheel()
+        fired = []
+        timer = wheel.schedule(1, fired.append, 1)
+        timer.cancel()
+        timer.cancel()
+        assert not timer.active
+        assert wheel.advance(clock.time + 5) == 0
+        assert fired == []
+        assert wheel.active == 0
+
+    def test_postpone(self):
+        """Tests that a postponed timer moves to its new deadline when its old slot comes up."""
+        wheel, clock = _wheel()
+        fired = []
+        timer = wheel.schedule(3, fired.append, "keep-alive")
+        wheel.advance(clock.time + 2)
+        timer.postpone() # Now due at +5
+        assert wheel.advance(clock.time + 3) == 0
+        assert timer.active
+        assert wheel.advance(clock.time + 5) == 1
+        assert fired == ["keep-alive"]
+
+    def test_reschedule_earlier(self):
+        """Tests that reschedule() can bring a deadline forward."""
+        wheel, clock = _wheel()
+        fired = []
+        timer = wheel.schedule(10, fired.append, 1)
+        timer.reschedule(1)
+        assert wheel.advance(clock.time + 1) == 1
+        assert wheel.active == 0
+
+    def test_stall_longer_than_a_turn(self):
+        """Tests that every due timer fires after the clock jumps past a full turn."""
+        wheel, clock = _wheel(slots=4)
+        fired = []
+        for delay in range(1, 10):
+            wheel.schedule(delay, fired.append, delay)
+        assert wheel.advance(clock.time + 100) == 9
+        assert sorted(fired) == list(range(1, 10))
+
+    def test_failing_callback(self):
+        """Tests that a raising callback does not stop other timers."""
+        wheel, clock = _wheel()
+        fired = []
+        wheel.schedule(1, lambda: 1 / 0)
+        wheel.schedule(1, fired.append, "ok")
+        assert wheel.advance(clock.time + 1) == 2
+        assert fired == ["ok"]
+        assert wheel.errors == 1
+        assert isinstance(wheel.last_error, ZeroDivisionError)
+
+@pytest.mark.asyncio
+class TestKeepAlive:
+    """Tests for keep alive enforcement by the network."""
+
+    @pytest.mark.parametrize("transport", [STREAMS_TRANSPORT, PROTOCOL_TRANSPORT])
+    async def test_silent_client_is_disconnected(self, transport):
+        """Tests that a client silent for 1.5 keep alive periods is disconnected, and an active one is not."""
+        network = create_network(NetworkConfig(transport=transport))
+        server_task = asyncio.create_task(network.start("127.0.0.1", 0))
+        while network.server is None or not network.server.sockets:
+            await asyncio.sleep(0.001)
+        port = network.server.sockets[0].getsockname()[1]
+
+        clients = {}
+        for client_id in ("silent", "active"):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(PacketEncoder.encode(ConnectPacket(
+                packet_type=PacketType.CONNECT, client_id=client_id, keep_alive=1
+            )))
+            clients[client_id] = (reader, writer)
+        for _ in range(8): # 2 seconds, past the 1.5 second deadline
+            clients["active"][1].write(PINGREQ_PACKET)
+            await asyncio.sleep(0.25)
+        assert await asyncio.wait_for(clients["silent"][0].read(), 1) == b""
+        assert not network.is_client_connected("silent")
+        assert network.is_client_connected("active")
+        assert network.keep_alive_expired == 1
+
+        for _, writer in clients.values():
+            writer.close()
+        await network.stop()
+        server_task.cancel()
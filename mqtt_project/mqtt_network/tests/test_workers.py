@@ -0,0 +1,338 @@
+import asyncio
+import pytest
+from mqtt_common.models.constants import MQTTProtocol, PacketType, PropertyId, QualityOfService
+from mqtt_common.models.message import Message
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.packet import (
+    ConnAckPacket, ConnectPacket, PublishPacket, PubRecPacket, PubRelPacket, PubCompPacket, SubscribePacket, SubAckPacket
+)
+from mqtt_protocol.src.properties import Properties
+from mqtt_protocol.src.stream import StreamDecoder
+from mqtt_network.src.config import NetworkConfig
+from mqtt_network.src.routing import PeerRouter
+from mqtt_network.src.workers import BrokerNode, Worker, WorkerPool
+from .conftest import _Client, _free_port, _serve, _wait_for
+
+async def _linked_routers(first: PeerRouter, second: PeerRouter, tmp_path):
+    """Links two routers over a Unix socket and returns the link tasks and server."""
+    path = str(tmp_path / "link.sock")
+    server = await asyncio.start_unix_server(second.link, path)
+    reader, writer = await asyncio.open_unix_connection(path)
+    task = asyncio.create_task(first.link(reader, writer))
+    await _wait_for(lambda: first.peers and second.peers)
+    return task, server
+
+@pytest.mark.asyncio
+class TestPeerRouter:
+    """Tests for routing publishes between linked peers by announced filters."""
+
+    async def test_forwarding_follows_interest(self, tmp_path):
+        """Tests that messages are forwarded only while the peer announces a matching filter."""
+        received = []
+        first = PeerRouter("first", lambda message: None)
+        second = PeerRouter("second", received.append)
+        second.add_local("sensors/+/temperature") # Announced in the initial snapshot
+        task, server = await _linked_routers(first, second, tmp_path)
+        await _wait_for(lambda: len(first.interest) == 1)
+
+        message = Message(topic="sensors/1/temperature", payload=b"21.5", qos=1, retain=False,
+                          message_id=3, properties={"content_type": "text/plain"})
+        assert first.publish(message) == 1
+        assert first.publish(Message(topic="sensors/1/humidity", payload=b"40", qos=0, retain=False)) == 0
+        await _wait_for(lambda: received)
+        forwarded = received[0]
+        assert (forwarded.topic, forwarded.payload, forwarded.qos, forwarded.message_id) == (
+            "sensors/1/temperature", b"21.5", 1, 3
+        )
+        assert forwarded.properties == {"content_type": "text/plain"}
+
+        # A filter is withdrawn only when its last local subscriber leaves
+        second.add_local("sensors/+/temperature")
+        second.remove_local("sensors/+/temperature")
+        await asyncio.sleep(0.01)
+        assert len(first.interest) == 1
+        second.remove_local("sensors/+/temperature")
+        await _wait_for(lambda: len(first.interest) == 0)
+        assert first.publish(message) == 0
+
+        task.cancel()
+        server.close()
+
+    async def test_full_link_drops_messages(self, tmp_path):
+        """Tests that a full link drops forwarded messages of any QoS but is closed by an announcement that does not fit."""
+        first = PeerRouter("first", lambda message: None, max_queue_depth=2)
+        second = PeerRouter("second", lambda message: None)
+        second.add_local("a/#")
+        task, server = await _linked_routers(first, second, tmp_path)
+        await _wait_for(lambda: len(first.interest) == 1)
+
+        message = Message(topic="a/b", payload=b"x", qos=1, retain=False, message_id=1)
+        assert [first.publish(message) for _ in range(4)] == [1, 1, 0, 0]
+        assert (first.forwarded, first.dropped) == (2, 2)
+        assert not first.peers["second"].closed
+        first.add_local("b/#") # The peer would miss this filter, so the link is closed
+        await _wait_for(lambda: not second.peers)
+        task.cancel()
+        server.close()
+
+    async def test_interest_dropped_with_link(self, tmp_path):
+        """Tests that a closed link forgets the filters of its peer."""
+        first = PeerRouter("first", lambda message: None)
+        second = PeerRouter("second", lambda message: None)
+        task, server = await _linked_routers(first, second, tmp_path)
+        second.add_local("a/#")
+        await _wait_for(lambda: len(first.interest) == 1)
+        second.peers["first"].close()
+        await _wait_for(lambda: not first.peers)
+        assert len(first.interest) == 0
+        task.cancel()
+        server.close()
+
+@pytest.mark.asyncio
+class TestBrokerNode:
+    """Tests for broker nodes: the QoS 1/2 flows of their clients and their links."""
+
+    async def test_qos_handshakes(self):
+        """Tests QoS 2 publishes, per-subscriber packet IDs and the subscribers' acknowledgements."""
+        node = BrokerNode("node", NetworkConfig())
+        server_task, port = await _serve(node.network)
+        subscribers = {}
+        for client_id, qos in (("exactly", QualityOfService.EXACTLY_ONCE), ("least", QualityOfService.AT_LEAST_ONCE)):
+            client = subscribers[client_id] = await _Client.connect(port, client_id)
+            client.writer.write(PacketEncoder.encode(SubscribePacket(
+                packet_type=PacketType.SUBSCRIBE, packet_id=1, subscriptions=[("alarms/#", qos)]
+            )))
+            assert isinstance(await client.receive(), SubAckPacket)
+        publisher = await _Client.connect(port, "publisher")
+
+        # A resent QoS 2 PUBLISH is acknowledged again but delivered once
+        publish = PacketEncoder.encode(PublishPacket(
+            packet_type=PacketType.PUBLISH, topic="alarms/door", payload=b"open",
+            qos=QualityOfService.EXACTLY_ONCE, packet_id=7
+        ))
+        publisher.writer.write(publish + publish)
+        assert await publisher.receive() == PubRecPacket(packet_id=7)
+        assert await publisher.receive() == PubRecPacket(packet_id=7)
+        publisher.writer.write(PacketEncoder.encode_ack(PacketType.PUBREL, 7))
+        assert await publisher.receive() == PubCompPacket(packet_id=7)
+
+        # Each subscriber gets a packet ID from its own session, not the publisher's
+        delivered = {client_id: await client.receive() for client_id, client in subscribers.items()}
+        assert (delivered["exactly"].qos, delivered["exactly"].packet_id) == (2, 1)
+        assert (delivered["least"].qos, delivered["least"].packet_id) == (1, 1)
+        subscribers["least"].writer.write(PacketEncoder.encode_ack(PacketType.PUBACK, 1))
+        subscribers["exactly"].writer.write(PacketEncoder.encode_ack(PacketType.PUBREC, 1))
+        assert await subscribers["exactly"].receive() == PubRelPacket(packet_id=1)
+        subscribers["exactly"].writer.write(PacketEncoder.encode_ack(PacketType.PUBCOMP, 1))
+        sessions = {client_id: node.network.clients[client_id].session for client_id in subscribers}
+        await _wait_for(lambda: all(session.outbound.completed == 1 for session in sessions.values()))
+        assert all(session.outbound.inflight == 0 for session in sessions.values())
+        assert node.network.clients["publisher"].session.inbound.duplicates == 1
+
+        for client in [publisher, *subscribers.values()]:
+            client.writer.close()
+        await node.network.stop()
+        server_task.cancel()
+
+    async def test_delivery_through_fanout(self):
+        """Tests that the node fans each message out once per wire format, in publish order, yielding between batches."""
+        node = BrokerNode("node", NetworkConfig())
+        node.fanout.batch_size = 2
+        server_task, port = await _serve(node.network)
+        subscribers = [await _Client.connect(port, f"sub-{i}") for i in range(3)]
+        for client in subscribers:
+            await client.subscribe("alarms/#")
+        publisher = await _Client.connect(port, "publisher")
+        for payload in (b"1", b"2"):
+            publisher.publish("alarms/door", payload)
+        for client in subscribers:
+            assert [bytes((await client.receive()).payload) for _ in range(2)] == [b"1", b"2"]
+        assert (node.fanout.publishes, node.fanout.encoded, node.fanout.yields) == (2, 2, 2)
+
+        for client in [publisher, *subscribers]:
+            client.writer.close()
+        await node.network.stop()
+        server_task.cancel()
+
+    async def test_clean_takeover_drops_subscriptions(self):
+        """Tests that a clean-session CONNECT taking over a client ID does not inherit its subscriptions."""
+        node = BrokerNode("node", NetworkConfig())
+        server_task, port = await _serve(node.network)
+        first = await _Client.connect(port, "sensor")
+        first.writer.write(PacketEncoder.encode(SubscribePacket(
+            packet_type=PacketType.SUBSCRIBE, packet_id=1, subscriptions=[("alarms/#", QualityOfService.AT_MOST_ONCE)]
+        )))
+        assert isinstance(await first.receive(), SubAckPacket)
+        second = await _Client.connect(port, "sensor")
+        assert node.network.takeovers == 1
+        assert node.subscriptions.subscriptions("sensor") == {}
+        assert not node.subscriptions.match("alarms/door")
+
+        for client in (first, second):
+            client.writer.close()
+        await node.network.stop()
+        server_task.cancel()
+
+    async def test_persistent_session(self):
+        """Tests that a persistent session keeps its subscriptions after disconnect and resends unacknowledged deliveries."""
+        node = BrokerNode("node", NetworkConfig())
+        server_task, port = await _serve(node.network)
+
+        async def connect(clean_session):
+            client = _Client(*await asyncio.open_connection("127.0.0.1", port))
+            client.writer.write(PacketEncoder.encode(ConnectPacket(
+                packet_type=PacketType.CONNECT, client_id="sensor", clean_session=clean_session
+            )))
+            return client, await client.receive()
+
+        subscriber, connack = await connect(False)
+        assert not connack.session_present
+        subscriber.writer.write(PacketEncoder.encode(SubscribePacket(
+            packet_type=PacketType.SUBSCRIBE, packet_id=1, subscriptions=[("alarms/#", QualityOfService.AT_LEAST_ONCE)]
+        )))
+        assert isinstance(await subscriber.receive(), SubAckPacket)
+        publisher = await _Client.connect(port, "publisher")
+        publisher.writer.write(PacketEncoder.encode(PublishPacket(
+            packet_type=PacketType.PUBLISH, topic="alarms/door", payload=b"open",
+            qos=QualityOfService.AT_LEAST_ONCE, packet_id=1, retain=True
+        )))
+        delivered = await subscriber.receive()
+        assert (delivered.packet_id, delivered.retain, delivered.dup) == (1, False, False) # Live delivery clears RETAIN
+
+        subscriber.writer.close()
+        await _wait_for(lambda: "sensor" not in node.network.clients)
+        assert node.subscriptions.match("alarms/door")
+        subscriber, connack = await connect(False)
+        assert connack.session_present
+        resent = await subscriber.receive()
+        assert (resent.topic, resent.packet_id, resent.dup) == ("alarms/door", 1, True)
+        subscriber.writer.write(PacketEncoder.encode_ack(PacketType.PUBACK, 1))
+        await _wait_for(lambda: node.sessions["sensor"].outbound.completed == 1)
+
+        # A clean session starts over and ends with its connection
+        subscriber.writer.close()
+        await _wait_for(lambda: "sensor" not in node.network.clients)
+        subscriber, connack = await connect(True)
+        assert not connack.session_present
+        assert not node.subscriptions.match("alarms/door")
+        subscriber.writer.close()
+        await _wait_for(lambda: "sensor" not in node.sessions)
+
+        publisher.writer.close()
+        await node.network.stop()
+        server_task.cancel()
+
+    async def test_session_expiry(self):
+        """Tests that an MQTT 5.0 session outlives its connection until its Session Expiry Interval runs out."""
+        node = BrokerNode("node", NetworkConfig())
+        server_task, port = await _serve(node.network)
+        v5 = MQTTProtocol.VERSION_5_0
+        for client_id, expiry in (("brief", None), ("lasting", 5)):
+            client = _Client(*await asyncio.open_connection("127.0.0.1", port))
+            client.decoder = StreamDecoder(protocol_version=v5)
+            client.writer.write(PacketEncoder.encode(ConnectPacket(
+                packet_type=PacketType.CONNECT, protocol_name=MQTTProtocol.PROTOCOL_NAME_3_1_1, protocol_version=v5,
+                client_id=client_id, clean_session=False,
+                properties=None if expiry is None else Properties({PropertyId.SESSION_EXPIRY_INTERVAL: expiry})
+            ), v5))
+            assert isinstance(await client.receive(), ConnAckPacket)
+            client.writer.write(PacketEncoder.encode(SubscribePacket(
+                packet_type=PacketType.SUBSCRIBE, packet_id=1, subscriptions=[(f"{client_id}/#", 0)]
+            ), v5))
+            assert isinstance(await client.receive(), SubAckPacket)
+            client.writer.close()
+        await _wait_for(lambda: not node.network.clients)
+        # Without an expiry interval the session ends with the connection
+        assert list(node.sessions) == ["lasting"]
+        assert node.subscriptions.match("lasting/x") and not node.subscriptions.match("brief/x")
+
+        timers = node.network.timers
+        timers.advance(timers.clock() + 4)
+        assert "lasting" in node.sessions
+        timers.advance(timers.clock() + 6)
+        assert not node.sessions
+        assert not node.subscriptions.match("lasting/x")
+
+        await node.network.stop()
+        server_task.cancel()
+
+    async def test_worker_link_reopens(self, tmp_path):
+        """Tests that a worker reopens a lost link to a lower-index worker and filters are announced again."""
+        config = NetworkConfig()
+        workers = [Worker(index, 2, str(tmp_path), config) for index in range(2)]
+        tasks = [asyncio.create_task(worker.run("127.0.0.1", 0)) for worker in workers]
+        await _wait_for(lambda: all(worker.router.peers for worker in workers))
+        workers[0].router.add_local("plant/#")
+        await _wait_for(lambda: workers[1].router.interest.match("plant/7"))
+
+        workers[0].router.peers["worker-1"].close()
+        await _wait_for(lambda: workers[1].link_attempts == 1 and all(worker.router.peers for worker in workers))
+        await _wait_for(lambda: workers[1].router.interest.match("plant/7"))
+
+        for worker, task in zip(workers, tasks):
+            await worker.network.stop()
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def test_metrics_monitor(self, tmp_path):
+        """Tests that with config.metrics workers publish their $SYS topics to every worker and serve Prometheus."""
+        config = NetworkConfig(metrics=True, metrics_interval=0.02, metrics_port=0)
+        assert NetworkConfig(metrics_port=9100).for_process(2).metrics_port == 9102
+        workers = [Worker(index, 2, str(tmp_path), config) for index in range(2)]
+        tasks = [asyncio.create_task(worker.run("127.0.0.1", 0)) for worker in workers]
+        await _wait_for(lambda: all(worker.router.peers and worker.network.server for worker in workers))
+        port = workers[1].network.server.sockets[0].getsockname()[1]
+        client = await _Client.connect(port, "dashboard")
+        client.writer.write(PacketEncoder.encode(SubscribePacket(
+            packet_type=PacketType.SUBSCRIBE, packet_id=1,
+            subscriptions=[("$SYS/broker/worker-0/router_peers", QualityOfService.AT_MOST_ONCE)]
+        )))
+        assert isinstance(await client.receive(), SubAckPacket)
+        packet = await client.receive()
+        assert (packet.topic, bytes(packet.payload), packet.retain) == ("$SYS/broker/worker-0/router_peers", b"1", False)
+
+        monitor = workers[0].monitor
+        reader, writer = await asyncio.open_connection("127.0.0.1", monitor.server.sockets[0].getsockname()[1])
+        writer.write(b"GET /metrics HTTP/1.1\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        assert b"# TYPE mqtt_network_clients gauge\nmqtt_network_clients 0\n" in response and b"mqtt_node_link_attempts_total" in response
+
+        client.writer.close()
+        for worker in workers:
+            await worker.network.stop() # run() returns, stopping the monitor
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(worker.monitor.server is None for worker in workers)
+
+@pytest.mark.asyncio
+class TestWorkerPool:
+    """Tests for broker workers sharing a port."""
+
+    async def test_publish_reaches_subscribers_on_every_worker(self):
+        """Tests that a publish reaches subscribers whichever worker they are connected to."""
+        port = _free_port()
+        pool = WorkerPool("127.0.0.1", port, workers=2)
+        await asyncio.to_thread(pool.start)
+        try:
+            # With ten subscribers both workers almost certainly hold some of them
+            subscribers = [await _Client.connect(port, f"sub-{i}") for i in range(10)]
+            for client in subscribers:
+                client.writer.write(PacketEncoder.encode(SubscribePacket(
+                    packet_type=PacketType.SUBSCRIBE, packet_id=1,
+                    subscriptions=[("plant/+/status", QualityOfService.AT_MOST_ONCE)]
+                )))
+                suback = await client.receive()
+                assert isinstance(suback, SubAckPacket) and suback.return_codes == [0]
+            await asyncio.sleep(0.2) # Filter announcements reach the other worker
+
+            publisher = await _Client.connect(port, "publisher")
+            publisher.writer.write(PacketEncoder.encode(PublishPacket(
+                packet_type=PacketType.PUBLISH, topic="plant/7/status", payload=b"running"
+            )))
+            for client in subscribers:
+                packet = await client.receive()
+                assert (packet.topic, bytes(packet.payload)) == ("plant/7/status", b"running")
+            for client in subscribers + [publisher]:
+                client.writer.close()
+        finally:
+            await asyncio.to_thread(pool.stop)
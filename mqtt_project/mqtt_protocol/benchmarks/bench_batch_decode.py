@@ -0,0 +1,89 @@
+"""
+Compares decode_batch with the per-packet decode paths on a synthetic capture.
+
+Run from mqtt_project/:
+    python -m mqtt_protocol.benchmarks.bench_batch_decode --packets 1000000
+"""
+import argparse
+import asyncio
+import time
+from mqtt_common.models.constants import QualityOfService
+from mqtt_protocol.src.batch import decode_batch
+from mqtt_protocol.src.encoder import PublishTemplate
+from mqtt_protocol.src.parser import PacketParser
+from mqtt_protocol.src.stream import StreamDecoder
+
+
+def build_capture(packets: int, topics: int, payload_size: int) -> bytes:
+    """Builds a buffer of PUBLISH packets cycling through topics and QoS 0/1."""
+    payload = b"p" * payload_size
+    templates = [
+        PublishTemplate(f"site/{i % 100}/device/{i}/telemetry", payload, QualityOfService(i % 2))
+        for i in range(topics)
+    ]
+    return b"".join(
+        templates[i % topics].to_bytes((i % 65535) + 1) for i in range(packets)
+    )
+
+
+def bench(name: str, packets: int, func) -> None:
+    """Times func and prints its throughput."""
+    start = time.perf_counter()
+    decoded = func()
+    elapsed = time.perf_counter() - start
+    assert decoded == packets, f"{name} decoded {decoded} of {packets} packets"
+    print(f"{name:<28} {elapsed:8.3f} s  {packets / elapsed:>12,.0f} packets/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=1_000_000)
+    parser.add_argument("--topics", type=int, default=5000)
+    parser.add_argument("--payload-size", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=65536, help="read size for the stream decoder")
+    args = parser.parse_args()
+
+    capture = build_capture(args.packets, args.topics, args.payload_size)
+    print(f"capture: {args.packets:,} packets, {len(capture) / 2**20:.1f} MiB")
+
+    def batch() -> int:
+        return len(decode_batch(capture))
+
+    def stream() -> int:
+        decoder = StreamDecoder()
+        view = memoryview(capture)
+        return sum(
+            len(decoder.packets(view[i:i + args.chunk_size]))
+            for i in range(0, len(capture), args.chunk_size)
+        )
+
+    def per_packet_sync() -> int:
+        view = memoryview(capture)
+        offset = count = 0
+        while offset < len(view):
+            length = PacketParser._get_header_length(view[offset:])
+            _, _, remaining_length = PacketParser.parse_fixed_header_sync(view[offset:offset + length])
+            PacketParser.parse_packet_sync(view[offset:offset + length + remaining_length])
+            offset += length + remaining_length
+            count += 1
+        return count
+
+    async def per_packet_async() -> int:
+        offset = count = 0
+        while offset < len(capture):
+            packet_data = capture[offset:offset + 5]
+            _, _, remaining_length = await PacketParser.parse_fixed_header(packet_data)
+            total_length = PacketParser._get_header_length(packet_data) + remaining_length
+            await PacketParser.parse_packet(capture[offset:offset + total_length])
+            offset += total_length
+            count += 1
+        return count
+
+    bench("decode_batch (columnar)", args.packets, batch)
+    bench("StreamDecoder.packets", args.packets, stream)
+    bench("parse_packet_sync", args.packets, per_packet_sync)
+    bench("parse_packet (async)", args.packets, lambda: asyncio.run(per_packet_async()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measures QoS 1 round trips per second over loopback TCP for several in-flight window sizes.
+
+Run from mqtt_project/:
+    python -m mqtt_protocol.benchmarks.bench_inflight --messages 100000 --windows 1 16 256
+"""
+import argparse
+import asyncio
+import time
+from mqtt_common.models.constants import QualityOfService
+from mqtt_common.models.message import Message
+from mqtt_protocol.src.encoder import PublishTemplate
+from mqtt_protocol.src.inflight import InboundFlow, OutboundFlow
+from mqtt_protocol.src.stream import StreamDecoder
+
+_READ_SIZE = 65536
+
+
+async def _acknowledge(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Receiving end: acknowledges every PUBLISH of a read in one write."""
+    decoder = StreamDecoder()
+    flow = InboundFlow()
+    while True:
+        data = await reader.read(_READ_SIZE)
+        if not data:
+            break
+        for packet in decoder.packets(data):
+            flow.receive(packet)
+        writer.write(flow.flush())
+    writer.close()
+
+
+async def run(window: int, messages: int, payload: bytes) -> float:
+    """Publishes messages at QoS 1 through a window and returns the round trips per second."""
+    server = await asyncio.start_server(_acknowledge, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    template = PublishTemplate("bench/inflight", payload, QualityOfService.AT_LEAST_ONCE)
+    message = Message(topic="bench/inflight", payload=payload, qos=1, retain=False, message_id=1)
+    flow = OutboundFlow(receive_maximum=window)
+    decoder = StreamDecoder()
+
+    start = time.perf_counter()
+    buffers = []
+    for _ in range(messages):
+        packet_id = flow.send(message)
+        if packet_id is not None:
+            buffers.extend(template.buffers(packet_id))
+    writer.writelines(buffers)
+    while flow.completed < messages:
+        data = await reader.read(_READ_SIZE)
+        if not data:
+            raise ConnectionError("Benchmark connection closed")
+        released, _ = flow.acknowledge(decoder.packets(data))
+        if released:
+            writer.writelines([buffer for packet_id, _ in released for buffer in template.buffers(packet_id)])
+    elapsed = time.perf_counter() - start
+
+    # Let the receiving end see EOF and finish before the server goes away
+    writer.write_eof()
+    while await reader.read(_READ_SIZE):
+        pass
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return messages / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--windows", type=int, nargs="+", default=[1, 16, 256])
+    parser.add_argument("--payload-size", type=int, default=64)
+    args = parser.parse_args()
+    payload = b"p" * args.payload_size
+
+    print(f"{'window':>8} {'round trips/s':>14}")
+    for window in args.windows:
+        # Stop-and-wait needs one network round trip per message, so it gets fewer messages
+        messages = args.messages if window > 1 else min(args.messages, 20000)
+        rate = asyncio.run(run(window, messages, payload))
+        print(f"{window:>8} {rate:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
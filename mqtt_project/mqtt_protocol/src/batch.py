@@ -0,0 +1,154 @@
+from array import array
+from dataclasses import dataclass, field
+from mqtt_common.models.constants import PacketType, MQTTProtocol
+from mqtt_common.models.errors import ProtocolError
+from .packet import MQTTPacket
+from .parser import PacketParser, Buffer
+from .properties import decode_variable_int
+from .stream import _MIN_FIRST_BYTE, _MAX_FIRST_BYTE
+
+_PUBLISH = PacketType.PUBLISH
+
+
+@dataclass
+class PacketBatch:
+    """
+    Columnar metadata for every complete packet found in one buffer.
+
+    Column i describes the i-th packet. Offsets are absolute positions in buffer, so
+    topics and payloads can be read, routed and stored as slices without building a
+    packet object per message. Topic and packet ID columns are 0 for packets other
+    than PUBLISH, as is the packet ID of a QoS 0 PUBLISH.
+
+    Attributes:
+        buffer: The decoded buffer; all offsets point into it
+        packet_types: Packet type of each packet
+        flags: Fixed header flags of each packet
+        offsets: Offset of each packet body (after the fixed header)
+        lengths: Length of each packet body (the remaining length)
+        topic_offsets: Offset of the topic string of each PUBLISH
+        topic_lengths: Length in bytes of the topic of each PUBLISH
+        packet_ids: Packet identifier of each QoS 1/2 PUBLISH
+        consumed: Bytes covered by complete packets; a trailing partial packet starts here
+        protocol_version: Version the packets were decoded for
+    """
+    buffer: memoryview
+    packet_types: array = field(default_factory=lambda: array('B'))
+    flags: array = field(default_factory=lambda: array('B'))
+    offsets: array = field(default_factory=lambda: array('I'))
+    lengths: array = field(default_factory=lambda: array('I'))
+    topic_offsets: array = field(default_factory=lambda: array('I'))
+    topic_lengths: array = field(default_factory=lambda: array('H'))
+    packet_ids: array = field(default_factory=lambda: array('H'))
+    consumed: int = 0
+    protocol_version: int = MQTTProtocol.VERSION_3_1_1
+
+    def __len__(self) -> int:
+        return len(self.packet_types)
+
+    def topic(self, index: int) -> str:
+        """Decodes the topic of the PUBLISH at index."""
+        start = self.topic_offsets[index]
+        return str(self.buffer[start:start + self.topic_lengths[index]], MQTTProtocol.STRING_ENCODING)
+
+    def payload(self, index: int) -> memoryview:
+        """Returns the payload of the PUBLISH at index as a view into the buffer."""
+        start = self.topic_offsets[index] + self.topic_lengths[index]
+        if self.flags[index] & MQTTProtocol.PUBLISH_QOS_MASK:
+            start += MQTTProtocol.PACKET_ID_SIZE
+        if self.protocol_version >= MQTTProtocol.VERSION_5_0:
+            # Skip the property block without decoding it
+            length, start = decode_variable_int(self.buffer, start)
+            start += length
+        return self.buffer[start:self.offsets[index] + self.lengths[index]]
+
+    def packet(self, index: int) -> MQTTPacket:
+        """Materialises the packet at index as a packet object, for the few that need one."""
+        start = self.offsets[index]
+        return PacketParser.parse_body_sync(
+            PacketType(self.packet_types[index]),
+            self.flags[index],
+            self.buffer[start:start + self.lengths[index]],
+            self.protocol_version
+        )
+
+
+def decode_batch(data: Buffer, protocol_version: int = MQTTProtocol.VERSION_3_1_1) -> PacketBatch:
+    """
+    Scans a buffer holding many packets and returns their metadata as columns.
+
+    Only the fixed header of every packet and the topic length and packet ID of every
+    PUBLISH are read. Decoding stops at a trailing incomplete packet, whose start is
+    reported as PacketBatch.consumed so the caller can carry it over to the next buffer.
+    MQTT 5.0 topic aliases are not resolved here; an aliased PUBLISH has an empty topic.
+    """
+    view = memoryview(data)
+    batch = PacketBatch(buffer=view, protocol_version=protocol_version)
+    packet_types = batch.packet_types.append
+    flag_column = batch.flags.append
+    offsets = batch.offsets.append
+    lengths = batch.lengths.append
+    topic_offsets = batch.topic_offsets.append
+    topic_lengths = batch.topic_lengths.append
+    packet_ids = batch.packet_ids.append
+
+    end_of_data = len(view)
+    offset = 0
+    while offset < end_of_data:
+        byte1 = view[offset]
+        if byte1 < _MIN_FIRST_BYTE or byte1 > _MAX_FIRST_BYTE:
+            raise ProtocolError("Invalid packet type")
+
+        index = offset + 1
+        remaining_length = 0
+        multiplier = 1
+        while True:
+            if index >= end_of_data:
+                batch.consumed = offset
+                return batch
+            byte = view[index]
+            index += 1
+            remaining_length += (byte & MQTTProtocol.LENGTH_MASK) * multiplier
+            if byte & MQTTProtocol.CONTINUATION_BIT == 0:
+                break
+            if index - offset > MQTTProtocol.MAX_LENGTH_BYTES:
+                raise ProtocolError("Remaining length field too long")
+            multiplier *= 128
+
+        packet_end = index + remaining_length
+        if packet_end > end_of_data:
+            break
+
+        packet_type = byte1 >> MQTTProtocol.PACKET_TYPE_SHIFT
+        flags = byte1 & MQTTProtocol.FLAGS_MASK
+        if packet_type == _PUBLISH:
+            if remaining_length < MQTTProtocol.LENGTH_FIELD_SIZE:
+                raise ProtocolError("Incomplete string length")
+            topic_start = index + MQTTProtocol.LENGTH_FIELD_SIZE
+            topic_length = (view[index] << 8) | view[index + 1]
+            topic_end = topic_start + topic_length
+            packet_id = 0
+            if flags & MQTTProtocol.PUBLISH_QOS_MASK:
+                if flags & MQTTProtocol.PUBLISH_QOS_MASK == MQTTProtocol.PUBLISH_QOS_MASK:
+                    raise ProtocolError("Invalid QoS level")
+                if topic_end + MQTTProtocol.PACKET_ID_SIZE > packet_end:
+                    raise ProtocolError("Invalid PUBLISH packet")
+                packet_id = (view[topic_end] << 8) | view[topic_end + 1]
+            elif topic_end > packet_end:
+                raise ProtocolError("Incomplete string data")
+            topic_offsets(topic_start)
+            topic_lengths(topic_length)
+            packet_ids(packet_id)
+        else:
+            topic_offsets(0)
+            topic_lengths(0)
+            packet_ids(0)
+
+        packet_types(packet_type)
+        flag_column(flags)
+        offsets(index)
+        lengths(remaining_length)
+        offset = packet_end
+
+    batch.consumed = offset
+    return batch
@@ -1,7 +1,50 @@
-from typing import List
-from mqtt_common.models.constants import PacketType, QualityOfService, MQTTProtocol
+import struct
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Type, Union
+from mqtt_common.models.constants import (
+    PacketType, QualityOfService, ConnectReturnCode, MQTTProtocol, PropertyId
+)
 from mqtt_common.models.errors import ProtocolError
-from .packet import MQTTPacket, ConnectPacket, PublishPacket
+from .packet import (
+    MQTTPacket, ConnectPacket, ConnAckPacket, PublishPacket,
+    PubAckPacket, PubRecPacket, PubRelPacket, PubCompPacket,
+    SubscribePacket, SubAckPacket, UnsubscribePacket, UnsubAckPacket,
+    PingReqPacket, PingRespPacket, DisconnectPacket
+)
+from .properties import Properties, encode_properties, encode_property
+
+# Number of distinct topics whose length-prefixed encoding is kept for reuse
+TOPIC_CACHE_SIZE = 4096
+
+# A buffer that can be handed to writer.writelines() or socket.sendmsg()
+Buffer = Union[bytes, memoryview]
+
+# Packets without a variable header or payload never change, so they are built once
+PINGREQ_PACKET = bytes([PacketType.PINGREQ << MQTTProtocol.PACKET_TYPE_SHIFT, 0])
+PINGRESP_PACKET = bytes([PacketType.PINGRESP << MQTTProtocol.PACKET_TYPE_SHIFT, 0])
+DISCONNECT_PACKET = bytes([PacketType.DISCONNECT << MQTTProtocol.PACKET_TYPE_SHIFT, 0])
+
+# Acknowledgements carrying only a packet ID: first byte, remaining length (2), packet ID
+_ACK_STRUCT = struct.Struct('!BBH')
+_ACK_FIRST_BYTES = {
+    PacketType.PUBACK: PacketType.PUBACK << MQTTProtocol.PACKET_TYPE_SHIFT,
+    PacketType.PUBREC: PacketType.PUBREC << MQTTProtocol.PACKET_TYPE_SHIFT,
+    PacketType.PUBREL: (PacketType.PUBREL << MQTTProtocol.PACKET_TYPE_SHIFT) | MQTTProtocol.PUBREL_FLAGS,
+    PacketType.PUBCOMP: PacketType.PUBCOMP << MQTTProtocol.PACKET_TYPE_SHIFT,
+    PacketType.UNSUBACK: PacketType.UNSUBACK << MQTTProtocol.PACKET_TYPE_SHIFT,
+}
+
+# Every CONNACK variant, keyed by (session_present, return_code)
+_CONNACK_PACKETS = {
+    (session_present, return_code): bytes([
+        PacketType.CONNACK << MQTTProtocol.PACKET_TYPE_SHIFT,
+        2,
+        MQTTProtocol.CONNACK_SESSION_PRESENT_FLAG if session_present else 0,
+        return_code
+    ])
+    for session_present in (False, True)
+    for return_code in ConnectReturnCode
+}
 
 def encode_packet(packet: 'MQTTPacket') -> bytes:
     """Encodes the MQTT packet into its byte representation."""
@@ -15,22 +58,128 @@ def encode(packet: 'MQTTPacket') -> bytes:
     return encode_packet(packet)
 
 class PacketEncoder:
-    """Handles encoding of MQTT packets from objects to bytes."""
+    """
+    Handles encoding of MQTT packets from objects to bytes.
+
+    Packets are encoded for the protocol version negotiated on the connection they are
+    sent on (CONNECT uses its own protocol_version). MQTT 5.0 packets whose reason code
+    is success and that carry no properties use the shortened forms the protocol allows,
+    which for acknowledgements are byte-for-byte the MQTT 3.1.1 encoding.
+    """
     
     @staticmethod
-    def encode_packet(packet: MQTTPacket) -> bytes:
+    def encode(packet: MQTTPacket, protocol_version: int = MQTTProtocol.VERSION_3_1_1) -> bytes:
+        """Static method for packet encoding."""
+        return PacketEncoder.encode_packet(packet, protocol_version)
+
+    @staticmethod
+    def encode_packet(packet: MQTTPacket, protocol_version: int = MQTTProtocol.VERSION_3_1_1) -> bytes:
         """Encodes an MQTT packet object into its byte representation according to the MQTT protocol."""
-        if isinstance(packet, ConnectPacket):
-            return PacketEncoder._encode_connect(packet)
-        elif isinstance(packet, PublishPacket):
-            return PacketEncoder._encode_publish(packet)
-        else:
-            # Basic packet encoding for other types
-            return PacketEncoder.encode_fixed_header(
-                packet.packet_type,
-                packet.flags,
-                packet.remaining_length
+        encoder = _ENCODERS.get(type(packet))
+        if encoder is not None:
+            return encoder(packet, protocol_version)
+        # Basic packet encoding for a bare MQTTPacket
+        return PacketEncoder.encode_fixed_header(
+            packet.packet_type,
+            packet.flags,
+            packet.remaining_length
+        )
+
+    @staticmethod
+    def encode_ack(packet_type: PacketType, packet_id: int) -> bytes:
+        """Encodes a PUBACK, PUBREC, PUBREL, PUBCOMP or UNSUBACK for packet_id from a pre-packed template."""
+        return _ACK_STRUCT.pack(_ACK_FIRST_BYTES[packet_type], MQTTProtocol.PACKET_ID_SIZE, packet_id)
+
+    @staticmethod
+    def encode_connack(session_present: bool, return_code: ConnectReturnCode) -> bytes:
+        """Returns the precomputed CONNACK for the given session present flag and return code."""
+        return _CONNACK_PACKETS[bool(session_present), return_code]
+
+    @staticmethod
+    def _encode_connack(packet: ConnAckPacket, protocol_version: int) -> bytes:
+        """Encodes a CONNACK packet, from the precomputed variants for MQTT 3.1.1."""
+        if protocol_version < MQTTProtocol.VERSION_5_0:
+            return _CONNACK_PACKETS[bool(packet.session_present), packet.return_code]
+        body = bytes([
+            MQTTProtocol.CONNACK_SESSION_PRESENT_FLAG if packet.session_present else 0,
+            packet.return_code
+        ]) + encode_properties(packet.properties)
+        return PacketEncoder.encode_fixed_header(PacketType.CONNACK, 0, len(body)) + body
+
+    @staticmethod
+    def _encode_ack(packet: MQTTPacket, protocol_version: int) -> bytes:
+        """Encodes an acknowledgement: the packet ID, plus an MQTT 5.0 reason code and properties if set."""
+        if protocol_version < MQTTProtocol.VERSION_5_0 or (
+            not packet.reason_code and packet.properties is None
+        ):
+            return _ACK_STRUCT.pack(
+                _ACK_FIRST_BYTES[packet.packet_type], MQTTProtocol.PACKET_ID_SIZE, packet.packet_id
             )
+        body = packet.packet_id.to_bytes(
+            MQTTProtocol.PACKET_ID_SIZE, MQTTProtocol.BYTE_ORDER
+        ) + bytes((packet.reason_code,))
+        if packet.properties is not None:
+            body += encode_properties(packet.properties)
+        return PacketEncoder.encode_fixed_header(packet.packet_type, packet.flags, len(body)) + body
+
+    @staticmethod
+    def _encode_unsuback(packet: UnsubAckPacket, protocol_version: int) -> bytes:
+        """Encodes an UNSUBACK packet, which in MQTT 5.0 carries properties and one reason code per filter."""
+        if protocol_version < MQTTProtocol.VERSION_5_0:
+            return PacketEncoder.encode_ack(PacketType.UNSUBACK, packet.packet_id)
+        body = packet.packet_id.to_bytes(
+            MQTTProtocol.PACKET_ID_SIZE, MQTTProtocol.BYTE_ORDER
+        ) + encode_properties(packet.properties) + bytes(packet.reason_codes)
+        return PacketEncoder.encode_fixed_header(PacketType.UNSUBACK, 0, len(body)) + body
+
+    @staticmethod
+    def _encode_subscribe(packet: SubscribePacket, protocol_version: int) -> bytes:
+        """Encodes a SUBSCRIBE packet: packet ID, MQTT 5.0 properties, then each topic filter and its options."""
+        body = bytearray(packet.packet_id.to_bytes(MQTTProtocol.PACKET_ID_SIZE, MQTTProtocol.BYTE_ORDER))
+        options = None
+        if protocol_version >= MQTTProtocol.VERSION_5_0:
+            body += encode_properties(packet.properties)
+            options = packet.subscription_options
+        for index, (topic_filter, qos) in enumerate(packet.subscriptions):
+            body += PacketEncoder.encode_string(topic_filter)
+            # The MQTT 5.0 options byte holds the requested QoS in its low bits
+            body.append(options[index] if options else qos)
+        return PacketEncoder.encode_fixed_header(
+            PacketType.SUBSCRIBE, MQTTProtocol.SUBSCRIBE_FLAGS, len(body)
+        ) + body
+
+    @staticmethod
+    def _encode_suback(packet: SubAckPacket, protocol_version: int) -> bytes:
+        """Encodes a SUBACK packet: packet ID, MQTT 5.0 properties, then one return code per topic filter."""
+        body = packet.packet_id.to_bytes(MQTTProtocol.PACKET_ID_SIZE, MQTTProtocol.BYTE_ORDER)
+        if protocol_version >= MQTTProtocol.VERSION_5_0:
+            body += encode_properties(packet.properties)
+        body += bytes(packet.return_codes)
+        return PacketEncoder.encode_fixed_header(PacketType.SUBACK, 0, len(body)) + body
+
+    @staticmethod
+    def _encode_unsubscribe(packet: UnsubscribePacket, protocol_version: int) -> bytes:
+        """Encodes an UNSUBSCRIBE packet: packet ID, MQTT 5.0 properties, then each topic filter."""
+        body = bytearray(packet.packet_id.to_bytes(MQTTProtocol.PACKET_ID_SIZE, MQTTProtocol.BYTE_ORDER))
+        if protocol_version >= MQTTProtocol.VERSION_5_0:
+            body += encode_properties(packet.properties)
+        for topic_filter in packet.topics:
+            body += PacketEncoder.encode_string(topic_filter)
+        return PacketEncoder.encode_fixed_header(
+            PacketType.UNSUBSCRIBE, MQTTProtocol.UNSUBSCRIBE_FLAGS, len(body)
+        ) + body
+
+    @staticmethod
+    def _encode_disconnect(packet: DisconnectPacket, protocol_version: int) -> bytes:
+        """Encodes a DISCONNECT packet, with an MQTT 5.0 reason code and properties if set."""
+        if protocol_version < MQTTProtocol.VERSION_5_0 or (
+            not packet.reason_code and packet.properties is None
+        ):
+            return DISCONNECT_PACKET
+        body = bytes((packet.reason_code,))
+        if packet.properties is not None:
+            body += encode_properties(packet.properties)
+        return PacketEncoder.encode_fixed_header(PacketType.DISCONNECT, 0, len(body)) + body
 
     @staticmethod
     def encode_fixed_header(packet_type: PacketType, flags: int, remaining_length: int) -> bytes:
@@ -56,7 +205,7 @@ class PacketEncoder:
         return bytes([byte1] + remaining_bytes)
 
     @staticmethod
-    def _encode_connect(packet: ConnectPacket) -> bytes:
+    def _encode_connect(packet: ConnectPacket, protocol_version: int = MQTTProtocol.VERSION_3_1_1) -> bytes:
         """Encodes a CONNECT packet with client identification, protocol version, and optional authentication."""
         # Variable header
         variable_header = []
@@ -87,11 +236,18 @@ class PacketEncoder:
             packet.keep_alive.to_bytes(MQTTProtocol.KEEP_ALIVE_SIZE, MQTTProtocol.BYTE_ORDER)
         )
         
+        # The version of the CONNECT itself decides its layout
+        is_v5 = packet.protocol_version >= MQTTProtocol.VERSION_5_0
+        if is_v5:
+            variable_header.extend(encode_properties(packet.properties))
+        
         # Payload
         payload = []
         payload.extend(PacketEncoder.encode_string(packet.client_id))
         
         if packet.will_topic is not None:
+            if is_v5:
+                payload.extend(encode_properties(packet.will_properties))
             payload.extend(PacketEncoder.encode_string(packet.will_topic))
             payload.extend(PacketEncoder.encode_bytes(packet.will_message))
             
@@ -112,36 +268,27 @@ class PacketEncoder:
         return fixed_header + variable_header_and_payload
 
     @staticmethod
-    def _encode_publish(packet: PublishPacket) -> bytes:
+    def _encode_publish(packet: PublishPacket, protocol_version: int = MQTTProtocol.VERSION_3_1_1) -> bytes:
         """Encodes a PUBLISH packet containing the topic, payload, and quality of service settings."""
-        # Calculate flags
-        flags = 0
-        if packet.dup: # Duplicate delivery flag
-            flags |= MQTTProtocol.PUBLISH_DUP_FLAG
-        flags |= (packet.qos.value << MQTTProtocol.PUBLISH_QOS_SHIFT)
-        if packet.retain:
-            flags |= MQTTProtocol.PUBLISH_RETAIN_FLAG
-            
-        # Variable header
-        variable_header = []
-        variable_header.extend(PacketEncoder.encode_string(packet.topic)) # Encodes the topic string    
-        
-        if packet.qos > QualityOfService.AT_MOST_ONCE:
-            if packet.packet_id is None: # Packet ID required for QoS > 0
-                raise ProtocolError("Packet ID required for QoS > 0")
-            variable_header.extend(
-                packet.packet_id.to_bytes(MQTTProtocol.PACKET_ID_SIZE, MQTTProtocol.BYTE_ORDER)
-            )
-            
-        # Combine all parts
-        variable_header_and_payload = bytes(variable_header) + packet.payload
-        fixed_header = PacketEncoder.encode_fixed_header( 
-            PacketType.PUBLISH,
-            flags,
-            len(variable_header_and_payload)
-        )
-        
-        return fixed_header + variable_header_and_payload
+        # Joining the buffers copies the payload exactly once
+        return b"".join(PacketEncoder.encode_publish_buffers(packet, protocol_version))
+
+    @staticmethod
+    def encode_publish_buffers(
+        packet: PublishPacket, protocol_version: int = MQTTProtocol.VERSION_3_1_1
+    ) -> List[Buffer]:
+        """Encodes a PUBLISH packet as a list of buffers for writelines/sendmsg, without copying the payload."""
+        return PublishTemplate(
+            packet.topic, packet.payload, packet.qos, packet.retain, packet.dup,
+            protocol_version=protocol_version,
+            properties=packet.properties,
+            topic_alias=packet.topic_alias
+        ).buffers(packet.packet_id)
+
+    @staticmethod
+    def encode_topic(topic: str) -> bytes:
+        """Returns the length-prefixed encoding of a topic, cached per topic string."""
+        return _encode_topic_cached(topic)
 
     @staticmethod
     def encode_string(string: str) -> bytes:
@@ -158,4 +305,95 @@ class PacketEncoder:
     def encode_bytes(data: bytes) -> bytes:
         """Encodes a byte array into MQTT format with a 2-byte length prefix followed by the raw data."""
         length = len(data)
-        return length.to_bytes(MQTTProtocol.LENGTH_FIELD_SIZE, MQTTProtocol.BYTE_ORDER) + data
\ No newline at end of file
+        return length.to_bytes(MQTTProtocol.LENGTH_FIELD_SIZE, MQTTProtocol.BYTE_ORDER) + data
+
+
+_encode_topic_cached = lru_cache(maxsize=TOPIC_CACHE_SIZE)(PacketEncoder.encode_string)
+
+# Encoder for each packet class, replacing an isinstance chain in encode_packet
+# Each takes the packet and the protocol version of the connection.
+_ENCODERS: Dict[Type[MQTTPacket], Callable[[MQTTPacket, int], bytes]] = {
+    ConnectPacket: PacketEncoder._encode_connect,
+    ConnAckPacket: PacketEncoder._encode_connack,
+    PublishPacket: PacketEncoder._encode_publish,
+    PubAckPacket: PacketEncoder._encode_ack,
+    PubRecPacket: PacketEncoder._encode_ack,
+    PubRelPacket: PacketEncoder._encode_ack,
+    PubCompPacket: PacketEncoder._encode_ack,
+    SubscribePacket: PacketEncoder._encode_subscribe,
+    SubAckPacket: PacketEncoder._encode_suback,
+    UnsubscribePacket: PacketEncoder._encode_unsubscribe,
+    UnsubAckPacket: PacketEncoder._encode_unsuback,
+    PingReqPacket: lambda packet, version: PINGREQ_PACKET,
+    PingRespPacket: lambda packet, version: PINGRESP_PACKET,
+    DisconnectPacket: PacketEncoder._encode_disconnect,
+}
+
+
+class PublishTemplate:
+    """
+    A PUBLISH packet encoded once and emitted per recipient as a list of buffers.
+
+    The fixed header and length-prefixed topic are built once per template (the topic
+    encoding itself is cached across templates) and the payload is shared by reference,
+    so sending the same message to N subscribers costs N small header writes rather than
+    N payload copies. Only the packet ID differs between recipients at QoS > 0.
+
+    For MQTT 5.0 the property block, including an optional per-connection topic alias,
+    is encoded once as well; a forwarded block that was never read is copied verbatim.
+    With a topic alias the topic may be empty, once the alias is known to the receiver.
+    """
+    __slots__ = ('qos', 'header', 'property_block', 'payload')
+
+    def __init__(
+        self,
+        topic: str,
+        payload: Buffer,
+        qos: QualityOfService = QualityOfService.AT_MOST_ONCE,
+        retain: bool = False,
+        dup: bool = False,
+        protocol_version: int = MQTTProtocol.VERSION_3_1_1,
+        properties: Optional[Properties] = None,
+        topic_alias: Optional[int] = None
+    ):
+        flags = qos << MQTTProtocol.PUBLISH_QOS_SHIFT
+        if dup: # Duplicate delivery flag
+            flags |= MQTTProtocol.PUBLISH_DUP_FLAG
+        if retain:
+            flags |= MQTTProtocol.PUBLISH_RETAIN_FLAG
+
+        property_block = b""
+        if protocol_version >= MQTTProtocol.VERSION_5_0:
+            alias = b"" if topic_alias is None else encode_property(PropertyId.TOPIC_ALIAS, topic_alias)
+            property_block = encode_properties(properties, alias)
+
+        topic_header = _encode_topic_cached(topic)
+        remaining_length = len(topic_header) + len(property_block) + len(payload)
+        if qos > QualityOfService.AT_MOST_ONCE:
+            remaining_length += MQTTProtocol.PACKET_ID_SIZE
+
+        self.qos = qos
+        # Fixed header and topic joined once; the packet ID (if any) follows per recipient
+        self.header = PacketEncoder.encode_fixed_header(
+            PacketType.PUBLISH, flags, remaining_length
+        ) + topic_header
+        self.property_block = property_block
+        if qos == QualityOfService.AT_MOST_ONCE:
+            self.header += property_block
+        self.payload = payload
+
+    def buffers(self, packet_id: Optional[int] = None) -> List[Buffer]:
+        """Returns the buffers making up the packet for one recipient."""
+        if self.qos == QualityOfService.AT_MOST_ONCE:
+            return [self.header, self.payload]
+        if packet_id is None: # Packet ID required for QoS > 0
+            raise ProtocolError("Packet ID required for QoS > 0")
+        return [
+            self.header,
+            packet_id.to_bytes(MQTTProtocol.PACKET_ID_SIZE, MQTTProtocol.BYTE_ORDER) + self.property_block,
+            self.payload
+        ]
+
+    def to_bytes(self, packet_id: Optional[int] = None) -> bytes:
+        """Returns the packet for one recipient as a single bytes object."""
+        return b"".join(self.buffers(packet_id))
@@ -0,0 +1,246 @@
+from array import array
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from mqtt_common.models.constants import MQTTProtocol, PacketType, QualityOfService
+from mqtt_common.models.errors import ProtocolError, ValidationError
+from mqtt_common.models.message import Message
+from .encoder import PacketEncoder
+from .packet import MQTTPacket, PublishPacket, PubAckPacket, PubRecPacket, PubCompPacket
+
+_WORD_SHIFT = 6
+_WORD_BITS = 1 << _WORD_SHIFT # IDs per bitmap word
+_WORD_MASK = _WORD_BITS - 1
+_FULL_WORD = (1 << _WORD_BITS) - 1
+
+
+class PacketIdAllocator:
+    """
+    Packet IDs in use on one session, as a bitmap of 64-bit words: bit (n - 1) % 64 of
+    word (n - 1) // 64 is set while ID n is taken.
+
+    allocate() returns the lowest free ID. A cursor points at the lowest word that may
+    have a clear bit, so allocation starts there instead of at ID 1 and skips full words;
+    release() moves the cursor back when it frees a lower ID. Every operation touches one
+    machine-word-sized integer rather than the whole bitmap, so its cost does not grow
+    with the number of IDs in flight. The word array only grows as far as the highest ID
+    in use: a window of a few hundred messages takes a few dozen bytes.
+    """
+    __slots__ = ('_words', '_cursor', 'in_use')
+
+    def __init__(self):
+        self._words = array('Q') # Bitmap words, grown on demand
+        self._cursor = 0 # Index of the lowest word that may have a free ID
+        self.in_use = 0 # IDs currently allocated
+
+    def allocate(self) -> int:
+        """Takes the lowest free packet ID."""
+        words = self._words
+        index = self._cursor
+        count = len(words)
+        while index < count and words[index] == _FULL_WORD:
+            index += 1
+        if index == count:
+            words.append(0) # The last word never fills up: its top bit would be ID 65536
+        self._cursor = index
+        word = words[index]
+        lowest_free = ~word & (word + 1)
+        packet_id = (index << _WORD_SHIFT) + lowest_free.bit_length()
+        if packet_id > MQTTProtocol.MAX_PACKET_ID:
+            raise ProtocolError("No packet identifier available")
+        words[index] = word | lowest_free
+        self.in_use += 1
+        return packet_id
+
+    def take(self, packet_id: int) -> bool:
+        """Marks a given packet ID as in use and returns False if it already was."""
+        if not 0 < packet_id <= MQTTProtocol.MAX_PACKET_ID:
+            raise ProtocolError(f"Invalid packet identifier: {packet_id}")
+        index = (packet_id - 1) >> _WORD_SHIFT
+        words = self._words
+        if index >= len(words):
+            words.extend([0] * (index + 1 - len(words)))
+        word = words[index]
+        mask = 1 << ((packet_id - 1) & _WORD_MASK)
+        if word & mask:
+            return False
+        words[index] = word | mask
+        self.in_use += 1
+        return True
+
+    def release(self, packet_id: int) -> bool:
+        """Frees a packet ID and returns whether it was in use."""
+        if not 0 < packet_id <= MQTTProtocol.MAX_PACKET_ID:
+            raise ProtocolError(f"Invalid packet identifier: {packet_id}")
+        index = (packet_id - 1) >> _WORD_SHIFT
+        words = self._words
+        mask = 1 << ((packet_id - 1) & _WORD_MASK)
+        if index >= len(words) or not words[index] & mask:
+            return False
+        words[index] ^= mask
+        self.in_use -= 1
+        if index < self._cursor:
+            self._cursor = index
+        return True
+
+    def __contains__(self, packet_id: int) -> bool:
+        index = (packet_id - 1) >> _WORD_SHIFT
+        words = self._words
+        return 0 <= index < len(words) and bool(words[index] >> ((packet_id - 1) & _WORD_MASK) & 1)
+
+
+class OutboundFlow:
+    """
+    QoS 1 and 2 messages sent on one session, waiting to be acknowledged by the peer.
+
+    Up to receive_maximum messages are in flight at once (the peer's MQTT 5.0 Receive
+    Maximum); further messages wait in order and enter the window as acknowledgements
+    free it, so publishing is pipelined instead of stop-and-wait. A QoS 2 message leaves
+    the window on PUBCOMP; after PUBREC only its packet ID is kept, since PUBREL is all
+    that is resent from then on.
+
+    acknowledge() takes every acknowledgement decoded from one read and refills the
+    window once for the whole batch.
+    """
+    __slots__ = ('receive_maximum', 'ids', '_inflight', '_pending', 'completed', 'unexpected')
+
+    def __init__(self, receive_maximum: int = MQTTProtocol.DEFAULT_RECEIVE_MAXIMUM):
+        if not 0 < receive_maximum <= MQTTProtocol.MAX_PACKET_ID:
+            raise ValidationError(f"Invalid receive maximum: {receive_maximum}")
+        self.receive_maximum = receive_maximum
+        self.ids = PacketIdAllocator()
+        # Messages in flight by packet ID, in sending order; None once PUBREC has been received
+        self._inflight: Dict[int, Optional[Message]] = {}
+        self._pending: Deque[Message] = deque() # Messages waiting for room in the window
+        self.completed = 0 # Messages fully acknowledged
+        self.unexpected = 0 # Acknowledgements for packet IDs not in flight, ignored
+
+    @property
+    def inflight(self) -> int:
+        """Messages sent and not yet fully acknowledged."""
+        return len(self._inflight)
+
+    @property
+    def pending(self) -> int:
+        """Messages waiting for room in the window."""
+        return len(self._pending)
+
+    def send(self, message: Message) -> Optional[int]:
+        """
+        Enters a QoS 1 or 2 message in the window and returns the packet ID to send it with,
+        or None if the window is full and the message has been queued behind it.
+        """
+        if message.qos == QualityOfService.AT_MOST_ONCE:
+            raise ValidationError("QoS 0 messages are not acknowledged")
+        if self._pending or len(self._inflight) >= self.receive_maximum:
+            self._pending.append(message)
+            return None
+        packet_id = self.ids.allocate()
+        self._inflight[packet_id] = message
+        return packet_id
+
+    def acknowledge(self, packets: Iterable[MQTTPacket]) -> Tuple[List[Tuple[int, Message]], List[int]]:
+        """
+        Applies a batch of PUBACK, PUBREC and PUBCOMP packets.
+
+        Returns the messages that entered the window, with their packet IDs, and the packet
+        IDs to send PUBREL for. Acknowledgements for IDs not in flight are counted and
+        ignored; one of the wrong type for its message raises ProtocolError.
+        """
+        inflight = self._inflight
+        release = self.ids.release
+        pubrel: List[int] = []
+        for packet in packets:
+            packet_type = type(packet)
+            packet_id = packet.packet_id
+            if packet_id not in inflight:
+                self.unexpected += 1
+                continue
+            message = inflight[packet_id]
+            if packet_type is PubAckPacket:
+                if message is None or message.qos != QualityOfService.AT_LEAST_ONCE:
+                    raise ProtocolError(f"PUBACK for a QoS 2 message: {packet_id}")
+            elif packet_type is PubRecPacket:
+                if message is None:
+                    pubrel.append(packet_id) # Repeated PUBREC: our PUBREL was lost
+                    continue
+                if message.qos != QualityOfService.EXACTLY_ONCE:
+                    raise ProtocolError(f"PUBREC for a QoS 1 message: {packet_id}")
+                inflight[packet_id] = None
+                pubrel.append(packet_id)
+                continue
+            elif packet_type is PubCompPacket:
+                if message is not None:
+                    raise ProtocolError(f"PUBCOMP before PUBREC: {packet_id}")
+            else:
+                raise ProtocolError(f"Not a publish acknowledgement: {packet.packet_type!r}")
+            del inflight[packet_id]
+            release(packet_id)
+            self.completed += 1
+        return self._fill(), pubrel
+
+    def _fill(self) -> List[Tuple[int, Message]]:
+        """Moves waiting messages into the window while there is room."""
+        pending = self._pending
+        inflight = self._inflight
+        released: List[Tuple[int, Message]] = []
+        while pending and len(inflight) < self.receive_maximum:
+            message = pending.popleft()
+            packet_id = self.ids.allocate()
+            inflight[packet_id] = message
+            released.append((packet_id, message))
+        return released
+
+    def unacknowledged(self) -> Iterator[Tuple[int, Optional[Message]]]:
+        """
+        Yields the messages in flight in sending order, for resending with the DUP flag
+        when the session resumes; the message is None where a PUBREL is to be resent.
+        """
+        return iter(list(self._inflight.items()))
+
+
+class InboundFlow:
+    """
+    QoS 1 and 2 messages received on one session, and the acknowledgements owed for them.
+
+    QoS 2 duplicate detection keeps one bit per packet ID between PUBLISH and PUBREL,
+    in the same kind of bitmap as PacketIdAllocator, rather than the messages themselves.
+    Acknowledgements are collected and returned together by flush(), so the acks for
+    every PUBLISH decoded from one read go out in a single write.
+    """
+    __slots__ = ('_received', '_acks', 'duplicates')
+
+    def __init__(self):
+        self._received = PacketIdAllocator() # QoS 2 packet IDs awaiting PUBREL
+        self._acks: List[bytes] = []
+        self.duplicates = 0 # QoS 2 retransmissions not delivered again
+
+    @property
+    def pending_acks(self) -> int:
+        """Acknowledgements waiting for flush()."""
+        return len(self._acks)
+
+    def receive(self, packet: PublishPacket) -> bool:
+        """Records a PUBLISH, queues its acknowledgement and returns whether to deliver it."""
+        qos = packet.qos
+        if qos == QualityOfService.AT_MOST_ONCE:
+            return True
+        packet_id = packet.packet_id
+        if qos == QualityOfService.AT_LEAST_ONCE:
+            self._acks.append(PacketEncoder.encode_ack(PacketType.PUBACK, packet_id))
+            return True
+        self._acks.append(PacketEncoder.encode_ack(PacketType.PUBREC, packet_id))
+        if not self._received.take(packet_id):
+            self.duplicates += 1
+            return False
+        return True
+
+    def release(self, packet_id: int) -> None:
+        """Handles a PUBREL: forgets the packet ID and queues the PUBCOMP."""
+        self._received.release(packet_id)
+        self._acks.append(PacketEncoder.encode_ack(PacketType.PUBCOMP, packet_id))
+
+    def flush(self) -> bytes:
+        """Returns the queued acknowledgements as one buffer and clears them."""
+        acks = b"".join(self._acks)
+        self._acks.clear()
+        return acks
@@ -1,9 +1,11 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple, Union
 from mqtt_common.models.constants import (
     PacketType, QualityOfService, ConnectReturnCode, MQTTProtocol
 )
 from mqtt_common.models.errors import ValidationError, ProtocolError
+from mqtt_common.models.message import Message
+from .properties import Properties
 
 
 @dataclass
@@ -27,6 +29,9 @@ class ConnectPacket(MQTTPacket):
     will_retain: bool = False
     username: Optional[str] = None
     password: Optional[bytes] = None
+    properties: Optional[Properties] = None # MQTT 5.0 only
+    will_properties: Optional[Properties] = None # MQTT 5.0 only
+    packet_type: PacketType = PacketType.CONNECT
 
     def validate(self) -> None:
         """Validates the CONNECT packet fields according to MQTT protocol rules, checking client ID, QoS, and will message settings."""
@@ -42,23 +47,146 @@ class ConnAckPacket(MQTTPacket):
     """Represents an MQTT CONNACK packet sent by the broker in response to a client's CONNECT request."""
     session_present: bool = False
     return_code: ConnectReturnCode = ConnectReturnCode.ACCEPTED
+    properties: Optional[Properties] = None # MQTT 5.0 only
+    packet_type: PacketType = PacketType.CONNACK
 
 @dataclass
 class PublishPacket(MQTTPacket):
     """Represents an MQTT PUBLISH packet used to distribute messages between clients through the broker."""
-    topic: str
-    payload: bytes
+    topic: str = ""
+    payload: Union[bytes, memoryview] = b"" # A view into the receive buffer until detached
     packet_id: Optional[int] = None
     qos: QualityOfService = QualityOfService.AT_MOST_ONCE
     retain: bool = False
     dup: bool = False
+    properties: Optional[Properties] = None # MQTT 5.0 only, never includes the topic alias
+    topic_alias: Optional[int] = None # MQTT 5.0 topic alias on the wire for this connection
     packet_type: PacketType = PacketType.PUBLISH
 
     def validate(self) -> None:
         """Validates the PUBLISH packet fields, ensuring topic is present, QoS is valid, and packet ID is included when required."""
-        if not self.topic:
+        if not self.topic and self.topic_alias is None:
             raise ValidationError("Topic cannot be empty")
         if self.qos not in QualityOfService:
             raise ValidationError(f"Invalid QoS level: {self.qos}")
         if self.qos > QualityOfService.AT_MOST_ONCE and self.packet_id is None:
-            raise ValidationError("Packet ID is required for QoS > 0")
\ No newline at end of file
+            raise ValidationError("Packet ID is required for QoS > 0")
+
+    def detach(self) -> 'PublishPacket':
+        """Copies a payload borrowed from the receive buffer into bytes owned by this packet and returns the packet."""
+        if isinstance(self.payload, memoryview):
+            self.payload = self.payload.tobytes()
+        if self.properties is not None:
+            self.properties.detach()
+        return self
+
+    def to_message(self) -> Message:
+        """Creates the Message for this parsed PUBLISH without validating it again; detach() first if the message outlives the receive buffer."""
+        return Message.trusted(
+            topic=self.topic,
+            payload=self.payload,
+            qos=int(self.qos),
+            retain=self.retain,
+            message_id=self.packet_id,
+            properties=self.properties.to_dict() if self.properties else None
+        )
+
+@dataclass
+class PubAckPacket(MQTTPacket):
+    """Represents an MQTT PUBACK packet acknowledging a QoS 1 PUBLISH."""
+    packet_id: int = 0
+    reason_code: int = 0 # MQTT 5.0 only
+    properties: Optional[Properties] = None # MQTT 5.0 only
+    packet_type: PacketType = PacketType.PUBACK
+
+@dataclass
+class PubRecPacket(MQTTPacket):
+    """Represents an MQTT PUBREC packet, the first acknowledgement of a QoS 2 PUBLISH."""
+    packet_id: int = 0
+    reason_code: int = 0 # MQTT 5.0 only
+    properties: Optional[Properties] = None # MQTT 5.0 only
+    packet_type: PacketType = PacketType.PUBREC
+
+@dataclass
+class PubRelPacket(MQTTPacket):
+    """Represents an MQTT PUBREL packet releasing a QoS 2 message after PUBREC."""
+    packet_id: int = 0
+    reason_code: int = 0 # MQTT 5.0 only
+    properties: Optional[Properties] = None # MQTT 5.0 only
+    packet_type: PacketType = PacketType.PUBREL
+    flags: int = MQTTProtocol.PUBREL_FLAGS
+
+@dataclass
+class PubCompPacket(MQTTPacket):
+    """Represents an MQTT PUBCOMP packet completing a QoS 2 exchange."""
+    packet_id: int = 0
+    reason_code: int = 0 # MQTT 5.0 only
+    properties: Optional[Properties] = None # MQTT 5.0 only
+    packet_type: PacketType = PacketType.PUBCOMP
+
+@dataclass
+class SubscribePacket(MQTTPacket):
+    """Represents an MQTT SUBSCRIBE packet carrying one or more topic filters and their requested QoS."""
+    packet_id: int = 0
+    subscriptions: List[Tuple[str, QualityOfService]] = field(default_factory=list)
+    subscription_options: List[int] = field(default_factory=list) # MQTT 5.0 options byte per filter
+    properties: Optional[Properties] = None # MQTT 5.0 only
+    packet_type: PacketType = PacketType.SUBSCRIBE
+    flags: int = MQTTProtocol.SUBSCRIBE_FLAGS
+
+    def validate(self) -> None:
+        """Validates the SUBSCRIBE packet, ensuring it carries at least one non-empty topic filter."""
+        if not self.subscriptions:
+            raise ValidationError("SUBSCRIBE must contain at least one topic filter")
+        for topic_filter, qos in self.subscriptions:
+            if not topic_filter:
+                raise ValidationError("Topic filter cannot be empty")
+            if qos not in QualityOfService:
+                raise ValidationError(f"Invalid QoS level: {qos}")
+
+@dataclass
+class SubAckPacket(MQTTPacket):
+    """Represents an MQTT SUBACK packet with one return code (granted QoS or failure reason) per requested filter."""
+    packet_id: int = 0
+    return_codes: List[int] = field(default_factory=list)
+    properties: Optional[Properties] = None # MQTT 5.0 only
+    packet_type: PacketType = PacketType.SUBACK
+
+@dataclass
+class UnsubscribePacket(MQTTPacket):
+    """Represents an MQTT UNSUBSCRIBE packet carrying the topic filters to remove."""
+    packet_id: int = 0
+    topics: List[str] = field(default_factory=list)
+    properties: Optional[Properties] = None # MQTT 5.0 only
+    packet_type: PacketType = PacketType.UNSUBSCRIBE
+    flags: int = MQTTProtocol.UNSUBSCRIBE_FLAGS
+
+    def validate(self) -> None:
+        """Validates the UNSUBSCRIBE packet, ensuring it carries at least one topic filter."""
+        if not self.topics:
+            raise ValidationError("UNSUBSCRIBE must contain at least one topic filter")
+
+@dataclass
+class UnsubAckPacket(MQTTPacket):
+    """Represents an MQTT UNSUBACK packet acknowledging an UNSUBSCRIBE."""
+    packet_id: int = 0
+    reason_codes: List[int] = field(default_factory=list) # MQTT 5.0 only
+    properties: Optional[Properties] = None # MQTT 5.0 only
+    packet_type: PacketType = PacketType.UNSUBACK
+
+@dataclass
+class PingReqPacket(MQTTPacket):
+    """Represents an MQTT PINGREQ packet sent by clients to keep the connection alive."""
+    packet_type: PacketType = PacketType.PINGREQ
+
+@dataclass
+class PingRespPacket(MQTTPacket):
+    """Represents an MQTT PINGRESP packet answering a PINGREQ."""
+    packet_type: PacketType = PacketType.PINGRESP
+
+@dataclass
+class DisconnectPacket(MQTTPacket):
+    """Represents an MQTT DISCONNECT packet sent by a client before closing the connection."""
+    reason_code: int = 0 # MQTT 5.0 only
+    properties: Optional[Properties] = None # MQTT 5.0 only
+    packet_type: PacketType = PacketType.DISCONNECT
@@ -1,7 +1,22 @@
-from typing import Tuple
-from mqtt_common.models.constants import PacketType, QualityOfService, MQTTProtocol
+from typing import Callable, Dict, Tuple, Union
+from mqtt_common.models.constants import (
+    PacketType, QualityOfService, ConnectReturnCode, MQTTProtocol
+)
 from mqtt_common.models.errors import ProtocolError
-from .packet import MQTTPacket, ConnectPacket, ConnAckPacket, PublishPacket
+from mqtt_common.models.constants import PropertyId
+from .packet import (
+    MQTTPacket, ConnectPacket, ConnAckPacket, PublishPacket,
+    PubAckPacket, PubRecPacket, PubRelPacket, PubCompPacket,
+    SubscribePacket, SubAckPacket, UnsubscribePacket, UnsubAckPacket,
+    PingReqPacket, PingRespPacket, DisconnectPacket
+)
+from .properties import split_properties
+
+# Any buffer the synchronous parser accepts; slices of a memoryview are not copied
+Buffer = Union[bytes, bytearray, memoryview]
+
+# QoS levels indexed by the 2-bit QoS field, avoiding an enum lookup per PUBLISH
+_QOS_LEVELS = tuple(QualityOfService)
 
 async def decode_packet(data: bytes) -> 'MQTTPacket':
     """Decodes raw bytes into an MQTT packet object."""
@@ -17,14 +32,83 @@ async def decode(data: bytes) -> 'MQTTPacket':
     return await decode_packet(data)
 
 class PacketParser:
-    """Handles parsing of MQTT packets from raw bytes into structured packet objects."""
+    """
+    Handles parsing of MQTT packets from raw bytes into structured packet objects.
+
+    The *_sync methods do the actual work without creating coroutines and operate on
+    memoryviews, so a PUBLISH payload decoded by parse_packet_sync or parse_body_sync is
+    a view into the caller's buffer rather than a copy (see PublishPacket.detach). The
+    async methods are kept for compatibility and always return packets owning their data.
+
+    Except for CONNECT, which carries its own version, the wire format depends on the
+    protocol version negotiated for the connection, passed as protocol_version. MQTT 5.0
+    property blocks are sliced out undecoded (see Properties).
+    """
+
     @staticmethod
-    async def parse_packet(data: bytes) -> MQTTPacket:
+    async def decode(data: bytes) -> MQTTPacket:
+        """Static method for packet decoding."""
+        return await PacketParser.parse_packet(data)
+
+    @staticmethod
+    async def parse_packet(
+        data: bytes, protocol_version: int = MQTTProtocol.VERSION_3_1_1
+    ) -> MQTTPacket:
         """Parses a complete MQTT packet from bytes and returns the appropriate packet object based on type."""
+        return PacketParser._owned(PacketParser.parse_packet_sync(data, protocol_version))
+
+    @staticmethod
+    async def parse_body(
+        packet_type: PacketType, flags: int, data: bytes,
+        protocol_version: int = MQTTProtocol.VERSION_3_1_1
+    ) -> MQTTPacket:
+        """Parses the variable header and payload of a packet whose fixed header has already been decoded."""
+        return PacketParser._owned(
+            PacketParser.parse_body_sync(packet_type, flags, data, protocol_version)
+        )
+
+    @staticmethod
+    async def parse_fixed_header(data: bytes) -> Tuple[PacketType, int, int]:
+        """Parses the fixed header of an MQTT packet, extracting packet type, flags, and remaining length."""
+        return PacketParser.parse_fixed_header_sync(data)
+
+    @staticmethod
+    async def _parse_connect(data: bytes) -> ConnectPacket:
+        """Parses a CONNECT packet, extracting protocol information, client details, and optional will message settings."""
+        return PacketParser._parse_connect_sync(memoryview(data))
+
+    @staticmethod
+    async def parse_string(data: bytes, offset: int) -> Tuple[str, int]:
+        """Parses a length-prefixed UTF-8 string from the packet data and returns the string and new offset."""
+        return PacketParser.parse_string_sync(data, offset)
+
+    @staticmethod
+    async def _parse_publish(data: bytes, flags: int) -> PublishPacket:
+        """Parses a PUBLISH packet, extracting topic, payload, and message delivery settings including QoS level."""
+        return PacketParser._parse_publish_sync(memoryview(data), flags).detach()
+
+    @staticmethod
+    async def parse_bytes(data: bytes, offset: int) -> Tuple[bytes, int]:
+        """Parses a length-prefixed byte array from the packet data and returns the bytes and new offset."""
+        value, offset = PacketParser.parse_bytes_sync(data, offset)
+        return bytes(value), offset
+
+    @staticmethod
+    def _owned(packet: MQTTPacket) -> MQTTPacket:
+        """Detaches a borrowed PUBLISH payload so the packet no longer references the receive buffer."""
+        if isinstance(packet, PublishPacket):
+            packet.detach()
+        return packet
+
+    @staticmethod
+    def parse_packet_sync(
+        data: Buffer, protocol_version: int = MQTTProtocol.VERSION_3_1_1
+    ) -> MQTTPacket:
+        """Synchronously parses a complete MQTT packet; a PUBLISH payload is returned as a view into data."""
         if len(data) < MQTTProtocol.MIN_PACKET_LENGTH:
             raise ProtocolError("Packet too short")
             
-        packet_type, flags, remaining_length = await PacketParser.parse_fixed_header(data)
+        packet_type, flags, remaining_length = PacketParser.parse_fixed_header_sync(data)
         
         header_length = PacketParser._get_header_length(data)
         total_length = header_length + remaining_length
@@ -32,18 +116,164 @@ class PacketParser:
         if len(data) < total_length:
             raise ProtocolError("Incomplete packet")
             
-        packet_data = data[header_length:total_length]
-        
-        if packet_type == PacketType.CONNECT:
-            return await PacketParser._parse_connect(packet_data)
-        elif packet_type == PacketType.PUBLISH:
-            return await PacketParser._parse_publish(packet_data, flags)
+        packet_data = memoryview(data)[header_length:total_length]
         
-        return MQTTPacket(packet_type=packet_type, flags=flags, remaining_length=remaining_length)
+        return PacketParser.parse_body_sync(packet_type, flags, packet_data, protocol_version)
 
     @staticmethod
-    async def parse_fixed_header(data: bytes) -> Tuple[PacketType, int, int]:
-        """Parses the fixed header of an MQTT packet, extracting packet type, flags, and remaining length."""
+    def parse_body_sync(
+        packet_type: PacketType, flags: int, data: Buffer,
+        protocol_version: int = MQTTProtocol.VERSION_3_1_1
+    ) -> MQTTPacket:
+        """Synchronously parses a packet body; a PUBLISH payload is returned as a view into data."""
+        if packet_type == PacketType.PUBLISH:
+            return PacketParser._parse_publish_sync(memoryview(data), flags, protocol_version)
+        if flags != _REQUIRED_FLAGS.get(packet_type, 0):
+            raise ProtocolError(f"Invalid flags for {packet_type.name} packet")
+        return _BODY_PARSERS[packet_type](memoryview(data), protocol_version)
+
+    @staticmethod
+    def _parse_ack_sync(data: memoryview, packet_class: type, protocol_version: int) -> MQTTPacket:
+        """
+        Parses PUBACK, PUBREC, PUBREL and PUBCOMP: a packet ID, followed in MQTT 5.0 by
+        an optional reason code and optional properties.
+        """
+        length = len(data)
+        if length < MQTTProtocol.PACKET_ID_SIZE or (
+            length != MQTTProtocol.PACKET_ID_SIZE and protocol_version < MQTTProtocol.VERSION_5_0
+        ):
+            raise ProtocolError("Invalid acknowledgement packet")
+        packet = packet_class(packet_id=(data[0] << 8) | data[1])
+        if length > MQTTProtocol.PACKET_ID_SIZE:
+            packet.reason_code = data[MQTTProtocol.PACKET_ID_SIZE]
+            if length > MQTTProtocol.PACKET_ID_SIZE + 1:
+                packet.properties, _ = split_properties(data, MQTTProtocol.PACKET_ID_SIZE + 1)
+        return packet
+
+    @staticmethod
+    def _parse_connack_sync(data: memoryview, protocol_version: int) -> ConnAckPacket:
+        """Parses a CONNACK packet: acknowledge flags, the return code and, in MQTT 5.0, properties."""
+        if protocol_version >= MQTTProtocol.VERSION_5_0:
+            if len(data) < 3:
+                raise ProtocolError("Invalid CONNACK packet")
+            properties, _ = split_properties(data, 2)
+            return ConnAckPacket(
+                session_present=bool(data[0] & MQTTProtocol.CONNACK_SESSION_PRESENT_FLAG),
+                return_code=data[1], # An MQTT 5.0 reason code
+                properties=properties
+            )
+        if len(data) != 2:
+            raise ProtocolError("Invalid CONNACK packet")
+        try:
+            return_code = ConnectReturnCode(data[1])
+        except ValueError:
+            raise ProtocolError(f"Invalid CONNACK return code: {data[1]}")
+        return ConnAckPacket(
+            session_present=bool(data[0] & MQTTProtocol.CONNACK_SESSION_PRESENT_FLAG),
+            return_code=return_code
+        )
+
+    @staticmethod
+    def _parse_subscribe_sync(data: memoryview, protocol_version: int) -> SubscribePacket:
+        """Parses a SUBSCRIBE packet: packet ID, MQTT 5.0 properties, then topic filter and options pairs."""
+        if len(data) < MQTTProtocol.PACKET_ID_SIZE:
+            raise ProtocolError("Invalid SUBSCRIBE packet")
+        packet = SubscribePacket(packet_id=(data[0] << 8) | data[1])
+        offset = MQTTProtocol.PACKET_ID_SIZE
+        is_v5 = protocol_version >= MQTTProtocol.VERSION_5_0
+        if is_v5:
+            packet.properties, offset = split_properties(data, offset)
+        while offset < len(data):
+            topic_filter, offset = PacketParser.parse_string_sync(data, offset)
+            if offset >= len(data):
+                raise ProtocolError("Missing SUBSCRIBE options")
+            options = data[offset]
+            qos = options & MQTTProtocol.SUBSCRIBE_QOS_MASK
+            if qos > QualityOfService.EXACTLY_ONCE:
+                raise ProtocolError("Invalid QoS level")
+            packet.subscriptions.append((topic_filter, _QOS_LEVELS[qos]))
+            if is_v5:
+                packet.subscription_options.append(options)
+            offset += 1
+        if not packet.subscriptions:
+            raise ProtocolError("SUBSCRIBE must contain at least one topic filter")
+        return packet
+
+    @staticmethod
+    def _parse_suback_sync(data: memoryview, protocol_version: int) -> SubAckPacket:
+        """Parses a SUBACK packet: packet ID, MQTT 5.0 properties, then one return code per topic filter."""
+        if len(data) < MQTTProtocol.PACKET_ID_SIZE:
+            raise ProtocolError("Invalid SUBACK packet")
+        properties = None
+        offset = MQTTProtocol.PACKET_ID_SIZE
+        if protocol_version >= MQTTProtocol.VERSION_5_0:
+            properties, offset = split_properties(data, offset)
+        return SubAckPacket(
+            packet_id=(data[0] << 8) | data[1],
+            return_codes=list(data[offset:]),
+            properties=properties
+        )
+
+    @staticmethod
+    def _parse_unsubscribe_sync(data: memoryview, protocol_version: int) -> UnsubscribePacket:
+        """Parses an UNSUBSCRIBE packet: packet ID, MQTT 5.0 properties, then the topic filters to remove."""
+        if len(data) < MQTTProtocol.PACKET_ID_SIZE:
+            raise ProtocolError("Invalid UNSUBSCRIBE packet")
+        packet = UnsubscribePacket(packet_id=(data[0] << 8) | data[1])
+        offset = MQTTProtocol.PACKET_ID_SIZE
+        if protocol_version >= MQTTProtocol.VERSION_5_0:
+            packet.properties, offset = split_properties(data, offset)
+        while offset < len(data):
+            topic_filter, offset = PacketParser.parse_string_sync(data, offset)
+            packet.topics.append(topic_filter)
+        if not packet.topics:
+            raise ProtocolError("UNSUBSCRIBE must contain at least one topic filter")
+        return packet
+
+    @staticmethod
+    def _parse_unsuback_sync(data: memoryview, protocol_version: int) -> UnsubAckPacket:
+        """Parses an UNSUBACK packet: packet ID, followed in MQTT 5.0 by properties and reason codes."""
+        if protocol_version < MQTTProtocol.VERSION_5_0:
+            return PacketParser._parse_ack_sync(data, UnsubAckPacket, protocol_version)
+        if len(data) < MQTTProtocol.PACKET_ID_SIZE + 1:
+            raise ProtocolError("Invalid acknowledgement packet")
+        properties, offset = split_properties(data, MQTTProtocol.PACKET_ID_SIZE)
+        return UnsubAckPacket(
+            packet_id=(data[0] << 8) | data[1],
+            reason_codes=list(data[offset:]),
+            properties=properties
+        )
+
+    @staticmethod
+    def _parse_disconnect_sync(data: memoryview, protocol_version: int) -> DisconnectPacket:
+        """Parses a DISCONNECT packet, which in MQTT 5.0 may carry a reason code and properties."""
+        if protocol_version < MQTTProtocol.VERSION_5_0:
+            return PacketParser._parse_empty_sync(data, DisconnectPacket)
+        packet = DisconnectPacket()
+        if len(data):
+            packet.reason_code = data[0]
+            if len(data) > 1:
+                packet.properties, _ = split_properties(data, 1)
+        return packet
+
+    @staticmethod
+    def _parse_empty_sync(data: memoryview, packet_class: type) -> MQTTPacket:
+        """Parses a packet that has no variable header or payload."""
+        if len(data):
+            raise ProtocolError(f"Unexpected payload in {packet_class.__name__}")
+        return packet_class()
+
+    @staticmethod
+    def _get_header_length(data: Buffer) -> int:
+        """Returns the size of the fixed header: the first byte plus the variable-length remaining length field."""
+        index = MQTTProtocol.MIN_HEADER_LENGTH
+        while data[index] & MQTTProtocol.CONTINUATION_BIT:
+            index += 1
+        return index + 1
+
+    @staticmethod
+    def parse_fixed_header_sync(data: Buffer) -> Tuple[PacketType, int, int]:
+        """Synchronously parses the fixed header, returning packet type, flags, and remaining length."""
         if not data:
             raise ProtocolError("Empty packet")
             
@@ -76,37 +306,49 @@ class PacketParser:
         return packet_type, flags, remaining_length
 
     @staticmethod
-    async def _parse_connect(data: bytes) -> ConnectPacket:
-        """Parses a CONNECT packet, extracting protocol information, client details, and optional will message settings."""
+    def _parse_connect_sync(data: memoryview) -> ConnectPacket:
+        """Parses a CONNECT packet body; unlike PUBLISH, all fields are copied out of the buffer."""
         offset = 0
-        protocol_name, offset = await PacketParser.parse_string(data, offset)
+        protocol_name, offset = PacketParser.parse_string_sync(data, offset)
         
         if offset + MQTTProtocol.KEEP_ALIVE_SIZE >= len(data):
             raise ProtocolError("Invalid CONNECT packet")
             
         protocol_version = data[offset]
         connect_flags = data[offset + 1]
-        keep_alive = int.from_bytes(
-            data[offset + 2:offset + 2 + MQTTProtocol.KEEP_ALIVE_SIZE], 
-            MQTTProtocol.BYTE_ORDER
-        )
+        keep_alive = (data[offset + 2] << 8) | data[offset + 3]
         offset += 2 + MQTTProtocol.KEEP_ALIVE_SIZE
         
-        client_id, offset = await PacketParser.parse_string(data, offset)
+        # The CONNECT packet carries its own version, whatever the caller assumed
+        is_v5 = protocol_version >= MQTTProtocol.VERSION_5_0
+        properties = None
+        if is_v5:
+            properties, offset = split_properties(data, offset)
+            if properties is not None:
+                properties.detach()
+        
+        client_id, offset = PacketParser.parse_string_sync(data, offset)
         
         will_topic = None
         will_message = None
+        will_properties = None
         if connect_flags & MQTTProtocol.CONNECT_WILL_FLAG:
-            will_topic, offset = await PacketParser.parse_string(data, offset)
-            will_message, offset = await PacketParser.parse_bytes(data, offset)
+            if is_v5:
+                will_properties, offset = split_properties(data, offset)
+                if will_properties is not None:
+                    will_properties.detach()
+            will_topic, offset = PacketParser.parse_string_sync(data, offset)
+            will_message, offset = PacketParser.parse_bytes_sync(data, offset)
+            will_message = bytes(will_message)
             
         username = None
         if connect_flags & MQTTProtocol.CONNECT_USERNAME_FLAG:
-            username, offset = await PacketParser.parse_string(data, offset)
+            username, offset = PacketParser.parse_string_sync(data, offset)
             
         password = None
         if connect_flags & MQTTProtocol.CONNECT_PASSWORD_FLAG:
-            password, offset = await PacketParser.parse_bytes(data, offset)
+            password, offset = PacketParser.parse_bytes_sync(data, offset)
+            password = bytes(password)
             
         return ConnectPacket(
             protocol_name=protocol_name,
@@ -122,19 +364,18 @@ class PacketParser:
             ),
             will_retain=bool(connect_flags & MQTTProtocol.CONNECT_WILL_RETAIN_FLAG),
             username=username,
-            password=password
+            password=password,
+            properties=properties,
+            will_properties=will_properties
         )
 
     @staticmethod
-    async def parse_string(data: bytes, offset: int) -> Tuple[str, int]:
-        """Parses a length-prefixed UTF-8 string from the packet data and returns the string and new offset."""
+    def parse_string_sync(data: Buffer, offset: int) -> Tuple[str, int]:
+        """Synchronously parses a length-prefixed UTF-8 string, decoding it straight from the buffer."""
         if offset + MQTTProtocol.LENGTH_FIELD_SIZE > len(data):
             raise ProtocolError("Incomplete string length")
             
-        length = int.from_bytes(
-            data[offset:offset + MQTTProtocol.LENGTH_FIELD_SIZE], 
-            MQTTProtocol.BYTE_ORDER
-        )
+        length = (data[offset] << 8) | data[offset + 1]
         
         if length > MQTTProtocol.MAX_TOPIC_LENGTH:
             raise ProtocolError("String too long")
@@ -143,51 +384,72 @@ class PacketParser:
         if string_end > len(data):
             raise ProtocolError("Incomplete string data")
             
-        string = data[
-            offset + MQTTProtocol.LENGTH_FIELD_SIZE:string_end
-        ].decode(MQTTProtocol.STRING_ENCODING)
+        # str() decodes directly from a memoryview slice without an intermediate bytes copy
+        string = str(
+            data[offset + MQTTProtocol.LENGTH_FIELD_SIZE:string_end],
+            MQTTProtocol.STRING_ENCODING
+        )
         
         return string, string_end
     
     @staticmethod
-    async def _parse_publish(data: bytes, flags: int) -> PublishPacket:
-        """Parses a PUBLISH packet, extracting topic, payload, and message delivery settings including QoS level."""
-        offset = 0
-        topic, offset = await PacketParser.parse_string(data, offset)
+    def _parse_publish_sync(
+        data: memoryview, flags: int, protocol_version: int = MQTTProtocol.VERSION_3_1_1
+    ) -> PublishPacket:
+        """
+        Parses a PUBLISH packet body; the payload stays a view into data until detached.
+
+        In MQTT 5.0 the property block is sliced out undecoded. A topic alias is the only
+        property looked at: it is moved to PublishPacket.topic_alias, since aliases are
+        per connection and must not be forwarded (see InboundTopicAliases to resolve it).
+        """
+        end_of_data = len(data)
+        if end_of_data < MQTTProtocol.LENGTH_FIELD_SIZE:
+            raise ProtocolError("Incomplete string length")
+        topic_end = MQTTProtocol.LENGTH_FIELD_SIZE + ((data[0] << 8) | data[1])
+        if topic_end > end_of_data:
+            raise ProtocolError("Incomplete string data")
+        topic = str(data[MQTTProtocol.LENGTH_FIELD_SIZE:topic_end], MQTTProtocol.STRING_ENCODING)
+        offset = topic_end
         
         # Parse packet ID for QoS > 0
         qos = (flags & MQTTProtocol.PUBLISH_QOS_MASK) >> MQTTProtocol.PUBLISH_QOS_SHIFT
         packet_id = None
         if qos > QualityOfService.AT_MOST_ONCE.value:
-            if offset + MQTTProtocol.PACKET_ID_SIZE > len(data):
+            if qos > QualityOfService.EXACTLY_ONCE.value:
+                raise ProtocolError("Invalid QoS level")
+            if offset + MQTTProtocol.PACKET_ID_SIZE > end_of_data:
                 raise ProtocolError("Invalid PUBLISH packet")
-            packet_id = int.from_bytes(
-                data[offset:offset + MQTTProtocol.PACKET_ID_SIZE], 
-                MQTTProtocol.BYTE_ORDER
-            )
+            packet_id = (data[offset] << 8) | data[offset + 1]
             offset += MQTTProtocol.PACKET_ID_SIZE
             
-        payload = data[offset:]
-        
+        properties = None
+        topic_alias = None
+        if protocol_version >= MQTTProtocol.VERSION_5_0:
+            properties, offset = split_properties(data, offset)
+            if properties is not None:
+                topic_alias = properties.pop_raw(PropertyId.TOPIC_ALIAS)
+                if not properties:
+                    properties = None
+            
         return PublishPacket(
             topic=topic,
-            payload=payload,
+            payload=data[offset:],
             packet_id=packet_id,
-            qos=QualityOfService(qos),
+            qos=_QOS_LEVELS[qos],
             retain=bool(flags & MQTTProtocol.PUBLISH_RETAIN_FLAG),
-            dup=bool(flags & MQTTProtocol.PUBLISH_DUP_FLAG)
+            dup=bool(flags & MQTTProtocol.PUBLISH_DUP_FLAG),
+            properties=properties,
+            topic_alias=topic_alias
         )
     
     @staticmethod
-    async def parse_bytes(data: bytes, offset: int) -> Tuple[bytes, int]:
-        """Parses a length-prefixed byte array from the packet data and returns the bytes and new offset."""
+    def parse_bytes_sync(data: Buffer, offset: int) -> Tuple[Buffer, int]:
+        """Synchronously parses a length-prefixed byte array; the result is a slice of data (a view for memoryviews)."""
         if offset + MQTTProtocol.LENGTH_FIELD_SIZE > len(data):
             raise ProtocolError("Incomplete bytes length")
             
-        length = int.from_bytes(
-            data[offset:offset + MQTTProtocol.LENGTH_FIELD_SIZE], 
-            MQTTProtocol.BYTE_ORDER
-        )
+        length = (data[offset] << 8) | data[offset + 1]
         
         bytes_end = offset + MQTTProtocol.LENGTH_FIELD_SIZE + length
         if bytes_end > len(data):
@@ -196,4 +458,30 @@ class PacketParser:
         return (
             data[offset + MQTTProtocol.LENGTH_FIELD_SIZE:bytes_end], 
             bytes_end
-        )
\ No newline at end of file
+        )
+
+
+# Fixed header flags each packet type must carry; PUBLISH is parsed separately, all others must be 0
+_REQUIRED_FLAGS: Dict[PacketType, int] = {
+    PacketType.PUBREL: MQTTProtocol.PUBREL_FLAGS,
+    PacketType.SUBSCRIBE: MQTTProtocol.SUBSCRIBE_FLAGS,
+    PacketType.UNSUBSCRIBE: MQTTProtocol.UNSUBSCRIBE_FLAGS,
+}
+
+# Body parser for each packet type other than PUBLISH, replacing an if/elif chain in parse_body_sync.
+# Each takes the body and the protocol version of the connection.
+_BODY_PARSERS: Dict[PacketType, Callable[[memoryview, int], MQTTPacket]] = {
+    PacketType.CONNECT: lambda data, version: PacketParser._parse_connect_sync(data),
+    PacketType.CONNACK: PacketParser._parse_connack_sync,
+    PacketType.PUBACK: lambda data, version: PacketParser._parse_ack_sync(data, PubAckPacket, version),
+    PacketType.PUBREC: lambda data, version: PacketParser._parse_ack_sync(data, PubRecPacket, version),
+    PacketType.PUBREL: lambda data, version: PacketParser._parse_ack_sync(data, PubRelPacket, version),
+    PacketType.PUBCOMP: lambda data, version: PacketParser._parse_ack_sync(data, PubCompPacket, version),
+    PacketType.SUBSCRIBE: PacketParser._parse_subscribe_sync,
+    PacketType.SUBACK: PacketParser._parse_suback_sync,
+    PacketType.UNSUBSCRIBE: PacketParser._parse_unsubscribe_sync,
+    PacketType.UNSUBACK: PacketParser._parse_unsuback_sync,
+    PacketType.PINGREQ: lambda data, version: PacketParser._parse_empty_sync(data, PingReqPacket),
+    PacketType.PINGRESP: lambda data, version: PacketParser._parse_empty_sync(data, PingRespPacket),
+    PacketType.DISCONNECT: PacketParser._parse_disconnect_sync,
+}
@@ -0,0 +1,330 @@
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple, Union
+from mqtt_common.models.constants import PropertyId, MQTTProtocol
+from mqtt_common.models.errors import ProtocolError
+
+# Wire types of property values
+_BYTE = 0
+_TWO_BYTE_INT = 1
+_FOUR_BYTE_INT = 2
+_VARIABLE_INT = 3
+_UTF8_STRING = 4
+_BINARY = 5
+_STRING_PAIR = 6
+
+_PROPERTY_TYPES: Dict[int, int] = {
+    PropertyId.PAYLOAD_FORMAT_INDICATOR: _BYTE,
+    PropertyId.MESSAGE_EXPIRY_INTERVAL: _FOUR_BYTE_INT,
+    PropertyId.CONTENT_TYPE: _UTF8_STRING,
+    PropertyId.RESPONSE_TOPIC: _UTF8_STRING,
+    PropertyId.CORRELATION_DATA: _BINARY,
+    PropertyId.SUBSCRIPTION_IDENTIFIER: _VARIABLE_INT,
+    PropertyId.SESSION_EXPIRY_INTERVAL: _FOUR_BYTE_INT,
+    PropertyId.ASSIGNED_CLIENT_IDENTIFIER: _UTF8_STRING,
+    PropertyId.SERVER_KEEP_ALIVE: _TWO_BYTE_INT,
+    PropertyId.AUTHENTICATION_METHOD: _UTF8_STRING,
+    PropertyId.AUTHENTICATION_DATA: _BINARY,
+    PropertyId.REQUEST_PROBLEM_INFORMATION: _BYTE,
+    PropertyId.WILL_DELAY_INTERVAL: _FOUR_BYTE_INT,
+    PropertyId.REQUEST_RESPONSE_INFORMATION: _BYTE,
+    PropertyId.RESPONSE_INFORMATION: _UTF8_STRING,
+    PropertyId.SERVER_REFERENCE: _UTF8_STRING,
+    PropertyId.REASON_STRING: _UTF8_STRING,
+    PropertyId.RECEIVE_MAXIMUM: _TWO_BYTE_INT,
+    PropertyId.TOPIC_ALIAS_MAXIMUM: _TWO_BYTE_INT,
+    PropertyId.TOPIC_ALIAS: _TWO_BYTE_INT,
+    PropertyId.MAXIMUM_QOS: _BYTE,
+    PropertyId.RETAIN_AVAILABLE: _BYTE,
+    PropertyId.USER_PROPERTY: _STRING_PAIR,
+    PropertyId.MAXIMUM_PACKET_SIZE: _FOUR_BYTE_INT,
+    PropertyId.WILDCARD_SUBSCRIPTION_AVAILABLE: _BYTE,
+    PropertyId.SUBSCRIPTION_IDENTIFIER_AVAILABLE: _BYTE,
+    PropertyId.SHARED_SUBSCRIPTION_AVAILABLE: _BYTE,
+}
+
+# Properties allowed more than once in a block; their values are kept as lists
+_REPEATABLE = frozenset((PropertyId.USER_PROPERTY, PropertyId.SUBSCRIPTION_IDENTIFIER))
+
+_FIXED_SIZES = {_BYTE: 1, _TWO_BYTE_INT: 2, _FOUR_BYTE_INT: 4}
+
+# Encoding of an empty property block (a zero property length)
+EMPTY_PROPERTIES = b"\x00"
+
+
+def encode_variable_int(value: int) -> bytes:
+    """Encodes a variable byte integer as used for property lengths and subscription identifiers."""
+    if value < 0 or value > MQTTProtocol.MAX_VARIABLE_BYTE_INTEGER:
+        raise ProtocolError("Variable byte integer out of range")
+    if value < 128:
+        return bytes((value,))
+    encoded = bytearray()
+    while True:
+        byte = value % 128
+        value //= 128
+        if value:
+            encoded.append(byte | MQTTProtocol.CONTINUATION_BIT)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def decode_variable_int(data: memoryview, offset: int) -> Tuple[int, int]:
+    """Decodes a variable byte integer at offset and returns the value and the new offset."""
+    value = 0
+    multiplier = 1
+    for index in range(offset, offset + MQTTProtocol.MAX_LENGTH_BYTES):
+        if index >= len(data):
+            raise ProtocolError("Incomplete variable byte integer")
+        byte = data[index]
+        value += (byte & MQTTProtocol.LENGTH_MASK) * multiplier
+        if byte & MQTTProtocol.CONTINUATION_BIT == 0:
+            return value, index + 1
+        multiplier *= 128
+    raise ProtocolError("Variable byte integer too long")
+
+
+def split_properties(data: memoryview, offset: int) -> Tuple[Optional['Properties'], int]:
+    """
+    Slices the property block at offset without decoding it and returns it with the offset after it.
+
+    An empty block, by far the most common, yields None rather than a Properties object.
+    """
+    length, start = decode_variable_int(data, offset)
+    end = start + length
+    if end > len(data):
+        raise ProtocolError("Incomplete properties")
+    if not length:
+        return None, end
+    return Properties.from_raw(data[start:end]), end
+
+
+def _read_length_prefixed(data: memoryview, offset: int) -> Tuple[memoryview, int]:
+    """Reads a 2-byte length prefixed field and returns it with the offset after it."""
+    if offset + MQTTProtocol.LENGTH_FIELD_SIZE > len(data):
+        raise ProtocolError("Incomplete property value")
+    end = offset + MQTTProtocol.LENGTH_FIELD_SIZE + ((data[offset] << 8) | data[offset + 1])
+    if end > len(data):
+        raise ProtocolError("Incomplete property value")
+    return data[offset + MQTTProtocol.LENGTH_FIELD_SIZE:end], end
+
+
+def _skip_value(data: memoryview, offset: int, value_type: int) -> int:
+    """Returns the offset after a property value without decoding it."""
+    size = _FIXED_SIZES.get(value_type)
+    if size is not None:
+        return offset + size
+    if value_type == _VARIABLE_INT:
+        return decode_variable_int(data, offset)[1]
+    _, offset = _read_length_prefixed(data, offset)
+    if value_type == _STRING_PAIR:
+        _, offset = _read_length_prefixed(data, offset)
+    return offset
+
+
+def _decode_value(data: memoryview, offset: int, value_type: int) -> Tuple[Any, int]:
+    """Decodes one property value at offset and returns it with the offset after it."""
+    size = _FIXED_SIZES.get(value_type)
+    if size is not None:
+        end = offset + size
+        if end > len(data):
+            raise ProtocolError("Incomplete property value")
+        return int.from_bytes(data[offset:end], MQTTProtocol.BYTE_ORDER), end
+    if value_type == _VARIABLE_INT:
+        return decode_variable_int(data, offset)
+    value, offset = _read_length_prefixed(data, offset)
+    if value_type == _BINARY:
+        return value.tobytes(), offset
+    if value_type == _UTF8_STRING:
+        return str(value, MQTTProtocol.STRING_ENCODING), offset
+    second, offset = _read_length_prefixed(data, offset)
+    return (
+        str(value, MQTTProtocol.STRING_ENCODING),
+        str(second, MQTTProtocol.STRING_ENCODING)
+    ), offset
+
+
+def _encode_value(value: Any, value_type: int) -> bytes:
+    """Encodes one property value."""
+    size = _FIXED_SIZES.get(value_type)
+    if size is not None:
+        return int(value).to_bytes(size, MQTTProtocol.BYTE_ORDER)
+    if value_type == _VARIABLE_INT:
+        return encode_variable_int(value)
+    if value_type == _STRING_PAIR:
+        return _encode_length_prefixed(value[0]) + _encode_length_prefixed(value[1])
+    return _encode_length_prefixed(value)
+
+
+def _encode_length_prefixed(value: Union[str, bytes]) -> bytes:
+    """Encodes a UTF-8 string or binary value with its 2-byte length prefix."""
+    if isinstance(value, str):
+        value = value.encode(MQTTProtocol.STRING_ENCODING)
+    if len(value) > MQTTProtocol.MAX_TOPIC_LENGTH:
+        raise ProtocolError("Property value too long")
+    return len(value).to_bytes(MQTTProtocol.LENGTH_FIELD_SIZE, MQTTProtocol.BYTE_ORDER) + value
+
+
+class Properties:
+    """
+    MQTT 5.0 property block that is decoded only when first read.
+
+    Blocks parsed from the wire keep their raw bytes, typically a view into the receive
+    buffer. Most brokered messages are forwarded without anyone reading their properties,
+    so encode() writes the raw bytes back unchanged until a property is read or modified.
+    Repeatable properties (user properties, subscription identifiers) hold lists.
+    """
+    __slots__ = ('_raw', '_values')
+
+    def __init__(self, values: Optional[Dict[PropertyId, Any]] = None):
+        self._raw: Optional[memoryview] = None # Undecoded block, None once decoded or when built locally
+        self._values: Optional[Dict[PropertyId, Any]] = dict(values) if values else {}
+
+    @classmethod
+    def from_raw(cls, raw: Union[bytes, memoryview]) -> 'Properties':
+        """Wraps an undecoded property block (without its length prefix)."""
+        properties = cls()
+        properties._raw = memoryview(raw)
+        properties._values = None
+        return properties
+
+    @classmethod
+    def from_dict(cls, values: Mapping[str, Any]) -> 'Properties':
+        """Builds properties from a mapping keyed by lower-case property name, the inverse of to_dict()."""
+        return cls({PropertyId[name.upper()]: value for name, value in values.items()})
+
+    @property
+    def is_decoded(self) -> bool:
+        """Whether the raw block has been decoded into values."""
+        return self._values is not None
+
+    def _decoded(self) -> Dict[PropertyId, Any]:
+        """Returns the property values, decoding the raw block on first use."""
+        if self._values is None:
+            self._values = self._decode(self._raw)
+            self._raw = None
+        return self._values
+
+    @staticmethod
+    def _decode(data: memoryview) -> Dict[PropertyId, Any]:
+        """Decodes a raw property block into a dictionary."""
+        values: Dict[PropertyId, Any] = {}
+        offset = 0
+        while offset < len(data):
+            identifier, offset = decode_variable_int(data, offset)
+            value_type = _PROPERTY_TYPES.get(identifier)
+            if value_type is None:
+                raise ProtocolError(f"Unknown property identifier: {identifier}")
+            value, offset = _decode_value(data, offset, value_type)
+            identifier = PropertyId(identifier)
+            if identifier in _REPEATABLE:
+                values.setdefault(identifier, []).append(value)
+            elif identifier in values:
+                raise ProtocolError(f"Duplicate property: {identifier.name}")
+            else:
+                values[identifier] = value
+        return values
+
+    def pop_raw(self, identifier: PropertyId) -> Optional[int]:
+        """
+        Removes a single integer property and returns its value without decoding the rest.
+
+        Used for the topic alias, which must be resolved for every PUBLISH and must not be
+        forwarded: the remaining raw bytes are spliced around it so the block stays lazy.
+        """
+        if self._raw is None:
+            return self._decoded().pop(identifier, None)
+        data = self._raw
+        offset = 0
+        while offset < len(data):
+            start = offset
+            current, offset = decode_variable_int(data, offset)
+            value_type = _PROPERTY_TYPES.get(current)
+            if value_type is None:
+                raise ProtocolError(f"Unknown property identifier: {current}")
+            if current == identifier:
+                value, offset = _decode_value(data, offset, value_type)
+                remainder = data[:start].tobytes() + data[offset:].tobytes()
+                self._raw = memoryview(remainder)
+                return value
+            offset = _skip_value(data, offset, value_type)
+        return None
+
+    def get(self, identifier: PropertyId, default: Any = None) -> Any:
+        return self._decoded().get(identifier, default)
+
+    def __getitem__(self, identifier: PropertyId) -> Any:
+        return self._decoded()[identifier]
+
+    def __setitem__(self, identifier: PropertyId, value: Any) -> None:
+        self._decoded()[identifier] = value
+
+    def __delitem__(self, identifier: PropertyId) -> None:
+        del self._decoded()[identifier]
+
+    def __contains__(self, identifier: PropertyId) -> bool:
+        return identifier in self._decoded()
+
+    def __iter__(self) -> Iterator[PropertyId]:
+        return iter(self._decoded())
+
+    def __len__(self) -> int:
+        return len(self._decoded())
+
+    def __bool__(self) -> bool:
+        if self._raw is not None:
+            return len(self._raw) > 0
+        return bool(self._values)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Properties):
+            return self._decoded() == other._decoded()
+        if isinstance(other, dict):
+            return self._decoded() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        if self._raw is not None:
+            return f"Properties(<{len(self._raw)} undecoded bytes>)"
+        return f"Properties({self._values!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the properties keyed by lower-case property name, as stored in Message.properties."""
+        return {identifier.name.lower(): value for identifier, value in self._decoded().items()}
+
+    def detach(self) -> 'Properties':
+        """Copies an undecoded block out of the receive buffer and returns the properties."""
+        if self._raw is not None:
+            self._raw = memoryview(self._raw.tobytes())
+        return self
+
+    def encode(self, extra: bytes = b"") -> bytes:
+        """
+        Encodes the block including its variable byte integer length prefix.
+
+        extra holds already encoded properties appended to the block, such as the
+        per-connection topic alias of an outbound PUBLISH.
+        """
+        if self._raw is not None:
+            return encode_variable_int(len(self._raw) + len(extra)) + self._raw.tobytes() + extra
+        body = bytearray()
+        for identifier, value in self._values.items():
+            value_type = _PROPERTY_TYPES[identifier]
+            prefix = encode_variable_int(identifier)
+            for item in (value if identifier in _REPEATABLE else (value,)):
+                body += prefix
+                body += _encode_value(item, value_type)
+        body += extra
+        return encode_variable_int(len(body)) + body
+
+
+def encode_properties(properties: Optional[Properties], extra: bytes = b"") -> bytes:
+    """Encodes an optional property block, producing an empty block for None."""
+    if properties is None:
+        if not extra:
+            return EMPTY_PROPERTIES
+        return encode_variable_int(len(extra)) + extra
+    return properties.encode(extra)
+
+
+def encode_property(identifier: PropertyId, value: Any) -> bytes:
+    """Encodes a single property entry, for appending to a block through encode(extra=...)."""
+    return encode_variable_int(identifier) + _encode_value(value, _PROPERTY_TYPES[identifier])
@@ -0,0 +1,195 @@
+import asyncio
+from typing import AsyncIterator, List, Tuple
+from mqtt_common.models.constants import PacketType, MQTTProtocol
+from mqtt_common.models.errors import ProtocolError
+from .packet import MQTTPacket, ConnectPacket, PublishPacket
+from .parser import PacketParser, Buffer
+from .topic_alias import InboundTopicAliases
+
+# Valid first bytes lie between CONNECT (0x10) and the last DISCONNECT byte (0xEF)
+_MIN_FIRST_BYTE = PacketType.CONNECT << MQTTProtocol.PACKET_TYPE_SHIFT
+_MAX_FIRST_BYTE = ((PacketType.DISCONNECT + 1) << MQTTProtocol.PACKET_TYPE_SHIFT) - 1
+
+class StreamDecoder:
+    """
+    Incrementally decodes MQTT packets from a byte stream delivered in arbitrary chunks.
+
+    Chunks are fed exactly as they arrive from asyncio.StreamReader or Protocol.data_received.
+    Complete packets are sliced straight out of the chunk; only a trailing partial packet is
+    carried over in a single growable buffer, and a remaining length field split across reads
+    resumes where it stopped instead of the fixed header being parsed again on the next read.
+
+    Packet bodies are memoryviews into an immutable copy of the received data: the chunk
+    itself when it is already bytes, so decoding a PUBLISH never copies its payload. A view
+    keeps its chunk alive; call PublishPacket.detach() before holding a packet long term.
+
+    packets() parses bodies for protocol_version, which follows the version of a decoded
+    CONNECT, and resolves inbound MQTT 5.0 topic aliases up to topic_alias_maximum.
+    """
+
+    def __init__(
+        self,
+        max_packet_size: int = MQTTProtocol.MAX_PACKET_SIZE,
+        protocol_version: int = MQTTProtocol.VERSION_3_1_1,
+        topic_alias_maximum: int = 0
+    ):
+        self.max_packet_size = max_packet_size # Largest remaining length accepted
+        self.protocol_version = protocol_version # Version used to parse packet bodies
+        self.topic_aliases = InboundTopicAliases(topic_alias_maximum)
+        self._buffer = bytearray() # Bytes received so far of the pending (incomplete) packet
+        self._reset_pending()
+
+    def _reset_pending(self) -> None:
+        """Clears the fixed header decoding state of the pending packet."""
+        self._remaining_length = 0 # Remaining length decoded so far
+        self._multiplier = 1 # Weight of the next remaining length byte
+        self._length_bytes = 0 # Remaining length bytes consumed so far
+        self._packet_length = -1 # Total packet size, -1 until the fixed header is complete
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered bytes belonging to a packet that is not yet complete."""
+        return len(self._buffer)
+
+    def reset(self) -> None:
+        """Discards any partially received packet."""
+        self._buffer.clear()
+        self._reset_pending()
+
+    def feed(self, data: Buffer) -> List[Tuple[int, int, memoryview]]:
+        """Feeds a chunk of the stream and returns (packet_type, flags, body) for every packet it completes."""
+        # Views handed out must not change under the caller, so mutable chunks are copied once
+        view = memoryview(data if type(data) is bytes else bytes(data))
+        frames: List[Tuple[int, int, memoryview]] = []
+        offset = 0
+        if self._buffer:
+            offset = self._resume(view, frames)
+            if offset < 0:
+                return frames
+        self._split(view, offset, frames)
+        return frames
+
+    def packets(self, data: Buffer) -> List[MQTTPacket]:
+        """Feeds a chunk of the stream and synchronously parses every packet it completes."""
+        parse_body = PacketParser.parse_body_sync
+        packets = []
+        for packet_type, flags, body in self.feed(data):
+            packet = parse_body(PacketType(packet_type), flags, body, self.protocol_version)
+            if type(packet) is PublishPacket:
+                if packet.topic_alias is not None:
+                    self.topic_aliases.resolve(packet)
+            elif type(packet) is ConnectPacket:
+                self.protocol_version = packet.protocol_version
+            packets.append(packet)
+        return packets
+
+    async def decode(self, data: bytes) -> List[MQTTPacket]:
+        """Feeds a chunk of the stream and returns every packet it completes as a parsed packet object."""
+        return self.packets(data)
+
+    async def iter_packets(
+        self, reader: asyncio.StreamReader, chunk_size: int = 65536
+    ) -> AsyncIterator[MQTTPacket]:
+        """Reads the stream until EOF, yielding packets as soon as they are complete."""
+        while True:
+            chunk = await reader.read(chunk_size)
+            if not chunk:
+                if self._buffer:
+                    raise ProtocolError("Incomplete packet")
+                return
+            for packet in self.packets(chunk):
+                yield packet
+
+    def _split(self, data: memoryview, offset: int, frames: List[Tuple[int, int, memoryview]]) -> None:
+        """Appends every complete packet in data from offset onwards and buffers the trailing partial packet."""
+        end_of_data = len(data)
+        max_packet_size = self.max_packet_size
+        while offset < end_of_data:
+            byte1 = data[offset]
+            if byte1 < _MIN_FIRST_BYTE or byte1 > _MAX_FIRST_BYTE:
+                raise ProtocolError("Invalid packet type")
+
+            # Decode the remaining length in place; most packets need a single byte
+            index = offset + 1
+            remaining_length = 0
+            multiplier = 1
+            while True:
+                if index >= end_of_data:
+                    self._buffer += data[offset:]
+                    self._remaining_length = remaining_length
+                    self._multiplier = multiplier
+                    self._length_bytes = index - offset - 1
+                    return
+                byte = data[index]
+                index += 1
+                remaining_length += (byte & MQTTProtocol.LENGTH_MASK) * multiplier
+                if byte & MQTTProtocol.CONTINUATION_BIT == 0:
+                    break
+                if index - offset > MQTTProtocol.MAX_LENGTH_BYTES:
+                    raise ProtocolError("Remaining length field too long")
+                multiplier *= 128
+
+            if remaining_length > max_packet_size:
+                raise ProtocolError("Packet too large")
+
+            packet_end = index + remaining_length
+            if packet_end > end_of_data:
+                self._buffer += data[offset:]
+                self._length_bytes = index - offset - 1
+                self._packet_length = packet_end - offset
+                return
+
+            frames.append((
+                byte1 >> MQTTProtocol.PACKET_TYPE_SHIFT,
+                byte1 & MQTTProtocol.FLAGS_MASK,
+                data[index:packet_end]
+            ))
+            offset = packet_end
+
+    def _resume(self, data: memoryview, frames: List[Tuple[int, int, memoryview]]) -> int:
+        """
+        Continues the pending packet with data.
+
+        Returns the offset of the first byte after the completed packet, or -1 if the
+        whole chunk was absorbed without completing it.
+        """
+        offset = 0
+        end_of_data = len(data)
+
+        # Finish a remaining length field that was split across reads
+        while self._packet_length < 0:
+            if offset >= end_of_data:
+                self._buffer += data
+                return -1
+            byte = data[offset]
+            offset += 1
+            self._length_bytes += 1
+            self._remaining_length += (byte & MQTTProtocol.LENGTH_MASK) * self._multiplier
+            if byte & MQTTProtocol.CONTINUATION_BIT == 0:
+                if self._remaining_length > self.max_packet_size:
+                    raise ProtocolError("Packet too large")
+                self._packet_length = (
+                    MQTTProtocol.MIN_HEADER_LENGTH + self._length_bytes + self._remaining_length
+                )
+            elif self._length_bytes >= MQTTProtocol.MAX_LENGTH_BYTES:
+                raise ProtocolError("Remaining length field too long")
+            else:
+                self._multiplier *= 128
+
+        missing = self._packet_length - len(self._buffer) - offset
+        if missing > end_of_data - offset:
+            self._buffer += data
+            return -1
+
+        offset += missing
+        self._buffer += data[:offset]
+        byte1 = self._buffer[0]
+        body = memoryview(bytes(self._buffer))[MQTTProtocol.MIN_HEADER_LENGTH + self._length_bytes:]
+        frames.append((
+            byte1 >> MQTTProtocol.PACKET_TYPE_SHIFT,
+            byte1 & MQTTProtocol.FLAGS_MASK,
+            body
+        ))
+        self._buffer.clear()
+        self._reset_pending()
+        return offset
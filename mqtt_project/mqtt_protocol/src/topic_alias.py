@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from mqtt_common.models.errors import ProtocolError
+from .packet import PublishPacket
+
+
+class InboundTopicAliases:
+    """
+    Topic aliases set by the peer on one MQTT 5.0 connection.
+
+    A PUBLISH carrying both a topic and an alias (re)binds the alias; one carrying only
+    an alias reuses the bound topic. maximum is the Topic Alias Maximum we announced,
+    0 meaning aliases are not accepted.
+    """
+    __slots__ = ('maximum', '_topics')
+
+    def __init__(self, maximum: int = 0):
+        self.maximum = maximum
+        self._topics: Dict[int, str] = {}
+
+    def resolve(self, packet: PublishPacket) -> PublishPacket:
+        """Fills in the topic of a PUBLISH sent with a topic alias and clears the alias."""
+        alias = packet.topic_alias
+        if alias is None:
+            return packet
+        if alias == 0 or alias > self.maximum:
+            raise ProtocolError(f"Topic alias out of range: {alias}")
+        if packet.topic:
+            self._topics[alias] = packet.topic
+        else:
+            topic = self._topics.get(alias)
+            if topic is None:
+                raise ProtocolError(f"Unknown topic alias: {alias}")
+            packet.topic = topic
+        packet.topic_alias = None
+        return packet
+
+    def clear(self) -> None:
+        """Forgets every alias, as required when the connection ends."""
+        self._topics.clear()
+
+
+class OutboundTopicAliases:
+    """
+    Topic aliases we assign when publishing to one MQTT 5.0 connection.
+
+    maximum is the Topic Alias Maximum announced by the peer. Frequently used topics
+    keep their alias; once all aliases are taken the least recently used one is rebound,
+    so long topics sent repeatedly cost two bytes instead of the full topic string.
+    """
+    __slots__ = ('maximum', '_aliases')
+
+    def __init__(self, maximum: int = 0):
+        self.maximum = maximum
+        self._aliases: 'OrderedDict[str, int]' = OrderedDict()
+
+    def assign(self, topic: str) -> Tuple[str, Optional[int]]:
+        """
+        Returns the topic to put on the wire and the alias to send with it.
+
+        The topic is empty when the peer already knows the alias, and the alias is None
+        when aliases are disabled for the connection.
+        """
+        if not self.maximum:
+            return topic, None
+        alias = self._aliases.get(topic)
+        if alias is not None:
+            self._aliases.move_to_end(topic)
+            return "", alias
+        if len(self._aliases) < self.maximum:
+            alias = len(self._aliases) + 1
+        else:
+            _, alias = self._aliases.popitem(last=False)
+        self._aliases[topic] = alias
+        return topic, alias
+
+    def clear(self) -> None:
+        """Forgets every alias, as required when the connection ends."""
+        self._aliases.clear()
@@ -126,6 +126,24 @@ class TestPublishPacket:
         with pytest.raises(ValidationError, match="Packet ID is required"):
             packet.validate()
 
+    def test_publish_to_message(self):
+        """Tests that a parsed PUBLISH converts to a Message carrying its fields."""
+        packet = PublishPacket(
+            packet_type=PacketType.PUBLISH,
+            topic="test/topic",
+            payload=b"data",
+            qos=QualityOfService.AT_LEAST_ONCE,
+            packet_id=7,
+            retain=True
+        )
+        message = packet.to_message()
+        assert message.topic == "test/topic"
+        assert message.payload == b"data"
+        assert message.qos == 1
+        assert message.message_id == 7
+        assert message.retain is True
+        assert message.properties == {}
+
 class TestConnAckPacket:
     """Tests for CONNACK packet creation."""
     
@@ -136,4 +154,32 @@ class TestConnAckPacket:
             session_present=True
         )
         assert packet.session_present is True
-        assert packet.return_code == 0  # ACCEPTED
\ No newline at end of file
+        assert packet.return_code == 0  # ACCEPTED
+
+class TestSynchronousParsing:
+    """Tests for the synchronous, zero-copy parsing API."""
+
+    def test_parse_publish_sync_borrows_payload(self):
+        """Tests that the synchronous parser returns the payload as a view into the input buffer."""
+        packet = PublishPacket(
+            topic="telemetry/device-1",
+            payload=b"v" * 4096,
+            qos=QualityOfService.AT_LEAST_ONCE,
+            packet_id=42
+        )
+        encoded = PacketEncoder.encode_packet(packet)
+
+        decoded = PacketParser.parse_packet_sync(encoded)
+        assert isinstance(decoded.payload, memoryview)
+        assert decoded.payload.obj is encoded
+        assert decoded.topic == packet.topic
+        assert decoded.packet_id == 42
+        assert decoded.qos == QualityOfService.AT_LEAST_ONCE
+
+    @pytest.mark.asyncio
+    async def test_async_parse_returns_owned_payload(self):
+        """Tests that the async wrappers keep returning packets that own their payload."""
+        encoded = PacketEncoder.encode_packet(PublishPacket(topic="a", payload=b"owned"))
+        decoded = await PacketParser.parse_packet(encoded)
+        assert isinstance(decoded.payload, bytes)
+        assert decoded.payload == b"owned"
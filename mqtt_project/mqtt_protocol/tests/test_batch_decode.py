@@ -0,0 +1,52 @@
+import pytest
+from mqtt_common.models.constants import PacketType, QualityOfService
+from mqtt_common.models.errors import ProtocolError
+from mqtt_protocol.src.batch import decode_batch
+from mqtt_protocol.src.encoder import PublishTemplate
+from mqtt_protocol.src.packet import PublishPacket
+
+PINGREQ = bytes([0xC0, 0x00])
+
+class TestDecodeBatch:
+    """Tests for columnar decoding of buffers holding many packets."""
+
+    def test_columns_describe_each_packet(self):
+        """Tests that every column is filled for PUBLISH and non-PUBLISH packets."""
+        buffer = (
+            PublishTemplate("a/b", b"zero").to_bytes()
+            + PINGREQ
+            + PublishTemplate("c/d/e", b"one", QualityOfService.AT_LEAST_ONCE, retain=True).to_bytes(77)
+        )
+        batch = decode_batch(buffer)
+
+        assert len(batch) == 3
+        assert list(batch.packet_types) == [PacketType.PUBLISH, PacketType.PINGREQ, PacketType.PUBLISH]
+        assert list(batch.packet_ids) == [0, 0, 77]
+        assert batch.topic(0) == "a/b"
+        assert batch.topic(2) == "c/d/e"
+        assert batch.payload(0) == b"zero"
+        assert batch.payload(2) == b"one"
+        assert batch.lengths[1] == 0
+        assert batch.consumed == len(buffer)
+
+    def test_trailing_partial_packet_is_not_consumed(self):
+        """Tests that decoding stops at an incomplete packet and reports where it starts."""
+        complete = PublishTemplate("t", b"done").to_bytes()
+        partial = PublishTemplate("t", b"pending").to_bytes()[:-3]
+        batch = decode_batch(complete + partial)
+
+        assert len(batch) == 1
+        assert batch.consumed == len(complete)
+
+    def test_packet_materialisation(self):
+        """Tests that a single entry can still be turned into a packet object."""
+        batch = decode_batch(PublishTemplate("x/y", b"body", QualityOfService.EXACTLY_ONCE).to_bytes(9))
+        packet = batch.packet(0)
+        assert isinstance(packet, PublishPacket)
+        assert packet.packet_id == 9
+        assert packet.payload == b"body"
+
+    def test_invalid_qos_rejected(self):
+        """Tests that a PUBLISH with both QoS bits set is rejected."""
+        with pytest.raises(ProtocolError, match="Invalid QoS level"):
+            decode_batch(bytes([0x36, 0x05, 0x00, 0x01, 0x61, 0x00, 0x01]))
@@ -0,0 +1,91 @@
+import pytest
+from mqtt_common.models.constants import QualityOfService, ConnectReturnCode, MQTTProtocol
+from mqtt_common.models.errors import ProtocolError
+from mqtt_protocol.src.packet import (
+    PublishPacket, ConnAckPacket, SubscribePacket, SubAckPacket,
+    UnsubscribePacket, UnsubAckPacket, PingReqPacket, PingRespPacket, DisconnectPacket
+)
+from mqtt_protocol.src.encoder import PacketEncoder, PublishTemplate, PINGRESP_PACKET
+from mqtt_protocol.src.parser import PacketParser
+
+class TestPublishBuffers:
+    """Tests for scatter-gather encoding of PUBLISH packets."""
+
+    def test_buffers_match_encoded_packet(self):
+        """Tests that joining the buffers yields the same bytes as encode_packet."""
+        packet = PublishPacket(
+            topic="site/1/temp",
+            payload=b"21.5",
+            qos=QualityOfService.AT_LEAST_ONCE,
+            packet_id=300,
+            retain=True
+        )
+        buffers = PacketEncoder.encode_publish_buffers(packet)
+        assert b"".join(buffers) == PacketEncoder.encode_packet(packet)
+
+    def test_payload_is_shared_not_copied(self):
+        """Tests that the payload buffer is passed through by reference."""
+        payload = b"x" * 100000
+        template = PublishTemplate("fw/chunk", payload, QualityOfService.AT_LEAST_ONCE)
+        first = template.buffers(1)
+        second = template.buffers(2)
+        assert first[-1] is payload
+        assert second[-1] is payload
+        assert first[0] is second[0]
+
+    def test_template_round_trip_per_packet_id(self):
+        """Tests that each recipient's packet decodes with its own packet ID."""
+        template = PublishTemplate("a/b", b"data", QualityOfService.EXACTLY_ONCE)
+        for packet_id in (1, 255, 65535):
+            decoded = PacketParser.parse_packet_sync(template.to_bytes(packet_id))
+            assert decoded.packet_id == packet_id
+            assert decoded.topic == "a/b"
+            assert decoded.payload == b"data"
+            assert decoded.qos == QualityOfService.EXACTLY_ONCE
+
+    def test_qos0_template_has_no_packet_id(self):
+        """Tests that QoS 0 templates emit only header and payload."""
+        template = PublishTemplate("a/b", b"data")
+        assert len(template.buffers()) == 2
+        assert PacketParser.parse_packet_sync(template.to_bytes()).packet_id is None
+
+    def test_qos1_template_requires_packet_id(self):
+        """Tests that QoS > 0 templates refuse to emit a packet without an ID."""
+        template = PublishTemplate("a/b", b"data", QualityOfService.AT_LEAST_ONCE)
+        with pytest.raises(ProtocolError, match="Packet ID required"):
+            template.buffers()
+
+    def test_topic_encoding_is_cached(self):
+        """Tests that the length-prefixed topic encoding is reused for the same topic."""
+        assert PacketEncoder.encode_topic("cached/topic") is PacketEncoder.encode_topic("cached/topic")
+
+
+class TestControlPacketRoundTrip:
+    """Tests that every control packet survives encoding and decoding."""
+
+    @pytest.mark.parametrize("packet", [
+        ConnAckPacket(session_present=True),
+        ConnAckPacket(return_code=ConnectReturnCode.NOT_AUTHORIZED),
+        SubscribePacket(packet_id=10, subscriptions=[
+            ("site/+/temp", QualityOfService.AT_LEAST_ONCE),
+            ("site/#", QualityOfService.AT_MOST_ONCE),
+        ]),
+        SubAckPacket(packet_id=10, return_codes=[1, 0, MQTTProtocol.SUBACK_FAILURE]),
+        UnsubscribePacket(packet_id=11, topics=["site/+/temp", "site/#"]),
+        UnsubAckPacket(packet_id=11),
+        PingReqPacket(),
+        PingRespPacket(),
+        DisconnectPacket(),
+    ])
+    def test_round_trip(self, packet):
+        """Tests that decoding an encoded packet yields an equal packet."""
+        decoded = PacketParser.parse_packet_sync(PacketEncoder.encode_packet(packet))
+        assert decoded == packet
+
+    def test_constant_packets_are_shared(self):
+        """Tests that fixed-content packets are served from precomputed bytes."""
+        assert PacketEncoder.encode_packet(PingRespPacket()) is PINGRESP_PACKET
+        assert PacketEncoder.encode_connack(False, ConnectReturnCode.ACCEPTED) == b"\x20\x02\x00\x00"
+        assert PacketEncoder.encode_connack(True, 0) is PacketEncoder.encode_packet(
+            ConnAckPacket(session_present=True)
+        )
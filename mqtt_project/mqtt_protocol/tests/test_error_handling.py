@@ -0,0 +1,36 @@
+import pytest
+from mqtt_common.models.errors import ProtocolError
+from mqtt_protocol.src.parser import PacketParser
+
+class TestControlPacketErrors:
+    """Tests for protocol violations in control packets."""
+
+    def test_subscribe_with_wrong_flags(self):
+        """Tests that SUBSCRIBE without the reserved 0b0010 flags is rejected."""
+        with pytest.raises(ProtocolError, match="Invalid flags for SUBSCRIBE"):
+            PacketParser.parse_packet_sync(bytes([0x80, 0x06, 0x00, 0x01, 0x00, 0x01, 0x61, 0x00]))
+
+    def test_subscribe_without_filters(self):
+        """Tests that SUBSCRIBE with no topic filters is rejected."""
+        with pytest.raises(ProtocolError, match="at least one topic filter"):
+            PacketParser.parse_packet_sync(bytes([0x82, 0x02, 0x00, 0x01]))
+
+    def test_subscribe_with_invalid_qos(self):
+        """Tests that a requested QoS of 3 is rejected."""
+        with pytest.raises(ProtocolError, match="Invalid QoS level"):
+            PacketParser.parse_packet_sync(bytes([0x82, 0x06, 0x00, 0x01, 0x00, 0x01, 0x61, 0x03]))
+
+    def test_ack_with_wrong_length(self):
+        """Tests that a PUBACK with a truncated packet ID is rejected."""
+        with pytest.raises(ProtocolError, match="Invalid acknowledgement packet"):
+            PacketParser.parse_packet_sync(bytes([0x40, 0x01, 0x00]))
+
+    def test_pingreq_with_payload(self):
+        """Tests that PINGREQ must not carry a body."""
+        with pytest.raises(ProtocolError, match="Unexpected payload"):
+            PacketParser.parse_packet_sync(bytes([0xC0, 0x01, 0x00]))
+
+    def test_connack_with_unknown_return_code(self):
+        """Tests that an out-of-range CONNACK return code is rejected."""
+        with pytest.raises(ProtocolError, match="Invalid CONNACK return code"):
+            PacketParser.parse_packet_sync(bytes([0x20, 0x02, 0x00, 0x09]))
@@ -0,0 +1,141 @@
+import pytest
+from mqtt_common.models.constants import MQTTProtocol, PacketType, QualityOfService
+from mqtt_common.models.errors import ProtocolError, ValidationError
+from mqtt_common.models.message import Message
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.inflight import PacketIdAllocator, OutboundFlow, InboundFlow
+from mqtt_protocol.src.packet import PublishPacket, PubAckPacket, PubRecPacket, PubCompPacket
+
+
+def _message(qos: int = 1) -> Message:
+    return Message(topic="a/b", payload=b"x", qos=qos, retain=False, message_id=1 if qos else None)
+
+
+class TestPacketIdAllocator:
+    """Tests for the bitmap packet ID allocator."""
+
+    def test_allocates_lowest_free_id(self):
+        """Tests that IDs start at 1 and released IDs are reused before higher ones."""
+        ids = PacketIdAllocator()
+        assert [ids.allocate() for _ in range(4)] == [1, 2, 3, 4]
+        assert ids.release(2)
+        assert 2 not in ids and 3 in ids
+        assert ids.allocate() == 2
+        assert ids.allocate() == 5
+        assert ids.in_use == 5
+
+    def test_skips_taken_ids(self):
+        """Tests that IDs marked with take() are skipped."""
+        ids = PacketIdAllocator()
+        assert ids.take(1) and ids.take(2)
+        assert not ids.take(2)
+        assert ids.allocate() == 3
+
+    def test_release_of_free_id(self):
+        """Tests that releasing an ID not in use reports it."""
+        assert not PacketIdAllocator().release(7)
+
+    def test_reuses_ids_across_words(self):
+        """Tests that IDs freed below the cursor are reused before the next unused ID."""
+        ids = PacketIdAllocator()
+        for _ in range(200):
+            ids.allocate()
+        assert ids.release(150) and ids.release(5)
+        assert [ids.allocate() for _ in range(3)] == [5, 150, 201]
+        assert ids.take(1000) and 1000 in ids and 999 not in ids
+
+    @pytest.mark.parametrize("packet_id", [0, MQTTProtocol.MAX_PACKET_ID + 1])
+    def test_invalid_id(self, packet_id):
+        """Tests that IDs outside 1..65535 are refused."""
+        ids = PacketIdAllocator()
+        assert packet_id not in ids
+        with pytest.raises(ProtocolError):
+            ids.take(packet_id)
+        with pytest.raises(ProtocolError):
+            ids.release(packet_id)
+
+    def test_exhausted(self):
+        """Tests that allocating with every ID in use raises ProtocolError."""
+        ids = PacketIdAllocator()
+        for _ in range(MQTTProtocol.MAX_PACKET_ID):
+            ids.allocate()
+        assert MQTTProtocol.MAX_PACKET_ID in ids
+        with pytest.raises(ProtocolError):
+            ids.allocate()
+        ids.release(40000)
+        assert ids.allocate() == 40000
+
+
+class TestOutboundFlow:
+    """Tests for the outbound in-flight window."""
+
+    def test_window_limits_inflight(self):
+        """Tests that messages beyond receive_maximum wait and enter as acks arrive."""
+        flow = OutboundFlow(receive_maximum=2)
+        messages = [_message() for _ in range(4)]
+        assert [flow.send(message) for message in messages] == [1, 2, None, None]
+        assert flow.inflight == 2 and flow.pending == 2
+        released, pubrel = flow.acknowledge([PubAckPacket(packet_id=1), PubAckPacket(packet_id=2)])
+        assert released == [(1, messages[2]), (2, messages[3])]
+        assert pubrel == []
+        assert flow.completed == 2 and flow.pending == 0
+
+    def test_qos2_handshake(self):
+        """Tests PUBREC, PUBREL and PUBCOMP handling of a QoS 2 message."""
+        flow = OutboundFlow()
+        packet_id = flow.send(_message(qos=2))
+        assert flow.acknowledge([PubRecPacket(packet_id=packet_id)]) == ([], [packet_id])
+        assert list(flow.unacknowledged()) == [(packet_id, None)]
+        # A repeated PUBREC asks for PUBREL again
+        assert flow.acknowledge([PubRecPacket(packet_id=packet_id)]) == ([], [packet_id])
+        flow.acknowledge([PubCompPacket(packet_id=packet_id)])
+        assert flow.inflight == 0 and packet_id not in flow.ids
+
+    def test_wrong_acknowledgement(self):
+        """Tests that an ack of the wrong type raises and an unknown ID is ignored."""
+        flow = OutboundFlow()
+        qos1 = flow.send(_message(qos=1))
+        qos2 = flow.send(_message(qos=2))
+        with pytest.raises(ProtocolError):
+            flow.acknowledge([PubRecPacket(packet_id=qos1)])
+        with pytest.raises(ProtocolError):
+            flow.acknowledge([PubCompPacket(packet_id=qos2)])
+        flow.acknowledge([PubAckPacket(packet_id=999)])
+        assert flow.unexpected == 1
+
+    def test_rejects_qos0_and_bad_window(self):
+        """Tests that QoS 0 messages and empty windows are rejected."""
+        with pytest.raises(ValidationError):
+            OutboundFlow().send(_message(qos=0))
+        with pytest.raises(ValidationError):
+            OutboundFlow(receive_maximum=0)
+
+
+class TestInboundFlow:
+    """Tests for inbound acknowledgement and QoS 2 duplicate detection."""
+
+    def test_batched_acks(self):
+        """Tests that acks of several publishes are flushed as one buffer."""
+        flow = InboundFlow()
+        for packet_id, qos in ((1, 1), (2, 1), (3, 2)):
+            assert flow.receive(PublishPacket(topic="a", qos=QualityOfService(qos), packet_id=packet_id))
+        assert flow.receive(PublishPacket(topic="a"))
+        assert flow.pending_acks == 3
+        assert flow.flush() == (
+            PacketEncoder.encode_ack(PacketType.PUBACK, 1)
+            + PacketEncoder.encode_ack(PacketType.PUBACK, 2)
+            + PacketEncoder.encode_ack(PacketType.PUBREC, 3)
+        )
+        assert flow.flush() == b""
+
+    def test_qos2_duplicate_until_release(self):
+        """Tests that a resent QoS 2 PUBLISH is acknowledged but not delivered twice."""
+        flow = InboundFlow()
+        packet = PublishPacket(topic="a", qos=QualityOfService.EXACTLY_ONCE, packet_id=65535)
+        assert flow.receive(packet)
+        assert not flow.receive(packet)
+        assert flow.duplicates == 1
+        flow.release(65535)
+        assert flow.receive(packet)
+        assert flow.flush().endswith(PacketEncoder.encode_ack(PacketType.PUBCOMP, 65535)
+                                     + PacketEncoder.encode_ack(PacketType.PUBREC, 65535))
@@ -0,0 +1,189 @@
+import pytest
+from mqtt_common.models.constants import QualityOfService, MQTTProtocol, PropertyId
+from mqtt_common.models.errors import ProtocolError
+from mqtt_protocol.src.packet import (
+    ConnectPacket, ConnAckPacket, PublishPacket, PubAckPacket, PubRelPacket,
+    SubscribePacket, SubAckPacket, UnsubscribePacket, UnsubAckPacket, DisconnectPacket
+)
+from mqtt_protocol.src.encoder import PacketEncoder, PublishTemplate
+from mqtt_protocol.src.parser import PacketParser
+from mqtt_protocol.src.properties import Properties, encode_variable_int, decode_variable_int
+from mqtt_protocol.src.stream import StreamDecoder
+from mqtt_protocol.src.topic_alias import InboundTopicAliases, OutboundTopicAliases
+
+V5 = MQTTProtocol.VERSION_5_0
+
+def _properties() -> Properties:
+    """Builds a property block using each value type found on a PUBLISH."""
+    return Properties({
+        PropertyId.PAYLOAD_FORMAT_INDICATOR: 1,
+        PropertyId.MESSAGE_EXPIRY_INTERVAL: 3600,
+        PropertyId.CONTENT_TYPE: "application/json",
+        PropertyId.CORRELATION_DATA: b"\x00\x01",
+        PropertyId.USER_PROPERTY: [("site", "1"), ("site", "2")],
+    })
+
+class TestProperties:
+    """Tests for the lazily decoded MQTT 5.0 property block."""
+
+    @pytest.mark.parametrize("value", [0, 127, 128, 16383, 16384, MQTTProtocol.MAX_VARIABLE_BYTE_INTEGER])
+    def test_variable_int_round_trip(self, value):
+        """Tests variable byte integers at each encoding length boundary."""
+        encoded = encode_variable_int(value)
+        assert decode_variable_int(memoryview(encoded), 0) == (value, len(encoded))
+
+    def test_parsed_properties_stay_undecoded(self):
+        """Tests that a forwarded block is neither decoded nor changed."""
+        packet = PublishPacket(topic="a/b", payload=b"x", properties=_properties())
+        data = PacketEncoder.encode_packet(packet, V5)
+        decoded = PacketParser.parse_packet_sync(data, V5)
+
+        assert not decoded.properties.is_decoded
+        assert PacketEncoder.encode_packet(decoded, V5) == data
+        assert not decoded.properties.is_decoded
+
+    def test_properties_decode_on_access(self):
+        """Tests that reading a property decodes the block."""
+        data = PacketEncoder.encode_packet(PublishPacket(topic="a", properties=_properties()), V5)
+        properties = PacketParser.parse_packet_sync(data, V5).properties
+
+        assert properties[PropertyId.CONTENT_TYPE] == "application/json"
+        assert properties.is_decoded
+        assert properties == _properties()
+        assert properties.to_dict()["user_property"] == [("site", "1"), ("site", "2")]
+        assert Properties.from_dict(properties.to_dict()) == properties
+
+    def test_unknown_property_rejected(self):
+        """Tests that an unknown property identifier is a protocol error once decoded."""
+        properties = Properties.from_raw(b"\x7f\x00")
+        with pytest.raises(ProtocolError, match="Unknown property identifier"):
+            properties.get(PropertyId.CONTENT_TYPE)
+
+    def test_duplicate_property_rejected(self):
+        """Tests that a non-repeatable property may appear only once."""
+        properties = Properties.from_raw(b"\x01\x00\x01\x01")
+        with pytest.raises(ProtocolError, match="Duplicate property"):
+            len(properties)
+
+    def test_incomplete_property_block(self):
+        """Tests that a property length running past the packet is rejected."""
+        data = bytes([0x30, 0x05, 0x00, 0x01, ord("a"), 0x09, 0x01])
+        with pytest.raises(ProtocolError, match="Incomplete properties"):
+            PacketParser.parse_packet_sync(data, V5)
+
+
+class TestMQTT5RoundTrip:
+    """Tests that MQTT 5.0 packets survive encoding and decoding."""
+
+    @pytest.mark.parametrize("packet", [
+        ConnAckPacket(session_present=True, return_code=0x87,
+                      properties=Properties({PropertyId.REASON_STRING: "not authorized"})),
+        PublishPacket(topic="a/b", payload=b"data", qos=QualityOfService.AT_LEAST_ONCE,
+                      packet_id=9, properties=_properties()),
+        PubAckPacket(packet_id=9),
+        PubAckPacket(packet_id=9, reason_code=0x10),
+        PubRelPacket(packet_id=9, reason_code=0x92,
+                     properties=Properties({PropertyId.REASON_STRING: "unknown"})),
+        SubscribePacket(packet_id=3, subscriptions=[("a/#", QualityOfService.EXACTLY_ONCE)],
+                        subscription_options=[0x2E],
+                        properties=Properties({PropertyId.SUBSCRIPTION_IDENTIFIER: [42]})),
+        SubAckPacket(packet_id=3, return_codes=[2, 0x87]),
+        UnsubscribePacket(packet_id=4, topics=["a/#"]),
+        UnsubAckPacket(packet_id=4, reason_codes=[0, 0x11]),
+        DisconnectPacket(),
+        DisconnectPacket(reason_code=0x04,
+                         properties=Properties({PropertyId.SESSION_EXPIRY_INTERVAL: 0})),
+    ])
+    def test_round_trip(self, packet):
+        """Tests that decoding an encoded packet yields an equal packet."""
+        decoded = PacketParser.parse_packet_sync(PacketEncoder.encode_packet(packet, V5), V5)
+        assert decoded == packet
+
+    def test_connect_round_trip(self):
+        """Tests that CONNECT is parsed by its own version, including will properties."""
+        packet = ConnectPacket(
+            client_id="c1", protocol_version=V5, will_topic="lwt", will_message=b"gone",
+            properties=Properties({PropertyId.RECEIVE_MAXIMUM: 16}),
+            will_properties=Properties({PropertyId.WILL_DELAY_INTERVAL: 30}),
+        )
+        decoded = PacketParser.parse_packet_sync(PacketEncoder.encode_packet(packet))
+        assert decoded.properties[PropertyId.RECEIVE_MAXIMUM] == 16
+        assert decoded.will_properties[PropertyId.WILL_DELAY_INTERVAL] == 30
+        assert decoded.will_message == b"gone"
+
+    def test_success_ack_matches_v311(self):
+        """Tests that a successful acknowledgement without properties uses the short form."""
+        assert PacketEncoder.encode_packet(PubAckPacket(packet_id=7), V5) == \
+            PacketEncoder.encode_packet(PubAckPacket(packet_id=7))
+
+    def test_subscription_options(self):
+        """Tests that the MQTT 5.0 options byte is kept alongside the requested QoS."""
+        options = (QualityOfService.AT_LEAST_ONCE | MQTTProtocol.SUBSCRIBE_NO_LOCAL_FLAG
+                   | (2 << MQTTProtocol.SUBSCRIBE_RETAIN_HANDLING_SHIFT))
+        packet = SubscribePacket(packet_id=1, subscriptions=[("t", QualityOfService.AT_LEAST_ONCE)],
+                                 subscription_options=[options])
+        decoded = PacketParser.parse_packet_sync(PacketEncoder.encode_packet(packet, V5), V5)
+        assert decoded.subscriptions == [("t", QualityOfService.AT_LEAST_ONCE)]
+        assert decoded.subscription_options[0] & MQTTProtocol.SUBSCRIBE_NO_LOCAL_FLAG
+
+
+class TestTopicAliases:
+    """Tests for MQTT 5.0 topic aliases on PUBLISH."""
+
+    def test_alias_split_from_properties(self):
+        """Tests that the topic alias is moved out of the property block without decoding it."""
+        template = PublishTemplate("long/topic", b"x", protocol_version=V5,
+                                   properties=_properties(), topic_alias=5)
+        packet = PacketParser.parse_packet_sync(template.to_bytes(), V5)
+
+        assert packet.topic_alias == 5
+        assert not packet.properties.is_decoded
+        assert packet.properties == _properties()
+
+    def test_alias_only_property(self):
+        """Tests that a block holding only the alias leaves no properties behind."""
+        template = PublishTemplate("t", b"x", QualityOfService.AT_LEAST_ONCE,
+                                   protocol_version=V5, topic_alias=1)
+        packet = PacketParser.parse_packet_sync(template.to_bytes(2), V5)
+        assert packet.properties is None
+        assert (packet.topic_alias, packet.packet_id, packet.payload) == (1, 2, b"x")
+
+    def test_stream_decoder_resolves_aliases(self):
+        """Tests that the stream decoder maps alias-only PUBLISH packets back to their topic."""
+        first = PublishTemplate("sensors/1", b"a", protocol_version=V5, topic_alias=1).to_bytes()
+        second = PublishTemplate("", b"b", protocol_version=V5, topic_alias=1).to_bytes()
+        decoder = StreamDecoder(protocol_version=V5, topic_alias_maximum=10)
+
+        packets = decoder.packets(first + second)
+        assert [p.topic for p in packets] == ["sensors/1", "sensors/1"]
+        assert packets[1].topic_alias is None
+
+    def test_stream_decoder_follows_connect_version(self):
+        """Tests that packets after an MQTT 5.0 CONNECT are parsed as MQTT 5.0."""
+        connect = PacketEncoder.encode_packet(ConnectPacket(client_id="c", protocol_version=V5))
+        publish = PacketEncoder.encode_packet(PublishPacket(topic="t", payload=b"p"), V5)
+        packets = StreamDecoder().packets(connect + publish)
+        assert packets[1].payload == b"p"
+
+    def test_unknown_alias_rejected(self):
+        """Tests that an alias never bound to a topic is a protocol error."""
+        with pytest.raises(ProtocolError, match="Unknown topic alias"):
+            InboundTopicAliases(10).resolve(PublishPacket(topic_alias=3))
+
+    def test_alias_above_maximum_rejected(self):
+        """Tests that an alias above the announced maximum is a protocol error."""
+        with pytest.raises(ProtocolError, match="Topic alias out of range"):
+            InboundTopicAliases(2).resolve(PublishPacket(topic="t", topic_alias=3))
+
+    def test_outbound_aliases_reuse_and_replace(self):
+        """Tests that outbound aliases are reused and the least recently used is rebound."""
+        aliases = OutboundTopicAliases(2)
+        assert aliases.assign("a") == ("a", 1)
+        assert aliases.assign("b") == ("b", 2)
+        assert aliases.assign("a") == ("", 1)
+        assert aliases.assign("c") == ("c", 2)
+        assert aliases.assign("b") == ("b", 1)
+
+    def test_outbound_aliases_disabled(self):
+        """Tests that no alias is assigned when the peer does not accept them."""
+        assert OutboundTopicAliases().assign("a") == ("a", None)
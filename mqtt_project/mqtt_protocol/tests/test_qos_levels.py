@@ -0,0 +1,41 @@
+import pytest
+from mqtt_common.models.constants import PacketType, QualityOfService
+from mqtt_protocol.src.packet import (
+    PublishPacket, PubAckPacket, PubRecPacket, PubRelPacket, PubCompPacket
+)
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.parser import PacketParser
+
+class TestQoS1:
+    """Tests for the QoS 1 (at least once) packet exchange."""
+
+    def test_puback_acknowledges_publish(self):
+        """Tests that a PUBACK built for a PUBLISH carries its packet ID."""
+        publish = PacketParser.parse_packet_sync(PacketEncoder.encode_packet(PublishPacket(
+            topic="a/b", payload=b"1", qos=QualityOfService.AT_LEAST_ONCE, packet_id=513
+        )))
+        puback = PacketParser.parse_packet_sync(
+            PacketEncoder.encode_ack(PacketType.PUBACK, publish.packet_id)
+        )
+        assert puback == PubAckPacket(packet_id=513)
+
+class TestQoS2:
+    """Tests for the QoS 2 (exactly once) packet exchange."""
+
+    @pytest.mark.parametrize("packet_class", [PubRecPacket, PubRelPacket, PubCompPacket])
+    def test_handshake_packets_round_trip(self, packet_class):
+        """Tests that PUBREC, PUBREL and PUBCOMP keep their packet ID through encoding."""
+        packet = packet_class(packet_id=65535)
+        encoded = PacketEncoder.encode_packet(packet)
+        assert len(encoded) == 4
+        assert PacketParser.parse_packet_sync(encoded) == packet
+
+    def test_pubrel_carries_reserved_flags(self):
+        """Tests that PUBREL is encoded with the reserved 0b0010 flags."""
+        assert PacketEncoder.encode_ack(PacketType.PUBREL, 1)[0] == 0x62
+
+    def test_ack_template_matches_packet_encoding(self):
+        """Tests that the pre-packed ack templates agree with packet object encoding."""
+        for packet_class in (PubAckPacket, PubRecPacket, PubRelPacket, PubCompPacket):
+            packet = packet_class(packet_id=1234)
+            assert PacketEncoder.encode_ack(packet.packet_type, 1234) == PacketEncoder.encode_packet(packet)
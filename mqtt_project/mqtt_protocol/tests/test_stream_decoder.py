@@ -0,0 +1,125 @@
+import pytest
+from mqtt_common.models.constants import PacketType, QualityOfService
+from mqtt_common.models.errors import ProtocolError
+from mqtt_protocol.src.packet import ConnectPacket, PublishPacket
+from mqtt_protocol.src.encoder import PacketEncoder
+from mqtt_protocol.src.stream import StreamDecoder
+
+def _publish(topic: str, payload: bytes, packet_id: int = None) -> bytes:
+    """Encodes a PUBLISH packet, using QoS 1 when a packet ID is given."""
+    qos = QualityOfService.AT_LEAST_ONCE if packet_id else QualityOfService.AT_MOST_ONCE
+    return PacketEncoder.encode_packet(
+        PublishPacket(topic=topic, payload=payload, qos=qos, packet_id=packet_id)
+    )
+
+class TestStreamDecoder:
+    """Tests for incremental decoding of packets from a chunked byte stream."""
+
+    @pytest.mark.asyncio
+    async def test_multiple_packets_in_one_chunk(self):
+        """Tests that every packet coalesced into a single read is returned."""
+        stream = b"".join(_publish(f"sensors/{i}", b"x" * i) for i in range(10))
+        decoder = StreamDecoder()
+
+        packets = await decoder.decode(stream)
+        assert [p.topic for p in packets] == [f"sensors/{i}" for i in range(10)]
+        assert [p.payload for p in packets] == [b"x" * i for i in range(10)]
+        assert decoder.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_byte_by_byte_feed(self):
+        """Tests that packets are reassembled when the stream arrives one byte at a time."""
+        connect = PacketEncoder.encode_packet(
+            ConnectPacket(packet_type=PacketType.CONNECT, client_id="client-1")
+        )
+        stream = connect + _publish("a/b", b"payload", packet_id=7)
+        decoder = StreamDecoder()
+
+        packets = []
+        for i in range(len(stream)):
+            packets.extend(await decoder.decode(stream[i:i + 1]))
+
+        assert isinstance(packets[0], ConnectPacket)
+        assert packets[0].client_id == "client-1"
+        assert isinstance(packets[1], PublishPacket)
+        assert packets[1].packet_id == 7
+        assert packets[1].payload == b"payload"
+
+    def test_split_multi_byte_remaining_length(self):
+        """Tests that a remaining length field split across reads resumes mid-field."""
+        packet = _publish("big", b"y" * 20000) # Needs a 3-byte remaining length
+        decoder = StreamDecoder()
+
+        assert decoder.feed(packet[:2]) == []
+        assert decoder.feed(packet[2:3]) == []
+        frames = decoder.feed(packet[3:] + packet[:1])
+
+        assert len(frames) == 1
+        packet_type, flags, body = frames[0]
+        assert packet_type == PacketType.PUBLISH
+        assert bytes(body).endswith(b"y" * 20000)
+        assert decoder.pending == 1
+
+    def test_body_split_after_header(self):
+        """Tests a packet whose fixed header arrives whole but whose body is split across reads."""
+        packet = _publish("ab", b"hello") # 1-byte remaining length
+        decoder = StreamDecoder()
+
+        assert decoder.feed(packet[:4]) == []
+        frames = decoder.feed(packet[4:])
+        assert frames == [(PacketType.PUBLISH, 0, packet[2:])]
+        assert decoder.pending == 0
+
+    def test_zero_length_packets(self):
+        """Tests packets without a variable header or payload, such as PINGREQ."""
+        decoder = StreamDecoder()
+        frames = decoder.feed(bytes([0xC0, 0x00, 0xC0, 0x00]))
+        assert frames == [(PacketType.PINGREQ, 0, b""), (PacketType.PINGREQ, 0, b"")]
+
+    def test_packet_too_large(self):
+        """Tests that a remaining length above the configured limit is rejected."""
+        decoder = StreamDecoder(max_packet_size=1024)
+        with pytest.raises(ProtocolError, match="Packet too large"):
+            decoder.feed(_publish("t", b"z" * 2048))
+
+    def test_remaining_length_field_too_long(self):
+        """Tests that a remaining length field longer than 4 bytes is rejected."""
+        decoder = StreamDecoder()
+        decoder.feed(bytes([0x30, 0xFF, 0xFF]))
+        with pytest.raises(ProtocolError, match="Remaining length field too long"):
+            decoder.feed(bytes([0xFF, 0xFF]))
+
+    def test_invalid_packet_type(self):
+        """Tests that the reserved packet types are rejected."""
+        with pytest.raises(ProtocolError, match="Invalid packet type"):
+            StreamDecoder().feed(bytes([0x00, 0x00]))
+
+    def test_publish_payload_is_view_into_chunk(self):
+        """Tests that a decoded PUBLISH payload borrows from the chunk until detached."""
+        chunk = _publish("zero/copy", b"p" * 1000) + _publish("zero/copy", b"q" * 10)
+        packets = StreamDecoder().packets(chunk)
+
+        assert isinstance(packets[0].payload, memoryview)
+        assert packets[0].payload.obj is chunk
+        assert packets[1].payload == b"q" * 10
+
+        packets[0].detach()
+        assert packets[0].payload == b"p" * 1000
+        assert isinstance(packets[0].payload, bytes)
+
+    def test_mutable_chunk_is_not_aliased(self):
+        """Tests that reusing a bytearray receive buffer does not corrupt decoded payloads."""
+        receive_buffer = bytearray(_publish("t", b"first"))
+        packet = StreamDecoder().packets(receive_buffer)[0]
+        receive_buffer[-5:] = b"XXXXX"
+        assert packet.payload == b"first"
+
+    def test_body_split_after_multi_byte_remaining_length(self):
+        """Tests a packet whose multi-byte fixed header arrives whole but whose body is split."""
+        packet = _publish("big", b"w" * 300, packet_id=5) # Needs a 2-byte remaining length
+        decoder = StreamDecoder()
+
+        assert decoder.packets(packet[:100]) == []
+        decoded = decoder.packets(packet[100:])
+        assert decoded[0].topic == "big"
+        assert decoded[0].payload == b"w" * 300
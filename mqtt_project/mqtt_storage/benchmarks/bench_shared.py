@@ -0,0 +1,45 @@
+"""
+Measures shared subscription match latency per selection strategy as groups grow.
+
+Run from mqtt_project/:
+    python -m mqtt_storage.benchmarks.bench_shared --members 10 1000 100000
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from mqtt_storage.src.subscriptions import SubscriptionTrie, LeastLoaded, hash_by_topic, round_robin
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--members", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--matches", type=int, default=200000)
+    args = parser.parse_args()
+
+    topics = [f"jobs/{n}" for n in range(1000)]
+    print(f"{'members':>9} {'strategy':<14} {'match us':>9} {'max/mean load':>14}")
+    for members in args.members:
+        depths = Counter()
+        strategies = (
+            ("round_robin", round_robin),
+            ("hash_by_topic", hash_by_topic),
+            ("least_loaded", LeastLoaded(depths.__getitem__, random.Random(0))),
+        )
+        for name, strategy in strategies:
+            trie = SubscriptionTrie(strategy)
+            for i in range(members):
+                trie.add(f"worker-{i}", "$share/workers/jobs/+", 1)
+            depths.clear()
+            start = time.perf_counter()
+            for i in range(args.matches):
+                for client_id in trie.match(topics[i % 1000]):
+                    depths[client_id] += 1 # Stands in for the member's queue depth
+            elapsed = time.perf_counter() - start
+            mean = args.matches / members
+            print(f"{members:>9,} {name:<14} {elapsed / args.matches * 1e6:>9.2f} "
+                  f"{max(depths.values()) / mean:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Measures SubscriptionTrie match latency as the number of subscriptions grows.
+
+Run from mqtt_project/:
+    python -m mqtt_storage.benchmarks.bench_subscriptions --sizes 1000 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+from mqtt_storage.src.subscriptions import SubscriptionTrie
+
+
+def build(size: int, rng: random.Random) -> SubscriptionTrie:
+    """Subscribes one client per device: mostly exact filters, some '+' and '#' filters."""
+    trie = SubscriptionTrie()
+    for i in range(size):
+        site, device = i % 1000, i
+        kind = i % 10
+        if kind < 8:
+            topic_filter = f"site/{site}/device/{device}/telemetry"
+        elif kind == 8:
+            topic_filter = f"site/{site}/device/+/telemetry"
+        else:
+            topic_filter = f"site/{site}/#"
+        trie.add(f"client-{i}", topic_filter, rng.randrange(3))
+    return trie
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--matches", type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'subscriptions':>14} {'build s':>9} {'match us':>9} {'matched':>8}")
+    for size in args.sizes:
+        start = time.perf_counter()
+        trie = build(size, rng)
+        build_time = time.perf_counter() - start
+
+        topics = [
+            f"site/{d % 1000}/device/{d}/telemetry"
+            for d in (rng.randrange(size) for _ in range(1000))
+        ]
+        matched = 0
+        start = time.perf_counter()
+        for i in range(args.matches):
+            matched += len(trie.match(topics[i % 1000]))
+        elapsed = time.perf_counter() - start
+        print(f"{size:>14,} {build_time:>9.2f} {elapsed / args.matches * 1e6:>9.2f} "
+              f"{matched / args.matches:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measures durable QoS 1 store throughput of WALStorage with and without group commit.
+
+Run from mqtt_project/ (put --directory on the disk you want to measure):
+    python -m mqtt_storage.benchmarks.bench_wal --messages 200000 --publishers 500
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from mqtt_common.models.message import Message
+from mqtt_storage.src.wal import WALStorage
+
+
+async def run(directory: str, messages: int, publishers: int, latency: float, payload: bytes) -> float:
+    """Stores messages from concurrent publishers and returns messages per second."""
+    storage = WALStorage(directory, max_commit_latency=latency)
+    await storage.start()
+    per_publisher = messages // publishers
+
+    async def publisher(index: int) -> None:
+        for i in range(per_publisher):
+            message_id = index * per_publisher + i + 1
+            await storage.store_message(Message(
+                topic=f"site/{index % 100}/device/{index}", payload=payload,
+                qos=1, retain=False, message_id=message_id
+            ))
+            await storage.remove_message(message_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(publisher(i) for i in range(publishers)))
+    elapsed = time.perf_counter() - start
+    commits = storage.commits
+    await storage.stop()
+    rate = per_publisher * publishers / elapsed
+    print(f"{publishers:>10} {latency * 1000:>10.1f} {rate:>14,.0f} {commits:>9,}")
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--publishers", type=int, default=500)
+    parser.add_argument("--payload-size", type=int, default=128)
+    parser.add_argument("--directory", default=None, help="parent directory of the logs")
+    args = parser.parse_args()
+    payload = b"p" * args.payload_size
+
+    print(f"{'publishers':>10} {'latency ms':>10} {'messages/s':>14} {'commits':>9}")
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        # Sequential stores pay one fsync each, as a per-message fsync design would
+        asyncio.run(run(f"{directory}/single", min(args.messages, 2000), 1, 0, payload))
+        asyncio.run(run(f"{directory}/group", args.messages, args.publishers, 0.002, payload))
+
+
+if __name__ == "__main__":
+    main()
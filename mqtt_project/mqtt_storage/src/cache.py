@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from mqtt_common.src.storage import StorageInterface
+from mqtt_common.models.message import Message
+from .subscriptions import SubscriptionTrie, has_wildcards, parse_shared_filter, topic_matches
+
+# Number of distinct topics whose subscriber list is kept
+DEFAULT_CACHE_SIZE = 10000
+
+_KEY_SEPARATOR = '\0' # Joins client ID and shared filter into a key of the shared filter trie
+
+class CachedStorage(StorageInterface):
+    """
+    LRU cache of get_subscriptions results in front of any StorageInterface.
+
+    Publish topics repeat far more often than subscriptions change, so the subscriber
+    list of each recently published topic is kept. A subscription change invalidates
+    only the cached topics its filter matches: a single entry for a filter without
+    wildcards, a scan of the cached topics otherwise. Cached lists are returned as is
+    and must not be modified by callers.
+
+    Topics matching a shared subscription ('$share/<group>/<filter>') are never cached,
+    since each lookup may pick a different group member; their filters are tracked
+    here to recognise them.
+
+    Attributes:
+        hits: Lookups answered from the cache
+        misses: Lookups forwarded to the wrapped storage
+        evictions: Entries dropped to stay within max_size
+        invalidations: Entries dropped because a matching subscription changed
+    """
+    gauges = frozenset({"size"}) # The cache's size is a level; its other stats count lookups
+
+    def __init__(self, storage: StorageInterface, max_size: int = DEFAULT_CACHE_SIZE):
+        self.storage = storage # Wrapped storage
+        self.max_size = max_size # Maximum number of cached topics
+        self._entries: 'OrderedDict[str, List[Tuple[str, int]]]' = OrderedDict()
+        self._generation = 0 # Incremented on every subscription change
+        self._shared = SubscriptionTrie() # Filters of shared subscriptions, keyed by client and shared filter
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Counters for sizing the cache."""
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    async def store_message(self, message: Message) -> None:
+        """Store a message in the wrapped storage"""
+        await self.storage.store_message(message)
+
+    async def get_message(self, message_id: int) -> Optional[Message]:
+        """Retrieve a message from the wrapped storage"""
+        return await self.storage.get_message(message_id)
+
+    async def store_subscription(self, client_id: str, topic: str, qos: int) -> None:
+        """Store a subscription and invalidate the cached topics it matches"""
+        await self.storage.store_subscription(client_id, topic, qos)
+        shared = parse_shared_filter(topic)
+        if shared is not None:
+            self._shared.add(client_id + _KEY_SEPARATOR + topic, shared[1], 0)
+            topic = shared[1]
+        self.invalidate(topic)
+
+    async def remove_subscription(self, client_id: str, topic: str) -> None:
+        """Remove a subscription and invalidate the cached topics it matched"""
+        await self.storage.remove_subscription(client_id, topic)
+        shared = parse_shared_filter(topic)
+        if shared is not None:
+            self._shared.remove(client_id + _KEY_SEPARATOR + topic, shared[1])
+            topic = shared[1]
+        self.invalidate(topic)
+
+    async def get_subscriptions(self, topic: str) -> List[Tuple[str, int]]:
+        """Get the subscribers of a topic, from the cache when possible"""
+        entries = self._entries
+        subscribers = entries.get(topic)
+        if subscribers is not None:
+            entries.move_to_end(topic)
+            self.hits += 1
+            return subscribers
+
+        self.misses += 1
+        generation = self._generation
+        subscribers = await self.storage.get_subscriptions(topic)
+        # A subscription changed while awaiting the lookup: the result may be stale
+        if generation == self._generation and not (self._shared and self._shared.match(topic)):
+            entries[topic] = subscribers
+            if len(entries) > self.max_size:
+                entries.popitem(last=False)
+                self.evictions += 1
+        return subscribers
+
+    def invalidate(self, topic_filter: str) -> int:
+        """Drops the cached topics matching a topic filter and returns how many were dropped."""
+        self._generation += 1
+        entries = self._entries
+        if not has_wildcards(topic_filter):
+            stale = [topic_filter] if topic_filter in entries else []
+        else:
+            stale = [topic for topic in entries if topic_matches(topic_filter, topic)]
+        for topic in stale:
+            del entries[topic]
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        """Drops every cached entry."""
+        self._generation += 1
+        self._entries.clear()
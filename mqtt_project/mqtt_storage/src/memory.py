@@ -0,0 +1,42 @@
+from typing import Dict, List, Optional, Tuple
+from mqtt_common.src.storage import StorageInterface
+from mqtt_common.models.message import Message
+from .subscriptions import SubscriptionTrie, SelectionStrategy, round_robin
+
+class MemoryStorage(StorageInterface):
+    """
+    In-memory storage with subscriptions indexed in a SubscriptionTrie.
+
+    get_subscriptions supports '+' and '#' filters and returns each matching client
+    once, with the highest QoS of its matching filters. Of each matching shared
+    subscription ('$share/<group>/<filter>') it returns one member, picked by strategy.
+    """
+
+    def __init__(self, strategy: SelectionStrategy = round_robin):
+        self.messages: Dict[int, Message] = {} # Messages by message ID
+        self.subscriptions = SubscriptionTrie(strategy) # Subscription index
+
+    async def store_message(self, message: Message) -> None:
+        """Store a message under its message ID"""
+        if message.message_id is not None:
+            self.messages[message.message_id] = message
+
+    async def get_message(self, message_id: int) -> Optional[Message]:
+        """Retrieve a message by ID"""
+        return self.messages.get(message_id)
+
+    async def remove_message(self, message_id: int) -> None:
+        """Remove a message once it has been acknowledged"""
+        self.messages.pop(message_id, None)
+
+    async def store_subscription(self, client_id: str, topic: str, qos: int) -> None:
+        """Store or update a client's subscription"""
+        self.subscriptions.add(client_id, topic, qos)
+
+    async def remove_subscription(self, client_id: str, topic: str) -> None:
+        """Remove a client's subscription"""
+        self.subscriptions.remove(client_id, topic)
+
+    async def get_subscriptions(self, topic: str) -> List[Tuple[str, int]]:
+        """Get (client_id, qos) for every client subscribed to a matching filter"""
+        return list(self.subscriptions.match(topic).items())
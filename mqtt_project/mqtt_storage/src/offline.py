@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Deque, Dict, List, Optional
+from mqtt_common.models.errors import StorageError
+from mqtt_common.models.message import Message
+from .wal import encode_message, decode_message
+
+SPILL_SUFFIX = ".spill"
+DEFAULT_CLIENT_MEMORY = 64 * 1024 # Bytes of queued messages kept in memory per offline client
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024 # Bytes of queued messages kept in memory for all clients
+DEFAULT_FLUSH_BYTES = 1024 * 1024 # Spilled bytes buffered before they are written out
+DEFAULT_READ_SIZE = 1024 * 1024 # Bytes read from a spill file per replay step
+DEFAULT_BATCH_SIZE = 1000 # Messages per replayed batch taken from memory
+
+_MESSAGE_OVERHEAD = 160 # Approximate bytes of a Message object and its queue slot
+# Spill record header: body length; the body is a WAL MESSAGE record body
+_SPILL_HEADER = struct.Struct('!I')
+
+
+class _OfflineClient:
+    """Queue of one offline client: a head in memory and a tail in its spill file."""
+    __slots__ = ('head', 'head_bytes', 'spilled', 'pending', 'appended', 'read_offset', 'path')
+
+    def __init__(self, path: str):
+        self.head: Deque[Message] = deque()
+        self.head_bytes = 0 # Accounted size of the head
+        self.spilled = 0 # Messages in the tail, written or pending
+        self.pending = bytearray() # Spill records not yet handed to the executor
+        self.appended = 0 # Bytes handed to the executor for the spill file
+        self.read_offset = 0 # Bytes of the spill file already replayed
+        self.path = path
+
+
+class OfflineQueues:
+    """
+    Messages queued for disconnected persistent-session clients, with bounded memory.
+
+    Each client's queue keeps its oldest messages in memory up to client_memory bytes,
+    as long as all clients together stay within memory_budget. Once either limit is
+    reached, the client's later messages are appended to a spill file of its own, and
+    keep going there until the file has been replayed, so the queue stays in order.
+    Spill records are buffered and written in batches of flush_bytes on a single
+    executor thread; only clients that overflow get a file.
+
+    replay() streams a queue back on reconnect: the memory head in batches, then the
+    spill file in reads of read_size bytes, so replaying a long queue never loads it
+    whole. Messages queued while a replay runs are replayed after the older ones.
+
+    Spill files only bound memory and are not a durability mechanism: they are not
+    synced, and start() removes the files left by a previous run. Persist QoS 1/2
+    messages with WALStorage where they must survive a restart.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        client_memory: int = DEFAULT_CLIENT_MEMORY,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        flush_bytes: int = DEFAULT_FLUSH_BYTES,
+        read_size: int = DEFAULT_READ_SIZE
+    ):
+        self.directory = directory
+        self.client_memory = client_memory
+        self.memory_budget = memory_budget
+        self.flush_bytes = flush_bytes
+        self.read_size = read_size
+        self.memory = 0 # Accounted bytes of every memory head
+        self.spilled = 0 # Messages written to spill files
+        self.replayed = 0 # Messages handed out by replay()
+        self.last_error: Optional[Exception] = None # Last failed spill write
+        self._clients: Dict[str, _OfflineClient] = {}
+        self._pending_bytes = 0 # Bytes of spill records not yet handed to the executor
+        self._writes: List[asyncio.Future] = [] # Spill writes not yet finished
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def __contains__(self, client_id: str) -> bool:
+        return client_id in self._clients
+
+    async def start(self) -> None:
+        """Creates the spill directory and removes files left by a previous run"""
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if name.endswith(SPILL_SUFFIX):
+                os.unlink(os.path.join(self.directory, name))
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="offline")
+
+    async def stop(self) -> None:
+        """Waits for pending spill writes and drops every queue"""
+        if self._executor is None:
+            return
+        await self.flush()
+        for client_id in list(self._clients):
+            self.discard(client_id)
+        await self.flush()
+        self._executor.shutdown()
+        self._executor = None
+
+    def queued(self, client_id: str) -> int:
+        """Returns the number of messages queued for a client."""
+        client = self._clients.get(client_id)
+        return 0 if client is None else len(client.head) + client.spilled
+
+    def enqueue(self, client_id: str, message: Message) -> None:
+        """Queues a message for an offline client."""
+        client = self._clients.get(client_id)
+        if client is None:
+            client = self._clients[client_id] = _OfflineClient(self._spill_path(client_id))
+        size = len(message.payload) + len(message.topic) + _MESSAGE_OVERHEAD
+        if (
+            not client.spilled
+            and client.head_bytes + size <= self.client_memory
+            and self.memory + size <= self.memory_budget
+        ):
+            client.head.append(message)
+            client.head_bytes += size
+            self.memory += size
+            return
+        body = encode_message(message)
+        client.pending += _SPILL_HEADER.pack(len(body))
+        client.pending += body
+        client.spilled += 1
+        self.spilled += 1
+        self._pending_bytes += _SPILL_HEADER.size + len(body)
+        if self._pending_bytes >= self.flush_bytes:
+            for pending in self._clients.values():
+                if pending.pending:
+                    self._write(pending)
+            self._pending_bytes = 0
+
+    def discard(self, client_id: str) -> None:
+        """Drops a client's queue, e.g. when its session ends or expires."""
+        client = self._clients.pop(client_id, None)
+        if client is None:
+            return
+        self.memory -= client.head_bytes
+        self._pending_bytes -= len(client.pending)
+        if client.appended:
+            self._submit(self._remove_file, client.path)
+
+    async def flush(self) -> None:
+        """Waits until every spill write handed to the executor so far has finished."""
+        writes, self._writes = self._writes, []
+        if writes:
+            await asyncio.gather(*writes, return_exceptions=True)
+
+    async def replay(self, client_id: str, batch_size: int = DEFAULT_BATCH_SIZE) -> AsyncIterator[List[Message]]:
+        """
+        Yields a client's queued messages in order, in batches, and forgets the queue.
+
+        The caller should keep queuing the client's new messages here until the replay
+        ends and only then deliver directly, so that new messages do not overtake queued
+        ones. Raises StorageError if the spill file cannot be read.
+        """
+        while True:
+            client = self._clients.get(client_id)
+            if client is None:
+                return
+            if client.head:
+                count = min(batch_size, len(client.head))
+                batch = [client.head.popleft() for _ in range(count)]
+                size = sum(len(message.payload) + len(message.topic) for message in batch)
+                size += count * _MESSAGE_OVERHEAD
+                client.head_bytes -= size
+                self.memory -= size
+                self.replayed += count
+                yield batch
+            elif client.spilled:
+                batch = await self._read(client)
+                self.replayed += len(batch)
+                yield batch
+            else:
+                del self._clients[client_id]
+                return
+
+    async def _read(self, client: _OfflineClient) -> List[Message]:
+        """Reads the next whole records of a client's spill file."""
+        if client.pending:
+            self._pending_bytes -= len(client.pending)
+            self._write(client)
+        loop = asyncio.get_running_loop()
+        # The executor runs one job at a time in order, so every write handed to it is done first
+        try:
+            data = await loop.run_in_executor(
+                self._executor, self._read_file, client.path, client.read_offset,
+                min(self.read_size, client.appended - client.read_offset)
+            )
+            length, = _SPILL_HEADER.unpack_from(data)
+            if _SPILL_HEADER.size + length > len(data): # A record larger than read_size
+                data = await loop.run_in_executor(
+                    self._executor, self._read_file, client.path, client.read_offset,
+                    _SPILL_HEADER.size + length
+                )
+        except (OSError, struct.error) as e:
+            raise StorageError(f"Failed to read the spill file of a client: {e}")
+        view = memoryview(data)
+        batch: List[Message] = []
+        offset = 0
+        while offset + _SPILL_HEADER.size <= len(view):
+            length, = _SPILL_HEADER.unpack_from(view, offset)
+            end = offset + _SPILL_HEADER.size + length
+            if end > len(view):
+                break
+            batch.append(decode_message(view[offset + _SPILL_HEADER.size:end]))
+            offset = end
+        client.read_offset += offset
+        client.spilled -= len(batch)
+        if not client.spilled:
+            # The tail is drained: start over with the memory head
+            self._submit(self._remove_file, client.path)
+            client.appended = client.read_offset = 0
+        return batch
+
+    def _write(self, client: _OfflineClient) -> None:
+        """Hands a client's pending spill records to the executor."""
+        data, client.pending = client.pending, bytearray()
+        client.appended += len(data)
+        self._submit(self._append_file, client.path, data)
+
+    def _submit(self, function, *args) -> None:
+        """Runs a file operation on the executor, recording failures in last_error."""
+        future = asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+        future.add_done_callback(self._write_done)
+        self._writes.append(future)
+
+    def _write_done(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.last_error = StorageError(f"Failed to write a spill file: {error}")
+        if future in self._writes:
+            self._writes.remove(future)
+
+    def _spill_path(self, client_id: str) -> str:
+        """Returns the spill file of a client; client IDs are hashed into safe file names."""
+        name = hashlib.blake2b(client_id.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name + SPILL_SUFFIX)
+
+    # The methods below run on the executor thread
+
+    @staticmethod
+    def _append_file(path: str, data: bytearray) -> None:
+        """Appends spill records to a file."""
+        with open(path, 'ab') as spill_file:
+            spill_file.write(data)
+
+    @staticmethod
+    def _read_file(path: str, offset: int, size: int) -> bytes:
+        """Reads size bytes of a file from offset."""
+        with open(path, 'rb') as spill_file:
+            return os.pread(spill_file.fileno(), size, offset)
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        """Deletes a spill file if it exists."""
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
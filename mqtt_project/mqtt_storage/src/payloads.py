@@ -0,0 +1,245 @@
+import mmap
+import os
+from typing import Dict, List, Optional, Union
+from mqtt_common.models.errors import StorageError
+from mqtt_common.models.message import Message, PayloadHandle
+
+SEGMENT_SUFFIX = ".payloads"
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024 # Bytes per segment file; larger payloads get their own segment
+DEFAULT_INLINE_THRESHOLD = 256 # Payloads shorter than this stay on the heap, where they are cheaper
+
+
+class MappedPayload(PayloadHandle):
+    """
+    A payload stored in a PayloadStore segment: a reference counted (segment, offset, length).
+
+    The handle starts with one reference. Every additional owner (for instance each
+    offline queue holding the message) calls acquire() and every owner calls release()
+    when done; the segment is reclaimed once none of its payloads are referenced.
+    """
+    __slots__ = ('store', 'segment', 'offset', 'length', 'references')
+
+    def __init__(self, store: 'PayloadStore', segment: int, offset: int, length: int):
+        self.store = store
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        self.references = 1
+
+    def view(self) -> memoryview:
+        """Returns the payload as a read-only view into the mapped segment."""
+        return self.store.view(self)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __repr__(self) -> str:
+        return f"MappedPayload(segment={self.segment}, offset={self.offset}, length={self.length})"
+
+    def acquire(self) -> 'MappedPayload':
+        """Adds a reference and returns the handle."""
+        self.store.acquire(self)
+        return self
+
+    def release(self) -> None:
+        """Drops a reference."""
+        self.store.release(self)
+
+
+class _Segment:
+    """A segment file and its mapping."""
+    __slots__ = ('path', 'size', 'used', 'references', 'map', 'sealed')
+
+    def __init__(self, path: str, size: int, used: int, sealed: bool):
+        self.path = path
+        self.size = size # Size of the file
+        self.used = used # Bytes allocated to payloads
+        self.references = 0 # References held on payloads in this segment
+        self.map: Optional[mmap.mmap] = None # Mapping, created on first access
+        self.sealed = sealed # No further payloads are allocated in a sealed segment
+
+
+class PayloadStore:
+    """
+    Payloads kept in memory-mapped segment files instead of on the Python heap.
+
+    put() copies a payload into the active segment once and returns a MappedPayload
+    handle; view() hands out memoryviews of the mapping, so delivering a stored payload
+    copies nothing and resident memory is managed by the OS page cache rather than the
+    Python allocator. Segments are preallocated as sparse files of segment_size.
+
+    Handles are reference counted per segment: a sealed segment whose references drop
+    to zero is unmapped and deleted. A mapping still exported through a memoryview
+    cannot be closed; it is closed on a later reclaim() once the views are gone.
+
+    On open(), segments left by a previous run are registered without being read or
+    mapped. Their owners re-create handles with restore() (for instance while replaying
+    a log), after which reclaim() deletes the segments nobody restored.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = DEFAULT_SEGMENT_SIZE,
+        inline_threshold: int = DEFAULT_INLINE_THRESHOLD
+    ):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.inline_threshold = inline_threshold
+        self._segments: Dict[int, _Segment] = {}
+        self._active: Optional[int] = None
+        self._next_id = 1
+        self._closing: List[mmap.mmap] = [] # Mappings of deleted segments with views still exported
+
+    def open(self) -> None:
+        """Registers the segments of a previous run, without mapping them."""
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            segment_id = name[:-len(SEGMENT_SUFFIX)]
+            if not name.endswith(SEGMENT_SUFFIX) or not segment_id.isdigit():
+                continue
+            path = os.path.join(self.directory, name)
+            size = os.path.getsize(path)
+            self._segments[int(segment_id)] = _Segment(path, size, size, sealed=True)
+            self._next_id = max(self._next_id, int(segment_id) + 1)
+
+    def close(self) -> None:
+        """Unmaps every segment; the files are kept for the next open()."""
+        for segment in self._segments.values():
+            self._unmap(segment)
+        self._segments.clear()
+        self._active = None
+        self._close_pending()
+
+    @property
+    def segments(self) -> int:
+        """Number of segment files."""
+        return len(self._segments)
+
+    def put(self, data: Union[bytes, memoryview]) -> MappedPayload:
+        """Copies a payload into the store and returns a handle holding one reference."""
+        length = len(data)
+        segment_id = self._active
+        if segment_id is None or self._segments[segment_id].used + length > self._segments[segment_id].size:
+            segment_id = self._new_segment(max(length, self.segment_size))
+        segment = self._segments[segment_id]
+        offset = segment.used
+        segment.map[offset:offset + length] = data
+        segment.used += length
+        segment.references += 1
+        return MappedPayload(self, segment_id, offset, length)
+
+    def store(self, message: Message) -> Message:
+        """Returns a copy of message whose payload lives in the store, unless it is small."""
+        if isinstance(message.payload, PayloadHandle) or len(message.payload) < self.inline_threshold:
+            return message
+        return message.replace(payload=self.put(message.payload))
+
+    def restore(self, segment: int, offset: int, length: int) -> MappedPayload:
+        """Re-creates a handle to a payload stored by a previous run."""
+        stored = self._segments.get(segment)
+        if stored is None or offset + length > stored.size:
+            raise StorageError(f"No stored payload at segment {segment}, offset {offset}")
+        stored.references += 1
+        return MappedPayload(self, segment, offset, length)
+
+    def view(self, handle: MappedPayload) -> memoryview:
+        """Returns a read-only view of a stored payload, mapping its segment if needed."""
+        if handle.references <= 0:
+            raise StorageError("Payload has been released")
+        segment = self._segments[handle.segment]
+        if segment.map is None:
+            self._map(segment)
+        return memoryview(segment.map).toreadonly()[handle.offset:handle.offset + handle.length]
+
+    def acquire(self, handle: MappedPayload) -> None:
+        """Adds a reference to a payload."""
+        if handle.references <= 0:
+            raise StorageError("Payload has been released")
+        handle.references += 1
+        self._segments[handle.segment].references += 1
+
+    def release(self, handle: MappedPayload) -> None:
+        """Drops a reference to a payload, reclaiming its segment once unreferenced."""
+        if handle.references <= 0:
+            raise StorageError("Payload released more often than acquired")
+        handle.references -= 1
+        segment = self._segments[handle.segment]
+        segment.references -= 1
+        if segment.sealed and not segment.references:
+            self._delete(handle.segment)
+
+    def reclaim(self) -> int:
+        """Deletes unreferenced sealed segments and returns how many were deleted."""
+        unreferenced = [
+            segment_id for segment_id, segment in self._segments.items()
+            if segment.sealed and not segment.references
+        ]
+        for segment_id in unreferenced:
+            self._delete(segment_id)
+        self._close_pending()
+        return len(unreferenced)
+
+    def _new_segment(self, size: int) -> int:
+        """Seals the active segment and creates a new sparse segment file of size bytes."""
+        if self._active is not None:
+            active = self._segments[self._active]
+            active.sealed = True
+            if not active.references:
+                self._delete(self._active)
+        segment_id = self._next_id
+        self._next_id += 1
+        path = os.path.join(self.directory, f"{segment_id:020d}{SEGMENT_SUFFIX}")
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                os.ftruncate(fd, size)
+                segment_map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            raise StorageError(f"Failed to create payload segment {path}: {e}")
+        segment = self._segments[segment_id] = _Segment(path, size, 0, sealed=False)
+        segment.map = segment_map
+        self._active = segment_id
+        self._close_pending()
+        return segment_id
+
+    def _map(self, segment: _Segment) -> None:
+        """Maps a segment registered by open() read-only."""
+        try:
+            with open(segment.path, 'rb') as segment_file:
+                segment.map = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise StorageError(f"Failed to map payload segment {segment.path}: {e}")
+
+    def _delete(self, segment_id: int) -> None:
+        """Unmaps and deletes a segment file."""
+        segment = self._segments.pop(segment_id)
+        if self._active == segment_id:
+            self._active = None
+        self._unmap(segment)
+        try:
+            os.unlink(segment.path)
+        except FileNotFoundError:
+            pass
+
+    def _unmap(self, segment: _Segment) -> None:
+        """Closes the mapping of a segment, deferring it while views are exported."""
+        if segment.map is None:
+            return
+        try:
+            segment.map.close()
+        except BufferError:
+            self._closing.append(segment.map)
+        segment.map = None
+
+    def _close_pending(self) -> None:
+        """Closes deferred mappings whose views have been released."""
+        still_exported = []
+        for segment_map in self._closing:
+            try:
+                segment_map.close()
+            except BufferError:
+                still_exported.append(segment_map)
+        self._closing = still_exported
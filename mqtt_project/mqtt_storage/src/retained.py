@@ -0,0 +1,257 @@
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+from mqtt_common.models.constants import MQTTProtocol
+from mqtt_common.models.errors import StorageError
+from mqtt_common.models.message import Message
+from .subscriptions import validate_topic_filter
+
+_SEPARATOR = MQTTProtocol.TOPIC_LEVEL_SEPARATOR
+_PLUS = MQTTProtocol.SINGLE_LEVEL_WILDCARD
+_HASH = MQTTProtocol.MULTI_LEVEL_WILDCARD
+_SYSTEM_PREFIX = MQTTProtocol.SYSTEM_TOPIC_PREFIX
+
+# Spill file garbage (replaced or deleted payloads) tolerated before compaction
+COMPACTION_THRESHOLD = 16 * 1024 * 1024
+
+
+class _Entry:
+    """A retained message; a spilled entry keeps its message without the payload."""
+    __slots__ = ('message', 'offset', 'size')
+
+    def __init__(self, message: Message):
+        self.message = message
+        self.offset = -1 # Position of the payload in the spill file, -1 while in memory
+        self.size = len(message.payload)
+
+
+class _Node:
+    """One topic level of the retained message tree."""
+    __slots__ = ('children', 'entry')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.entry: Optional[_Entry] = None
+
+
+class RetainedStore:
+    """
+    Retained messages keyed by topic, stored in a tree of topic levels.
+
+    match() walks the tree along the subscription filter: a literal level follows one
+    child, '+' every child of the current node and '#' the whole subtree, so a SUBSCRIBE
+    only visits the branches its filter can match instead of every retained topic.
+    As for subscriptions, leading wildcards do not match '$' topics.
+
+    With max_memory set, payloads are kept in memory up to that many bytes. Beyond it
+    the least recently stored or read payloads are appended to a spill file and read
+    back on demand; the message metadata and the topic tree always stay in memory.
+    """
+
+    def __init__(self, max_memory: Optional[int] = None, spill_path: Optional[str] = None):
+        self.max_memory = max_memory # Payload bytes kept in memory, None for no limit
+        self.memory_usage = 0 # Payload bytes currently in memory
+        self._root = _Node()
+        self._count = 0
+        self._resident: 'OrderedDict[str, _Entry]' = OrderedDict() # In-memory entries, coldest first
+        self._spill_path = spill_path
+        self._spill_fd: Optional[int] = None
+        self._spill_end = 0 # Size of the spill file
+        self._spilled_bytes = 0 # Live payload bytes in the spill file
+        self.spilled = 0 # Number of spilled entries
+
+    def __len__(self) -> int:
+        return self._count
+
+    def set(self, message: Message) -> None:
+        """Retains a message for its topic; an empty payload deletes the retained message."""
+        if not message.payload:
+            self.delete(message.topic)
+            return
+        node = self._root
+        for level in message.topic.split(_SEPARATOR):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _Node()
+            node = child
+        if node.entry is None:
+            self._count += 1
+        else:
+            self._release(message.topic, node.entry)
+        entry = node.entry = _Entry(message)
+        self._resident[message.topic] = entry
+        self.memory_usage += entry.size
+        self._enforce_limit()
+        self._maybe_compact()
+
+    def get(self, topic: str) -> Optional[Message]:
+        """Returns the retained message of a topic, if any."""
+        node = self._root
+        for level in topic.split(_SEPARATOR):
+            node = node.children.get(level)
+            if node is None:
+                return None
+        if node.entry is None:
+            return None
+        return self._load(topic, node.entry)
+
+    def delete(self, topic: str) -> bool:
+        """Removes the retained message of a topic and returns whether there was one."""
+        path: List[Tuple[_Node, str]] = []
+        node = self._root
+        for level in topic.split(_SEPARATOR):
+            child = node.children.get(level)
+            if child is None:
+                return False
+            path.append((node, level))
+            node = child
+        if node.entry is None:
+            return False
+        self._release(topic, node.entry)
+        node.entry = None
+        self._count -= 1
+        # Prune levels left without retained messages
+        for parent, level in reversed(path):
+            if node.children or node.entry is not None:
+                break
+            del parent.children[level]
+            node = parent
+        self._maybe_compact()
+        return True
+
+    def match(self, topic_filter: str) -> Iterator[Message]:
+        """Yields the retained messages whose topic matches a subscription filter."""
+        validate_topic_filter(topic_filter)
+        levels = topic_filter.split(_SEPARATOR)
+        depth = len(levels)
+        # Stack of (node, topic levels so far, index of the next filter level)
+        stack: List[Tuple[_Node, List[str], int]] = [(self._root, [], 0)]
+        while stack:
+            node, path, index = stack.pop()
+            if index == depth:
+                if node.entry is not None:
+                    yield self._load(_SEPARATOR.join(path), node.entry)
+                continue
+            level = levels[index]
+            if level == _HASH:
+                # '#' also matches the parent level itself
+                yield from self._subtree(node, path, index == 0)
+            elif level == _PLUS:
+                for name, child in node.children.items():
+                    if index == 0 and name.startswith(_SYSTEM_PREFIX):
+                        continue
+                    stack.append((child, path + [name], index + 1))
+            else:
+                child = node.children.get(level)
+                if child is not None:
+                    stack.append((child, path + [level], index + 1))
+
+    def _subtree(self, node: _Node, path: List[str], at_root: bool) -> Iterator[Message]:
+        """Yields every retained message at or below node."""
+        stack = [(node, path)]
+        while stack:
+            node, path = stack.pop()
+            if node.entry is not None and path:
+                yield self._load(_SEPARATOR.join(path), node.entry)
+            for name, child in node.children.items():
+                if at_root and not path and name.startswith(_SYSTEM_PREFIX):
+                    continue
+                stack.append((child, path + [name]))
+
+    def _load(self, topic: str, entry: _Entry) -> Message:
+        """Returns the message of an entry, reading a spilled payload back from disk."""
+        if entry.offset < 0:
+            self._resident.move_to_end(topic)
+            return entry.message
+        payload = os.pread(self._spill_fd, entry.size, entry.offset)
+        if len(payload) != entry.size:
+            raise StorageError(f"Truncated retained payload for {topic}")
+        return entry.message.replace(payload=payload)
+
+    def _release(self, topic: str, entry: _Entry) -> None:
+        """Forgets the payload of an entry being replaced or deleted."""
+        if entry.offset < 0:
+            del self._resident[topic]
+            self.memory_usage -= entry.size
+        else:
+            self._spilled_bytes -= entry.size
+            self.spilled -= 1
+
+    def _enforce_limit(self) -> None:
+        """Spills the coldest payloads until memory usage is within max_memory."""
+        if self.max_memory is None:
+            return
+        while self.memory_usage > self.max_memory and self._resident:
+            topic, entry = self._resident.popitem(last=False)
+            self._spill(entry)
+
+    def _spill(self, entry: _Entry) -> None:
+        """Appends the payload of an entry to the spill file and drops it from memory."""
+        if self._spill_fd is None:
+            self._open_spill_file()
+        payload = entry.message.view()
+        written = os.pwrite(self._spill_fd, payload, self._spill_end)
+        if written != len(payload):
+            raise StorageError("Short write to retained message spill file")
+        entry.offset = self._spill_end
+        entry.message = entry.message.replace(payload=b"")
+        self._spill_end += entry.size
+        self._spilled_bytes += entry.size
+        self.memory_usage -= entry.size
+        self.spilled += 1
+
+    def _open_spill_file(self) -> None:
+        """Creates the spill file, in the temporary directory unless a path was given."""
+        if self._spill_path is None:
+            fd, self._spill_path = tempfile.mkstemp(prefix="mqtt-retained-", suffix=".spill")
+            self._spill_fd = fd
+        else:
+            self._spill_fd = os.open(self._spill_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+
+    def _maybe_compact(self) -> None:
+        """Compacts the spill file once garbage outweighs both live data and the threshold."""
+        garbage = self._spill_end - self._spilled_bytes
+        if garbage > COMPACTION_THRESHOLD and garbage > self._spilled_bytes:
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrites the spill file with live payloads only."""
+        if self._spill_fd is None:
+            return
+        entries = [entry for entry in self._entries() if entry.offset >= 0]
+        path = self._spill_path + ".compact"
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        offsets = []
+        end = 0
+        try:
+            for entry in entries:
+                payload = os.pread(self._spill_fd, entry.size, entry.offset)
+                os.pwrite(fd, payload, end)
+                offsets.append(end)
+                end += entry.size
+            os.replace(path, self._spill_path)
+        except OSError as e:
+            os.close(fd)
+            raise StorageError(f"Failed to compact retained message spill file: {e}")
+        for entry, offset in zip(entries, offsets):
+            entry.offset = offset
+        os.close(self._spill_fd)
+        self._spill_fd = fd
+        self._spill_end = end
+
+    def _entries(self) -> Iterator[_Entry]:
+        """Iterates over every entry in the tree."""
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node.entry is not None:
+                yield node.entry
+            stack.extend(node.children.values())
+
+    def close(self) -> None:
+        """Closes and removes the spill file."""
+        if self._spill_fd is not None:
+            os.close(self._spill_fd)
+            self._spill_fd = None
+            os.unlink(self._spill_path)
@@ -0,0 +1,357 @@
+import random
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from mqtt_common.models.constants import MQTTProtocol
+from mqtt_common.models.errors import ValidationError
+
+_SEPARATOR = MQTTProtocol.TOPIC_LEVEL_SEPARATOR
+_PLUS = MQTTProtocol.SINGLE_LEVEL_WILDCARD
+_HASH = MQTTProtocol.MULTI_LEVEL_WILDCARD
+_SYSTEM_PREFIX = MQTTProtocol.SYSTEM_TOPIC_PREFIX
+_SHARED_PREFIX = MQTTProtocol.SHARED_SUBSCRIPTION_PREFIX + _SEPARATOR
+
+
+def validate_topic_filter(topic_filter: str) -> None:
+    """Raises ValidationError unless topic_filter is a valid subscription topic filter."""
+    if not topic_filter:
+        raise ValidationError("Topic filter must not be empty")
+    levels = topic_filter.split(_SEPARATOR)
+    for index, level in enumerate(levels):
+        if _HASH in level and (level != _HASH or index != len(levels) - 1):
+            raise ValidationError(f"Invalid '#' wildcard in topic filter: {topic_filter}")
+        if _PLUS in level and level != _PLUS:
+            raise ValidationError(f"Invalid '+' wildcard in topic filter: {topic_filter}")
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """Returns whether a topic name matches a (valid) topic filter."""
+    if topic.startswith(_SYSTEM_PREFIX) and topic_filter[:1] in (_PLUS, _HASH):
+        return False
+    filter_levels = topic_filter.split(_SEPARATOR)
+    topic_levels = topic.split(_SEPARATOR)
+    for index, level in enumerate(filter_levels):
+        if level == _HASH:
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != _PLUS and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def has_wildcards(topic_filter: str) -> bool:
+    """Returns whether a topic filter contains a '+' or '#' wildcard."""
+    return _PLUS in topic_filter or _HASH in topic_filter
+
+
+def parse_shared_filter(topic_filter: str) -> Optional[Tuple[str, str]]:
+    """
+    Returns (group, topic filter) for a '$share/<group>/<filter>' subscription, or None
+    for an ordinary filter. Raises ValidationError for a malformed shared subscription.
+    """
+    if not topic_filter.startswith(_SHARED_PREFIX):
+        return None
+    group, separator, inner = topic_filter[len(_SHARED_PREFIX):].partition(_SEPARATOR)
+    if not group or not separator or _PLUS in group or _HASH in group:
+        raise ValidationError(f"Invalid shared subscription: {topic_filter}")
+    validate_topic_filter(inner)
+    return group, inner
+
+
+class SharedGroup:
+    """
+    Members of one shared subscription, i.e. one group name and topic filter.
+
+    Members are kept in a list with their positions indexed, so adding, removing and
+    picking a member by position are all O(1).
+    """
+    __slots__ = ('name', 'topic_filter', 'members', 'qos', '_positions', 'cursor')
+
+    def __init__(self, name: str, topic_filter: str):
+        self.name = name
+        self.topic_filter = topic_filter
+        self.members: List[str] = [] # Member client IDs, in no particular order
+        self.qos: Dict[str, int] = {} # client_id -> QoS of its subscription
+        self._positions: Dict[str, int] = {} # client_id -> index in members
+        self.cursor = 0 # Round-robin position
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def add(self, client_id: str, qos: int) -> bool:
+        """Adds a member or updates its QoS and returns whether it is new."""
+        self.qos[client_id] = qos
+        if client_id in self._positions:
+            return False
+        self._positions[client_id] = len(self.members)
+        self.members.append(client_id)
+        return True
+
+    def remove(self, client_id: str) -> bool:
+        """Removes a member by moving the last member into its place; returns whether it was one."""
+        position = self._positions.pop(client_id, None)
+        if position is None:
+            return False
+        del self.qos[client_id]
+        last = self.members.pop()
+        if last != client_id:
+            self.members[position] = last
+            self._positions[last] = position
+        return True
+
+
+# Picks the member of a non-empty group that receives a message published to topic
+SelectionStrategy = Callable[[SharedGroup, str], str]
+
+
+def round_robin(group: SharedGroup, topic: str) -> str:
+    """Takes turns between the members."""
+    group.cursor = (group.cursor + 1) % len(group.members)
+    return group.members[group.cursor]
+
+
+def hash_by_topic(group: SharedGroup, topic: str) -> str:
+    """Sends every message of a topic to the same member, keeping their order while membership is stable."""
+    return group.members[zlib.crc32(topic.encode()) % len(group.members)]
+
+
+class LeastLoaded:
+    """
+    Picks the less loaded of two random members ("power of two choices").
+
+    depth(client_id) reports a member's load, e.g. its outbound queue depth. Comparing
+    two random members instead of all of them keeps selection O(1) while steering
+    messages away from slow consumers almost as well as a full scan.
+    """
+    __slots__ = ('depth', '_random')
+
+    def __init__(self, depth: Callable[[str], int], rng: Optional[random.Random] = None):
+        self.depth = depth
+        self._random = rng or random.Random()
+
+    def __call__(self, group: SharedGroup, topic: str) -> str:
+        members = group.members
+        count = len(members)
+        if count == 1:
+            return members[0]
+        first = self._random.randrange(count)
+        second = self._random.randrange(count - 1)
+        if second >= first:
+            second += 1
+        a, b = members[first], members[second]
+        return a if self.depth(a) <= self.depth(b) else b
+
+
+def _collect(result: Dict[str, int], subscribers: Dict[str, int]) -> None:
+    """Merges subscribers into result, keeping the highest QoS per client."""
+    if not result:
+        result.update(subscribers)
+        return
+    for client_id, qos in subscribers.items():
+        if result.get(client_id, -1) < qos:
+            result[client_id] = qos
+
+
+class _Node:
+    """One topic level of the trie."""
+    __slots__ = ('children', 'plus', 'multi', 'subscribers')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {} # Child per literal topic level
+        self.plus: Optional['_Node'] = None # Child for a '+' level
+        self.multi: Optional[Dict[str, int]] = None # Subscribers of a '#' level below this one
+        self.subscribers: Dict[str, int] = {} # client_id -> QoS of filters ending here
+
+    def is_empty(self) -> bool:
+        return not (self.children or self.plus or self.multi or self.subscribers)
+
+
+class SubscriptionTrie:
+    """
+    Subscription index keyed by topic level, with '+' and '#' as dedicated branches.
+
+    Matching a topic walks one level at a time, following at most the literal child,
+    the '+' child and the '#' subscribers of each node reached, so its cost depends on
+    the topic depth and the number of matching filters rather than on the number of
+    subscriptions. Each client appears at most once in a match, with the highest QoS
+    of all its matching filters. Filters starting with a wildcard do not match topics
+    starting with '$', such as $SYS topics.
+
+    Shared subscriptions ('$share/<group>/<filter>') are indexed by their own trie of
+    SharedGroups. A match adds one member of each matching group, picked by strategy
+    (round_robin, hash_by_topic, LeastLoaded or any SelectionStrategy), so matching
+    the same topic twice may return different clients.
+    """
+
+    def __init__(self, strategy: SelectionStrategy = round_robin):
+        self._root = _Node()
+        self._client_filters: Dict[str, Dict[str, int]] = {} # client_id -> {topic_filter: qos}
+        self._count = 0
+        self.strategy = strategy # Picks the member of a shared group that receives a message
+        self._groups: Dict[str, SharedGroup] = {} # '$share/<group>/<filter>' -> its members
+        self._shared: Optional['SubscriptionTrie'] = None # Group filters keyed by their shared filter
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, client_id: str, topic_filter: str, qos: int) -> bool:
+        """Adds or replaces a subscription and returns whether it is new."""
+        shared = parse_shared_filter(topic_filter)
+        if shared is not None:
+            is_new = self._add_shared(client_id, topic_filter, shared, qos)
+            self._client_filters.setdefault(client_id, {})[topic_filter] = qos
+            if is_new:
+                self._count += 1
+            return is_new
+        validate_topic_filter(topic_filter)
+        node = self._root
+        levels = topic_filter.split(_SEPARATOR)
+        if levels[-1] == _HASH:
+            levels.pop()
+            for level in levels:
+                node = self._child(node, level)
+            if node.multi is None:
+                node.multi = {}
+            subscribers = node.multi
+        else:
+            for level in levels:
+                node = self._child(node, level)
+            subscribers = node.subscribers
+
+        is_new = client_id not in subscribers
+        subscribers[client_id] = qos
+        self._client_filters.setdefault(client_id, {})[topic_filter] = qos
+        if is_new:
+            self._count += 1
+        return is_new
+
+    def _add_shared(self, client_id: str, topic_filter: str, shared: Tuple[str, str], qos: int) -> bool:
+        group = self._groups.get(topic_filter)
+        if group is None:
+            group = self._groups[topic_filter] = SharedGroup(*shared)
+            if self._shared is None:
+                self._shared = SubscriptionTrie()
+            self._shared.add(topic_filter, shared[1], 0)
+        return group.add(client_id, qos)
+
+    def _remove_shared(self, client_id: str, topic_filter: str) -> None:
+        group = self._groups[topic_filter]
+        group.remove(client_id)
+        if not group:
+            del self._groups[topic_filter]
+            self._shared.remove(topic_filter, group.topic_filter)
+
+    def shared_group(self, topic_filter: str) -> Optional[SharedGroup]:
+        """Returns the members of a '$share/<group>/<filter>' subscription, if it has any."""
+        return self._groups.get(topic_filter)
+
+    @staticmethod
+    def _child(node: _Node, level: str) -> _Node:
+        """Returns the child of node for level, creating it if needed."""
+        if level == _PLUS:
+            if node.plus is None:
+                node.plus = _Node()
+            return node.plus
+        child = node.children.get(level)
+        if child is None:
+            child = node.children[level] = _Node()
+        return child
+
+    def remove(self, client_id: str, topic_filter: str) -> bool:
+        """Removes a subscription and returns whether it existed; emptied branches are pruned."""
+        filters = self._client_filters.get(client_id)
+        if not filters or filters.pop(topic_filter, None) is None:
+            return False
+        if not filters:
+            del self._client_filters[client_id]
+        if topic_filter in self._groups:
+            self._remove_shared(client_id, topic_filter)
+            self._count -= 1
+            return True
+
+        levels = topic_filter.split(_SEPARATOR)
+        is_multi = levels[-1] == _HASH
+        if is_multi:
+            levels.pop()
+        path: List[Tuple[_Node, str]] = []
+        node = self._root
+        for level in levels:
+            child = node.plus if level == _PLUS else node.children[level]
+            path.append((node, level))
+            node = child
+
+        if is_multi:
+            del node.multi[client_id]
+            if not node.multi:
+                node.multi = None
+        else:
+            del node.subscribers[client_id]
+        self._count -= 1
+
+        # Prune nodes left without subscriptions, deepest first
+        for parent, level in reversed(path):
+            if not node.is_empty():
+                break
+            if level == _PLUS:
+                parent.plus = None
+            else:
+                del parent.children[level]
+            node = parent
+        return True
+
+    def remove_client(self, client_id: str) -> int:
+        """Removes every subscription of a client and returns how many were removed."""
+        filters = list(self._client_filters.get(client_id, ()))
+        for topic_filter in filters:
+            self.remove(client_id, topic_filter)
+        return len(filters)
+
+    def subscriptions(self, client_id: str) -> Dict[str, int]:
+        """Returns the topic filters of a client with their QoS."""
+        return dict(self._client_filters.get(client_id, ()))
+
+    def clients(self) -> Iterator[str]:
+        """Iterates over the clients holding at least one subscription."""
+        return iter(self._client_filters)
+
+    def match(self, topic: str) -> Dict[str, int]:
+        """Returns client_id -> highest QoS for every subscription matching a topic name."""
+        result = self._match(topic)
+        if self._groups:
+            for topic_filter in self._shared._match(topic):
+                group = self._groups[topic_filter]
+                client_id = self.strategy(group, topic)
+                qos = group.qos[client_id]
+                if result.get(client_id, -1) < qos:
+                    result[client_id] = qos
+        return result
+
+    def _match(self, topic: str) -> Dict[str, int]:
+        """Matches the ordinary subscriptions."""
+        result: Dict[str, int] = {}
+        levels = topic.split(_SEPARATOR)
+        root = self._root
+        nodes = [root]
+        # Wildcards at the first level do not match '$' topics
+        skip_wildcards = topic.startswith(_SYSTEM_PREFIX)
+        for level in levels:
+            next_nodes = []
+            for node in nodes:
+                if node.multi is not None and not (skip_wildcards and node is root):
+                    _collect(result, node.multi)
+                child = node.children.get(level)
+                if child is not None:
+                    next_nodes.append(child)
+                if node.plus is not None and not (skip_wildcards and node is root):
+                    next_nodes.append(node.plus)
+            if not next_nodes:
+                return result
+            nodes = next_nodes
+
+        for node in nodes:
+            if node.subscribers:
+                _collect(result, node.subscribers)
+            # 'a/#' also matches 'a'
+            if node.multi is not None:
+                _collect(result, node.multi)
+        return result
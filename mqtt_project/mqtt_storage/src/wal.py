@@ -0,0 +1,526 @@
+import asyncio
+import marshal
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from mqtt_common.models.errors import StorageError
+from mqtt_common.models.message import Message, WALL_CLOCK_OFFSET_NS
+from .memory import MemoryStorage
+from .subscriptions import SubscriptionTrie
+
+SEGMENT_SUFFIX = ".wal"
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024 # Bytes appended to a segment before rolling to a new one
+DEFAULT_COMMIT_LATENCY = 0.002 # Seconds a commit waits for more records before fsync
+DEFAULT_COMMIT_BYTES = 1024 * 1024 # Pending bytes that trigger a commit without waiting
+DEFAULT_MAX_SEGMENTS = 8 # Sealed segments kept before they are compacted into a snapshot
+
+# Record header: body length, record type, CRC-32 of the body
+_RECORD_HEADER = struct.Struct('!IBI')
+# MESSAGE body: message ID, QoS, retain, wall-clock nanoseconds, topic length, properties length;
+# followed by the topic, the marshalled properties and the payload
+_MESSAGE = struct.Struct('!QBBqHI')
+# SUBSCRIBE body: QoS, client ID length; followed by the client ID and the topic filter
+_SUBSCRIBE = struct.Struct('!BH')
+# UNSUBSCRIBE body: client ID length; followed by the client ID and the topic filter
+_UNSUBSCRIBE = struct.Struct('!H')
+# ACK body: message ID
+_ACK = struct.Struct('!Q')
+
+_MESSAGE_RECORD = 1
+_ACK_RECORD = 2
+_SUBSCRIBE_RECORD = 3
+_UNSUBSCRIBE_RECORD = 4
+_CHECKPOINT_RECORD = 5 # Starts a snapshot: discard the state of earlier segments
+
+_ENCODING = 'utf-8'
+
+
+def encode_message(message: Message) -> bytes:
+    """Encodes the body of a MESSAGE record."""
+    topic = message.topic.encode(_ENCODING)
+    properties = marshal.dumps(dict(message.properties)) if message.properties else b""
+    return _MESSAGE.pack(
+        message.message_id or 0, message.qos, message.retain,
+        message.wall_time_ns, len(topic), len(properties)
+    ) + topic + properties + message.view()
+
+
+def decode_message(body: memoryview) -> Message:
+    """Decodes the body of a MESSAGE record."""
+    message_id, qos, retain, timestamp, topic_length, properties_length = _MESSAGE.unpack_from(body)
+    offset = _MESSAGE.size
+    topic = str(body[offset:offset + topic_length], _ENCODING)
+    offset += topic_length
+    properties = marshal.loads(body[offset:offset + properties_length]) if properties_length else {}
+    offset += properties_length
+    # The record passed its CRC and was validated when it was stored
+    return Message.trusted(
+        topic=topic,
+        payload=body[offset:].tobytes(),
+        qos=qos,
+        retain=bool(retain),
+        message_id=message_id if qos else None,
+        properties=properties,
+        timestamp_ns=timestamp - WALL_CLOCK_OFFSET_NS
+    )
+
+
+class _Segment:
+    """Bookkeeping of one segment file."""
+    __slots__ = ('live_messages', 'has_subscriptions')
+
+    def __init__(self):
+        self.live_messages = 0 # Unacknowledged messages whose latest record is in this segment
+        self.has_subscriptions = False # Whether the segment holds subscription changes
+
+
+class WALStorage(MemoryStorage):
+    """
+    Durable storage appending QoS 1/2 messages and subscription changes to a write-ahead log.
+
+    The log is a directory of numbered segment files holding CRC-checked records. State
+    is served from memory (see MemoryStorage) and rebuilt by replaying the segments in
+    start(); a torn record at the end of the last segment is truncated away.
+
+    store_message, store_subscription and remove_subscription return once their record
+    is on disk. Records are written by a single writer task that waits up to
+    max_commit_latency (or until max_commit_bytes are pending) and then commits every
+    pending record with one write and one fsync, so concurrent awaiters share the cost
+    of an fsync. remove_message does not wait: a lost acknowledgement only causes a
+    redelivery, which QoS 1 allows.
+
+    A commit that fails is undone: its segments are truncated back to their committed
+    size, so later records never follow a torn one, and the changes its writes made to
+    memory are reverted before they raise StorageError. If the truncation fails too, the
+    log stops accepting writes, since nothing appended after the torn record could be
+    replayed.
+
+    Segments roll at segment_size. The oldest sealed segments are deleted once all their
+    messages are acknowledged; when more than max_segments sealed segments remain (for
+    instance because they hold subscriptions), they are replaced by a snapshot of the
+    current state.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = DEFAULT_SEGMENT_SIZE,
+        max_commit_latency: float = DEFAULT_COMMIT_LATENCY,
+        max_commit_bytes: int = DEFAULT_COMMIT_BYTES,
+        max_segments: int = DEFAULT_MAX_SEGMENTS,
+        sync: bool = True
+    ):
+        super().__init__()
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_commit_latency = max_commit_latency
+        self.max_commit_bytes = max_commit_bytes
+        self.max_segments = max_segments
+        self.sync = sync # fsync on commit; only disable for tests and benchmarks
+        self.commits = 0 # Number of group commits
+        self.compactions = 0 # Number of snapshots written
+        self.last_error: Optional[Exception] = None # Last failed commit or background compaction
+        self._segments: Dict[int, _Segment] = {}
+        self._message_segments: Dict[int, int] = {} # Message ID -> segment of its latest record
+        self._active = 0 # Segment receiving new records
+        self._active_size = 0
+        self._pending: List[Tuple[int, bytearray]] = [] # (segment, records) not yet written
+        self._pending_bytes = 0
+        self._waiters: List[asyncio.Future] = []
+        self._wakeup = asyncio.Event() # Records are pending
+        self._full = asyncio.Event() # max_commit_bytes are pending
+        self._writer_task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._fd: Optional[int] = None # Open segment; only used from the executor thread
+        self._fd_segment = 0
+        self._failed: Optional[StorageError] = None # Set when a failed commit could not be undone
+
+    async def start(self) -> None:
+        """Replays the log into memory and starts the writer task"""
+        os.makedirs(self.directory, exist_ok=True)
+        segment_ids = self._segment_ids()
+        for index, segment_id in enumerate(segment_ids):
+            self._segments[segment_id] = _Segment()
+            self._replay(segment_id, is_last=index == len(segment_ids) - 1)
+        # New records always go to a fresh segment
+        self._active = (segment_ids[-1] if segment_ids else 0) + 1
+        self._segments[self._active] = _Segment()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wal")
+        self._writer_task = asyncio.create_task(self._writer())
+
+    async def stop(self) -> None:
+        """Commits pending records and closes the log"""
+        if self._writer_task is None:
+            return
+        if self._failed is None:
+            await self.flush()
+        self._writer_task.cancel()
+        try:
+            await self._writer_task
+        except asyncio.CancelledError:
+            pass
+        self._writer_task = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_segment)
+        self._executor.shutdown()
+
+    async def flush(self) -> None:
+        """Waits until every record appended so far is on disk"""
+        self._check_started()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._wakeup.set()
+        self._full.set()
+        await waiter
+
+    async def store_message(self, message: Message) -> None:
+        """Store a message; QoS 1/2 messages are durable when this returns"""
+        if message.message_id is None:
+            return
+        if message.qos == 0:
+            await super().store_message(message)
+            return
+        self._check_started()
+        committed = self._append(_MESSAGE_RECORD, encode_message(message), durable=True)
+        previous = self.messages.get(message.message_id)
+        previous_segment = self._message_segments.get(message.message_id)
+        self._apply_message(message, self._active)
+        try:
+            await committed
+        except StorageError:
+            # Unless it was acknowledged meanwhile, forget the message and restore the one it replaced
+            if self.messages.get(message.message_id) is message:
+                self._apply_ack(message.message_id)
+                if previous is not None and previous_segment in self._segments:
+                    self._apply_message(previous, previous_segment)
+            raise
+
+    async def remove_message(self, message_id: int) -> None:
+        """Remove an acknowledged message; the acknowledgement is committed with the next batch"""
+        if message_id not in self._message_segments:
+            await super().remove_message(message_id)
+            return
+        self._append(_ACK_RECORD, _ACK.pack(message_id), durable=False)
+        self._apply_ack(message_id)
+
+    async def store_subscription(self, client_id: str, topic: str, qos: int) -> None:
+        """Store a subscription; it is durable when this returns"""
+        self._check_started()
+        previous = self.subscriptions.subscriptions(client_id).get(topic)
+        self.subscriptions.add(client_id, topic, qos)
+        client = client_id.encode(_ENCODING)
+        committed = self._append(
+            _SUBSCRIBE_RECORD, _SUBSCRIBE.pack(qos, len(client)) + client + topic.encode(_ENCODING),
+            durable=True
+        )
+        self._segments[self._active].has_subscriptions = True
+        try:
+            await committed
+        except StorageError:
+            if previous is None:
+                self.subscriptions.remove(client_id, topic)
+            else:
+                self.subscriptions.add(client_id, topic, previous)
+            raise
+
+    async def remove_subscription(self, client_id: str, topic: str) -> None:
+        """Remove a subscription; the removal is durable when this returns"""
+        self._check_started()
+        qos = self.subscriptions.subscriptions(client_id).get(topic)
+        if qos is None:
+            return
+        self.subscriptions.remove(client_id, topic)
+        client = client_id.encode(_ENCODING)
+        committed = self._append(
+            _UNSUBSCRIBE_RECORD, _UNSUBSCRIBE.pack(len(client)) + client + topic.encode(_ENCODING),
+            durable=True
+        )
+        self._segments[self._active].has_subscriptions = True
+        try:
+            await committed
+        except StorageError:
+            self.subscriptions.add(client_id, topic, qos)
+            raise
+
+    def _check_started(self) -> None:
+        """Raises StorageError unless the log has been started, not stopped and accepts writes."""
+        if self._writer_task is None:
+            raise StorageError(f"Write-ahead log {self.directory} is not open; call start() first")
+        if self._failed is not None:
+            raise self._failed
+
+    def _apply_message(self, message: Message, segment_id: int) -> None:
+        """Indexes a stored message as living in a segment."""
+        previous = self._message_segments.get(message.message_id)
+        if previous is not None:
+            self._segments[previous].live_messages -= 1
+        self.messages[message.message_id] = message
+        self._message_segments[message.message_id] = segment_id
+        self._segments[segment_id].live_messages += 1
+
+    def _apply_ack(self, message_id: int) -> None:
+        """Drops an acknowledged message from the index."""
+        self.messages.pop(message_id, None)
+        segment_id = self._message_segments.pop(message_id, None)
+        if segment_id is not None:
+            self._segments[segment_id].live_messages -= 1
+
+    def _append(self, record_type: int, body: bytes, durable: bool) -> Optional[asyncio.Future]:
+        """Queues a record for the writer task; returns a future resolved once it is on disk."""
+        record = _RECORD_HEADER.pack(len(body), record_type, zlib.crc32(body)) + body
+        if self._active_size and self._active_size + len(record) > self.segment_size:
+            self._active += 1
+            self._segments[self._active] = _Segment()
+            self._active_size = 0
+        self._active_size += len(record)
+        if self._pending and self._pending[-1][0] == self._active:
+            self._pending[-1][1].extend(record)
+        else:
+            self._pending.append((self._active, bytearray(record)))
+        self._pending_bytes += len(record)
+        self._wakeup.set()
+        if self._pending_bytes >= self.max_commit_bytes:
+            self._full.set()
+        if not durable:
+            return None
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        return waiter
+
+    async def _writer(self) -> None:
+        """Commits pending records in batches, then reclaims segments."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            if self.max_commit_latency and not self._full.is_set():
+                # Give concurrent writers a chance to join this commit
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_commit_latency)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            self._full.clear()
+            chunks, waiters = self._pending, self._waiters
+            self._pending, self._waiters, self._pending_bytes = [], [], 0
+            try:
+                if self._failed is not None:
+                    raise self._failed
+                await loop.run_in_executor(self._executor, self._write, chunks)
+            except Exception as e:
+                # Fail this batch but keep committing later ones, so no awaiter hangs;
+                # _write() already truncated the batch away, or marked the log as failed
+                if e is self._failed:
+                    error = e
+                else:
+                    error = StorageError(f"Failed to write to the log: {e}")
+                    error.__cause__ = e
+                self.last_error = error
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(error)
+                continue
+            self.commits += 1
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+            try:
+                await self._reclaim()
+            except Exception as e:
+                self.last_error = StorageError(f"Failed to compact the log: {e}")
+
+    async def _reclaim(self) -> None:
+        """Deletes the oldest fully acknowledged segments and compacts when too many remain."""
+        loop = asyncio.get_running_loop()
+        # Segments before the one being written to are complete on disk
+        sealed = sorted(segment_id for segment_id in self._segments if segment_id < self._fd_segment)
+        removable = []
+        for segment_id in sealed:
+            segment = self._segments[segment_id]
+            # Acknowledgements refer to earlier segments, so only a prefix may go
+            if segment.live_messages or segment.has_subscriptions:
+                break
+            removable.append(segment_id)
+        if removable:
+            await loop.run_in_executor(self._executor, self._remove_segments, removable)
+            for segment_id in removable:
+                del self._segments[segment_id]
+            sealed = sealed[len(removable):]
+        if len(sealed) > self.max_segments:
+            await self._compact(sealed)
+
+    async def _compact(self, sealed: List[int]) -> None:
+        """Replaces the sealed segments with a snapshot of the current state."""
+        target = sealed[-1]
+        snapshot = bytearray(_RECORD_HEADER.pack(0, _CHECKPOINT_RECORD, zlib.crc32(b"")))
+        for client_id in list(self.subscriptions.clients()):
+            client = client_id.encode(_ENCODING)
+            for topic_filter, qos in self.subscriptions.subscriptions(client_id).items():
+                body = _SUBSCRIBE.pack(qos, len(client)) + client + topic_filter.encode(_ENCODING)
+                snapshot += _RECORD_HEADER.pack(len(body), _SUBSCRIBE_RECORD, zlib.crc32(body)) + body
+        captured = dict(self._message_segments)
+        for message_id in captured:
+            body = encode_message(self.messages[message_id])
+            snapshot += _RECORD_HEADER.pack(len(body), _MESSAGE_RECORD, zlib.crc32(body)) + body
+
+        await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._write_snapshot, target, snapshot, sealed[:-1]
+        )
+
+        # Messages unchanged since the snapshot now live in it; later records still replay after it
+        for segment_id in sealed[:-1]:
+            del self._segments[segment_id]
+        self._segments[target].has_subscriptions = len(self.subscriptions) > 0
+        for message_id, segment_id in captured.items():
+            if self._message_segments.get(message_id) == segment_id:
+                self._message_segments[message_id] = target
+        for segment in self._segments.values():
+            segment.live_messages = 0
+        for segment_id in self._message_segments.values():
+            self._segments[segment_id].live_messages += 1
+        self.compactions += 1
+
+    def _segment_ids(self) -> List[int]:
+        """Returns the IDs of the segment files in the directory, oldest first."""
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"{segment_id:020d}{SEGMENT_SUFFIX}")
+
+    def _replay(self, segment_id: int, is_last: bool) -> None:
+        """Applies the records of a segment to the in-memory state."""
+        path = self._segment_path(segment_id)
+        with open(path, 'rb') as segment_file:
+            data = memoryview(segment_file.read())
+        offset = 0
+        while offset < len(data):
+            body_start = offset + _RECORD_HEADER.size
+            if body_start > len(data):
+                break
+            length, record_type, checksum = _RECORD_HEADER.unpack_from(data, offset)
+            body = data[body_start:body_start + length]
+            if len(body) != length or zlib.crc32(body) != checksum:
+                break
+            self._apply_record(record_type, body, segment_id)
+            offset = body_start + length
+        if offset < len(data):
+            if not is_last:
+                raise StorageError(f"Corrupt record in {path} at offset {offset}")
+            # A torn write at the end of the log never completed its commit
+            os.truncate(path, offset)
+
+    def _apply_record(self, record_type: int, body: memoryview, segment_id: int) -> None:
+        """Applies one replayed record."""
+        if record_type == _MESSAGE_RECORD:
+            self._apply_message(decode_message(body), segment_id)
+        elif record_type == _ACK_RECORD:
+            self._apply_ack(_ACK.unpack_from(body)[0])
+        elif record_type == _SUBSCRIBE_RECORD:
+            qos, client_length = _SUBSCRIBE.unpack_from(body)
+            client_end = _SUBSCRIBE.size + client_length
+            self.subscriptions.add(
+                str(body[_SUBSCRIBE.size:client_end], _ENCODING), str(body[client_end:], _ENCODING), qos
+            )
+            self._segments[segment_id].has_subscriptions = True
+        elif record_type == _UNSUBSCRIBE_RECORD:
+            client_length, = _UNSUBSCRIBE.unpack_from(body)
+            client_end = _UNSUBSCRIBE.size + client_length
+            self.subscriptions.remove(
+                str(body[_UNSUBSCRIBE.size:client_end], _ENCODING), str(body[client_end:], _ENCODING)
+            )
+            self._segments[segment_id].has_subscriptions = True
+        elif record_type == _CHECKPOINT_RECORD:
+            self.messages.clear()
+            self._message_segments.clear()
+            self.subscriptions = SubscriptionTrie(self.subscriptions.strategy)
+            for segment in self._segments.values():
+                segment.live_messages = 0
+                segment.has_subscriptions = False
+        else:
+            raise StorageError(f"Unknown log record type: {record_type}")
+
+    # The methods below run on the executor thread
+
+    def _write(self, chunks: List[Tuple[int, bytearray]]) -> None:
+        """Writes pending records to their segments and syncs them; undoes them on failure."""
+        committed: List[Tuple[int, int]] = [] # (segment, size before this commit)
+        try:
+            for segment_id, data in chunks:
+                if segment_id != self._fd_segment:
+                    self._close_segment()
+                    self._fd = os.open(
+                        self._segment_path(segment_id), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644
+                    )
+                    self._fd_segment = segment_id
+                    self._sync_directory()
+                committed.append((segment_id, os.fstat(self._fd).st_size))
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self._fd, view):]
+            if self._fd is not None and self.sync:
+                os.fsync(self._fd)
+        except Exception as e:
+            self._truncate(committed, e)
+            raise
+
+    def _truncate(self, committed: List[Tuple[int, int]], cause: Exception) -> None:
+        """Cuts the segments of a failed commit back to their committed sizes."""
+        try:
+            for segment_id, size in committed:
+                if segment_id == self._fd_segment and self._fd is not None:
+                    os.ftruncate(self._fd, size)
+                    if self.sync:
+                        os.fsync(self._fd)
+                else:
+                    os.truncate(self._segment_path(segment_id), size)
+        except OSError as e:
+            self._failed = StorageError(
+                f"Write-ahead log {self.directory} holds a torn record and accepts no more writes: {cause}"
+            )
+            self._failed.__cause__ = e
+
+    def _close_segment(self) -> None:
+        """Syncs and closes the open segment."""
+        if self._fd is not None:
+            if self.sync:
+                os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    def _write_snapshot(self, target: int, snapshot: bytearray, obsolete: List[int]) -> None:
+        """Atomically replaces segment target with a snapshot, then deletes older segments."""
+        path = self._segment_path(target)
+        temporary = path + ".compact"
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(snapshot)
+            while view:
+                view = view[os.write(fd, view):]
+            if self.sync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temporary, path)
+        self._sync_directory()
+        # The checkpoint at the start of the snapshot makes leftovers harmless after a crash
+        self._remove_segments(obsolete)
+
+    def _remove_segments(self, segment_ids: List[int]) -> None:
+        """Deletes segment files."""
+        for segment_id in segment_ids:
+            os.unlink(self._segment_path(segment_id))
+        self._sync_directory()
+
+    def _sync_directory(self) -> None:
+        """Makes file creations, renames and deletions in the log directory durable."""
+        if not self.sync:
+            return
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,81 @@
+import pytest
+from mqtt_storage.src.cache import CachedStorage
+from mqtt_storage.src.memory import MemoryStorage
+from mqtt_storage.src.subscriptions import topic_matches
+
+class TestTopicMatches:
+    """Tests for matching a single topic against a single filter."""
+
+    @pytest.mark.parametrize("topic_filter, topic, matches", [
+        ("a/b", "a/b", True),
+        ("a/+", "a/b", True),
+        ("a/+", "a/b/c", False),
+        ("a/#", "a", True),
+        ("a/b/c", "a/b", False),
+        ("#", "$SYS/x", False),
+    ])
+    def test_topic_matches(self, topic_filter, topic, matches):
+        """Tests wildcard matching of one filter."""
+        assert topic_matches(topic_filter, topic) is matches
+
+
+@pytest.mark.asyncio
+class TestCachedStorage:
+    """Tests for the subscription lookup cache."""
+
+    async def test_hits_and_misses(self):
+        """Tests that repeated lookups of a topic are served from the cache."""
+        storage = CachedStorage(MemoryStorage())
+        await storage.store_subscription("c1", "a/+", 1)
+        assert await storage.get_subscriptions("a/b") == [("c1", 1)]
+        assert await storage.get_subscriptions("a/b") == [("c1", 1)]
+        assert (storage.hits, storage.misses) == (1, 1)
+
+    async def test_invalidates_only_matching_topics(self):
+        """Tests that a subscription change drops only the cached topics its filter matches."""
+        storage = CachedStorage(MemoryStorage())
+        for topic in ("a/1", "a/2", "b/1"):
+            await storage.get_subscriptions(topic)
+
+        await storage.store_subscription("c1", "a/+", 0)
+        assert storage.invalidations == 2
+        assert len(storage) == 1
+        assert await storage.get_subscriptions("a/1") == [("c1", 0)]
+
+        await storage.remove_subscription("c1", "a/+")
+        assert await storage.get_subscriptions("a/1") == []
+
+    async def test_exact_filter_invalidates_single_entry(self):
+        """Tests that a filter without wildcards drops at most its own topic."""
+        storage = CachedStorage(MemoryStorage())
+        await storage.get_subscriptions("a/1")
+        await storage.get_subscriptions("a/2")
+        await storage.store_subscription("c1", "a/1", 2)
+        assert len(storage) == 1
+        assert await storage.get_subscriptions("a/1") == [("c1", 2)]
+
+    async def test_lru_eviction(self):
+        """Tests that the least recently used topic is evicted when the cache is full."""
+        storage = CachedStorage(MemoryStorage(), max_size=2)
+        await storage.get_subscriptions("a")
+        await storage.get_subscriptions("b")
+        await storage.get_subscriptions("a")
+        await storage.get_subscriptions("c")
+        assert storage.evictions == 1
+        await storage.get_subscriptions("a")
+        assert storage.stats["hits"] == 2
+
+    async def test_shared_topics_not_cached(self):
+        """Tests that topics matching a shared subscription are looked up every time and picked in turns."""
+        storage = CachedStorage(MemoryStorage())
+        await storage.get_subscriptions("jobs/1")
+        await storage.store_subscription("w1", "$share/g/jobs/+", 1)
+        await storage.store_subscription("w2", "$share/g/jobs/+", 1)
+        await storage.get_subscriptions("other")
+        picked = {client for _ in range(4) for client, _ in await storage.get_subscriptions("jobs/1")}
+        assert picked == {"w1", "w2"}
+        assert len(storage) == 1
+        await storage.remove_subscription("w1", "$share/g/jobs/+")
+        await storage.remove_subscription("w2", "$share/g/jobs/+")
+        assert await storage.get_subscriptions("jobs/1") == []
+        assert len(storage) == 2
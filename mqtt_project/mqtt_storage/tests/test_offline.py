@@ -0,0 +1,106 @@
+import os
+import pytest
+from mqtt_common.models.message import Message
+from mqtt_storage.src.offline import OfflineQueues, SPILL_SUFFIX
+
+def _message(index: int, payload: bytes = b"payload") -> Message:
+    """Builds a QoS 1 message."""
+    return Message(topic=f"devices/{index}", payload=payload, qos=1, retain=False,
+                   message_id=index + 1, properties={"content_type": "text/plain"})
+
+def _spill_files(directory) -> list:
+    """Returns the spill file names in a directory."""
+    return [name for name in os.listdir(directory) if name.endswith(SPILL_SUFFIX)]
+
+async def _replay(queues: OfflineQueues, client_id: str, batch_size: int = 1000) -> list:
+    """Collects every message replayed for a client."""
+    return [message async for batch in queues.replay(client_id, batch_size) for message in batch]
+
+@pytest.mark.asyncio
+class TestOfflineQueues:
+    """Tests for the offline session queues."""
+
+    async def test_memory_only(self, tmp_path):
+        """Tests that a short queue stays in memory and replays in order."""
+        queues = OfflineQueues(str(tmp_path))
+        await queues.start()
+        stored = [_message(index) for index in range(10)]
+        for message in stored:
+            queues.enqueue("c1", message)
+        assert queues.queued("c1") == 10
+        assert queues.spilled == 0
+        assert await _replay(queues, "c1", batch_size=3) == stored
+        assert "c1" not in queues and queues.memory == 0
+        await queues.stop()
+
+    async def test_spills_beyond_client_memory(self, tmp_path):
+        """Tests that the tail beyond the per-client budget goes to disk and replays after the head."""
+        queues = OfflineQueues(str(tmp_path), client_memory=2000, flush_bytes=1, read_size=512)
+        await queues.start()
+        stored = [_message(index, payload=b"x" * 100) for index in range(50)]
+        for message in stored:
+            queues.enqueue("c1", message)
+        await queues.flush()
+        assert 0 < queues.spilled < 50
+        assert queues.memory <= 2000
+        assert len(_spill_files(tmp_path)) == 1
+        assert await _replay(queues, "c1") == stored
+        await queues.flush()
+        assert _spill_files(tmp_path) == []
+        await queues.stop()
+
+    async def test_global_budget(self, tmp_path):
+        """Tests that clients spill once the memory shared by all clients is used up."""
+        queues = OfflineQueues(str(tmp_path), memory_budget=3000)
+        await queues.start()
+        stored = [_message(index, payload=b"x" * 200) for index in range(20)]
+        for index, message in enumerate(stored):
+            queues.enqueue(f"c{index}", message)
+        assert queues.memory <= 3000
+        assert queues.spilled > 0
+        assert await _replay(queues, "c19") == [stored[19]]
+        await queues.stop()
+
+    async def test_order_kept_while_replaying(self, tmp_path):
+        """Tests that messages queued during a replay come after the spilled ones."""
+        queues = OfflineQueues(str(tmp_path), client_memory=0, read_size=64)
+        await queues.start()
+        stored = [_message(index) for index in range(5)]
+        for message in stored[:3]:
+            queues.enqueue("c1", message)
+        replayed = []
+        async for batch in queues.replay("c1"):
+            replayed.extend(batch)
+            if len(replayed) == 1:
+                for message in stored[3:]:
+                    queues.enqueue("c1", message)
+        assert replayed == stored
+        await queues.stop()
+
+    async def test_large_record(self, tmp_path):
+        """Tests that a message larger than read_size is read back whole."""
+        queues = OfflineQueues(str(tmp_path), client_memory=0, read_size=16)
+        await queues.start()
+        message = _message(1, payload=b"x" * 1000)
+        queues.enqueue("c1", message)
+        assert await _replay(queues, "c1") == [message]
+        await queues.stop()
+
+    async def test_discard_and_restart(self, tmp_path):
+        """Tests that discarded queues release memory and files, and stale files are cleared on start."""
+        queues = OfflineQueues(str(tmp_path), client_memory=300, flush_bytes=1)
+        await queues.start()
+        for index in range(5):
+            queues.enqueue("c1", _message(index))
+        await queues.flush()
+        assert _spill_files(tmp_path)
+        queues.discard("c1")
+        await queues.flush()
+        assert queues.memory == 0 and _spill_files(tmp_path) == []
+
+        (tmp_path / ("0" * 32 + SPILL_SUFFIX)).write_bytes(b"stale")
+        await queues.stop()
+        restarted = OfflineQueues(str(tmp_path))
+        await restarted.start()
+        assert _spill_files(tmp_path) == []
+        await restarted.stop()
@@ -0,0 +1,81 @@
+import gc
+import pytest
+from mqtt_common.models.errors import StorageError
+from mqtt_common.models.message import Message
+from mqtt_storage.src.payloads import PayloadStore, MappedPayload
+
+@pytest.fixture
+def store(tmp_path):
+    store = PayloadStore(str(tmp_path), segment_size=1024, inline_threshold=16)
+    store.open()
+    yield store
+    store.close()
+
+class TestPayloadStore:
+    """Tests for the memory-mapped payload store."""
+
+    def test_put_and_view(self, store):
+        """Tests that a stored payload is returned as a read-only view of the mapping."""
+        handle = store.put(b"firmware chunk")
+        view = handle.view()
+        assert view == b"firmware chunk"
+        assert view.readonly
+        assert handle == b"firmware chunk"
+        assert handle.tobytes() == b"firmware chunk"
+
+    def test_store_message(self, store):
+        """Tests that large message payloads move to the store and small ones stay inline."""
+        large = store.store(Message(topic="fw", payload=b"x" * 100, qos=0, retain=False))
+        small = store.store(Message(topic="fw", payload=b"x", qos=0, retain=False))
+        assert isinstance(large.payload, MappedPayload)
+        assert large.view() == b"x" * 100
+        assert small.payload == b"x"
+
+    def test_segment_reclaimed_when_unreferenced(self, store, tmp_path):
+        """Tests that a sealed segment is deleted once all its payloads are released."""
+        handles = [store.put(bytes([i]) * 400) for i in range(4)] # Two payloads per segment
+        assert store.segments == 2
+        handles[0].acquire()
+        handles[0].release()
+        handles[0].release()
+        assert store.segments == 2
+        handles[1].release()
+        assert store.segments == 1
+        assert len(list(tmp_path.iterdir())) == 1
+        assert handles[2].view() == bytes([2]) * 400
+
+    def test_release_with_exported_view(self, store):
+        """Tests that a segment can be deleted while a delivered view is still alive."""
+        first = store.put(b"a" * 600)
+        view = first.view()
+        store.put(b"b" * 600) # Seals the first segment
+        first.release()
+        assert view == b"a" * 600
+        del view
+        gc.collect()
+        store.reclaim()
+        assert store._closing == []
+
+    def test_over_release_rejected(self, store):
+        """Tests that releasing a handle more often than acquired is an error."""
+        handle = store.put(b"data")
+        handle.release()
+        with pytest.raises(StorageError):
+            handle.release()
+        with pytest.raises(StorageError):
+            handle.view()
+
+    def test_lazy_reopen(self, store, tmp_path):
+        """Tests that segments of a previous run are mapped on first access and reclaimed unless restored."""
+        kept = store.put(b"k" * 700)
+        store.put(b"d" * 700)
+        location = (kept.segment, kept.offset, kept.length)
+        store.close()
+
+        reopened = PayloadStore(str(tmp_path), segment_size=1024)
+        reopened.open()
+        assert all(segment.map is None for segment in reopened._segments.values())
+        handle = reopened.restore(*location)
+        assert reopened.reclaim() == 1
+        assert handle.view() == b"k" * 700
+        reopened.close()
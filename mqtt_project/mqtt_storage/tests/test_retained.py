@@ -0,0 +1,74 @@
+import pytest
+from mqtt_common.models.message import Message
+from mqtt_storage.src import retained
+from mqtt_storage.src.retained import RetainedStore
+
+def _retain(store: RetainedStore, topic: str, payload: bytes = b"v") -> None:
+    """Retains a QoS 0 message."""
+    store.set(Message(topic=topic, payload=payload, qos=0, retain=True))
+
+def _topics(store: RetainedStore, topic_filter: str):
+    """Returns the sorted topics of the retained messages matching a filter."""
+    return sorted(message.topic for message in store.match(topic_filter))
+
+class TestRetainedStore:
+    """Tests for storing retained messages and looking them up by subscription filter."""
+
+    @pytest.fixture
+    def store(self):
+        store = RetainedStore()
+        for topic in ("site/1/temp", "site/2/temp", "site/2/hum", "site", "other/x", "$SYS/uptime"):
+            _retain(store, topic)
+        yield store
+        store.close()
+
+    @pytest.mark.parametrize("topic_filter, topics", [
+        ("site/1/temp", ["site/1/temp"]),
+        ("site/+/temp", ["site/1/temp", "site/2/temp"]),
+        ("site/#", ["site", "site/1/temp", "site/2/hum", "site/2/temp"]),
+        ("+", ["site"]),
+        ("#", ["other/x", "site", "site/1/temp", "site/2/hum", "site/2/temp"]),
+        ("$SYS/#", ["$SYS/uptime"]),
+        ("site/3/+", []),
+    ])
+    def test_match(self, store, topic_filter, topics):
+        """Tests that a filter enumerates exactly the matching retained topics."""
+        assert _topics(store, topic_filter) == topics
+
+    def test_replace_and_delete(self, store):
+        """Tests that retaining again replaces the message and an empty payload deletes it."""
+        _retain(store, "site/1/temp", b"new")
+        assert store.get("site/1/temp").payload == b"new"
+        assert len(store) == 6
+
+        _retain(store, "site/1/temp", b"")
+        assert store.get("site/1/temp") is None
+        assert len(store) == 5
+        assert "1" not in store._root.children["site"].children
+
+    def test_spill_to_disk(self, tmp_path):
+        """Tests that payloads beyond the memory cap are spilled and read back intact."""
+        store = RetainedStore(max_memory=250, spill_path=str(tmp_path / "retained.spill"))
+        for i in range(10):
+            _retain(store, f"dev/{i}", bytes([i]) * 100)
+
+        assert store.memory_usage <= 250
+        assert store.spilled == 8
+        assert store.get("dev/0").payload == b"\x00" * 100
+        assert {m.topic: m.payload for m in store.match("dev/+")} == {
+            f"dev/{i}": bytes([i]) * 100 for i in range(10)
+        }
+        store.close()
+
+    def test_compaction(self, tmp_path, monkeypatch):
+        """Tests that replaced spilled payloads are reclaimed by compaction."""
+        monkeypatch.setattr(retained, "COMPACTION_THRESHOLD", 0)
+        store = RetainedStore(max_memory=0, spill_path=str(tmp_path / "retained.spill"))
+        for i in range(4):
+            _retain(store, f"dev/{i}", b"x" * 10)
+        for i in range(3):
+            _retain(store, f"dev/{i}", b"")
+
+        assert store._spill_end == 10
+        assert store.get("dev/3").payload == b"x" * 10
+        store.close()
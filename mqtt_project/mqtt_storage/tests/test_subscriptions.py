@@ -0,0 +1,156 @@
+import random
+import pytest
+from mqtt_common.models.errors import ValidationError
+from mqtt_storage.src.memory import MemoryStorage
+from mqtt_storage.src.subscriptions import (
+    SubscriptionTrie, LeastLoaded, hash_by_topic, parse_shared_filter, round_robin, validate_topic_filter
+)
+
+class TestSubscriptionTrie:
+    """Tests for wildcard matching in the subscription trie."""
+
+    @pytest.mark.parametrize("topic_filter, topic, matches", [
+        ("a/b/c", "a/b/c", True),
+        ("a/b/c", "a/b", False),
+        ("a/+/c", "a/x/c", True),
+        ("a/+/c", "a/x/y/c", False),
+        ("a/+", "a/", True),
+        ("+/+", "/a", True),
+        ("a/#", "a", True),
+        ("a/#", "a/b/c", True),
+        ("a/#", "ab", False),
+        ("#", "a/b", True),
+        ("+", "a/b", False),
+        ("#", "$SYS/uptime", False),
+        ("+/uptime", "$SYS/uptime", False),
+        ("$SYS/#", "$SYS/uptime", True),
+    ])
+    def test_match(self, topic_filter, topic, matches):
+        """Tests that a filter matches exactly the topics the MQTT specification allows."""
+        trie = SubscriptionTrie()
+        trie.add("c1", topic_filter, 1)
+        assert trie.match(topic) == ({"c1": 1} if matches else {})
+
+    def test_overlapping_filters_deduplicated(self):
+        """Tests that a client matching several filters is returned once with its highest QoS."""
+        trie = SubscriptionTrie()
+        trie.add("c1", "a/b", 0)
+        trie.add("c1", "a/+", 2)
+        trie.add("c1", "#", 1)
+        trie.add("c2", "a/#", 0)
+        assert trie.match("a/b") == {"c1": 2, "c2": 0}
+
+    def test_resubscribe_replaces_qos(self):
+        """Tests that subscribing again to the same filter replaces its QoS."""
+        trie = SubscriptionTrie()
+        assert trie.add("c1", "a/+", 2)
+        assert not trie.add("c1", "a/+", 0)
+        assert trie.match("a/b") == {"c1": 0}
+        assert len(trie) == 1
+
+    def test_remove_prunes_branches(self):
+        """Tests that removing the last subscription of a branch frees its nodes."""
+        trie = SubscriptionTrie()
+        trie.add("c1", "a/+/c/#", 1)
+        trie.add("c2", "a/b", 1)
+        assert trie.remove("c1", "a/+/c/#")
+        assert not trie.remove("c1", "a/+/c/#")
+        assert trie._root.children["a"].plus is None
+        assert trie.match("a/b") == {"c2": 1}
+
+    def test_remove_client(self):
+        """Tests that all subscriptions of a disconnecting client can be removed at once."""
+        trie = SubscriptionTrie()
+        for topic_filter in ("a", "a/#", "+/b"):
+            trie.add("c1", topic_filter, 1)
+        trie.add("c2", "a", 0)
+        assert trie.remove_client("c1") == 3
+        assert trie.match("a") == {"c2": 0}
+        assert trie.subscriptions("c1") == {}
+        assert len(trie) == 1
+
+    @pytest.mark.parametrize("topic_filter", ["", "a/#/b", "a#", "a/b+", "+a"])
+    def test_invalid_filters(self, topic_filter):
+        """Tests that malformed wildcard filters are rejected."""
+        with pytest.raises(ValidationError):
+            validate_topic_filter(topic_filter)
+
+
+class TestMemoryStorage:
+    """Tests for the StorageInterface implementation backed by the trie."""
+
+    @pytest.mark.asyncio
+    async def test_get_subscriptions_with_wildcards(self):
+        """Tests that get_subscriptions returns (client_id, qos) pairs for wildcard filters."""
+        storage = MemoryStorage()
+        await storage.store_subscription("c1", "sensors/+/temp", 1)
+        await storage.store_subscription("c2", "sensors/#", 0)
+        await storage.store_subscription("c3", "other", 2)
+
+        assert sorted(await storage.get_subscriptions("sensors/1/temp")) == [("c1", 1), ("c2", 0)]
+        await storage.remove_subscription("c2", "sensors/#")
+        assert await storage.get_subscriptions("sensors/1/temp") == [("c1", 1)]
+
+
+class TestSharedSubscriptions:
+    """Tests for '$share/<group>/<filter>' subscriptions."""
+
+    def _trie(self, strategy=round_robin) -> SubscriptionTrie:
+        trie = SubscriptionTrie(strategy)
+        for client_id in ("w1", "w2", "w3"):
+            trie.add(client_id, "$share/workers/jobs/+", 1)
+        return trie
+
+    @pytest.mark.parametrize("topic_filter, parsed", [
+        ("jobs/+", None),
+        ("$share/g/jobs/#", ("g", "jobs/#")),
+        ("$shared/g/a", None),
+    ])
+    def test_parse(self, topic_filter, parsed):
+        """Tests that shared filters are split into group and filter."""
+        assert parse_shared_filter(topic_filter) == parsed
+
+    @pytest.mark.parametrize("topic_filter", ["$share/g", "$share//a", "$share/g+/a", "$share/g/a/#/b"])
+    def test_invalid(self, topic_filter):
+        """Tests that malformed shared subscriptions are rejected."""
+        with pytest.raises(ValidationError):
+            SubscriptionTrie().add("c1", topic_filter, 0)
+
+    def test_one_member_per_message(self):
+        """Tests that each publish reaches one member of each group, in turns with round robin."""
+        trie = self._trie()
+        trie.add("w4", "$share/audit/jobs/#", 0)
+        trie.add("viewer", "jobs/#", 0)
+        receivers = [trie.match("jobs/1") for _ in range(6)]
+        assert all(len(r) == 3 and r["viewer"] == 0 and r["w4"] == 0 for r in receivers)
+        picked = [next(c for c in r if c.startswith("w") and c != "w4") for r in receivers]
+        assert sorted(picked) == ["w1", "w1", "w2", "w2", "w3", "w3"]
+        assert trie.match("other") == {}
+
+    def test_hash_by_topic(self):
+        """Tests that hash_by_topic sends every message of a topic to the same member."""
+        trie = self._trie(hash_by_topic)
+        assert len({tuple(trie.match("jobs/a")) for _ in range(10)}) == 1
+        assert len({tuple(trie.match(f"jobs/{n}")) for n in range(50)}) == 3
+
+    def test_least_loaded(self):
+        """Tests that LeastLoaded avoids the member with the deepest queue."""
+        depths = {"w1": 100, "w2": 0, "w3": 0}
+        trie = self._trie(LeastLoaded(depths.get, random.Random(1)))
+        picked = [client for _ in range(100) for client in trie.match("jobs/1")]
+        assert "w1" not in picked
+        assert {"w2", "w3"} <= set(picked)
+
+    def test_membership_changes(self):
+        """Tests that members can leave and that the group disappears with its last member."""
+        trie = self._trie()
+        assert trie.remove("w1", "$share/workers/jobs/+")
+        assert not trie.remove("w1", "$share/workers/jobs/+")
+        assert sorted(trie.shared_group("$share/workers/jobs/+").members) == ["w2", "w3"]
+        assert trie.remove_client("w2") == 1
+        assert trie.match("jobs/1") == {"w3": 1}
+        assert not trie.add("w3", "$share/workers/jobs/+", 2)
+        assert trie.match("jobs/1") == {"w3": 2}
+        trie.remove("w3", "$share/workers/jobs/+")
+        assert trie.shared_group("$share/workers/jobs/+") is None
+        assert len(trie) == 0 and trie.match("jobs/1") == {}
@@ -0,0 +1,178 @@
+import asyncio
+import errno
+import os
+import pytest
+from mqtt_common.models.errors import StorageError
+from mqtt_common.models.message import Message
+from mqtt_storage.src.wal import WALStorage, SEGMENT_SUFFIX
+
+def _message(message_id: int, payload: bytes = b"payload") -> Message:
+    """Builds a QoS 1 message."""
+    return Message(topic=f"devices/{message_id}", payload=payload, qos=1, retain=False,
+                   message_id=message_id, properties={"content_type": "text/plain"})
+
+def _segments(directory) -> list:
+    """Returns the segment file names in a log directory."""
+    return sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+@pytest.mark.asyncio
+class TestWALStorage:
+    """Tests for the write-ahead log storage backend."""
+
+    async def test_recovery(self, tmp_path):
+        """Tests that messages and subscriptions are rebuilt from the log on startup."""
+        storage = WALStorage(str(tmp_path))
+        await storage.start()
+        stored = [_message(message_id) for message_id in range(1, 6)]
+        for message in stored:
+            await storage.store_message(message)
+        await storage.remove_message(2)
+        await storage.store_subscription("c1", "devices/+", 1)
+        await storage.store_subscription("c2", "devices/#", 0)
+        await storage.remove_subscription("c2", "devices/#")
+        await storage.stop()
+
+        recovered = WALStorage(str(tmp_path))
+        await recovered.start()
+        assert sorted(recovered.messages) == [1, 3, 4, 5]
+        assert await recovered.get_message(3) == stored[2]
+        assert await recovered.get_subscriptions("devices/1") == [("c1", 1)]
+        await recovered.stop()
+
+    async def test_group_commit(self, tmp_path):
+        """Tests that concurrent writers share commits instead of syncing once each."""
+        storage = WALStorage(str(tmp_path), max_commit_latency=0.01)
+        await storage.start()
+        await asyncio.gather(*(storage.store_message(_message(i)) for i in range(1, 201)))
+        assert storage.commits < 10
+        await storage.stop()
+
+    async def test_failed_commit_keeps_writer(self, tmp_path):
+        """Tests that a failing commit fails its awaiters and later commits still complete."""
+        storage = WALStorage(str(tmp_path))
+        await storage.start()
+        write = storage._write
+
+        def fail_once(chunks):
+            storage._write = write
+            raise ValueError("disk on fire")
+
+        storage._write = fail_once
+        with pytest.raises(StorageError):
+            await storage.store_message(_message(1))
+        assert isinstance(storage.last_error, StorageError)
+        await asyncio.wait_for(storage.store_message(_message(2)), 1)
+        assert storage.commits == 1
+        assert sorted(storage.messages) == [2]
+        await storage.stop()
+
+    async def test_torn_commit_is_undone(self, tmp_path, monkeypatch):
+        """Tests that a commit failing halfway leaves no torn record before later ones."""
+        storage = WALStorage(str(tmp_path))
+        await storage.start()
+        await storage.store_subscription("c1", "devices/+", 1)
+        write = os.write
+
+        def write_half(fd, data):
+            monkeypatch.setattr(os, "write", write)
+            write(fd, data[:len(data) // 2])
+            raise OSError(errno.ENOSPC, "No space left on device")
+
+        monkeypatch.setattr(os, "write", write_half)
+        with pytest.raises(StorageError):
+            await asyncio.gather(storage.store_message(_message(1)), storage.store_subscription("c2", "devices/#", 0))
+        assert 1 not in storage.messages and not storage.subscriptions.subscriptions("c2")
+        await storage.store_message(_message(2))
+        await storage.store_message(_message(3))
+        await storage.stop()
+
+        recovered = WALStorage(str(tmp_path))
+        await recovered.start()
+        assert sorted(recovered.messages) == [2, 3]
+        assert await recovered.get_subscriptions("devices/1") == [("c1", 1)]
+        await recovered.stop()
+
+    async def test_failed_truncation_stops_writes(self, tmp_path, monkeypatch):
+        """Tests that the log refuses writes once a torn commit could not be truncated."""
+        storage = WALStorage(str(tmp_path))
+        await storage.start()
+        await storage.store_message(_message(1))
+
+        def fail(*args):
+            raise OSError(errno.EIO, "Input/output error")
+
+        monkeypatch.setattr(os, "fsync", fail)
+        monkeypatch.setattr(os, "ftruncate", fail)
+        with pytest.raises(StorageError):
+            await storage.store_message(_message(2))
+        monkeypatch.undo()
+        with pytest.raises(StorageError, match="accepts no more writes"):
+            await storage.store_message(_message(3))
+        assert sorted(storage.messages) == [1]
+        await storage.stop()
+
+    async def test_requires_start(self, tmp_path):
+        """Tests that durable writes before start() or after stop() raise StorageError."""
+        storage = WALStorage(str(tmp_path))
+        with pytest.raises(StorageError):
+            await storage.store_subscription("c1", "devices/+", 1)
+        with pytest.raises(StorageError):
+            await storage.store_message(_message(1))
+        await storage.start()
+        await storage.store_subscription("c1", "devices/+", 1)
+        await storage.stop()
+        with pytest.raises(StorageError):
+            await storage.remove_subscription("c1", "devices/+")
+
+    async def test_torn_tail_is_truncated(self, tmp_path):
+        """Tests that an incomplete record at the end of the log is discarded."""
+        storage = WALStorage(str(tmp_path))
+        await storage.start()
+        await storage.store_message(_message(1))
+        await storage.stop()
+        path = tmp_path / _segments(tmp_path)[-1]
+        size = path.stat().st_size
+        with open(path, "ab") as segment:
+            segment.write(b"\x00\x00\x01\x00\x01") # Header of a record that was never completed
+
+        recovered = WALStorage(str(tmp_path))
+        await recovered.start()
+        assert list(recovered.messages) == [1]
+        assert path.stat().st_size == size
+        await recovered.stop()
+
+    async def test_acknowledged_segments_are_deleted(self, tmp_path):
+        """Tests that rolled segments are removed once all their messages are acknowledged."""
+        storage = WALStorage(str(tmp_path), segment_size=1024, max_segments=100)
+        await storage.start()
+        for message_id in range(1, 51):
+            await storage.store_message(_message(message_id, b"x" * 100))
+        assert len(_segments(tmp_path)) > 3
+        for message_id in range(1, 51):
+            await storage.remove_message(message_id)
+        await storage.store_message(_message(51)) # Commits the acknowledgements
+        await storage.flush()
+        assert len(_segments(tmp_path)) <= 2
+        await storage.stop()
+
+    async def test_compaction_keeps_subscriptions(self, tmp_path):
+        """Tests that segments pinned by subscriptions are compacted into a snapshot."""
+        storage = WALStorage(str(tmp_path), segment_size=256, max_segments=2)
+        await storage.start()
+        for i in range(100):
+            await storage.store_subscription(f"c{i % 10}", f"site/{i}/#", i % 3)
+            if i % 2:
+                await storage.remove_subscription(f"c{(i - 1) % 10}", f"site/{i - 1}/#")
+        await storage.store_message(_message(7))
+        await storage.flush()
+        assert storage.compactions > 0
+        assert len(_segments(tmp_path)) <= 4
+        expected = {f"c{i % 10}": i % 3 for i in range(100) if i % 2}
+        await storage.stop()
+
+        recovered = WALStorage(str(tmp_path))
+        await recovered.start()
+        assert len(recovered.subscriptions) == 50
+        assert await recovered.get_subscriptions("site/99/x") == [("c9", expected["c9"])]
+        assert list(recovered.messages) == [7]
+        await recovered.stop()